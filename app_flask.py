@@ -89,6 +89,8 @@ app_state = {
     'bybit_trader': None,
     'bybit_trading': False,
     'bybit_thread': None,
+    'bybit_scheduler': None,
+    'indicator_states': None,
     'user_config': {},
     'cases': [],
     'config_manager': None,
@@ -2,9 +2,13 @@
 AI 預測日誌工具模塊
 負責保存和更新 AI 預測日誌
 """
+import threading
 from typing import Dict
 from datetime import datetime
 
+# 多幣種排程會從多個執行緒寫入日誌
+_log_lock = threading.Lock()
+
 
 def save_ai_prediction_log(
     app_state: Dict,
@@ -45,16 +49,18 @@ def save_ai_prediction_log(
         'adx': market_data.get('adx')
     }
     
-    if app_state['ai_prediction_logs']:
-        _update_previous_log_accuracy(
-            app_state['ai_prediction_logs'],
-            price
-        )
-    
-    app_state['ai_prediction_logs'].append(log_entry)
-    
-    if len(app_state['ai_prediction_logs']) > 100:
-        app_state['ai_prediction_logs'] = app_state['ai_prediction_logs'][-100:]
+    with _log_lock:
+        if app_state['ai_prediction_logs']:
+            _update_previous_log_accuracy(
+                app_state['ai_prediction_logs'],
+                price,
+                symbol
+            )
+        
+        app_state['ai_prediction_logs'].append(log_entry)
+        
+        if len(app_state['ai_prediction_logs']) > 100:
+            app_state['ai_prediction_logs'] = app_state['ai_prediction_logs'][-100:]
     
     model_info = f" ({log_entry['model_type']} model)" if log_entry['model_type'] in ['dual', 'arbitrator'] else ""
     counter_info = " [Counter-trend]" if log_entry['is_counter_trend'] else ""
@@ -74,12 +80,12 @@ def _get_direction_from_action(action: str) -> str:
         return 'NEUTRAL'
 
 
-def _update_previous_log_accuracy(logs: list, current_price: float):
-    if len(logs) < 1:
+def _update_previous_log_accuracy(logs: list, current_price: float, symbol: str = None):
+    # 與同一幣種的上一筆預測比較
+    prev_log = next((log for log in reversed(logs) if symbol is None or log.get('symbol') == symbol), None)
+    if prev_log is None:
         return
     
-    prev_log = logs[-1]
-    
     if prev_log['is_correct'] is not None:
         return
     
@@ -26,6 +26,7 @@
   - 交易審核: 基於信心度和市場狀況最終核准
   - 強健 JSON 解析: 自動修復各種格式錯誤
   - Gemini API 超時保護: 60秒超時 + 重試機制
+  - 並行分析: Model A / B 同時呼叫，主力太慢時對沖備用模型 (hedge_delay_seconds)
 
 優勢：
   - 跨平台備援：Groq + Google + OpenRouter
@@ -43,13 +44,23 @@
   - Gemini API 卡住: 添加超時保護 + 重試 + 更好的錯誤處理
 """
 import json
+import threading
 import time
 import os
-from typing import Dict, Optional, List, Tuple
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, List, Tuple
 from datetime import datetime
 from pathlib import Path
 
+from core.decision_cache import LLMResponseCache
+from core.llm_replay import open_replay
+from core.prompt_compiler import (
+    CompiledPrompt, PromptCompiler, PromptSection, compact_json, estimate_tokens, head_variants, tail_variants, to_csv
+)
+from core.llm_http_client import chat_content, get_provider_client
+from core.model_hedging import hedged_call
+from core.stream_decision import DecisionStream
+
 # 導入強健 JSON 解析器
 try:
     from core.json_parser_robust import parse_trading_decision
@@ -69,42 +80,45 @@ class ModelInterface:
     
     def analyze(self, system_prompt: str, user_prompt: str) -> Dict:
         raise NotImplementedError
+    
+    def analyze_stream(self, system_prompt: str, user_prompt: str, on_delta: Callable[[str], None]) -> Dict:
+        """串流版的 analyze，不支援串流的模型在完成後一次送出全部內容"""
+        result = self.analyze(system_prompt, user_prompt)
+        if result.get('success') and result.get('content'):
+            on_delta(result['content'])
+        return result
 
 
 class OpenAICompatibleModel(ModelInterface):
-    def analyze(self, system_prompt: str, user_prompt: str) -> Dict:
-        headers = {
-            'Authorization': f'Bearer {self.api_key}',
-            'Content-Type': 'application/json'
-        }
-        
+    def _headers(self) -> Dict:
+        headers = {}
         if 'openrouter.ai' in self.base_url:
             headers['HTTP-Referer'] = 'https://github.com/caizongxun/STW'
             headers['X-Title'] = 'STW Trading Bot'
-        
-        payload = {
-            'model': self.model,
-            'messages': [
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': user_prompt}
-            ],
-            'temperature': 0.2,
-            'max_tokens': 4000
-        }
-        
+        return headers
+    
+    def _messages(self, system_prompt: str, user_prompt: str) -> List[Dict]:
+        return [
+            {'role': 'system', 'content': system_prompt},
+            {'role': 'user', 'content': user_prompt}
+        ]
+    
+    def analyze(self, system_prompt: str, user_prompt: str) -> Dict:
         try:
             start_time = time.time()
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=60
+            # 共用連線池 (keep-alive)，避免每次重新 TLS 握手
+            result = get_provider_client().chat_completion(
+                self.base_url,
+                self.api_key,
+                self.model,
+                self._messages(system_prompt, user_prompt),
+                timeout=60,
+                headers=self._headers(),
+                temperature=0.2,
+                max_tokens=4000
             )
             elapsed = time.time() - start_time
-            
-            response.raise_for_status()
-            result = response.json()
-            content = result['choices'][0]['message']['content']
+            content = chat_content(result)
             
             return {
                 'success': True,
@@ -119,6 +133,38 @@ class OpenAICompatibleModel(ModelInterface):
                 'model': self.model,
                 'elapsed_time': 0
             }
+    
+    def analyze_stream(self, system_prompt: str, user_prompt: str, on_delta: Callable[[str], None]) -> Dict:
+        """以 SSE 串流呼叫，每段內容交給 on_delta；返回與 analyze 相同格式的完整結果"""
+        parts = []
+        try:
+            start_time = time.time()
+            for chunk in get_provider_client().stream_chat_completion(
+                self.base_url,
+                self.api_key,
+                self.model,
+                self._messages(system_prompt, user_prompt),
+                timeout=60,
+                headers=self._headers(),
+                temperature=0.2,
+                max_tokens=4000
+            ):
+                parts.append(chunk)
+                on_delta(chunk)
+            
+            return {
+                'success': True,
+                'content': ''.join(parts),
+                'model': self.model,
+                'elapsed_time': time.time() - start_time
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'model': self.model,
+                'elapsed_time': 0
+            }
 
 
 class GeminiModel(ModelInterface):
@@ -243,10 +289,48 @@ class ArbitratorConsensusAgent:
             {'provider': 'groq', 'model': 'mixtral-8x7b-32768', 'name': 'Mixtral_8x7B'},
             {'provider': 'openrouter', 'model': 'deepseek/deepseek-r1:free', 'name': 'DeepSeek_R1'}
         ],
-        'enable_trading_executor': True
+        'enable_trading_executor': True,
+        # 主力模型超過此秒數未回應時，同時呼叫下一個備用模型 (0 = 只在失敗時切換)
+        'hedge_delay_seconds': 15,
+        # Model A / Model B 各自的整體期限 (含備用模型)
+        'model_deadline_seconds': 90,
+        # 同一根 K 棒內相同 prompt 的回應快取
+        'decision_cache': {
+            'enabled': True,
+            'bar_seconds': 900,
+            'max_entries': 256,
+            'disk_dir': None
+        },
+        # Prompt token 預算: 緊湊編碼 (CSV / 無縮排 JSON、有效位數) 並依優先度放入區段
+        'prompt_budget': {
+            'enabled': True,
+            'max_tokens': 3000,
+            'significant_digits': 5
+        },
+        # LLM 回應錄製 / 重播 (live / record / replay)，重播時不呼叫任何遠端模型
+        'llm_replay': {
+            'mode': 'live',
+            'path': 'data/llm_replay.jsonl'
+        },
+        # 串流回應: action / confidence 一出現就發布決策，兩個模型都先輸出 HOLD 時不等 reasoning 直接完成
+        'streaming': {
+            'enabled': True
+        }
     }
     
-    def __init__(self, config_file: str = 'arbitrator_config.json'):
+    # 多個幣種同時分析時共用決策歷史與歷史檔
+    _history_lock = threading.Lock()
+    
+    # 每個同時分析名額: Model A / B 各一個 fanout 執行緒；呼叫執行緒另外預留對沖的備用模型
+    FANOUT_WORKERS_PER_SLOT = 2
+    CALL_WORKERS_PER_SLOT = 4
+    DEFAULT_MAX_CONCURRENCY = 4
+    
+    def __init__(self, config_file: str = 'arbitrator_config.json', max_concurrency: Optional[int] = None):
+        """
+        Args:
+            max_concurrency: 同時分析的幣種數 (即時交易時與排程的 max_llm_concurrency 相同)
+        """
         self.primary_model_a = None
         self.primary_model_b = None
         self.backup_models_a = []
@@ -257,7 +341,12 @@ class ArbitratorConsensusAgent:
         self.arbitration_count = 0
         self.agreement_count = 0
         
+        # 最近一次完成的分析 (全部幣種 / 各幣種)；分析進行中的內容只放在區域變數
         self.last_analysis_detail = None
+        self.analysis_details: Dict[str, Dict] = {}
+        
+        # Model A / Model B 同時分析；模型呼叫 (含對沖的備用模型) 在 _call_pool 執行
+        self._create_pools(max_concurrency or self.DEFAULT_MAX_CONCURRENCY)
         
         self.config_file = Path(config_file)
         self.model_config = self._load_config()
@@ -277,9 +366,49 @@ class ArbitratorConsensusAgent:
                 print(f"[WARNING] 交易執行審核員無法啟動: {e}")
                 self.trading_executor = None
         
+        # LLM 回應快取 (Model A / B、仲裁者、執行審核員共用)
+        self.response_cache = None
+        cache_config = self.model_config.get('decision_cache', self.DEFAULT_CONFIG['decision_cache'])
+        if cache_config.get('enabled', True):
+            self.response_cache = LLMResponseCache(
+                max_entries=cache_config.get('max_entries', 256),
+                bar_seconds=cache_config.get('bar_seconds', 900),
+                disk_dir=cache_config.get('disk_dir')
+            )
+            if self.trading_executor:
+                self.trading_executor.response_cache = self.response_cache
+        
+        # LLM 回應錄製 / 重播 (Model A / B、仲裁者、執行審核員共用)
+        self.llm_replay = open_replay(self.model_config.get('llm_replay', self.DEFAULT_CONFIG['llm_replay']))
+        if self.llm_replay:
+            print(f"[REPLAY] LLM 回應 {self.llm_replay.mode} 模式: {self.llm_replay.store.path} ({len(self.llm_replay.store)} 筆)")
+            if self.trading_executor:
+                self.trading_executor.llm_replay = self.llm_replay
+        
+        # Prompt 編譯器 (None 表示使用原本的 json.dumps + 手動裁剪)
+        self.prompt_compiler = None
+        self.prompt_digits = 5
+        budget_config = self.model_config.get('prompt_budget', self.DEFAULT_CONFIG['prompt_budget'])
+        if budget_config.get('enabled', True):
+            self.prompt_compiler = PromptCompiler(max_tokens=budget_config.get('max_tokens', 3000))
+            self.prompt_digits = budget_config.get('significant_digits', 5)
+        
         # 初始化模型 (必須在 trading_executor 之後)
         self._init_models()
     
+    def _create_pools(self, max_concurrency: int):
+        """
+        依同時分析的幣種數建立執行緒池
+        所有幣種共用同一個仲裁者，池太小時幣種會排隊 (提早 HOLD 的背景串流也佔用執行緒，直到名額釋放)
+        """
+        self.max_concurrency = max(1, int(max_concurrency))
+        self._fanout_pool = ThreadPoolExecutor(
+            max_workers=self.FANOUT_WORKERS_PER_SLOT * self.max_concurrency, thread_name_prefix='arbitrator-fanout'
+        )
+        self._call_pool = ThreadPoolExecutor(
+            max_workers=self.CALL_WORKERS_PER_SLOT * self.max_concurrency, thread_name_prefix='arbitrator-call'
+        )
+    
     def _load_config(self) -> Dict:
         try:
             if self.config_file.exists():
@@ -368,6 +497,10 @@ class ArbitratorConsensusAgent:
             self.decision_history = []
     
     def _save_history(self):
+        with self._history_lock:
+            self._save_history_locked()
+    
+    def _save_history_locked(self):
         try:
             recent_decisions = self.decision_history[-100:]
             
@@ -377,6 +510,7 @@ class ArbitratorConsensusAgent:
                 safe_record = {
                     'timestamp': record.get('timestamp'),
                     'datetime': record.get('datetime'),
+                    'symbol': record.get('symbol'),
                     'needed_arbitration': record.get('needed_arbitration'),
                     'market_price': record.get('market_price')
                 }
@@ -403,11 +537,23 @@ class ArbitratorConsensusAgent:
         except Exception as e:
             print(f"[WARNING] 保存歷史失敗: {e}")
     
-    def _get_recent_decisions(self, limit=5) -> List[Dict]:
-        if not self.decision_history:
+    def _get_recent_decisions(self, limit=5, before: Optional[float] = None,
+                              symbol: Optional[str] = None) -> List[Dict]:
+        """
+        Args:
+            before: 只取此時間 (epoch 秒) 之前的決策
+            symbol: 只取此幣種的決策 (多幣種同時交易時不混入其他幣種)
+        """
+        with self._history_lock:
+            history = list(self.decision_history)
+        if symbol is not None:
+            history = [r for r in history if r.get('symbol') == symbol]
+        if before is not None:
+            history = [r for r in history if r.get('timestamp', 0) < before]
+        if not history:
             return []
         recent = []
-        for record in reversed(self.decision_history[-limit:]):
+        for record in reversed(history[-limit:]):
             final = record.get('final', {})
             recent.append({
                 'datetime': record.get('datetime', ''),
@@ -508,42 +654,196 @@ class ArbitratorConsensusAgent:
         print("  Gemini API: 60s 超時 + 自動重試")
         print("="*70 + "\n")
     
-    def _try_model_with_backups(self, primary_model, backup_models, system_prompt, user_prompt, label="Model"):
-        if primary_model:
-            print(f"\n[{primary_model.name}] 分析中...")
-            result = primary_model.analyze(system_prompt, user_prompt)
-            
-            if result['success']:
-                decision = self._parse_decision(result['content'])
-                decision['raw_reasoning'] = result['content']
-                decision['model_name'] = primary_model.name
-                print(f"[OK] [{primary_model.name}]: {decision['action']} (信心度 {decision['confidence']}%) - {result['elapsed_time']:.1f}s")
-                print(f"     理由: {decision['reasoning'][:80]}...")
-                return decision, result['content']  # 返回完整內容
-            else:
-                error_msg = result.get('error', 'Unknown')[:150]
-                print(f"[FAIL] [{primary_model.name}] 失敗: {error_msg}")
-                if 'Payload Too Large' in error_msg or '413' in error_msg:
-                    print("       -> 建議: 減少歷史 K 棒數量")
-        
-        for idx, backup in enumerate(backup_models, 1):
-            print(f"\n[BACKUP] 嘗試備用模型 {idx}: [{backup.name}]")
-            time.sleep(1)
-            
-            result = backup.analyze(system_prompt, user_prompt)
-            
-            if result['success']:
-                decision = self._parse_decision(result['content'])
-                decision['raw_reasoning'] = result['content']
-                decision['model_name'] = backup.name
-                print(f"[OK] [{backup.name}]: {decision['action']} (信心度 {decision['confidence']}%) - {result['elapsed_time']:.1f}s")
-                print(f"     理由: {decision['reasoning'][:80]}...")
-                return decision, result['content']  # 返回完整內容
+    def _analyze_cached(self, model, system_prompt: str, user_prompt: str,
+                        stream: Optional[DecisionStream] = None, cache_key: Optional[str] = None) -> Dict:
+        """
+        呼叫模型；同一根 K 棒內相同的狀態直接返回快取的回應，設定錄製 / 重播時經過錄製檔
+        
+        stream: 串流解析器；快取 / 重播命中或模型不支援串流時，完整內容一次送入
+        cache_key: 快取用的正規化狀態 (LLMResponseCache.bar_state)，None 時以 user prompt 為鍵
+        """
+        provider = f"{type(model).__name__}:{model.base_url}"
+        if self.llm_replay:
+            result = self.llm_replay.complete(
+                provider, model.model, system_prompt, user_prompt,
+                lambda: self._analyze_cached_live(model, provider, system_prompt, user_prompt, stream, cache_key)
+            )
+        else:
+            result = self._analyze_cached_live(model, provider, system_prompt, user_prompt, stream, cache_key)
+        if stream is not None and not stream.text and result.get('success') and result.get('content'):
+            stream.feed(result['content'])
+        return result
+    
+    def _analyze_cached_live(self, model, provider: str, system_prompt: str, user_prompt: str,
+                             stream: Optional[DecisionStream] = None, cache_key: Optional[str] = None) -> Dict:
+        def call():
+            if stream is not None:
+                return model.analyze_stream(system_prompt, user_prompt, stream.feed)
+            return model.analyze(system_prompt, user_prompt)
+        
+        if not self.response_cache:
+            return call()
+        
+        cache_args = (provider, model.model, system_prompt, cache_key or user_prompt)
+        result = self.response_cache.get(*cache_args)
+        if result is not None:
+            result['elapsed_time'] = 0.0
+            result['cached'] = True
+            return result
+        
+        result = call()
+        if result.get('success'):
+            self.response_cache.put(*cache_args, result)
+        return result
+    
+    def _streaming_enabled(self) -> bool:
+        return self.model_config.get('streaming', self.DEFAULT_CONFIG['streaming']).get('enabled', True)
+    
+    def _try_model_with_backups(self, primary_model, backup_models, system_prompt, user_prompt, label="Model",
+                                on_early: Optional[Callable[[object, Dict], None]] = None,
+                                on_stream: Optional[Callable[[str, Dict], None]] = None,
+                                cache_key: Optional[str] = None):
+        """
+        呼叫主力模型，慢或失敗時對沖備用模型，返回最先成功的結果
+        
+        主力超過 hedge_delay_seconds 未回應 -> 同時呼叫下一個備用模型
+        任一模型失敗 -> 立即呼叫下一個備用模型
+        超過 model_deadline_seconds -> 放棄
+        
+        串流時 (on_early / on_stream 其一不為 None):
+            on_early(model, fields): 該模型的 action / confidence 已輸出 (reasoning 還在串流)
+            on_stream(event, payload): 'delta' 每段文字、'done' 完整結果 (推送到前端)
+        """
+        def on_launch(model, index):
+            if index == 0:
+                print(f"\n[{model.name}] 分析中...")
             else:
-                print(f"[FAIL] [{backup.name}] 失敗: {result.get('error', 'Unknown')[:80]}")
+                print(f"\n[BACKUP] 嘗試備用模型 {index}: [{model.name}]")
+        
+        def on_failure(model, result):
+            error_msg = result.get('error', 'Unknown')[:150]
+            print(f"[FAIL] [{model.name}] 失敗: {error_msg}")
+            if 'Payload Too Large' in error_msg or '413' in error_msg:
+                print("       -> 建議: 減少歷史 K 棒數量")
+        
+        def call(model):
+            if on_early is None and on_stream is None:
+                return self._analyze_cached(model, system_prompt, user_prompt, cache_key=cache_key)
+            stream = DecisionStream(
+                on_decision=(lambda fields: on_early(model, fields)) if on_early else None,
+                on_delta=(lambda text: on_stream('delta', {'label': label, 'model': model.name, 'text': text}))
+                if on_stream else None
+            )
+            try:
+                return self._analyze_cached(model, system_prompt, user_prompt, stream, cache_key)
+            finally:
+                stream.finish()
+        
+        model, result = hedged_call(
+            [primary_model] + list(backup_models),
+            call,
+            self._call_pool,
+            hedge_delay=self.model_config.get('hedge_delay_seconds', self.DEFAULT_CONFIG['hedge_delay_seconds']),
+            deadline=self.model_config.get('model_deadline_seconds', self.DEFAULT_CONFIG['model_deadline_seconds']),
+            on_launch=on_launch,
+            on_failure=on_failure
+        )
+        
+        if model is None:
+            print(f"\n[FAIL] {label} 所有模型都失敗")
+            if on_stream:
+                on_stream('done', {'label': label, 'success': False})
+            return None, None
+        
+        decision = self._parse_decision(result['content'])
+        decision['raw_reasoning'] = result['content']
+        decision['model_name'] = model.name
+        print(f"[OK] [{model.name}]: {decision['action']} (信心度 {decision['confidence']}%) - {result['elapsed_time']:.1f}s")
+        print(f"     理由: {decision['reasoning'][:80]}...")
+        if on_stream:
+            on_stream('done', {
+                'label': label, 'success': True, 'model': model.name, 'action': decision['action'],
+                'confidence': decision['confidence'], 'reasoning': decision['reasoning']
+            })
+        return decision, result['content']  # 返回完整內容
+    
+    def _early_decision(self, fields: Dict, model_name: str) -> Dict:
+        """串流中途的決策: 已輸出的欄位蓋過緊急 HOLD 的預設值 (reasoning 可能還沒輸出)"""
+        decision = self._emergency_hold()
+        for key, value in fields.items():
+            if key in decision and value is not None:
+                decision[key] = value
+        decision['action'] = str(decision['action']).upper()
+        try:
+            decision['confidence'] = int(float(decision['confidence']))
+        except (TypeError, ValueError):
+            decision['confidence'] = 0
+        if 'reasoning' not in fields:
+            decision['reasoning'] = '(串流中，理由尚未輸出)'
+        decision['model_name'] = model_name
+        decision['early'] = True
+        return decision
+    
+    def _finish_in_background(self, background: List[Tuple], on_stream, on_settled):
+        """
+        提早完成的決策在背景的串流結束後:
+        以 'completed' 事件發布完整理由，兩個都結束後以補上理由的新分析記錄取代已發布的記錄，
+        最後呼叫 on_settled (已返回的決策、決策歷史與分析記錄都不修改)
+        """
+        if not background:
+            if on_settled:
+                on_settled()
+            return
         
-        print(f"\n[FAIL] {label} 所有模型都失敗")
-        return None, None
+        remaining = len(background)
+        responses = {}
+        lock = threading.Lock()
+        analysis_detail = background[0][3]
+        
+        def completed(done_future, label, key):
+            nonlocal remaining
+            try:
+                try:
+                    full_decision, raw_content = done_future.result()
+                except Exception:
+                    full_decision = raw_content = None
+                if full_decision:
+                    with lock:
+                        responses[key] = {'raw_content': raw_content, 'reasoning': full_decision['reasoning']}
+                    if on_stream:
+                        on_stream('completed', {
+                            'label': label, 'model': full_decision.get('model_name'), 'action': full_decision['action'],
+                            'confidence': full_decision['confidence'], 'reasoning': full_decision['reasoning']
+                        })
+            finally:
+                with lock:
+                    remaining -= 1
+                    settled = remaining == 0
+                if settled:
+                    try:
+                        self._replace_analysis_detail(analysis_detail, responses)
+                    finally:
+                        if on_settled:
+                            on_settled()
+        
+        for future, label, key, _ in background:
+            future.add_done_callback(lambda f, label=label, key=key: completed(f, label, key))
+    
+    def _replace_analysis_detail(self, analysis_detail: Dict, responses: Dict):
+        """以補上完整回應的新分析記錄取代已發布的記錄 (之後又有新的分析時不取代)"""
+        if not responses:
+            return
+        model_responses = dict(analysis_detail['model_responses'])
+        for key, response in responses.items():
+            if key in model_responses:
+                model_responses[key] = {**model_responses[key], **response}
+        replacement = {**analysis_detail, 'model_responses': model_responses}
+        symbol = analysis_detail.get('symbol')
+        with self._history_lock:
+            if self.last_analysis_detail is analysis_detail:
+                self.last_analysis_detail = replacement
+            if symbol is not None and self.analysis_details.get(symbol) is analysis_detail:
+                self.analysis_details[symbol] = replacement
     
     # ... (其他方法保持不變,太長省略)
     
@@ -554,8 +854,30 @@ class ArbitratorConsensusAgent:
         position_info: Optional[Dict] = None,
         historical_candles: Optional[List[Dict]] = None,
         successful_cases: Optional[List[Dict]] = None,
-        multi_timeframe_data: Optional[Dict] = None
+        multi_timeframe_data: Optional[Dict] = None,
+        on_stream: Optional[Callable[[str, Dict], None]] = None,
+        on_settled: Optional[Callable[[], None]] = None
     ) -> Dict:
+        """
+        on_stream(event, payload): 串流事件 (推送到前端)
+            'decision'   某個模型的 action / confidence 已輸出
+            'delta'      模型輸出的一段文字
+            'done'       某個模型的完整結果
+            'completed'  提早完成的決策返回之後，該模型的完整理由 (已返回的決策不會再修改)
+        on_settled(): 所有模型呼叫都結束時呼叫一次；提早完成時在背景的串流結束後才呼叫
+            (呼叫端以此釋放 LLM 同時呼叫名額)
+        """
+        background = []           # 提早完成後仍在背景串流的呼叫: (future, label, key, analysis_detail)
+        try:
+            return self._analyze_with_arbitration(
+                market_data, account_info, position_info, historical_candles,
+                successful_cases, multi_timeframe_data, on_stream, background
+            )
+        finally:
+            self._finish_in_background(background, on_stream, on_settled)
+    
+    def _analyze_with_arbitration(self, market_data, account_info, position_info, historical_candles,
+                                  successful_cases, multi_timeframe_data, on_stream, background) -> Dict:
         if not self.primary_model_a and not self.primary_model_b:
             print("[WARNING] 快速模型未配置，降級為單模型")
             from core.llm_agent_position_aware import PositionAwareDeepSeekAgent
@@ -566,17 +888,23 @@ class ArbitratorConsensusAgent:
         print(f"[ANALYSIS] {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - 階段 1: 兩個快速模型分析")
         print("="*70)
         
-        recent_decisions = self._get_recent_decisions(5)
-        
-        # 減少 Payload: 歷史 K 棒從 20 根減至 10 根
-        if historical_candles and len(historical_candles) > 10:
-            historical_candles = historical_candles[-10:]
+        # 啟用快取時只參考之前 K 棒的決策，讓同一根 K 棒的重複分析產生相同的 prompt
+        bar_start = self.response_cache.current_bar_start() if self.response_cache else None
+        symbol = market_data.get('symbol')
+        recent_decisions = self._get_recent_decisions(5, before=bar_start, symbol=symbol)
+        # 快取鍵只用已收盤的狀態: 同一根 K 棒內未收盤價格、帳戶餘額的變化不影響命中
+        cache_state = self.response_cache.bar_state(
+            bar_start, symbol, historical_candles, position_info
+        ) if self.response_cache else None
         
-        # 減少 Payload: 成功案例從 10 個減至 3 個
-        if successful_cases and len(successful_cases) > 3:
-            successful_cases = successful_cases[:3]
+        # 沒有 token 預算時手動減少 Payload: 歷史 K 棒 20 -> 10 根，成功案例 10 -> 3 個
+        if not self.prompt_compiler:
+            if historical_candles and len(historical_candles) > 10:
+                historical_candles = historical_candles[-10:]
+            if successful_cases and len(successful_cases) > 3:
+                successful_cases = successful_cases[:3]
         
-        system_prompt, user_prompt = self._prepare_prompts(
+        system_prompt, user_prompt, prompt_report = self._build_prompts(
             market_data, account_info, position_info,
             historical_candles, successful_cases, recent_decisions,
             multi_timeframe_data
@@ -584,24 +912,81 @@ class ArbitratorConsensusAgent:
         
         prompt_size = len(system_prompt) + len(user_prompt)
         print(f"[INFO] Prompt 大小: {prompt_size:,} 字元")
+        if prompt_report:
+            print(f"[INFO] Prompt 預算: {prompt_report.summary()}")
         
-        self.last_analysis_detail = {
+        # 其他幣種可能同時在分析，這次分析的記錄只放在區域變數，完成後才發布
+        analysis_detail = {
             'timestamp': datetime.now().isoformat(),
+            'symbol': symbol,
             'system_prompt': system_prompt,
             'user_prompt': user_prompt,
+            'prompt_report': prompt_report.report() if prompt_report else None,
             'model_responses': {}
         }
         
-        decision_a, raw_content_a = self._try_model_with_backups(
-            self.primary_model_a,
-            self.backup_models_a,
-            system_prompt,
-            user_prompt,
-            "Model A"
-        )
+        # Model A / Model B 同時呼叫 (串流時 action / confidence 先到)
+        streaming = self._streaming_enabled()
+        labels = ('Model A', 'Model B')
+        early = {}
+        early_ready = {label: threading.Event() for label in labels}
+        early_lock = threading.Lock()
+        
+        def early_listener(label):
+            def on_early(model, fields):
+                with early_lock:
+                    if label in early:           # 對沖時以最先輸出的模型為準
+                        return
+                    early[label] = self._early_decision(fields, model.name)
+                print(f"[STREAM] {label} [{model.name}]: {early[label]['action']} (信心度 {early[label]['confidence']}%)，理由串流中...")
+                if on_stream:
+                    on_stream('decision', {
+                        'label': label, 'model': model.name,
+                        'action': early[label]['action'], 'confidence': early[label]['confidence']
+                    })
+                early_ready[label].set()
+            return on_early
+        
+        futures = {}
+        for label, primary, backups in (
+            ('Model A', self.primary_model_a, self.backup_models_a),
+            ('Model B', self.primary_model_b, self.backup_models_b)
+        ):
+            futures[label] = self._fanout_pool.submit(
+                self._try_model_with_backups,
+                primary,
+                backups,
+                system_prompt,
+                user_prompt,
+                label,
+                early_listener(label) if streaming else None,
+                on_stream if streaming else None,
+                cache_state
+            )
+            futures[label].add_done_callback(lambda _, label=label: early_ready[label].set())
+        future_a, future_b = futures['Model A'], futures['Model B']
+        
+        # 兩個模型都先輸出 HOLD: 共識是 HOLD、執行審核員不審核 HOLD，不必等 reasoning 輸出完畢
+        # (HOLD 不下單，即使串流之後失敗也不會造成錯誤的交易)
+        early_hold = False
+        if streaming:
+            for label in labels:
+                early_ready[label].wait()
+            early_hold = (
+                not (future_a.done() and future_b.done())
+                and all(early.get(label, {}).get('action') == 'HOLD' for label in labels)
+            )
+        
+        if early_hold:
+            decision_a, decision_b = early['Model A'], early['Model B']
+            raw_content_a = raw_content_b = None
+            print("[STREAM] 兩個模型都先輸出 HOLD，不等待完整理由")
+        else:
+            decision_a, raw_content_a = future_a.result()
+            decision_b, raw_content_b = future_b.result()
         
         if decision_a:
-            self.last_analysis_detail['model_responses']['model_a'] = {
+            analysis_detail['model_responses']['model_a'] = {
                 'model_name': decision_a.get('model_name', 'Unknown'),
                 'raw_content': raw_content_a,  # 完整原始回應
                 'action': decision_a['action'],
@@ -609,18 +994,8 @@ class ArbitratorConsensusAgent:
                 'reasoning': decision_a['reasoning']
             }
         
-        time.sleep(1)
-        
-        decision_b, raw_content_b = self._try_model_with_backups(
-            self.primary_model_b,
-            self.backup_models_b,
-            system_prompt,
-            user_prompt,
-            "Model B"
-        )
-        
         if decision_b:
-            self.last_analysis_detail['model_responses']['model_b'] = {
+            analysis_detail['model_responses']['model_b'] = {
                 'model_name': decision_b.get('model_name', 'Unknown'),
                 'raw_content': raw_content_b,  # 完整原始回應
                 'action': decision_b['action'],
@@ -628,6 +1003,10 @@ class ArbitratorConsensusAgent:
                 'reasoning': decision_b['reasoning']
             }
         
+        if early_hold:
+            background.append((future_a, 'Model A', 'model_a', analysis_detail))
+            background.append((future_b, 'Model B', 'model_b', analysis_detail))
+        
         if decision_a and decision_b:
             if decision_a['action'] == decision_b['action']:
                 print("\n" + "="*70)
@@ -648,7 +1027,7 @@ class ArbitratorConsensusAgent:
                     market_data, account_info, position_info,
                     decision_a, decision_b,
                     historical_candles, successful_cases, recent_decisions,
-                    multi_timeframe_data
+                    multi_timeframe_data, analysis_detail, cache_state
                 )
                 final_decision['arbitration'] = True
         elif decision_a:
@@ -671,12 +1050,13 @@ class ArbitratorConsensusAgent:
                 market_data=market_data,
                 account_info=account_info,
                 position_info=position_info,
-                multi_timeframe_data=multi_timeframe_data
+                multi_timeframe_data=multi_timeframe_data,
+                cache_state=cache_state
             )
             
             # 儲存執行審核員的回應
             if hasattr(self.trading_executor, 'last_raw_response'):
-                self.last_analysis_detail['model_responses']['executor'] = {
+                analysis_detail['model_responses']['executor'] = {
                     'raw_content': self.trading_executor.last_raw_response,
                     'execution_decision': execution_review['execution_decision'],
                     'final_action': execution_review['final_action'],
@@ -684,7 +1064,7 @@ class ArbitratorConsensusAgent:
                     'reasoning': execution_review['executor_reasoning']
                 }
             else:
-                self.last_analysis_detail['model_responses']['executor'] = {
+                analysis_detail['model_responses']['executor'] = {
                     'execution_decision': execution_review['execution_decision'],
                     'final_action': execution_review['final_action'],
                     'adjusted_confidence': execution_review['adjusted_confidence'],
@@ -694,16 +1074,25 @@ class ArbitratorConsensusAgent:
             # 使用審核後的決策
             final_decision = execution_review
         
-        self.decision_history.append({
+        record = {
             'timestamp': time.time(),
             'datetime': datetime.now().isoformat(),
+            'symbol': symbol,
             'decision_a': decision_a,
             'decision_b': decision_b,
             'final': final_decision,
             'needed_arbitration': final_decision.get('arbitration', False),
             'market_price': market_data.get('close', 0)
-        })
-        self._save_history()
+        }
+        with self._history_lock:
+            self.decision_history.append(record)
+            self._save_history_locked()
+        
+        self.last_analysis_detail = analysis_detail
+        if symbol is not None:
+            self.analysis_details[symbol] = analysis_detail
+        if prompt_report:
+            final_decision['prompt_report'] = prompt_report.report()
         
         print("\n" + "="*70)
         print("[FINAL] 最終決策")
@@ -733,8 +1122,12 @@ class ArbitratorConsensusAgent:
         historical_candles: Optional[List[Dict]],
         successful_cases: Optional[List[Dict]],
         recent_decisions: List[Dict],
-        multi_timeframe_data: Optional[Dict] = None
+        multi_timeframe_data: Optional[Dict] = None,
+        analysis_detail: Optional[Dict] = None,
+        cache_state: Optional[str] = None
     ) -> Dict:
+        if analysis_detail is None:
+            analysis_detail = {'model_responses': {}}
         if not self.arbitrator_candidates:
             print("[WARNING] 仲裁者未配置，選擇信心度較高的模型")
             return decision_a if decision_a['confidence'] >= decision_b['confidence'] else decision_b
@@ -759,9 +1152,9 @@ class ArbitratorConsensusAgent:
 }"""
         
         user_prompt_parts = [
-            "市場數據:", json.dumps(market_data, indent=2, ensure_ascii=False),
-            "\n賬戶資訊:", json.dumps(account_info, indent=2, ensure_ascii=False),
-            "\n持倉:", json.dumps(position_info, indent=2, ensure_ascii=False) if position_info else '無',
+            "市場數據:", self._dump(market_data),
+            "\n賬戶資訊:", self._dump(account_info),
+            "\n持倉:", self._dump(position_info) if position_info else '無',
             "\n---\nModel A 分析:",
             f"決策: {decision_a['action']}, 信心: {decision_a['confidence']}%, 理由: {decision_a['reasoning']}",
             "\n---\nModel B 分析:",
@@ -772,14 +1165,22 @@ class ArbitratorConsensusAgent:
         
         for idx, arbitrator in enumerate(self.arbitrator_candidates):
             print(f"\n[ARBITRATOR] [{arbitrator.name}] 仲裁中...")
-            result = arbitrator.analyze(arbitrator_system_prompt, arbitrator_user_prompt)
+            cache_key = None
+            if cache_state:
+                cache_key = json.dumps({
+                    'state': cache_state,
+                    'a': [decision_a['action'], decision_a['confidence'], decision_a['reasoning']],
+                    'b': [decision_b['action'], decision_b['confidence'], decision_b['reasoning']]
+                }, ensure_ascii=False)
+            result = self._analyze_cached(arbitrator, arbitrator_system_prompt, arbitrator_user_prompt,
+                                          cache_key=cache_key)
             
             if result['success']:
                 final_decision = self._parse_decision(result['content'])
                 final_decision['model_name'] = arbitrator.name
                 final_decision['raw_reasoning'] = result['content']
                 
-                self.last_analysis_detail['model_responses']['arbitrator'] = {
+                analysis_detail['model_responses']['arbitrator'] = {
                     'model_name': arbitrator.name,
                     'raw_content': result['content'],  # 完整原始回應
                     'action': final_decision['action'],
@@ -812,7 +1213,9 @@ class ArbitratorConsensusAgent:
             'risk_assessment': decision_a['risk_assessment']
         }
     
-    def _prepare_prompts(self, market_data, account_info, position_info, historical_candles, successful_cases, recent_decisions, multi_timeframe_data=None) -> Tuple[str, str]:
+    def _build_prompts(self, market_data, account_info, position_info, historical_candles, successful_cases,
+                       recent_decisions, multi_timeframe_data=None) -> Tuple[str, str, Optional[CompiledPrompt]]:
+        """返回 (system prompt, user prompt, 預算報告)；不修改 self (多個幣種同時呼叫)"""
         system_prompt = """專業加密貨幣交易 AI。
 
 你的任務:
@@ -832,6 +1235,13 @@ class ArbitratorConsensusAgent:
 輸出 JSON 格式:
 {"action": "OPEN_LONG|OPEN_SHORT|CLOSE|HOLD", "confidence": 0-100, "leverage": 1-5, "position_size_usdt": 數字, "entry_price": 數字, "stop_loss": 數字, "take_profit": 數字, "reasoning": "詳細理由", "risk_assessment": "LOW|MEDIUM|HIGH", "is_counter_trend": true|false}"""
         
+        if self.prompt_compiler:
+            compiled = self._compile_user_prompt(
+                system_prompt, market_data, account_info, position_info,
+                historical_candles, successful_cases, recent_decisions, multi_timeframe_data
+            )
+            return system_prompt, compiled.text, compiled
+        
         user_prompt_parts = [
             "=== 市場數據 (15m) ===",
             json.dumps(market_data, indent=2, ensure_ascii=False),
@@ -876,7 +1286,70 @@ class ArbitratorConsensusAgent:
         
         user_prompt = "\n".join(user_prompt_parts)
         
-        return system_prompt, user_prompt
+        return system_prompt, user_prompt, None
+    
+    def _dump(self, obj) -> str:
+        """prompt 中的結構化資料: 有 token 預算時用緊湊 JSON"""
+        if self.prompt_compiler:
+            return compact_json(obj, self.prompt_digits)
+        return json.dumps(obj, indent=2, ensure_ascii=False)
+    
+    def _compile_user_prompt(self, system_prompt, market_data, account_info, position_info,
+                             historical_candles, successful_cases, recent_decisions, multi_timeframe_data):
+        """依優先度在 token 預算內組合 user prompt (K棒 / 最近決策用 CSV，其餘用緊湊 JSON)"""
+        digits = self.prompt_digits
+        
+        def dump(obj):
+            return compact_json(obj, digits)
+        
+        def candles_csv(candles):
+            rows = []
+            for candle in candles:
+                row = {k: v for k, v in candle.items() if k != 'features'}
+                row.update((k, v) for k, v in candle.get('features', {}).items() if k != 'symbol')
+                rows.append(row)
+            return to_csv(rows, digits)
+        
+        sections = [
+            PromptSection('market', '=== 市場數據 (15m) ===', [dump(market_data)], priority=100, required=True),
+            PromptSection('account', '=== 賬戶資訊 ===', [dump(account_info)], priority=95, required=True),
+            PromptSection('position', '=== 當前持倉 ===', [dump(position_info) if position_info else '無持倉'],
+                          priority=95, required=True),
+        ]
+        
+        if multi_timeframe_data:
+            key_fields = ('close', 'rsi', 'macd_hist', 'adx', 'ema50', 'ema200', 'atr', 'bb_position')
+            full_rows, key_rows = [], []
+            for tf, data in multi_timeframe_data.items():
+                current = data.get('current', {})
+                trend = data.get('trend_analysis', {})
+                full_rows.append({'tf': tf, **current, 'trend': trend})
+                key_rows.append({'tf': tf, **{k: current[k] for k in key_fields if k in current}, 'trend': trend})
+            sections.append(PromptSection(
+                'multi_timeframe', '=== 多時間框架 (CSV) ===',
+                [to_csv(full_rows, digits), to_csv(key_rows, digits)], priority=70
+            ))
+        
+        if historical_candles:
+            sections.append(PromptSection(
+                'candles', '=== 歷史 K 棒 (CSV，舊到新) ===',
+                tail_variants(historical_candles, (20, 10, 5, 3), candles_csv), priority=60
+            ))
+        
+        if recent_decisions:
+            sections.append(PromptSection(
+                'recent_decisions', '=== 最近決策 (CSV，新到舊) ===',
+                head_variants(recent_decisions, (5, 3, 1), lambda rows: to_csv(rows, digits)), priority=50
+            ))
+        
+        if successful_cases:
+            sections.append(PromptSection(
+                'cases', '=== 成功案例 ===',
+                head_variants(successful_cases, (10, 3, 1), dump), priority=40
+            ))
+        
+        sections.append(PromptSection('instruction', '', ['請基於以上資訊給出交易建議。'], priority=100, required=True))
+        return self.prompt_compiler.compile(sections, reserved_tokens=estimate_tokens(system_prompt))
     
     def _parse_decision(self, content: str) -> Dict:
         """解析模型輸出為決策字典"""
@@ -909,12 +1382,16 @@ class ArbitratorConsensusAgent:
             'reasoning': '緊急 HOLD: 模型失敗', 'risk_assessment': 'HIGH', 'is_counter_trend': False
         }
     
-    def get_last_analysis_detail(self) -> Optional[Dict]:
+    def get_last_analysis_detail(self, symbol: Optional[str] = None) -> Optional[Dict]:
+        """最近一次完成的分析記錄 (指定 symbol 時為該幣種最近一次)"""
+        if symbol is not None:
+            return self.analysis_details.get(symbol)
         return self.last_analysis_detail
     
     def get_statistics(self) -> Dict:
+        cache_stats = self.response_cache.get_stats() if self.response_cache else None
         if not self.decision_history:
-            return {'total': 0}
+            return {'total': 0, 'cache': cache_stats}
         total = len(self.decision_history)
         stats = {
             'total_decisions': total,
@@ -928,4 +1405,7 @@ class ArbitratorConsensusAgent:
             executor_stats = self.trading_executor.get_statistics()
             stats['executor'] = executor_stats
         
+        stats['cache'] = cache_stats
+        stats['llm_replay'] = self.llm_replay.get_stats() if self.llm_replay else None
+        
         return stats
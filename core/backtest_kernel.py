@@ -0,0 +1,345 @@
+"""
+共用回測核心 (事件驅動)
+V7 ~ V13 的回測迴圈共用同一套倉位管理，取代逐根 K 棒 df.iloc[i] 建立 Series 的寫法
+
+- 每根 K 棒只讀取 numpy 陣列轉成的 Python 數值，不再建立 pandas Series
+- 各版本只需提供「進場訊號」與「出場規則」(BacktestSpec)
+- 支援: 止盈止損 (先後順序可設定)、保本移損、啟動後追蹤止損、分批止盈、
+  收盤價出場訊號、持倉時間上限、冷卻 K 棒數、每日交易上限、最大回撤停止
+- 計算順序與各版本原本的迴圈相同，交易紀錄與權益曲線完全一致
+
+進場有兩種方式:
+1. 向量化訊號: entries = EntryArrays(...)，每根 K 棒的方向 / 止損 / 止盈都預先算好
+2. 逐根決策: entry_fn(i, capital) -> Order 或 None (LSTM / LLM 等無法向量化的模型)，
+   只在空倉、冷卻完畢、未達每日上限且 candidates[i] 為 True 時呼叫
+"""
+import math
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+NAN = float('nan')
+
+
+class Order(NamedTuple):
+    """
+    進場單
+
+    Args:
+        direction: 1 = 做多, -1 = 做空
+        sl: 止損價
+        tp: 止盈價 (NaN 表示沒有固定止盈)
+        sl_pct: 計算倉位用的止損比例
+        tp1: 啟動價 (追蹤止損 / 分批止盈)，NaN 表示不使用
+        r_unit: 1R 的價格距離 (追蹤止損用)
+    """
+    direction: int
+    sl: float
+    tp: float
+    sl_pct: float
+    tp1: float = NAN
+    r_unit: float = 0.0
+
+
+@dataclass
+class EntryArrays:
+    """向量化的進場訊號 (長度與 K 棒數相同)"""
+    direction: np.ndarray
+    sl: np.ndarray
+    tp: np.ndarray
+    sl_pct: np.ndarray
+    tp1: Optional[np.ndarray] = None
+    r_unit: Optional[np.ndarray] = None
+
+
+@dataclass
+class BacktestSpec:
+    """回測參數與出場規則"""
+
+    capital: float
+    base_risk: float
+    max_leverage: float
+    fee_rate: float                          # 單邊費率 (含滑點)
+    max_drawdown_stop: float
+    start: int = 0                           # 從第幾根 K 棒開始
+
+    # 交易限制
+    cooldown_bars: Optional[int] = None      # 出場後至少間隔的 K 棒數
+    max_daily_trades: Optional[int] = None   # 每日開倉上限 (依 open_time 的日期)
+
+    # 出場規則
+    exit_priority: str = 'sl_first'          # 同一根 K 棒同時碰到時先判斷 'sl_first' / 'tp_first'
+    break_even_r: Optional[float] = None     # 浮盈達到 N 倍 (目前) 止損距離時移到保本
+    break_even_mult: float = 1.0             # 多頭保本價 = 進場價 * mult
+    break_even_mult_short: float = 1.0       # 空頭保本價 = 進場價 * mult
+    activation_mult: float = 1.0             # 碰到 tp1 時止損移到 進場價 * mult
+    trail_r: Optional[float] = None          # 啟動後止損 = 進場價 + (最高 R - trail_r) * 1R
+    partial_pct: Optional[float] = None      # 碰到 tp1 時平倉的比例 (分批止盈)
+    exit_signal: Optional[np.ndarray] = None  # 收盤價出場訊號
+    exit_signal_min_mult: float = 0.0        # 收盤價需高於 進場價 * mult 才出場
+    max_hold_bars: Optional[float] = None    # 持倉超過 N 根 K 棒以收盤價出場 (依 open_time 計算)
+    bar_seconds: int = 900
+
+    # 倉位大小: 風險比例 (預設 base_risk)，可依目前資金調整 (複利)
+    risk_fn: Optional[Callable[[float], float]] = None
+
+
+@dataclass
+class BacktestResult:
+    trades: List[Dict]
+    equity_curve: List[float]
+    capital: float
+    halted: bool = False                     # 是否因最大回撤停止
+    stats: Dict[str, int] = field(default_factory=dict)
+
+
+def _holding_hours(times: Optional[np.ndarray], entry_idx: int, exit_idx: int) -> float:
+    if times is None:
+        return 0
+    return (pd.Timestamp(times[exit_idx]) - pd.Timestamp(times[entry_idx])).total_seconds() / 3600
+
+
+def run_backtest(
+    df: pd.DataFrame,
+    spec: BacktestSpec,
+    entries: Optional[EntryArrays] = None,
+    entry_fn: Optional[Callable[[int, float], Optional[Order]]] = None,
+    candidates: Optional[np.ndarray] = None,
+    on_exit: Optional[Callable[[int, Dict], None]] = None
+) -> BacktestResult:
+    """
+    執行回測
+
+    Args:
+        df: 至少包含 high / low / close，有 open_time 時計算持倉時間與每日上限
+        spec: 回測參數與出場規則
+        entries: 向量化的進場訊號
+        entry_fn: 逐根決策 (與 entries 二選一)
+        candidates: entry_fn 的候選 K 棒 (布林陣列)，None 表示每根都呼叫
+        on_exit: 每筆交易出場後呼叫 on_exit(i, trade)
+
+    Returns:
+        BacktestResult，trades 每筆包含 entry_idx / exit_idx / direction / entry_price /
+        exit_price / pnl_usd / return / reason / capital / activated / holding_hours
+    """
+    if (entries is None) == (entry_fn is None):
+        raise ValueError("entries 與 entry_fn 必須擇一提供")
+    if spec.exit_priority not in ('sl_first', 'tp_first'):
+        raise ValueError(f"未知的 exit_priority: {spec.exit_priority}")
+
+    n_bars = len(df)
+    highs = df['high'].to_numpy(dtype=np.float64).tolist()
+    lows = df['low'].to_numpy(dtype=np.float64).tolist()
+    closes = df['close'].to_numpy(dtype=np.float64).tolist()
+
+    times = df['open_time'].values if 'open_time' in df.columns else None
+    days = seconds = None
+    if times is not None and spec.max_daily_trades is not None:
+        # 以 open_time 的日期 (午夜) 作為每日上限的分界
+        days = df['open_time'].dt.normalize().values.astype(np.int64).tolist()
+    if times is not None and spec.max_hold_bars is not None:
+        seconds = times.astype('datetime64[s]').astype(np.int64).tolist()
+
+    if entries is not None:
+        entry_dir = np.asarray(entries.direction).tolist()
+        entry_sl = np.asarray(entries.sl, dtype=np.float64).tolist()
+        entry_tp = np.asarray(entries.tp, dtype=np.float64).tolist()
+        entry_sl_pct = np.asarray(entries.sl_pct, dtype=np.float64).tolist()
+        entry_tp1 = np.asarray(entries.tp1, dtype=np.float64).tolist() if entries.tp1 is not None else None
+        entry_r_unit = np.asarray(entries.r_unit, dtype=np.float64).tolist() if entries.r_unit is not None else None
+    candidate_list = np.asarray(candidates, dtype=bool).tolist() if candidates is not None else None
+    exit_signal = np.asarray(spec.exit_signal, dtype=bool).tolist() if spec.exit_signal is not None else None
+
+    tp_first = spec.exit_priority == 'tp_first'
+    total_fee = spec.fee_rate
+    cooldown = spec.cooldown_bars
+    daily_cap = spec.max_daily_trades
+    break_even_r = spec.break_even_r
+    trail_r = spec.trail_r
+    partial_pct = spec.partial_pct
+    max_hold = spec.max_hold_bars
+
+    capital = spec.capital
+    peak_capital = capital
+    halted = False
+
+    position = 0
+    entry_idx = -1
+    entry_price = sl_price = tp_price = tp1_price = 0.0
+    r_unit = 0.0
+    size_usd = 0.0
+    has_tp1 = activated = False
+    highest_r = 0.0
+
+    trades: List[Dict] = []
+    equity_curve: List[float] = []
+    stats = {'partials': 0, 'activations': 0, 'break_even': 0}
+    last_exit_idx = -cooldown if cooldown is not None else 0
+    trades_today = 0
+    last_day = None
+
+    for i in range(spec.start, n_bars):
+        equity_curve.append(capital)
+
+        if capital > peak_capital:
+            peak_capital = capital
+        if (peak_capital - capital) / peak_capital > spec.max_drawdown_stop:
+            halted = True
+            break
+
+        if days is not None and days[i] != last_day:
+            trades_today = 0
+            last_day = days[i]
+
+        # ==========================================
+        # 1. 出場
+        # ==========================================
+        if position != 0:
+            high = highs[i]
+            low = lows[i]
+            close = closes[i]
+            exit_price = 0.0
+            reason = ''
+
+            if trail_r is not None or partial_pct is not None:
+                current_r = (high - entry_price) / r_unit if r_unit > 0 else 0
+                if current_r > highest_r:
+                    highest_r = current_r
+
+            if break_even_r is not None:
+                if position > 0:
+                    sl_distance = entry_price - sl_price
+                    current_r = (high - entry_price) / sl_distance if sl_distance > 0 else 0
+                    if current_r >= break_even_r and sl_price < entry_price:
+                        sl_price = entry_price * spec.break_even_mult
+                        stats['break_even'] += 1
+                else:
+                    sl_distance = sl_price - entry_price
+                    current_r = (entry_price - low) / sl_distance if sl_distance > 0 else 0
+                    if current_r >= break_even_r and sl_price > entry_price:
+                        sl_price = entry_price * spec.break_even_mult_short
+                        stats['break_even'] += 1
+
+            partial_done = False
+            if has_tp1 and not activated and high >= tp1_price:
+                activated = True
+                sl_price = entry_price * spec.activation_mult
+                if partial_pct is not None:
+                    partial_size = size_usd * partial_pct
+                    pnl_pct = (tp1_price - entry_price) / entry_price
+                    capital += partial_size * pnl_pct - (partial_size * total_fee * 2)
+                    size_usd -= partial_size
+                    stats['partials'] += 1
+                    partial_done = True
+                else:
+                    stats['activations'] += 1
+
+            if activated and trail_r is not None:
+                new_sl = entry_price + (highest_r - trail_r) * r_unit
+                if new_sl > sl_price:
+                    sl_price = new_sl
+
+            if not partial_done:
+                if position > 0:
+                    hit_sl = low <= sl_price
+                    # 分批止盈模式下，剩餘倉位要在 tp1 之後才檢查最終目標
+                    hit_tp = high >= tp_price and (partial_pct is None or activated)
+                else:
+                    hit_sl = high >= sl_price
+                    hit_tp = low <= tp_price
+
+                if tp_first and hit_tp:
+                    exit_price, reason = tp_price, 'tp'
+                elif hit_sl:
+                    exit_price, reason = sl_price, 'sl'
+                elif hit_tp:
+                    exit_price, reason = tp_price, 'tp'
+                elif exit_signal is not None and exit_signal[i] and close > entry_price * spec.exit_signal_min_mult:
+                    exit_price, reason = close, 'signal'
+
+                if exit_price == 0 and max_hold is not None:
+                    time_in_trade = (seconds[i] - seconds[entry_idx]) / spec.bar_seconds
+                    if time_in_trade >= max_hold:
+                        exit_price, reason = close, 'time'
+
+            if exit_price > 0:
+                if position > 0:
+                    pnl_pct = (exit_price - entry_price) / entry_price
+                else:
+                    pnl_pct = (entry_price - exit_price) / entry_price
+                pnl_usd = size_usd * pnl_pct - (size_usd * total_fee * 2)
+                capital += pnl_usd
+
+                trade = {
+                    'entry_idx': entry_idx,
+                    'exit_idx': i,
+                    'direction': position,
+                    'entry_price': entry_price,
+                    'exit_price': exit_price,
+                    'pnl_usd': pnl_usd,
+                    'return': pnl_pct,
+                    'reason': reason,
+                    'capital': capital,
+                    'activated': activated,
+                    'holding_hours': _holding_hours(times, entry_idx, i)
+                }
+                trades.append(trade)
+                position = 0
+                last_exit_idx = i
+                if on_exit is not None:
+                    on_exit(i, trade)
+
+        # ==========================================
+        # 2. 進場
+        # ==========================================
+        if position != 0:
+            continue
+        if cooldown is not None and (i - last_exit_idx) < cooldown:
+            continue
+        if daily_cap is not None and trades_today >= daily_cap:
+            continue
+
+        if entries is not None:
+            direction = entry_dir[i]
+            if not direction:
+                continue
+            order = Order(
+                direction, entry_sl[i], entry_tp[i], entry_sl_pct[i],
+                entry_tp1[i] if entry_tp1 is not None else NAN,
+                entry_r_unit[i] if entry_r_unit is not None else 0.0
+            )
+        else:
+            if candidate_list is not None and not candidate_list[i]:
+                continue
+            order = entry_fn(i, capital)
+            if order is None:
+                continue
+
+        position = order.direction
+        entry_idx = i
+        entry_price = closes[i]
+        sl_price = order.sl
+        tp_price = order.tp
+        tp1_price = order.tp1
+        r_unit = order.r_unit
+        has_tp1 = not math.isnan(tp1_price)
+        activated = False
+        highest_r = 0.0
+
+        risk = spec.risk_fn(capital) if spec.risk_fn is not None else spec.base_risk
+        max_loss = capital * risk
+        leverage_cap = capital * spec.max_leverage
+        # 止損距離為 0 時 numpy 會得到 inf，倉位等於槓桿上限
+        size_usd = min(max_loss / order.sl_pct, leverage_cap) if order.sl_pct != 0 else leverage_cap
+        trades_today += 1
+
+    return BacktestResult(
+        trades=trades,
+        equity_curve=equity_curve,
+        capital=capital,
+        halted=halted,
+        stats=stats
+    )
+
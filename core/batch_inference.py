@@ -0,0 +1,208 @@
+"""
+批次 LLM 推論
+回測時一次送出所有決策點的 prompt，分散到 MultiAPIManager 的各個供應商同時執行；
+總時間由供應商的吞吐量 (RPM) 決定，而不是逐一等待每次呼叫的往返延遲
+
+- 每個供應商一組工作執行緒 (最多 max_in_flight 個同時請求)，共用一個工作佇列，
+  快的供應商自然拿到較多的 prompt
+- 每個供應商以滑動視窗限制每分鐘請求數 (rpm_limit)，並遵守每日上限 (daily_limit)
+- 失敗的 prompt 放回佇列由其他供應商重試 (最多 max_attempts 次)；
+  供應商連續失敗 3 次被停用時 (APIProvider.record_failure) 其工作執行緒結束
+- 返回結果與 prompts 同順序，格式與 ModelInterface.analyze 相同 ({'success', 'content', ...})
+
+供應商都以 OpenAI 相容的 /chat/completions 呼叫 (共用 llm_http_client 的連線池)；
+Google Gemini 使用官方的 OpenAI 相容端點 ({base_url}/openai)
+"""
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from core.llm_http_client import chat_content, get_provider_client
+from core.multi_api_manager import APIProvider
+
+
+class RPMLimiter:
+    """滑動視窗的每分鐘請求數限制 (執行緒安全)"""
+
+    def __init__(self, rpm: int, window_seconds: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self.rpm = max(1, int(rpm))
+        self.window_seconds = window_seconds
+        self.clock = clock
+        self._sent: Deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> Tuple[Optional[float], float]:
+        """(佔用的時間戳, 0) 或 (None, 需要等待的秒數)"""
+        now = self.clock()
+        while self._sent and self._sent[0] <= now - self.window_seconds:
+            self._sent.popleft()
+        if len(self._sent) < self.rpm:
+            self._sent.append(now)
+            return now, 0.0
+        return None, self._sent[0] + self.window_seconds - now
+
+    def acquire(self, stop: Optional[threading.Event] = None) -> Optional[float]:
+        """等到視窗內有名額並佔用，返回佔用的時間戳 (交給 release_unused)；stop 被設定時返回 None"""
+        while True:
+            with self._lock:
+                reserved, wait = self._reserve()
+            if reserved is not None:
+                return reserved
+            if stop is not None:
+                if stop.wait(wait):
+                    return None
+            else:
+                time.sleep(wait)
+
+    def release_unused(self, reserved: float):
+        """歸還 acquire 佔用、但沒有送出請求的名額 (其他執行緒之後佔用的名額不受影響)"""
+        with self._lock:
+            try:
+                self._sent.remove(reserved)
+            except ValueError:
+                pass                                    # 已經滑出視窗
+
+
+def call_provider(provider: APIProvider, system_prompt: str, user_prompt: str) -> Dict:
+    """以 OpenAI 相容 API 呼叫供應商，返回 ModelInterface.analyze 格式的結果"""
+    base_url = provider.base_url
+    if 'generativelanguage.googleapis.com' in base_url and not base_url.rstrip('/').endswith('/openai'):
+        base_url = base_url.rstrip('/') + '/openai'
+
+    messages = [{'role': 'user', 'content': user_prompt}]
+    if system_prompt:
+        messages.insert(0, {'role': 'system', 'content': system_prompt})
+
+    start_time = time.time()
+    result = get_provider_client().chat_completion(
+        base_url, provider.api_key, provider.model, messages,
+        timeout=60, temperature=0.2, max_tokens=3072
+    )
+    return {
+        'success': True,
+        'content': chat_content(result),
+        'model': provider.model,
+        'elapsed_time': time.time() - start_time
+    }
+
+
+class BatchInference:
+    """
+    RPM 受限的多供應商批次推論
+
+    用法:
+        batch = BatchInference(MultiAPIManager().providers)
+        results = batch.run(prompts)          # 與 prompts 同順序
+    """
+
+    def __init__(self, providers: List[APIProvider],
+                 call: Callable[[APIProvider, str, str], Dict] = call_provider,
+                 max_in_flight: int = 8, max_attempts: int = 3, window_seconds: float = 60.0):
+        """
+        Args:
+            call: (provider, system_prompt, user_prompt) -> {'success', 'content', ...}，例外視為失敗
+            max_in_flight: 每個供應商同時進行的請求數上限 (另受 rpm_limit 限制)
+            max_attempts: 每個 prompt 最多嘗試次數 (跨供應商)
+            window_seconds: RPM 視窗長度 (測試時可縮短)
+        """
+        self.providers = [p for p in providers if p.is_available]
+        self.call = call
+        self.max_in_flight = max_in_flight
+        self.max_attempts = max_attempts
+        self.window_seconds = window_seconds
+        self._provider_lock = threading.Lock()
+        self.stats: Dict[str, Dict] = {}
+
+    def run(self, prompts: List[str], system_prompt: str = '',
+            on_result: Optional[Callable[[int, Dict], None]] = None) -> List[Dict]:
+        """
+        Args:
+            on_result: 每完成一個 prompt 呼叫一次 (index, result)，用於進度顯示
+        """
+        results: List[Optional[Dict]] = [None] * len(prompts)
+        if not prompts:
+            return []
+        if not self.providers:
+            return [{'success': False, 'error': '沒有可用的 API 提供商'} for _ in prompts]
+
+        jobs: "queue.Queue" = queue.Queue()
+        for index in range(len(prompts)):
+            jobs.put((index, 0))
+        remaining = [len(prompts)]
+        done = threading.Condition()
+        stop = threading.Event()
+        self.stats = {p.name: {'requests': 0, 'failures': 0} for p in self.providers}
+
+        def finish(index, result):
+            with done:
+                results[index] = result
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    stop.set()
+                done.notify_all()
+            if on_result:
+                on_result(index, result)
+
+        def worker(provider: APIProvider, limiter: RPMLimiter):
+            while not stop.is_set():
+                with self._provider_lock:
+                    usable = provider.is_available and provider.daily_count < provider.daily_limit
+                if not usable:
+                    return
+                reserved = limiter.acquire(stop)
+                if reserved is None:
+                    return
+                try:
+                    index, attempts = jobs.get_nowait()
+                except queue.Empty:
+                    # 佇列暫時是空的 (其他請求還在進行，可能失敗後放回)
+                    limiter.release_unused(reserved)
+                    stop.wait(0.01)
+                    continue
+
+                with self._provider_lock:
+                    provider.record_request()
+                    self.stats[provider.name]['requests'] += 1
+                try:
+                    result = self.call(provider, system_prompt, prompts[index])
+                except Exception as e:
+                    result = {'success': False, 'error': str(e)}
+
+                if result.get('success'):
+                    with self._provider_lock:
+                        provider.record_success()
+                    finish(index, {**result, 'provider': provider.name})
+                    continue
+
+                with self._provider_lock:
+                    provider.record_failure()
+                    self.stats[provider.name]['failures'] += 1
+                if attempts + 1 >= self.max_attempts:
+                    finish(index, {**result, 'provider': provider.name})
+                else:
+                    jobs.put((index, attempts + 1))
+
+        threads = []
+        for provider in self.providers:
+            limiter = RPMLimiter(provider.rpm_limit, self.window_seconds)
+            for n in range(max(1, min(self.max_in_flight, provider.rpm_limit))):
+                thread = threading.Thread(
+                    target=worker, args=(provider, limiter), name=f'batch-{provider.name}-{n}', daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        with done:
+            while remaining[0] > 0 and any(t.is_alive() for t in threads):
+                done.wait(0.1)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        # 所有供應商都停用 / 用完每日額度時，剩下的 prompt 視為失敗
+        return [
+            result if result is not None else {'success': False, 'error': '所有 API 提供商都不可用'}
+            for result in results
+        ]
@@ -0,0 +1,303 @@
+"""
+Bybit 帳戶狀態鏡像
+由 Bybit v5 私有 / 公開 WebSocket 推送 (position / wallet / execution / tickers) 維護本地的
+持倉、餘額、成交與最新價格；BybitDemoTrader 的讀取全部來自記憶體，不再每次決策打多次 REST
+
+- 第一次讀取、WebSocket 重新連線、新增追蹤幣種、或距離上次同步超過 resync_interval 秒時，
+  以 REST 快照重新同步 (錢包 / 所有 USDT 永續持倉 / 各幣種行情)
+- 同步期間收到的推送比 REST 快照新：每個鍵 (錢包 / 各幣種持倉 / 各幣種行情) 有版本號，
+  REST 回來時只覆蓋期間沒有被推送更新的鍵
+- tickers 推送是 snapshot + delta，delta 只包含變動的欄位，合併到既有的行情
+- 持倉的現價與未實現損益以 tickers 的標記價格更新 (position 推送只在持倉變動時發送)
+- 假設單向持倉模式 (與 BybitDemoTrader 相同，每個幣種一個持倉)
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Set
+
+
+def _num(value, default: float = 0.0) -> float:
+    """Bybit 的數值欄位是字串，沒有值時是空字串"""
+    if value is None or value == '':
+        return default
+    return float(value)
+
+
+def parse_wallet(account: Dict) -> Dict:
+    """統一帳戶 (REST get_wallet_balance 或 wallet 推送) 轉成 get_balance 的格式"""
+    usdt_coin = None
+    for coin_data in account.get('coin', []):
+        if coin_data.get('coin') == 'USDT':
+            usdt_coin = coin_data
+            break
+
+    if usdt_coin:
+        return {
+            'total_equity': _num(usdt_coin.get('equity')),
+            'available_balance': _num(usdt_coin.get('walletBalance')),
+            'unrealized_pnl': _num(usdt_coin.get('unrealisedPnl'))
+        }
+    return {
+        'total_equity': _num(account.get('totalEquity')),
+        'available_balance': _num(account.get('totalAvailableBalance')),
+        'unrealized_pnl': _num(account.get('totalPerpUPL'))
+    }
+
+
+def parse_position(pos: Dict) -> Optional[Dict]:
+    """持倉 (REST get_positions 或 position 推送) 轉成 get_position 的格式，空倉返回 None"""
+    if _num(pos.get('size')) <= 0:
+        return None
+    return {
+        'side': pos['side'],
+        'size': _num(pos['size']),
+        # REST 是 avgPrice，推送是 entryPrice
+        'entry_price': _num(pos.get('avgPrice') or pos.get('entryPrice')),
+        'current_price': _num(pos.get('markPrice')),
+        'unrealized_pnl': _num(pos.get('unrealisedPnl')),
+        'leverage': int(_num(pos.get('leverage'), 1))
+    }
+
+
+class BybitAccountMirror:
+    """
+    WebSocket 推送維護的帳戶狀態
+
+    用法:
+        mirror = BybitAccountMirror(session)          # pybit HTTP，用於 REST 同步
+        streams = BybitAccountStreams(mirror, api_key, api_secret)
+        streams.start(['BTCUSDT'])
+        if mirror.ready():
+            balance = mirror.balance()
+            position = mirror.position('BTCUSDT')
+    """
+
+    def __init__(self, session=None, resync_interval: float = 600.0, clock: Callable[[], float] = time.time):
+        self.session = session
+        self.resync_interval = resync_interval
+        self.clock = clock
+        self.is_connected: Callable[[], bool] = lambda: False    # 由 BybitAccountStreams 設定
+        self._was_connected = False
+        self._lock = threading.RLock()
+        self._resync_lock = threading.Lock()
+        self._wallet: Optional[Dict] = None
+        self._positions: Dict[str, Dict] = {}
+        self._tickers: Dict[str, Dict] = {}
+        self._executions: Deque[Dict] = deque(maxlen=500)
+        self._versions: Dict[str, int] = defaultdict(int)
+        self._symbols: Set[str] = set()
+        self._synced_symbols: Set[str] = set()
+        self._last_resync: Optional[float] = None
+        self.stats = {'messages': 0, 'resyncs': 0, 'rest_calls': 0}
+
+    # ---------- 推送 ----------
+
+    def on_message(self, message: Dict):
+        """pybit WebSocket 的 callback (Bybit v5 推送格式)"""
+        topic = message.get('topic', '')
+        data = message.get('data')
+        with self._lock:
+            self.stats['messages'] += 1
+            if topic.startswith('position'):
+                for pos in data:
+                    if pos.get('category', 'linear') == 'linear':
+                        self._set_position(pos)
+            elif topic.startswith('wallet'):
+                for account in data:
+                    if account.get('accountType', 'UNIFIED') == 'UNIFIED':
+                        self._merge_wallet(account)
+            elif topic.startswith('execution'):
+                self._executions.extend(data)
+            elif topic.startswith('tickers.'):
+                symbol = data.get('symbol') or topic.split('.', 1)[1]
+                if message.get('type') == 'snapshot' or symbol not in self._tickers:
+                    self._tickers[symbol] = dict(data)
+                else:
+                    self._tickers[symbol].update(data)
+                self._versions[f'ticker:{symbol}'] += 1
+
+    def _set_position(self, pos: Dict):
+        symbol = pos['symbol']
+        self._positions[symbol] = dict(pos)
+        self._versions[f'position:{symbol}'] += 1
+
+    def _merge_wallet(self, account: Dict):
+        """帳戶欄位覆蓋，幣種依 coin 合併 (推送可能只包含變動的幣種)"""
+        if self._wallet is None:
+            self._wallet = {**account, 'coin': list(account.get('coin', []))}
+        else:
+            coins = {c.get('coin'): c for c in self._wallet.get('coin', [])}
+            coins.update((c.get('coin'), c) for c in account.get('coin', []))
+            self._wallet = {**self._wallet, **account, 'coin': list(coins.values())}
+        self._versions['wallet'] += 1
+
+    # ---------- REST 同步 ----------
+
+    def track(self, symbols: Iterable[str]):
+        """追蹤幣種的持倉與行情 (新幣種會在下一次讀取時同步)"""
+        with self._lock:
+            self._symbols.update(symbols)
+
+    def mark_stale(self):
+        """下一次讀取時重新同步 (例如 WebSocket 重新連線)"""
+        with self._lock:
+            self._last_resync = None
+
+    def needs_resync(self) -> bool:
+        with self._lock:
+            return (
+                self._last_resync is None
+                or self.clock() - self._last_resync >= self.resync_interval
+                or not self._symbols <= self._synced_symbols
+            )
+
+    def _rest(self, method, **params) -> List[Dict]:
+        self.stats['rest_calls'] += 1
+        result = method(**params)
+        if result['retCode'] != 0:
+            raise RuntimeError(result['retMsg'])
+        return result['result']['list']
+
+    def resync(self):
+        """以 REST 快照重新同步 (同步期間被推送更新過的鍵保留推送的值)"""
+        with self._resync_lock:
+            with self._lock:
+                versions = dict(self._versions)
+                symbols = sorted(self._symbols)
+
+            accounts = self._rest(self.session.get_wallet_balance, accountType='UNIFIED', coin='USDT')
+            positions = self._rest(self.session.get_positions, category='linear', settleCoin='USDT')
+            tickers = {
+                symbol: self._rest(self.session.get_tickers, category='linear', symbol=symbol)
+                for symbol in symbols
+            }
+
+            def unchanged(key):
+                return self._versions[key] == versions.get(key, 0)
+
+            with self._lock:
+                if accounts and unchanged('wallet'):
+                    self._wallet = None
+                    self._merge_wallet(accounts[0])
+
+                # 快照沒有列出的幣種 = 空倉
+                open_positions = {pos['symbol']: pos for pos in positions}
+                for symbol in set(symbols) | set(self._positions) | set(open_positions):
+                    if unchanged(f'position:{symbol}'):
+                        self._set_position(open_positions.get(symbol, {'symbol': symbol, 'size': '0', 'side': ''}))
+
+                for symbol, rows in tickers.items():
+                    if rows and unchanged(f'ticker:{symbol}'):
+                        self._tickers[symbol] = dict(rows[0])
+                        self._versions[f'ticker:{symbol}'] += 1
+
+                self._synced_symbols = set(symbols)
+                self._last_resync = self.clock()
+                self.stats['resyncs'] += 1
+
+    def ready(self) -> bool:
+        """WebSocket 已連線且狀態已同步 (需要時先以 REST 同步)；False 時呼叫端應改用 REST"""
+        connected = self.is_connected()
+        if connected and not self._was_connected:
+            self.mark_stale()      # 斷線期間的推送可能遺失
+        self._was_connected = connected
+        if not connected or self.session is None:
+            return False
+        if self.needs_resync():
+            try:
+                self.resync()
+            except Exception as e:
+                print(f"帳戶狀態同步錯誤: {e}")
+                return False
+        return True
+
+    # ---------- 讀取 (記憶體) ----------
+
+    def balance(self) -> Optional[Dict]:
+        with self._lock:
+            return parse_wallet(self._wallet) if self._wallet is not None else None
+
+    def position(self, symbol: str) -> Optional[Dict]:
+        with self._lock:
+            raw = self._positions.get(symbol)
+            position = parse_position(raw) if raw else None
+            mark = _num(self._tickers.get(symbol, {}).get('markPrice'))
+        if position and mark > 0:
+            sign = 1 if position['side'] == 'Buy' else -1
+            position['current_price'] = mark
+            position['unrealized_pnl'] = (mark - position['entry_price']) * position['size'] * sign
+        return position
+
+    def last_price(self, symbol: str) -> Optional[float]:
+        with self._lock:
+            price = _num(self._tickers.get(symbol, {}).get('lastPrice'))
+        return price if price > 0 else None
+
+    def executions(self, symbol: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """最近的成交 (新的在後)"""
+        with self._lock:
+            rows = [e for e in self._executions if symbol is None or e.get('symbol') == symbol]
+        return rows[-limit:]
+
+
+class BybitAccountStreams:
+    """
+    把 pybit WebSocket 的推送接到 BybitAccountMirror
+    私有連線訂閱 position / wallet / execution，公開連線訂閱各幣種 tickers
+    """
+
+    def __init__(self, mirror: BybitAccountMirror, api_key: str, api_secret: str,
+                 demo_mode: str = 'demo', ws_factory: Optional[Callable] = None):
+        """
+        Args:
+            ws_factory: 建立 WebSocket 的函數 (參數與 pybit.unified_trading.WebSocket 相同)，None 表示使用 pybit
+        """
+        self.mirror = mirror
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.demo_mode = demo_mode
+        self.ws_factory = ws_factory
+        self._private = None
+        self._public = None
+        self._symbols: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def start(self, symbols: Iterable[str]):
+        factory = self.ws_factory
+        if factory is None:
+            from pybit.unified_trading import WebSocket
+            factory = WebSocket
+
+        # 私有推送: demo 與 testnet 各有自己的端點；公開行情: demo 使用主網
+        testnet = self.demo_mode == 'testnet'
+        self._private = factory(
+            testnet=testnet, demo=self.demo_mode == 'demo', channel_type='private',
+            api_key=self.api_key, api_secret=self.api_secret
+        )
+        self._private.position_stream(callback=self.mirror.on_message)
+        self._private.wallet_stream(callback=self.mirror.on_message)
+        self._private.execution_stream(callback=self.mirror.on_message)
+        self._public = factory(testnet=testnet, channel_type='linear')
+
+        self.mirror.is_connected = self.is_connected
+        for symbol in symbols:
+            self.add_symbol(symbol)
+
+    def add_symbol(self, symbol: str):
+        """訂閱幣種行情並追蹤其持倉"""
+        with self._lock:
+            if symbol in self._symbols:
+                return
+            self._symbols.add(symbol)
+            self._public.ticker_stream(symbol=symbol, callback=self.mirror.on_message)
+        self.mirror.track([symbol])
+
+    def is_connected(self) -> bool:
+        return all(ws is not None and ws.is_connected() for ws in (self._private, self._public))
+
+    def stop(self):
+        for ws in (self._private, self._public):
+            if ws is not None:
+                ws.exit()
+        self.mirror.is_connected = lambda: False
@@ -3,12 +3,15 @@ Bybit Demo Trading 自動交易引擎
 使用模擬資金 + 真實市場數據 + 真實滑點
 整合倉位感知 AI
 """
+import copy
 import time
 from datetime import datetime
 from typing import Dict, Optional, List
 from pybit.unified_trading import HTTP
 import pandas as pd
 
+from core.bybit_account_mirror import BybitAccountMirror, BybitAccountStreams, parse_position, parse_wallet
+
 
 class BybitDemoTrader:
     """
@@ -22,7 +25,9 @@ class BybitDemoTrader:
         demo_mode: str = 'demo',
         symbol: str = 'BTCUSDT',
         max_leverage: int = 10,
-        min_order_value_usdt: float = 10.0  # 降低最小金額
+        min_order_value_usdt: float = 10.0,  # 降低最小金額
+        use_websocket: bool = False,
+        ws_factory=None
     ):
         self.symbol = symbol
         self.max_leverage = max_leverage
@@ -50,6 +55,43 @@ class BybitDemoTrader:
         self.current_leverage = 1
         self.open_orders = []
         self.trade_history = []
+        
+        # 帳戶狀態鏡像：持倉 / 餘額 / 價格由 WebSocket 推送維護，讀取不打 REST
+        self.account_mirror = None
+        self.account_streams = None
+        if use_websocket:
+            mirror = BybitAccountMirror(self.session)
+            streams = BybitAccountStreams(mirror, api_key, api_secret, demo_mode, ws_factory)
+            try:
+                streams.start([symbol])
+                self.account_mirror, self.account_streams = mirror, streams
+            except Exception as e:
+                print(f"WebSocket 啟動失敗，改用 REST 查詢: {e}")
+    
+    def _mirror(self) -> Optional[BybitAccountMirror]:
+        """可用的帳戶狀態鏡像 (WebSocket 斷線或同步失敗時返回 None，改用 REST)"""
+        if self.account_mirror is not None and self.account_mirror.ready():
+            return self.account_mirror
+        return None
+    
+    def close(self):
+        """關閉 WebSocket 推送"""
+        if self.account_streams is not None:
+            self.account_streams.stop()
+    
+    def for_symbol(self, symbol: str) -> 'BybitDemoTrader':
+        """同一帳戶交易另一個幣種 (共用已驗證的 session，持倉與交易紀錄各自獨立)"""
+        if symbol == self.symbol:
+            return self
+        trader = copy.copy(self)
+        trader.symbol = symbol
+        trader.current_position = None
+        trader.current_leverage = 1
+        trader.open_orders = []
+        trader.trade_history = []
+        if self.account_streams is not None:
+            self.account_streams.add_symbol(symbol)
+        return trader
     
     def set_leverage(self, leverage: int):
         try:
@@ -75,6 +117,12 @@ class BybitDemoTrader:
             return False
     
     def get_balance(self) -> Dict:
+        mirror = self._mirror()
+        if mirror is not None:
+            balance = mirror.balance()
+            if balance is not None:
+                return balance
+        
         try:
             result = self.session.get_wallet_balance(
                 accountType="UNIFIED",
@@ -82,26 +130,7 @@ class BybitDemoTrader:
             )
             
             if result['retCode'] == 0 and result['result']['list']:
-                account_info = result['result']['list'][0]
-                
-                usdt_coin = None
-                for coin_data in account_info.get('coin', []):
-                    if coin_data.get('coin') == 'USDT':
-                        usdt_coin = coin_data
-                        break
-                
-                if usdt_coin:
-                    return {
-                        'total_equity': float(usdt_coin.get('equity', 0)),
-                        'available_balance': float(usdt_coin.get('walletBalance', 0)),
-                        'unrealized_pnl': float(usdt_coin.get('unrealisedPnl', 0))
-                    }
-                else:
-                    return {
-                        'total_equity': float(account_info.get('totalEquity', 0)),
-                        'available_balance': float(account_info.get('totalAvailableBalance', 0)),
-                        'unrealized_pnl': float(account_info.get('totalPerpUPL', 0))
-                    }
+                return parse_wallet(result['result']['list'][0])
             
             return {'total_equity': 0, 'available_balance': 0, 'unrealized_pnl': 0}
             
@@ -110,6 +139,13 @@ class BybitDemoTrader:
             return {'total_equity': 0, 'available_balance': 0, 'unrealized_pnl': 0}
     
     def get_position(self) -> Optional[Dict]:
+        mirror = self._mirror()
+        if mirror is not None:
+            self.current_position = mirror.position(self.symbol)
+            if self.current_position:
+                self.current_leverage = self.current_position['leverage']
+            return self.current_position
+        
         try:
             result = self.session.get_positions(
                 category="linear",
@@ -117,18 +153,11 @@ class BybitDemoTrader:
             )
             
             if result['retCode'] == 0 and result['result']['list']:
-                pos = result['result']['list'][0]
+                position = parse_position(result['result']['list'][0])
                 
-                if float(pos['size']) > 0:
-                    self.current_position = {
-                        'side': pos['side'],
-                        'size': float(pos['size']),
-                        'entry_price': float(pos['avgPrice']),
-                        'current_price': float(pos['markPrice']),
-                        'unrealized_pnl': float(pos['unrealisedPnl']),
-                        'leverage': int(pos['leverage'])
-                    }
-                    self.current_leverage = int(pos['leverage'])
+                if position:
+                    self.current_position = position
+                    self.current_leverage = position['leverage']
                     return self.current_position
             
             self.current_position = None
@@ -139,6 +168,12 @@ class BybitDemoTrader:
             return None
     
     def get_current_price(self) -> float:
+        mirror = self._mirror()
+        if mirror is not None:
+            price = mirror.last_price(self.symbol)
+            if price is not None:
+                return price
+        
         try:
             result = self.session.get_tickers(
                 category="linear",
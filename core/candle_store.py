@@ -0,0 +1,146 @@
+"""
+本地 OHLCV K 線儲存
+以 交易對 / 時間框架 分區，每個欄位一個只追加 (append-only) 的二進位檔，
+讀取時用 numpy.memmap 映射，取最後 N 根不需要複製或解析整個檔案
+
+目錄結構:
+    {root}/{symbol}/{timeframe}/open_time.bin   (int64, 毫秒)
+    {root}/{symbol}/{timeframe}/close_time.bin  (int64, 毫秒)
+    {root}/{symbol}/{timeframe}/open.bin ... volume.bin  (float64)
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+
+CANDLE_COLUMNS = {
+    'open_time': np.int64,
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'volume': np.float64,
+    'close_time': np.int64,
+}
+
+
+class CandleStore:
+    """
+    只追加的欄式 K 線儲存
+
+    - append() 只會寫入 open_time 比已存最後一根更新的 K 棒
+    - tail() 返回最後 N 根的 memmap view (零複製)
+    - 寫入中途中斷時，開啟時會以最短欄位長度為準自動修復
+    """
+
+    def __init__(self, root: str = 'data/candles'):
+        self.root = Path(root)
+        self._locks: Dict[tuple, threading.RLock] = {}
+        self._locks_guard = threading.Lock()
+
+    def lock(self, symbol: str, timeframe: str) -> threading.RLock:
+        """取得交易對 / 時間框架的鎖 (同一分區的讀寫需串行)"""
+        key = (symbol, timeframe)
+        with self._locks_guard:
+            if key not in self._locks:
+                self._locks[key] = threading.RLock()
+            return self._locks[key]
+
+    def _partition(self, symbol: str, timeframe: str) -> Path:
+        return self.root / symbol / timeframe
+
+    def _column_path(self, symbol: str, timeframe: str, column: str) -> Path:
+        return self._partition(symbol, timeframe) / f"{column}.bin"
+
+    def count(self, symbol: str, timeframe: str) -> int:
+        """已儲存的 K 棒數量 (會修復長度不一致的欄位)"""
+        with self.lock(symbol, timeframe):
+            sizes = {}
+            for column, dtype in CANDLE_COLUMNS.items():
+                path = self._column_path(symbol, timeframe, column)
+                sizes[column] = path.stat().st_size // np.dtype(dtype).itemsize if path.exists() else 0
+
+            rows = min(sizes.values())
+            for column, size in sizes.items():
+                if size != rows:
+                    # 上次寫入中斷：截斷到一致的長度
+                    with open(self._column_path(symbol, timeframe, column), 'r+b') as f:
+                        f.truncate(rows * np.dtype(CANDLE_COLUMNS[column]).itemsize)
+            return rows
+
+    def last_open_time(self, symbol: str, timeframe: str) -> Optional[int]:
+        """最後一根已儲存 K 棒的 open_time (毫秒)，沒有數據時返回 None"""
+        view = self.tail(symbol, timeframe, 1)
+        if view is None:
+            return None
+        return int(view['open_time'][-1])
+
+    def first_open_time(self, symbol: str, timeframe: str) -> Optional[int]:
+        with self.lock(symbol, timeframe):
+            if self.count(symbol, timeframe) == 0:
+                return None
+            return int(self._memmap(symbol, timeframe, 'open_time')[0])
+
+    def _memmap(self, symbol: str, timeframe: str, column: str) -> np.memmap:
+        return np.memmap(
+            self._column_path(symbol, timeframe, column),
+            dtype=CANDLE_COLUMNS[column],
+            mode='r'
+        )
+
+    def tail(self, symbol: str, timeframe: str, n: int) -> Optional[Dict[str, np.ndarray]]:
+        """
+        返回最後 n 根 K 棒的欄位 view (零複製)
+
+        Returns:
+            {column: array}，沒有數據時返回 None
+        """
+        with self.lock(symbol, timeframe):
+            rows = self.count(symbol, timeframe)
+            if rows == 0 or n <= 0:
+                return None
+            start = max(0, rows - n)
+            return {
+                column: self._memmap(symbol, timeframe, column)[start:rows]
+                for column in CANDLE_COLUMNS
+            }
+
+    def append(self, symbol: str, timeframe: str, candles: Dict[str, np.ndarray]) -> int:
+        """
+        追加已收盤的 K 棒，只寫入比最後一根更新的部分
+
+        Args:
+            candles: {column: array}，需包含 CANDLE_COLUMNS 的所有欄位，依 open_time 排序
+
+        Returns:
+            實際寫入的 K 棒數量
+        """
+        with self.lock(symbol, timeframe):
+            last = self.last_open_time(symbol, timeframe)
+            open_time = np.asarray(candles['open_time'], dtype=np.int64)
+            mask = open_time > last if last is not None else np.ones(len(open_time), dtype=bool)
+            new_rows = int(mask.sum())
+            if new_rows == 0:
+                return 0
+
+            partition = self._partition(symbol, timeframe)
+            partition.mkdir(parents=True, exist_ok=True)
+            for column, dtype in CANDLE_COLUMNS.items():
+                data = np.ascontiguousarray(np.asarray(candles[column], dtype=dtype)[mask])
+                with open(self._column_path(symbol, timeframe, column), 'ab') as f:
+                    f.write(data.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+            return new_rows
+
+    def replace(self, symbol: str, timeframe: str, candles: Dict[str, np.ndarray]) -> int:
+        """以新的數據覆蓋整個分區 (例如需要更長的歷史時)"""
+        with self.lock(symbol, timeframe):
+            for column in CANDLE_COLUMNS:
+                path = self._column_path(symbol, timeframe, column)
+                if path.exists():
+                    path.unlink()
+            return self.append(symbol, timeframe, candles)
@@ -4,15 +4,28 @@
 """
 import pandas as pd
 import numpy as np
-import talib
 from typing import Dict, List
-import json
-from pathlib import Path
+from core.case_store import open_case_store
+from core.indicator_engine import MARKET_INDICATORS, compute_indicators, indicator
+
+
+# 案例特徵所需指標：核心指標 + ROC / 成交量均線 / AD / 成交量斜率
+CASE_INDICATORS = MARKET_INDICATORS + [
+    indicator('ROC', 'roc', timeperiod=10),
+    indicator('SMA', 'volume_ma20', inputs=('volume',), timeperiod=20),
+    indicator('AD', 'ad', inputs=('high', 'low', 'close', 'volume')),
+    indicator('LINEARREG_SLOPE', 'volume_trend', inputs=('volume',), timeperiod=10),
+]
 
 
 class CaseExtractor:
     """提取並格式化獲利交易案例的完整技術特徵"""
     
+    # 只保留技術指標，排除原始OHLCV和時間
+    EXCLUDE_COLS = ['open', 'high', 'low', 'close', 'volume', 'timestamp', 'time', 'symbol', 'open_time', 'close_time']
+    # 計算趨勢的關鍵指標
+    TREND_INDICATORS = ['rsi', 'macd_hist', 'volume_ratio', 'bb_position', 'adx']
+    
     def __init__(self):
         self.feature_count = 42  # 40+ 技術指標
         
@@ -40,13 +53,18 @@ class CaseExtractor:
         # 計算所有技術指標
         df = self._calculate_all_indicators(df)
         
+        # 只保留獲利 > 1% 的交易
+        trades = [trade for trade in trades if not trade.get('pnl_pct', 0) < 1.0]
+        
+        if self._supports_batch(df):
+            return self._extract_batch(df, trades)
+        return self._extract_each(df, trades)
+    
+    def _extract_each(self, df: pd.DataFrame, trades: List[Dict]) -> List[Dict]:
+        """逐筆提取 (時間未排序或索引不是連續整數時使用)"""
         detailed_cases = []
         
         for trade in trades:
-            # 只保留獲利 > 1% 的交易
-            if trade.get('pnl_pct', 0) < 1.0:
-                continue
-                
             try:
                 case = self._extract_single_case(df, trade)
                 if case:
@@ -57,6 +75,147 @@ class CaseExtractor:
         
         return detailed_cases
     
+    def _supports_batch(self, df: pd.DataFrame) -> bool:
+        """
+        批次提取的前提: 索引是連續整數 (位置運算與標籤運算相同)、時間遞增、
+        指標欄位都是數值
+        """
+        index = df.index
+        if len(index) == 0 or not pd.api.types.is_integer_dtype(index):
+            return False
+        if not (np.diff(index.to_numpy()) == 1).all():
+            return False
+        if not df['timestamp'].is_monotonic_increasing:
+            return False
+        return all(
+            pd.api.types.is_numeric_dtype(df[col]) or pd.api.types.is_bool_dtype(df[col])
+            for col in df.columns if col not in self.EXCLUDE_COLS
+        )
+    
+    def _parse_times(self, values: List) -> List[pd.Timestamp]:
+        """一次解析所有交易時間，格式不一致時改為逐個推斷格式"""
+        try:
+            return list(pd.to_datetime(values))
+        except (ValueError, TypeError):
+            pass
+        try:
+            return list(pd.to_datetime(values, format='mixed'))
+        except (ValueError, TypeError):
+            return [pd.to_datetime(v) for v in values]
+    
+    def _extract_batch(self, df: pd.DataFrame, trades: List[Dict]) -> List[Dict]:
+        """
+        批次提取 (輸出與逐筆的 _extract_single_case 相同)
+        
+        1. 所有交易的進出場K線用一次 searchsorted 找出
+        2. 用到的K線只組一次 candle (時間 / OHLCV / 指標)，各案例再複製
+        3. 進場前K線的指標趨勢依長度分組向量化計算
+        """
+        if not trades:
+            return []
+        try:
+            entry_times = self._parse_times([trade['entry_time'] for trade in trades])
+            exit_times = self._parse_times([trade['exit_time'] for trade in trades])
+        except Exception:
+            # 讓逐筆提取回報錯誤
+            return self._extract_each(df, trades)
+        if any(not isinstance(t, pd.Timestamp) or pd.isna(t) for t in entry_times + exit_times):
+            return self._extract_each(df, trades)
+        parsed = list(zip(trades, entry_times, exit_times))
+        
+        try:
+            # 時間 <= 進出場時間的最後一根K線
+            entry_pos = df['timestamp'].searchsorted([p[1] for p in parsed], side='right') - 1
+            exit_pos = df['timestamp'].searchsorted([p[2] for p in parsed], side='right') - 1
+        except TypeError:
+            # 時區不一致等無法一次比較的情況
+            return self._extract_each(df, [p[0] for p in parsed])
+        
+        lookback = 5
+        plans = []
+        for (trade, entry_time, exit_time), entry_idx, exit_idx in zip(parsed, entry_pos.tolist(), exit_pos.tolist()):
+            if entry_idx < 0:
+                print(f"⚠️ 提取案例失敗: 找不到進場時間 {entry_time} 對應的K線")
+                continue
+            if exit_idx < 0:
+                print(f"⚠️ 提取案例失敗: 找不到出場時間 {exit_time} 對應的K線")
+                continue
+            
+            entry_rows = list(range(max(0, entry_idx - lookback), entry_idx + 1))
+            holding_indices = list(range(entry_idx + 1, exit_idx + 1))
+            if len(holding_indices) > 10:
+                sampled = (
+                    holding_indices[:2] + 
+                    holding_indices[2:-2][::max(1, len(holding_indices[2:-2])//6)][:6] +
+                    holding_indices[-2:]
+                )
+                holding_indices = sorted(set(sampled))
+            plans.append((trade, entry_time, exit_time, entry_idx, exit_idx, entry_rows, holding_indices))
+        if not plans:
+            return []
+        
+        # 用到的K線一次取出
+        needed = sorted({i for plan in plans for i in plan[5] + plan[6]})
+        rows = df.iloc[needed]
+        columns = [col for col in df.columns if col not in self.EXCLUDE_COLS]
+        values = rows[columns].to_numpy(dtype=float)
+        ohlcv = rows[['open', 'high', 'low', 'close', 'volume']].to_numpy(dtype=float).tolist()
+        times = [str(t) for t in rows['timestamp']]
+        indicators = [
+            {col: round(v, 4) for col, v in zip(columns, row) if v == v}
+            for row in values.tolist()
+        ]
+        lookup = {i: k for k, i in enumerate(needed)}
+        
+        def make_candle(i, position):
+            k = lookup[i]
+            return {
+                'time': times[k],
+                'position': position,
+                'ohlcv': list(ohlcv[k]),
+                'indicators': dict(indicators[k])
+            }
+        
+        detailed_cases = []
+        entry_windows = []
+        for trade, entry_time, exit_time, entry_idx, exit_idx, entry_rows, holding_indices in plans:
+            try:
+                candles = [
+                    make_candle(i, 'entry' if i == entry_idx else f'entry-{entry_idx - i}')
+                    for i in entry_rows
+                ]
+                candles += [
+                    make_candle(i, 'exit' if i == exit_idx else f'holding+{i - entry_idx}')
+                    for i in holding_indices
+                ]
+                case = {
+                    'trade_id': f"{trade.get('symbol', 'UNKNOWN')}_{trade['direction']}_{entry_time.strftime('%Y%m%d_%H%M')}",
+                    'symbol': trade.get('symbol', 'UNKNOWN'),
+                    'direction': trade['direction'],
+                    'outcome': f"profit_{trade['pnl_pct']:.2f}%",
+                    'entry_price': float(trade['entry_price']),
+                    'exit_price': float(trade['exit_price']),
+                    'entry_time': str(entry_time),
+                    'exit_time': str(exit_time),
+                    'holding_bars': int(exit_idx - entry_idx),
+                    'candles': candles,
+                    'indicator_trends': None,
+                    'entry_logic': self._generate_entry_logic(
+                        dict(zip(columns, values[lookup[entry_idx]])), trade['direction']
+                    ),
+                    'exit_reason': trade.get('exit_reason', 'UNKNOWN')
+                }
+            except Exception as e:
+                print(f"⚠️ 提取案例失敗: {e}")
+                continue
+            detailed_cases.append(case)
+            entry_windows.append([c['indicators'] for c in candles[:len(entry_rows)]])
+        
+        for case, trends in zip(detailed_cases, self._batch_indicator_trends(entry_windows)):
+            case['indicator_trends'] = trends
+        
+        return detailed_cases
+    
     def _standardize_time_column(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         標準化時間欄位為 'timestamp'
@@ -90,43 +249,28 @@ class CaseExtractor:
         """計算所有40+技術指標"""
         df = df.copy()
         
-        close = df['close'].values
-        high = df['high'].values
-        low = df['low'].values
-        volume = df['volume'].values
+        # 趨勢 / 動能 / 波動 / 成交量指標由共用指標引擎單次計算
+        # (欄位依原本順序寫入，保持案例 JSON 的指標順序不變)
+        block = compute_indicators(df, CASE_INDICATORS)
+        
+        close = block['close']
+        high = block['high']
+        low = block['low']
         
         # === 趨勢指標 (8個) ===
-        df['ema9'] = talib.EMA(close, timeperiod=9)
-        df['ema21'] = talib.EMA(close, timeperiod=21)
-        df['ema50'] = talib.EMA(close, timeperiod=50)
-        df['ema200'] = talib.EMA(close, timeperiod=200)
-        macd, macd_signal, macd_hist = talib.MACD(close)
-        df['macd'] = macd
-        df['macd_signal'] = macd_signal
-        df['macd_hist'] = macd_hist
-        df['adx'] = talib.ADX(high, low, close, timeperiod=14)
+        block.assign_to(df, ['ema9', 'ema21', 'ema50', 'ema200', 'macd', 'macd_signal', 'macd_hist', 'adx'])
         
         # === 動能指標 (6個) ===
-        df['rsi'] = talib.RSI(close, timeperiod=14)
-        df['stoch_k'], df['stoch_d'] = talib.STOCH(high, low, close)
-        df['cci'] = talib.CCI(high, low, close, timeperiod=14)
-        df['mfi'] = talib.MFI(high, low, close, volume, timeperiod=14)
-        df['willr'] = talib.WILLR(high, low, close, timeperiod=14)
-        df['roc'] = talib.ROC(close, timeperiod=10)
+        block.assign_to(df, ['rsi', 'stoch_k', 'stoch_d', 'cci', 'mfi', 'willr', 'roc'])
         
         # === 波動指標 (5個) ===
-        df['atr'] = talib.ATR(high, low, close, timeperiod=14)
-        bb_upper, bb_middle, bb_lower = talib.BBANDS(close, timeperiod=20)
-        df['bb_upper'] = bb_upper
-        df['bb_middle'] = bb_middle
-        df['bb_lower'] = bb_lower
-        df['bb_position'] = (close - bb_lower) / (bb_upper - bb_lower + 1e-10)
+        block.assign_to(df, ['atr', 'bb_upper', 'bb_middle', 'bb_lower'])
+        df['bb_position'] = (close - block['bb_lower']) / (block['bb_upper'] - block['bb_lower'] + 1e-10)
         
         # === 成交量指標 (4個) ===
-        df['volume_ma20'] = talib.SMA(volume, timeperiod=20)
-        df['volume_ratio'] = volume / (df['volume_ma20'] + 1e-10)
-        df['obv'] = talib.OBV(close, volume)
-        df['ad'] = talib.AD(high, low, close, volume)
+        block.assign_to(df, ['volume_ma20'])
+        df['volume_ratio'] = block['volume'] / (df['volume_ma20'] + 1e-10)
+        block.assign_to(df, ['obv', 'ad'])
         
         # === 價格結構 (5個) ===
         df['high_20'] = df['high'].rolling(20).max()
@@ -150,7 +294,7 @@ class CaseExtractor:
         df['price_change_5'] = close / pd.Series(close).shift(5) - 1
         df['price_change_10'] = close / pd.Series(close).shift(10) - 1
         df['volatility_5'] = pd.Series(close).pct_change().rolling(5).std()
-        df['volume_trend'] = talib.LINEARREG_SLOPE(volume, timeperiod=10)
+        block.assign_to(df, ['volume_trend'])
         
         # === 支撐/壓力 (4個) ===
         df['resistance_1'] = df['pivot'] + (df['high'] - df['low'])
@@ -258,47 +402,51 @@ class CaseExtractor:
         """提取單根K線的所有指標數值"""
         indicators = {}
         
-        # 只保留技術指標，排除原始OHLCV和時間
-        exclude_cols = ['open', 'high', 'low', 'close', 'volume', 'timestamp', 'time', 'symbol', 'open_time', 'close_time']
-        
         for col in row.index:
-            if col not in exclude_cols and not pd.isna(row[col]):
+            if col not in self.EXCLUDE_COLS and not pd.isna(row[col]):
                 indicators[col] = round(float(row[col]), 4)
         
         return indicators
     
     def _calculate_indicator_trends(self, candles: List[Dict]) -> Dict:
         """計算關鍵指標的趨勢（上升/下降/平穩）"""
-        if len(candles) < 3:
-            return {}
-        
-        trends = {}
-        key_indicators = ['rsi', 'macd_hist', 'volume_ratio', 'bb_position', 'adx']
-        
-        for indicator in key_indicators:
-            values = []
-            for candle in candles:
-                val = candle['indicators'].get(indicator)
-                if val is not None:
-                    values.append(val)
+        return self._batch_indicator_trends([[c['indicators'] for c in candles]])[0]
+    
+    def _batch_indicator_trends(self, windows: List[List[Dict]]) -> List[Dict]:
+        """
+        多筆交易的指標趨勢，每筆是進場前K線的指標列表
+        斜率是對 (序號, 數值) 的最小平方法，依有效數值個數分組後用閉合解一次算出:
+            slope = Σ(x - x̄)·y / Σ(x - x̄)²
+        """
+        trends = [{} for _ in windows]
+        
+        for indicator in self.TREND_INDICATORS:
+            groups = {}
+            for t, window in enumerate(windows):
+                if len(window) < 3:
+                    continue
+                values = [ind[indicator] for ind in window if ind.get(indicator) is not None]
+                if len(values) >= 3:
+                    rows, series = groups.setdefault(len(values), ([], []))
+                    rows.append(t)
+                    series.append(values)
             
-            if len(values) >= 3:
-                # 計算線性趨勢
-                x = np.arange(len(values))
-                slope = np.polyfit(x, values, 1)[0]
-                
-                if abs(slope) < 0.01:
-                    trend = 'flat'
-                elif slope > 0:
-                    trend = 'rising'
-                else:
-                    trend = 'falling'
-                
-                trends[indicator] = {
-                    'trend': trend,
-                    'values': [round(v, 2) for v in values],
-                    'slope': round(slope, 4)
-                }
+            for length, (rows, series) in groups.items():
+                x = np.arange(length) - (length - 1) / 2
+                slopes = np.asarray(series, dtype=float) @ x / (x @ x)
+                for t, values, slope in zip(rows, series, slopes):
+                    if abs(slope) < 0.01:
+                        trend = 'flat'
+                    elif slope > 0:
+                        trend = 'rising'
+                    else:
+                        trend = 'falling'
+                    
+                    trends[t][indicator] = {
+                        'trend': trend,
+                        'values': [round(v, 2) for v in values],
+                        'slope': round(slope, 4)
+                    }
         
         return trends
     
@@ -341,32 +489,12 @@ class CaseExtractor:
         return " + ".join(conditions)
     
     def save_cases(self, cases: List[Dict], filepath: str = "data/detailed_success_cases.json"):
-        """保存案例到JSON文件"""
-        Path(filepath).parent.mkdir(parents=True, exist_ok=True)
-        
-        # 讀取現有案例
-        existing_cases = []
-        if Path(filepath).exists():
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                existing_cases = data.get('cases', [])
-        
-        # 去重（根據trade_id）
-        existing_ids = {c['trade_id'] for c in existing_cases}
-        new_cases = [c for c in cases if c['trade_id'] not in existing_ids]
-        
-        all_cases = existing_cases + new_cases
-        
-        output = {
-            'version': '2.0',
-            'feature_count': self.feature_count,
-            'total_cases': len(all_cases),
-            'last_updated': pd.Timestamp.now().isoformat(),
-            'cases': all_cases
-        }
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(output, f, indent=2, ensure_ascii=False)
+        """
+        追加案例到案例庫 ({filepath 去掉副檔名}.store，依 trade_id 去重)
+        舊的 JSON 會在第一次打開案例庫時匯入
+        """
+        store = open_case_store(filepath)
+        new_count = store.append(cases, feature_count=self.feature_count)
         
-        print(f"✅ 已保存 {len(new_cases)} 個新案例 (總計 {len(all_cases)} 個)")
-        return len(new_cases)
+        print(f"✅ 已保存 {new_count} 個新案例 (總計 {len(store)} 個)")
+        return new_count
@@ -0,0 +1,231 @@
+"""
+成功案例批量導入
+用簡單的 RSI 超買/超賣 + 成交量爆發策略在歷史K線上模擬交易，找出獲利交易再交給 CaseExtractor 提取案例
+
+- 進場條件一次向量化算出，逐筆交易只做「首次觸及」搜尋 (止盈或 -2% 止損)，
+  迴圈次數是交易數而不是K線數；交易列表與原本逐根K線的版本完全相同
+- 多個幣種分散到多個行程 (每個幣種一個任務)，案例庫只由主行程寫入
+
+load(symbol, timeframe, days) -> DataFrame
+    必須可被工作行程 pickle (模組層級函數)；None 表示使用 DataLoader
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from core.case_extractor import CaseExtractor
+
+
+WARMUP_BARS = 100       # 保留前100根計算指標
+LOOKAHEAD_BARS = 20     # 後20根看結果
+STOP_LOSS_PCT = 2.0
+MIN_BARS = 200
+
+
+def _time_column(df: pd.DataFrame) -> Optional[str]:
+    for col in ['timestamp', 'open_time', 'close_time', 'time']:
+        if col in df.columns:
+            return col
+    return None
+
+
+def filter_recent_days(df: pd.DataFrame, timeframe: str, days: int) -> pd.DataFrame:
+    """
+    截取最近N天的數據
+
+    Args:
+        df: 完整歷史數據
+        timeframe: 時間框架 (15m/1h/4h/1d)
+        days: 要截取多少天
+
+    Returns:
+        截取後的DataFrame
+    """
+    # 確定時間欄位
+    time_col = _time_column(df)
+
+    if time_col is None:
+        # 嘗試使用index
+        if isinstance(df.index, pd.DatetimeIndex):
+            df = df.copy()
+            df['timestamp'] = df.index
+            time_col = 'timestamp'
+        else:
+            raise ValueError("無法找到時間欄位")
+
+    # 確保是datetime類型
+    if not pd.api.types.is_datetime64_any_dtype(df[time_col]):
+        df[time_col] = pd.to_datetime(df[time_col])
+
+    # 計算截取時間點
+    latest_time = df[time_col].max()
+    cutoff_time = latest_time - timedelta(days=days)
+
+    # 截取
+    df_filtered = df[df[time_col] >= cutoff_time].copy()
+
+    # 恢復timestamp欄（如果是從index複製的）
+    if 'timestamp' not in df.columns and time_col == 'timestamp':
+        df_filtered = df_filtered.drop('timestamp', axis=1)
+
+    return df_filtered
+
+
+def first_passage(close: np.ndarray, entry: int, end: int, direction: str,
+                  take_profit_pct: float, stop_loss_pct: float = STOP_LOSS_PCT, chunk: int = 64):
+    """
+    進場後第一根觸及止盈或止損的K線 (只看收盤價，搜尋 entry+1 ~ end-1)
+    視窗從 chunk 根開始每次加倍，持倉短時不必計算整段
+
+    Returns:
+        (出場索引, 損益%)，到 end 都沒有觸及時返回 None
+    """
+    price = close[entry]
+    lo = entry + 1
+    while lo < end:
+        hi = min(end, lo + chunk)
+        window = close[lo:hi]
+        if direction == 'LONG':
+            pnl = (window - price) / price * 100
+        else:
+            pnl = (price - window) / price * 100
+        hit = (pnl >= take_profit_pct) | (pnl <= -stop_loss_pct)
+        if hit.any():
+            k = int(hit.argmax())
+            return lo + k, pnl[k]
+        lo = hi
+        chunk *= 2
+    return None
+
+
+def simulate_trades(df: pd.DataFrame, symbol: str, min_profit_pct: float) -> list:
+    """
+    模擬簡單的RSI超買/超賣策略，找到獲利交易
+    這只是示範，實際應使用你的V13回測引擎的交易記錄
+
+    LONG: RSI<30 + 成交量>1.5x，SHORT: RSI>70 + 成交量>1.5x
+    持倉時不再進場，收盤價獲利 >= min_profit_pct 或虧損 >= 2% 時出場，只保留獲利出場的交易
+    """
+    import talib
+
+    # 確定時間欄位
+    time_col = _time_column(df)
+    if time_col is None:
+        if not isinstance(df.index, pd.DatetimeIndex):
+            raise ValueError("無法找到時間欄位")
+        df = df.copy()
+        df['timestamp'] = df.index
+        time_col = 'timestamp'
+
+    close = df['close'].values
+    volume = df['volume'].values
+
+    rsi = talib.RSI(close, timeperiod=14)
+    volume_ma = pd.Series(volume).rolling(20).mean().values
+
+    start, end = WARMUP_BARS, len(df) - LOOKAHEAD_BARS
+    if end <= start:
+        return []
+
+    # 進場條件 (NaN 比較為 False，與逐根判斷相同)
+    surge = volume[start:end] > volume_ma[start:end] * 1.5
+    long_entry = (rsi[start:end] < 30) & surge
+    short_entry = (rsi[start:end] > 70) & surge
+    candidates = np.flatnonzero(long_entry | short_entry) + start
+
+    times = df[time_col]
+    trades = []
+    i = start
+    while True:
+        # 空手時的下一個進場訊號
+        k = np.searchsorted(candidates, i)
+        if k == len(candidates):
+            break
+        entry = int(candidates[k])
+        direction = 'LONG' if long_entry[entry - start] else 'SHORT'
+
+        passage = first_passage(close, entry, end, direction, min_profit_pct)
+        if passage is None:
+            break       # 到最後都沒有出場
+        exit_idx, pnl_pct = passage
+
+        if pnl_pct >= min_profit_pct:
+            trades.append({
+                'symbol': symbol,
+                'direction': direction,
+                'entry_time': str(times.iat[entry]),
+                'exit_time': str(times.iat[exit_idx]),
+                'entry_price': close[entry],
+                'exit_price': close[exit_idx],
+                'pnl_pct': pnl_pct,
+                'exit_reason': 'TP' if pnl_pct > 0 else 'SL'
+            })
+        i = exit_idx + 1
+
+    return trades
+
+
+def _load_klines(symbol: str, timeframe: str, days: int) -> Optional[pd.DataFrame]:
+    from core.data_loader import DataLoader
+    return DataLoader().load_data(symbol, timeframe, days=days)
+
+
+def import_symbol_cases(symbol: str, timeframe: str, days: int, min_profit_pct: float,
+                        load: Optional[Callable] = None) -> Dict:
+    """
+    單一幣種: 載入最近 days 天K線 -> 模擬交易 -> 提取案例 (不寫入案例庫)
+
+    Returns:
+        {'symbol', 'bars', 'trades', 'cases'}，失敗時包含 error
+    """
+    result = {'symbol': symbol, 'bars': 0, 'trades': 0, 'cases': []}
+    try:
+        df = (load or _load_klines)(symbol, timeframe, days)
+        if df is None or len(df) < MIN_BARS:
+            result['error'] = f"數據不足，至少需要{MIN_BARS}根K線"
+            return result
+
+        df = filter_recent_days(df, timeframe, days)
+        result['bars'] = len(df)
+        if len(df) < MIN_BARS:
+            result['error'] = f"最近{days}天數據不足，請增加天數或確認數據源"
+            return result
+
+        trades = simulate_trades(df, symbol, min_profit_pct)
+        result['trades'] = len(trades)
+        if trades:
+            result['cases'] = CaseExtractor().extract_from_trades(df, trades)
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+
+def bulk_import_cases(symbols: List[str], timeframe: str, days: int, min_profit_pct: float,
+                      max_workers: Optional[int] = None, load: Optional[Callable] = None) -> Iterator[Dict]:
+    """
+    多個幣種平行導入，依完成順序返回各幣種的 import_symbol_cases 結果
+
+    Args:
+        max_workers: 工作行程數，None 表示 CPU 核心數，<= 1 表示在目前行程執行
+    """
+    max_workers = os.cpu_count() if max_workers is None else max_workers
+    if max_workers <= 1 or len(symbols) <= 1:
+        for symbol in symbols:
+            yield import_symbol_cases(symbol, timeframe, days, min_profit_pct, load)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(symbols))) as pool:
+        futures = [
+            pool.submit(import_symbol_cases, symbol, timeframe, days, min_profit_pct, load)
+            for symbol in symbols
+        ]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
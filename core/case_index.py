@@ -0,0 +1,164 @@
+"""
+成功案例相似度索引
+把案例庫 (data/detailed_success_cases.json) 進場K線的指標編成欄式矩陣，
+一次向量化算出所有案例的加權相似度，再用 partition 取前 k 名
+
+相似度與原本逐案例計算的版本完全相同 (逐項相加的順序一致，分數逐位元相同，同分時保留案例順序):
+    score = Σ weight * (1 - diff)，目前值與案例值都是 0 的指標不計分
+    rsi / adx: |a - b| / 100
+    bb_position: |a - b|
+    volume_ratio: |a - b| / max(a, b, 1)
+    macd_hist: min(|a - b| * 100, 1)
+
+案例庫只會在尾端追加 (CaseExtractor.save_cases)，update() 只編入新增的案例
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+SIMILARITY_WEIGHTS = {
+    'rsi': 2.0,
+    'bb_position': 2.0,
+    'volume_ratio': 1.5,
+    'macd_hist': 1.5,
+    'adx': 1.0
+}
+
+
+def _indicator_diff(key: str, current: float, values: np.ndarray, out: np.ndarray, work: np.ndarray):
+    """正規化後的差異 (與原本逐案例的公式相同)，寫入 out"""
+    if key not in ('rsi', 'adx', 'bb_position', 'volume_ratio', 'macd_hist'):
+        out.fill(0.0)
+        return
+    np.subtract(current, values, out=out)
+    np.abs(out, out=out)
+    if key in ('rsi', 'adx'):
+        np.divide(out, 100.0, out=out)
+    elif key == 'volume_ratio':
+        np.maximum(values, current, out=work)
+        np.maximum(work, 1.0, out=work)
+        np.divide(out, work, out=out)
+    elif key == 'macd_hist':
+        np.multiply(out, 100, out=out)
+        np.minimum(out, 1.0, out=out)
+
+
+def entry_indicators(case: Dict) -> Optional[Dict]:
+    """案例進場K線的指標，沒有進場K線時返回 None"""
+    entry_candle = next((c for c in case.get('candles', []) if c.get('position') == 'entry'), None)
+    return entry_candle['indicators'] if entry_candle else None
+
+
+class CaseIndex:
+    """
+    成功案例的向量化 top-k 檢索
+
+    用法:
+        index = CaseIndex(cases)
+        similar = index.query(current_market, 5)
+        index.update(reloaded_cases)   # 只編入新增的案例
+    """
+
+    def __init__(self, cases: Optional[List[Dict]] = None, weights: Dict[str, float] = SIMILARITY_WEIGHTS):
+        self.weights = dict(weights)
+        self.keys = list(self.weights)
+        self._values = np.empty((len(self.keys), 0))
+        self._zero = np.empty((len(self.keys), 0), dtype=bool)
+        self._buffers = np.empty((3, 0))   # 查詢用的暫存 (分數 / 單項分數 / 計算用)
+        self._size = 0
+        self._cases: List[Dict] = []      # 已編入的案例 (有進場K線)
+        self._source_ids: List = []      # 來源案例的 trade_id (含沒有進場K線的案例)
+        self._rows: List[int] = []       # 已編入案例在來源中的位置
+        if cases:
+            self.add(cases)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _reserve(self, n: int):
+        capacity = self._values.shape[1]
+        if n <= capacity:
+            return
+        capacity = max(n, capacity * 2, 64)
+        values = np.empty((len(self.keys), capacity))
+        values[:, :self._size] = self._values[:, :self._size]
+        zero = np.empty((len(self.keys), capacity), dtype=bool)
+        zero[:, :self._size] = self._zero[:, :self._size]
+        self._values, self._zero = values, zero
+        # 查詢時重複使用同一塊記憶體，避免每次配置大陣列
+        self._buffers = np.empty((3, capacity))
+
+    def add(self, cases: List[Dict]):
+        """在尾端追加案例"""
+        new_rows = []
+        for case in cases:
+            indicators = entry_indicators(case)
+            self._source_ids.append(case.get('trade_id'))
+            if indicators is None:
+                continue
+            self._rows.append(len(self._source_ids) - 1)
+            self._cases.append(case)
+            new_rows.append([indicators.get(key, 0) for key in self.keys])
+
+        if new_rows:
+            self._reserve(self._size + len(new_rows))
+            block = slice(self._size, self._size + len(new_rows))
+            self._values[:, block] = np.asarray(new_rows, dtype=float).T
+            self._zero[:, block] = self._values[:, block] == 0
+            self._size += len(new_rows)
+
+    def rebuild(self, cases: List[Dict]):
+        """清空後重新編入"""
+        self._size = 0
+        self._cases, self._source_ids, self._rows = [], [], []
+        self.add(cases)
+
+    def update(self, cases: List[Dict]):
+        """
+        與重新載入的案例庫同步
+        舊的案例是新列表的前綴 (依 trade_id 判斷) 時只編入新增的部分，否則整個重建
+        """
+        n_seen = len(self._source_ids)
+        if len(cases) >= n_seen and [c.get('trade_id') for c in cases[:n_seen]] == self._source_ids:
+            self._cases = [cases[row] for row in self._rows]
+            self.add(cases[n_seen:])
+        else:
+            self.rebuild(cases)
+
+    def _scores(self, current: Dict) -> np.ndarray:
+        """所有已編入案例的相似度分數 (寫在暫存記憶體，下一次查詢會被覆蓋)"""
+        n = self._size
+        scores, term, work = self._buffers[0, :n], self._buffers[1, :n], self._buffers[2, :n]
+        scores.fill(0.0)
+        for j, key in enumerate(self.keys):
+            current_val = current.get(key, 0)
+            _indicator_diff(key, current_val, self._values[j, :n], term, work)
+            # weight * (1 - diff)
+            np.subtract(1, term, out=term)
+            np.multiply(self.weights[key], term, out=term)
+            if current_val == 0:
+                np.copyto(term, 0.0, where=self._zero[j, :n])
+            np.add(scores, term, out=scores)
+        return scores
+
+    def scores(self, current: Dict) -> np.ndarray:
+        """所有已編入案例的相似度分數"""
+        return self._scores(current).copy()
+
+    def query(self, current: Dict, k: int) -> List[Dict]:
+        """相似度最高的 k 個案例 (同分時依案例順序)"""
+        n = self._size
+        if n == 0 or k <= 0:
+            return []
+        scores = self._scores(current)
+        if k < n:
+            # 先找出第 k 名的分數 (原地 partition)，同分的案例全部留下再排序
+            work = self._buffers[2, :n]
+            np.copyto(work, scores)
+            work.partition(n - k)
+            candidates = np.flatnonzero(scores >= work[n - k])
+        else:
+            candidates = np.arange(n)
+        order = candidates[np.argsort(-scores[candidates], kind='stable')][:k]
+        return [self._cases[i] for i in order]
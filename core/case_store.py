@@ -0,0 +1,513 @@
+"""
+成功案例庫的二進位儲存
+取代每次變更都整份重寫 / 重新解析的 detailed_success_cases.json
+
+目錄結構 ({json 路徑}.store，例如 data/detailed_success_cases.store/):
+    meta.json        版本、指標欄位、feature_count、壓縮世代、最後更新時間
+    cases.jsonl      案例本體 (只追加)，每行一個案例，K棒的指標已抽出
+    indicators.f64   每根K棒一列的指標矩陣 (float64，NaN 表示沒有該指標)
+    records.bin      每個案例一筆固定長度紀錄: 本體位置、指標列範圍與篩選 / 排序用的欄位
+    trade_ids.txt    每個案例的 trade_id (與 records.bin 同順序)
+    tombstones.i64   已刪除案例的紀錄編號
+
+- 新增: 依序追加指標、本體、trade_id，最後寫入 records.bin (寫入 records 才算提交)
+- 刪除: 追加一筆墓碑，O(1)
+- 分頁: 篩選與排序只用 records.bin 的欄位，只解析該頁的案例
+- compact(): 去掉已刪除的案例並重新整理指標欄位 (紀錄重新編號，meta.json 的 generation 加一)
+- 多個實例 (或行程) 共用同一個庫時，所有寫入 (新增 / 刪除 / 壓縮) 以目錄旁的 {目錄}.lock 互斥；
+  寫入前比對磁碟上的壓縮世代、已提交紀錄數與墓碑數，有變化就重新讀取索引
+"""
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:                 # Windows
+    fcntl = None
+    import msvcrt
+
+
+_RECORD = np.dtype([
+    ('offset', '<i8'),        # cases.jsonl 中的位置
+    ('length', '<i4'),
+    ('ind_start', '<i8'),     # indicators.f64 中的第一列
+    ('ind_rows', '<i4'),
+    ('direction', 'i1'),      # 1 = LONG, -1 = SHORT
+    ('profit', '<f8'),        # outcome 'profit_2.30%' -> 2.3
+    ('entry_time', '<i8'),    # ns，無法解析時為 NaT
+    ('holding_bars', '<i4'),
+])
+
+_DIRECTIONS = {'LONG': 1, 'SHORT': -1}
+_SORT_FIELDS = {'profit': 'profit', 'entry_time': 'entry_time', 'holding_bars': 'holding_bars'}
+
+
+@contextmanager
+def _file_lock(path: Path):
+    """跨行程的互斥鎖 (flock / msvcrt)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def parse_profit(outcome) -> float:
+    """'profit_2.30%' -> 2.3"""
+    try:
+        return float(str(outcome).replace('profit_', '').replace('%', ''))
+    except ValueError:
+        return float('nan')
+
+
+def _parse_time(value) -> int:
+    try:
+        return pd.Timestamp(value).value if value is not None else np.iinfo(np.int64).min
+    except (ValueError, TypeError):
+        return np.iinfo(np.int64).min
+
+
+class CaseStore:
+    """
+    只追加的案例庫 (指標欄式儲存 + 墓碑刪除 + 壓縮)
+
+    用法:
+        store = open_case_store("data/detailed_success_cases.json")
+        store.append(cases)
+        page, total = store.page(offset=0, limit=20, sort_by='profit')
+        store.delete(trade_id)
+    """
+
+    VERSION = 1
+    COMPACT_MIN_DEAD = 1000   # 墓碑數超過這個值且多於存活案例時自動壓縮
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+        # 壓縮會替換整個目錄，鎖檔放在目錄外
+        self._lock_path = self.root.with_name(self.root.name + '.lock')
+        self.reload()
+
+    # ------------------------------------------------------------------
+    # 讀取狀態
+    # ------------------------------------------------------------------
+    def _path(self, name: str) -> Path:
+        return self.root / name
+
+    def reload(self):
+        """重新讀取索引 (其他行程寫入或壓縮後呼叫)"""
+        self.meta = self._read_meta()
+        self.indicator_keys: List[str] = self.meta.get('indicator_keys', [])
+
+        records_path = self._path('records.bin')
+        if records_path.exists():
+            # 寫到一半的最後一筆不算
+            n = records_path.stat().st_size // _RECORD.itemsize
+            self._records = np.fromfile(records_path, dtype=_RECORD, count=n)
+        else:
+            self._records = np.zeros(0, dtype=_RECORD)
+
+        n = len(self._records)
+        ids_path = self._path('trade_ids.txt')
+        ids = ids_path.read_text(encoding='utf-8').split('\n')[:-1] if ids_path.exists() else []
+        # 上次寫到一半: trade_id 比提交的紀錄多，下次寫入前先修正
+        self._ids_dirty = len(ids) != n
+        self._trade_ids: List[Optional[str]] = [i or None for i in ids[:n]]
+
+        self._alive = np.ones(n, dtype=bool)
+        self._tombstones = 0
+        tomb_path = self._path('tombstones.i64')
+        if tomb_path.exists():
+            dead = np.fromfile(tomb_path, dtype='<i8')
+            self._tombstones = len(dead)
+            self._alive[dead[(dead >= 0) & (dead < n)]] = False
+
+        self._by_id = {tid: i for i, tid in enumerate(self._trade_ids) if tid is not None and self._alive[i]}
+
+    def _read_meta(self) -> Dict:
+        meta_path = self._path('meta.json')
+        if not meta_path.exists():
+            return {}
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return meta if meta.get('version') == self.VERSION else {}
+
+    def _write_meta(self, **updates):
+        self.meta.update(updates)
+        self.meta['version'] = self.VERSION
+        self.meta['indicator_keys'] = self.indicator_keys
+        self.meta['last_updated'] = pd.Timestamp.now().isoformat()
+        tmp_path = self._path('meta.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._path('meta.json'))
+
+    @property
+    def exists(self) -> bool:
+        return self._path('meta.json').exists()
+
+    def __len__(self) -> int:
+        return int(self._alive.sum())
+
+    def __contains__(self, trade_id) -> bool:
+        return trade_id in self._by_id
+
+    def info(self) -> Dict:
+        return {
+            'total_cases': len(self),
+            'feature_count': self.meta.get('feature_count', 0),
+            'last_updated': self.meta.get('last_updated', 'N/A'),
+        }
+
+    # ------------------------------------------------------------------
+    # 編碼
+    # ------------------------------------------------------------------
+    def _encode(self, case: Dict) -> Tuple[str, np.ndarray]:
+        """案例 -> (本體 JSON, 指標矩陣)；不在欄位中的指標留在本體"""
+        body = dict(case)
+        keys = self.indicator_keys
+        columns = self._columns
+        rows = []
+        if isinstance(case.get('candles'), list):
+            candles = []
+            for candle in case['candles']:
+                indicators = candle.get('indicators') if isinstance(candle, dict) else None
+                if isinstance(indicators, dict):
+                    values = list(indicators.values())
+                    if list(indicators) == keys and all(type(v) is float and v == v for v in values):
+                        # 常見情況: 指標與欄位完全一致
+                        row, extra = values, {}
+                    else:
+                        row, extra = [np.nan] * len(keys), {}
+                        for key, value in indicators.items():
+                            col = columns.get(key)
+                            if col is not None and type(value) is float and value == value:
+                                row[col] = value
+                            else:
+                                extra[key] = value
+                    rows.append(row)
+                    candle = dict(candle, indicators=extra)
+                candles.append(candle)
+            body['candles'] = candles
+        matrix = np.array(rows, dtype=float).reshape(len(rows), len(keys))
+        return json.dumps(body, ensure_ascii=False, separators=(',', ':')), matrix
+
+    def _decode(self, body: Union[str, bytes], matrix: np.ndarray) -> Dict:
+        case = json.loads(body)
+        rows = matrix.tolist()
+        complete = (~np.isnan(matrix).any(axis=1)).tolist() if len(matrix) else []
+        keys = self.indicator_keys
+        row = 0
+        for candle in case.get('candles', []) if isinstance(case.get('candles'), list) else []:
+            if isinstance(candle, dict) and isinstance(candle.get('indicators'), dict):
+                values = rows[row]
+                if complete[row]:
+                    indicators = dict(zip(keys, values))
+                else:
+                    indicators = {key: v for key, v in zip(keys, values) if v == v}
+                indicators.update(candle['indicators'])
+                candle['indicators'] = indicators
+                row += 1
+        return case
+
+    @property
+    def _columns(self) -> Dict[str, int]:
+        return {key: i for i, key in enumerate(self.indicator_keys)}
+
+    def _learn_keys(self, cases: Iterable[Dict]):
+        """依第一次出現的順序收集指標欄位 (只在空的庫或壓縮時決定欄位)"""
+        seen = dict.fromkeys(self.indicator_keys)
+        for case in cases:
+            for candle in case.get('candles', []) or []:
+                indicators = candle.get('indicators') if isinstance(candle, dict) else None
+                if isinstance(indicators, dict):
+                    for key, value in indicators.items():
+                        if type(value) is float:
+                            seen.setdefault(key)
+        self.indicator_keys = list(seen)
+
+    # ------------------------------------------------------------------
+    # 寫入
+    # ------------------------------------------------------------------
+    def append(self, cases: List[Dict], feature_count: Optional[int] = None) -> int:
+        """
+        追加案例 (依 trade_id 去重，沒有 trade_id 的案例一律追加)
+
+        Returns:
+            新增的案例數
+        """
+        with _file_lock(self._lock_path):
+            self._sync_committed()
+            return self._append_locked(cases, feature_count)
+
+    def _sync_committed(self):
+        """
+        其他實例在這之後提交了紀錄、刪除或壓縮時重新讀取索引
+        (截斷位置以磁碟上的提交點為準；墓碑的紀錄編號在壓縮後會改變)
+        """
+        records_path, tomb_path = self._path('records.bin'), self._path('tombstones.i64')
+        disk = (
+            self._read_meta().get('generation', 0),
+            records_path.stat().st_size // _RECORD.itemsize if records_path.exists() else 0,
+            tomb_path.stat().st_size // 8 if tomb_path.exists() else 0,
+        )
+        if disk != (self.meta.get('generation', 0), len(self._records), self._tombstones):
+            self.reload()
+
+    def _append_locked(self, cases: List[Dict], feature_count: Optional[int]) -> int:
+        new_cases, batch_ids = [], set()
+        for case in cases:
+            trade_id = case.get('trade_id')
+            if trade_id is not None and (trade_id in self._by_id or trade_id in batch_ids):
+                continue
+            if trade_id is not None:
+                batch_ids.add(trade_id)
+            new_cases.append(case)
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        if not self._records.size and not self.indicator_keys:
+            self._learn_keys(new_cases)
+        if feature_count is not None:
+            self.meta['feature_count'] = feature_count
+        if not new_cases:
+            if not self.exists:
+                self._write_meta()
+            return 0
+
+        width = len(self.indicator_keys)
+        bodies_path, ind_path = self._path('cases.jsonl'), self._path('indicators.f64')
+        offset, ind_start = self._truncate_uncommitted()
+
+        records = np.zeros(len(new_cases), dtype=_RECORD)
+        bodies, matrices = [], []
+        for i, case in enumerate(new_cases):
+            body, matrix = self._encode(case)
+            data = (body + '\n').encode('utf-8')
+            bodies.append(data)
+            matrices.append(matrix)
+            records[i] = (
+                offset, len(data) - 1, ind_start, len(matrix),
+                _DIRECTIONS.get(case.get('direction'), 0),
+                parse_profit(case.get('outcome')),
+                _parse_time(case.get('entry_time')),
+                int(case.get('holding_bars', 0) or 0),
+            )
+            offset += len(data)
+            ind_start += len(matrix)
+
+        # 指標 -> 本體 -> trade_id -> records (最後寫入 records 才算提交)
+        with open(ind_path, 'ab') as f:
+            if width:
+                np.vstack(matrices).astype('<f8').tofile(f)
+        with open(bodies_path, 'ab') as f:
+            f.write(b''.join(bodies))
+        with open(self._path('trade_ids.txt'), 'ab') as f:
+            f.write(''.join(f"{c.get('trade_id') or ''}\n" for c in new_cases).encode('utf-8'))
+        with open(self._path('records.bin'), 'ab') as f:
+            records.tofile(f)
+
+        first = len(self._records)
+        self._records = np.concatenate([self._records, records])
+        self._alive = np.concatenate([self._alive, np.ones(len(new_cases), dtype=bool)])
+        for i, case in enumerate(new_cases):
+            trade_id = case.get('trade_id')
+            self._trade_ids.append(trade_id)
+            if trade_id is not None:
+                self._by_id[trade_id] = first + i
+        self._write_meta()
+        return len(new_cases)
+
+    def _truncate_uncommitted(self) -> Tuple[int, int]:
+        """去掉上次寫到一半 (沒有寫入 records) 的資料，返回本體與指標的寫入位置"""
+        offset = ind_end = 0
+        if self._records.size:
+            last = self._records[-1]
+            offset = int(last['offset'] + last['length'] + 1)
+            ind_end = int(last['ind_start'] + last['ind_rows'])
+        for name, size in (('cases.jsonl', offset), ('indicators.f64', ind_end * len(self.indicator_keys) * 8)):
+            path = self._path(name)
+            if path.exists() and path.stat().st_size != size:
+                os.truncate(path, size)
+        if self._ids_dirty:
+            self._path('trade_ids.txt').write_text(
+                ''.join(f"{tid or ''}\n" for tid in self._trade_ids), encoding='utf-8'
+            )
+            self._ids_dirty = False
+        return offset, ind_end
+
+    def delete(self, trade_id) -> bool:
+        """以墓碑刪除案例"""
+        with _file_lock(self._lock_path):
+            self._sync_committed()
+            index = self._by_id.pop(trade_id, None)
+            if index is None:
+                return False
+            self._kill([index])
+            return True
+
+    def trim(self, max_cases: int) -> int:
+        """只保留最近 max_cases 個案例，返回刪除數"""
+        with _file_lock(self._lock_path):
+            self._sync_committed()
+            live = np.flatnonzero(self._alive)
+            excess = live[:max(len(live) - max_cases, 0)]
+            if len(excess):
+                for index in excess:
+                    self._by_id.pop(self._trade_ids[index], None)
+                self._kill(excess)
+            return len(excess)
+
+    def _kill(self, indices):
+        with open(self._path('tombstones.i64'), 'ab') as f:
+            np.asarray(indices, dtype='<i8').tofile(f)
+        self._tombstones += len(indices)
+        self._alive[indices] = False
+        self._write_meta()
+
+        dead = len(self._alive) - len(self)
+        if dead >= self.COMPACT_MIN_DEAD and dead > len(self):
+            self._compact_locked()
+
+    def compact(self):
+        """重寫整個庫: 去掉已刪除的案例，指標欄位重新收集"""
+        with _file_lock(self._lock_path):
+            self._sync_committed()
+            self._compact_locked()
+
+    def _compact_locked(self):
+        cases = self.load_all()
+        tmp = self.root.with_name(self.root.name + '.tmp')
+        old = self.root.with_name(self.root.name + '.old')
+        shutil.rmtree(tmp, ignore_errors=True)
+        shutil.rmtree(old, ignore_errors=True)
+
+        fresh = CaseStore(tmp)
+        fresh.meta = {k: v for k, v in self.meta.items() if k not in ('indicator_keys',)}
+        fresh.meta['generation'] = self.meta.get('generation', 0) + 1
+        fresh.append(cases)
+        fresh._lock_path.unlink(missing_ok=True)
+
+        os.replace(self.root, old)
+        os.replace(tmp, self.root)
+        shutil.rmtree(old, ignore_errors=True)
+        self.reload()
+
+    # ------------------------------------------------------------------
+    # 查詢
+    # ------------------------------------------------------------------
+    def _read(self, indices: np.ndarray) -> List[Dict]:
+        if not len(indices):
+            return []
+        width = len(self.indicator_keys)
+        cases = []
+        with open(self._path('cases.jsonl'), 'rb') as bodies, open(self._path('indicators.f64'), 'rb') as ind:
+            for index in indices:
+                record = self._records[index]
+                bodies.seek(int(record['offset']))
+                body = bodies.read(int(record['length']))
+                matrix = np.zeros((0, width))
+                if width and record['ind_rows']:
+                    ind.seek(int(record['ind_start']) * width * 8)
+                    matrix = np.fromfile(ind, dtype='<f8', count=int(record['ind_rows']) * width).reshape(-1, width)
+                cases.append(self._decode(body, matrix))
+        return cases
+
+    def load_all(self) -> List[Dict]:
+        """所有存活案例 (依新增順序)"""
+        live = np.flatnonzero(self._alive)
+        if not len(live):
+            return []
+        width = len(self.indicator_keys)
+        bodies = self._path('cases.jsonl').read_bytes()
+        matrix = np.fromfile(self._path('indicators.f64'), dtype='<f8') if width else np.zeros(0)
+        matrix = matrix[:len(matrix) // width * width].reshape(-1, width) if width else np.zeros((0, 0))
+        cases = []
+        for index in live:
+            record = self._records[index]
+            start, rows = int(record['ind_start']), int(record['ind_rows'])
+            body = bodies[record['offset']:record['offset'] + record['length']]
+            cases.append(self._decode(body, matrix[start:start + rows] if width else np.zeros((rows, 0))))
+        return cases
+
+    def get(self, trade_id) -> Optional[Dict]:
+        index = self._by_id.get(trade_id)
+        return self._read(np.array([index]))[0] if index is not None else None
+
+    def select(self, directions: Optional[List[str]] = None, min_profit: Optional[float] = None,
+               sort_by: Optional[str] = None, descending: bool = True) -> np.ndarray:
+        """篩選並排序，返回紀錄編號 (同值時保留新增順序)"""
+        indices = np.flatnonzero(self._alive)
+        records = self._records[indices]
+        mask = np.ones(len(indices), dtype=bool)
+        if directions is not None:
+            mask &= np.isin(records['direction'], [_DIRECTIONS.get(d, 0) for d in directions])
+        if min_profit is not None:
+            mask &= records['profit'] >= min_profit
+        indices, records = indices[mask], records[mask]
+        if sort_by is not None:
+            keys = records[_SORT_FIELDS[sort_by]]
+            order = np.argsort(-keys if descending else keys, kind='stable')
+            indices = indices[order]
+        return indices
+
+    def page(self, offset: int = 0, limit: int = 20, **filters) -> Tuple[List[Dict], int]:
+        """
+        分頁讀取
+
+        Args:
+            filters: 傳給 select() 的篩選 / 排序條件
+        Returns:
+            (該頁案例, 符合條件的總數)
+        """
+        indices = self.select(**filters)
+        return self._read(indices[offset:offset + limit]), len(indices)
+
+    def summary(self) -> pd.DataFrame:
+        """所有存活案例的篩選 / 統計欄位 (不解析案例本體)"""
+        indices = np.flatnonzero(self._alive)
+        records = self._records[indices]
+        directions = {v: k for k, v in _DIRECTIONS.items()}
+        return pd.DataFrame({
+            'trade_id': [self._trade_ids[i] for i in indices],
+            'direction': [directions.get(int(d), '') for d in records['direction']],
+            'profit': records['profit'],
+            'entry_time': pd.to_datetime(records['entry_time']),
+            'holding_bars': records['holding_bars'],
+        })
+
+
+def open_case_store(json_path: Union[str, Path]) -> CaseStore:
+    """
+    打開 json 路徑對應的案例庫 ({json 路徑去掉副檔名}.store)
+    第一次打開時若舊的 JSON 存在，先匯入一次
+    """
+    json_path = Path(json_path)
+    store = CaseStore(json_path.with_suffix('.store'))
+    if not store.exists and json_path.exists():
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            store.append(data.get('cases', []), feature_count=data.get('feature_count'))
+        else:
+            store.append(data)
+        print(f"✅ 已從 {json_path} 匯入 {len(store)} 個案例")
+    return store
@@ -2,6 +2,8 @@ from datasets import load_dataset
 import pandas as pd
 import os
 
+from core.dataset_cache import HistoricalDatasetCache
+
 class DataLoader:
     def __init__(self):
         self.dataset_name = "zongowo111/v2-crypto-ohlcv-data"
@@ -9,11 +11,50 @@ class DataLoader:
         
         if not os.path.exists(self.cache_dir):
             os.makedirs(self.cache_dir)
+        
+        # parquet 解析一次後轉存為 memmap 欄式快取
+        self.dataset_cache = HistoricalDatasetCache(os.path.join(self.cache_dir, "columnar"))
     
-    def load_data(self, symbol="BTCUSDT", timeframe="15m"):
+    def load_data(self, symbol="BTCUSDT", timeframe="15m", start=None, end=None, days=None):
+        """
+        Args:
+            start / end: 只讀取此時間範圍 (含)
+            days: 只讀取最後 N 天 (open_time >= 最後一根 - N 天)
+        """
         cache_file = os.path.join(self.cache_dir, f"{symbol}_{timeframe}.parquet")
         
-        # 1. 優先從本地緩存讀取
+        # 1. 優先從欄式快取讀取 (只讀取需要的時間範圍)
+        source = HistoricalDatasetCache.source_signature(cache_file)
+        if source is not None and self.dataset_cache.is_fresh(symbol, timeframe, source):
+            print(f"Loading {symbol} {timeframe} from columnar cache...")
+            return self.dataset_cache.load(symbol, timeframe, start=start, end=end, days=days)
+        
+        df = self._load_parquet(symbol, timeframe, cache_file)
+        if df is None:
+            return None
+        
+        source = HistoricalDatasetCache.source_signature(cache_file)
+        if self.dataset_cache.ingest(symbol, timeframe, df, source=source):
+            return self.dataset_cache.load(symbol, timeframe, start=start, end=end, days=days)
+        return self._slice(df, start, end, days)
+    
+    @staticmethod
+    def _slice(df, start=None, end=None, days=None):
+        """無法使用欄式快取時，以 pandas 做相同的時間切片"""
+        if (start is None and end is None and not days) or "open_time" not in df.columns:
+            return df
+        open_time = pd.to_datetime(df["open_time"])
+        mask = pd.Series(True, index=df.index)
+        if start is not None:
+            mask &= open_time >= pd.Timestamp(start)
+        if end is not None:
+            mask &= open_time <= pd.Timestamp(end)
+        if days:
+            mask &= open_time >= open_time.max() - pd.Timedelta(days=days)
+        return df[mask].reset_index(drop=True)
+    
+    def _load_parquet(self, symbol, timeframe, cache_file):
+        # 本地 parquet 緩存
         if os.path.exists(cache_file):
             print(f"Loading {symbol} {timeframe} from local cache...")
             return pd.read_parquet(cache_file)
@@ -0,0 +1,203 @@
+"""
+歷史數據欄式快取
+parquet 只在第一次 (或來源更新時) 解析一次，時間欄位在寫入時轉成 int64 (保留原本的時間單位)，
+其餘數值欄位存成連續的 int64 / float64 檔案，讀取時用 numpy.memmap 映射，
+按時間範圍切片只會讀到需要的頁面
+
+目錄結構:
+    {root}/{symbol}_{timeframe}/meta.json
+    {root}/{symbol}_{timeframe}/{column}.bin
+"""
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class HistoricalDatasetCache:
+    """
+    欄式 memmap 歷史數據快取
+
+    - ingest() 寫入一份 DataFrame (時間欄位正規化一次)
+    - load() 以 open_time 二分搜尋出範圍，只複製該範圍的資料
+    """
+
+    VERSION = 1
+    TIME_COLUMN = 'open_time'
+
+    def __init__(self, root: str = 'data/columnar'):
+        self.root = Path(root)
+
+    def _partition(self, symbol: str, timeframe: str) -> Path:
+        return self.root / f"{symbol}_{timeframe}"
+
+    def _read_meta(self, symbol: str, timeframe: str) -> Optional[Dict]:
+        meta_path = self._partition(symbol, timeframe) / 'meta.json'
+        if not meta_path.exists():
+            return None
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('version') != self.VERSION:
+            return None
+        return meta
+
+    @staticmethod
+    def source_signature(path: str) -> Optional[List[int]]:
+        """來源檔案的 (大小, 修改時間)，用於判斷快取是否過期"""
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def is_fresh(self, symbol: str, timeframe: str, source: Optional[List[int]] = None) -> bool:
+        """快取存在，且 (若有提供) 來源檔案沒有變更"""
+        meta = self._read_meta(symbol, timeframe)
+        if meta is None:
+            return False
+        return source is None or meta.get('source') == source
+
+    @staticmethod
+    def _encode_column(series: pd.Series) -> Optional[Tuple[np.ndarray, str]]:
+        """轉成可 memmap 的陣列；不支援的欄位類型返回 None"""
+        if pd.api.types.is_datetime64_any_dtype(series):
+            if getattr(series.dt, 'tz', None) is not None:
+                return None
+            values = np.asarray(series.values)
+            return np.ascontiguousarray(values.view(np.int64)), str(values.dtype)
+        if pd.api.types.is_bool_dtype(series):
+            return np.ascontiguousarray(series.values, dtype=np.bool_), 'bool'
+        if pd.api.types.is_integer_dtype(series) and not series.isna().any():
+            return np.ascontiguousarray(series.values, dtype=np.int64), 'int64'
+        if pd.api.types.is_numeric_dtype(series):
+            return np.ascontiguousarray(series.values, dtype=np.float64), 'float64'
+        return None
+
+    def ingest(self, symbol: str, timeframe: str, df: pd.DataFrame, source: Optional[List[int]] = None) -> bool:
+        """
+        寫入 DataFrame
+
+        Returns:
+            是否成功寫入 (含有無法 memmap 的欄位或沒有 open_time 時返回 False)
+        """
+        if self.TIME_COLUMN not in df.columns or df.empty:
+            return False
+
+        encoded = {}
+        for column in df.columns:
+            result = self._encode_column(df[column])
+            if result is None:
+                print(f"[DatasetCache] 欄位 {column} ({df[column].dtype}) 無法快取，略過 {symbol} {timeframe}")
+                return False
+            encoded[column] = result
+
+        times = encoded[self.TIME_COLUMN][0]
+        if len(times) > 1 and np.any(np.diff(times) < 0):
+            # 時間切片依賴 open_time 遞增
+            order = np.argsort(times, kind='stable')
+            encoded = {c: (np.ascontiguousarray(v[order]), t) for c, (v, t) in encoded.items()}
+
+        partition = self._partition(symbol, timeframe)
+        if partition.exists():
+            shutil.rmtree(partition)
+        partition.mkdir(parents=True, exist_ok=True)
+
+        for column, (values, _) in encoded.items():
+            values.tofile(partition / f"{column}.bin")
+
+        # meta.json 最後寫入，存在即代表快取完整
+        meta = {
+            'version': self.VERSION,
+            'rows': int(len(df)),
+            'columns': [[column, dtype] for column, (_, dtype) in encoded.items()],
+            'source': source,
+        }
+        tmp_path = partition / 'meta.json.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, partition / 'meta.json')
+        return True
+
+    def _time_unit(self, meta: Dict) -> str:
+        dtype = dict(meta['columns'])[self.TIME_COLUMN]
+        return np.datetime_data(np.dtype(dtype))[0]
+
+    @staticmethod
+    def _to_int(value, unit: str) -> int:
+        """時間 / 時間差轉成與快取相同單位的整數"""
+        if isinstance(value, pd.Timedelta):
+            return int(value.to_timedelta64().astype(f'timedelta64[{unit}]').astype(np.int64))
+        return int(value.to_datetime64().astype(f'datetime64[{unit}]').astype(np.int64))
+
+    def _memmap(self, symbol: str, timeframe: str, column: str, dtype: str, rows: int) -> np.ndarray:
+        storage = np.int64 if dtype.startswith('datetime64') else np.dtype(dtype)
+        return np.memmap(
+            self._partition(symbol, timeframe) / f"{column}.bin",
+            dtype=storage, mode='r', shape=(rows,)
+        )
+
+    def time_range(self, symbol: str, timeframe: str) -> Optional[Tuple[pd.Timestamp, pd.Timestamp]]:
+        """快取中第一根與最後一根 K 棒的 open_time"""
+        meta = self._read_meta(symbol, timeframe)
+        if meta is None or meta['rows'] == 0:
+            return None
+        unit = self._time_unit(meta)
+        times = self._memmap(symbol, timeframe, self.TIME_COLUMN, 'int64', meta['rows'])
+        return pd.Timestamp(int(times[0]), unit=unit), pd.Timestamp(int(times[-1]), unit=unit)
+
+    def load(
+        self,
+        symbol: str,
+        timeframe: str,
+        start=None,
+        end=None,
+        days: Optional[float] = None,
+        columns: Optional[List[str]] = None
+    ) -> Optional[pd.DataFrame]:
+        """
+        讀取時間範圍內的數據
+
+        Args:
+            start: 起始時間 (含)，None 表示從頭
+            end: 結束時間 (含)，None 表示到最後
+            days: 只取最後 N 天 (open_time >= 最後一根 - N 天)，與 start 同時提供時取較晚者
+            columns: 只讀取指定欄位
+
+        Returns:
+            pd.DataFrame (RangeIndex)，快取不存在時返回 None
+        """
+        meta = self._read_meta(symbol, timeframe)
+        if meta is None:
+            return None
+
+        rows = meta['rows']
+        dtypes = dict(meta['columns'])
+        unit = self._time_unit(meta)
+        times = self._memmap(symbol, timeframe, self.TIME_COLUMN, 'int64', rows)
+
+        lo, hi = 0, rows
+        if start is not None:
+            lo = int(np.searchsorted(times, self._to_int(pd.Timestamp(start), unit), side='left'))
+        if days is not None and days > 0 and rows > 0:
+            cutoff = int(times[-1]) - self._to_int(pd.Timedelta(days=days), unit)
+            lo = max(lo, int(np.searchsorted(times, cutoff, side='left')))
+        if end is not None:
+            hi = int(np.searchsorted(times, self._to_int(pd.Timestamp(end), unit), side='right'))
+        hi = max(lo, hi)
+
+        selected = columns if columns is not None else [c for c, _ in meta['columns']]
+        data = {}
+        for column in selected:
+            dtype = dtypes[column]
+            # 只有 [lo, hi) 的頁面會被讀入
+            values = np.array(self._memmap(symbol, timeframe, column, dtype, rows)[lo:hi])
+            if dtype.startswith('datetime64'):
+                values = values.view(dtype)
+            data[column] = values
+        return pd.DataFrame(data)
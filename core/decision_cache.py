@@ -0,0 +1,165 @@
+"""
+LLM 回應快取
+以 (供應商, 模型, system prompt + user prompt 的雜湊) 為鍵，
+同一根 K 棒內相同的 prompt 直接返回上次的回應，不再消耗 API 配額
+
+- TTL: 到目前 K 棒收盤為止 (以 epoch 對齊 bar_seconds)
+- LRU: 記憶體中最多保留 max_entries 筆
+- 選用磁碟後端: disk_dir 下每筆一個 JSON 檔，重啟後仍可命中
+- 即時行情的 prompt 含未收盤 K 棒與帳戶餘額，每個 tick 都不同；
+  呼叫端以 bar_state() 的正規化狀態取代 user prompt 當作鍵，同一根已收盤 K 棒才會命中
+"""
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+class LLMResponseCache:
+    """內容定址的 LLM 回應快取 (執行緒安全)"""
+
+    def __init__(self, max_entries: int = 256, bar_seconds: int = 900, disk_dir: Optional[str] = None):
+        """
+        Args:
+            max_entries: 記憶體中最多保留的回應數
+            bar_seconds: K 棒長度 (秒)，快取在 K 棒收盤時過期
+            disk_dir: 磁碟後端目錄，None 表示只用記憶體
+        """
+        self.max_entries = max_entries
+        self.bar_seconds = bar_seconds
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+
+    @staticmethod
+    def make_key(provider: str, model: str, system_prompt: str, user_prompt: str) -> str:
+        digest = hashlib.sha256()
+        for part in (provider, model, system_prompt, user_prompt):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\x00')
+        return digest.hexdigest()
+
+    @staticmethod
+    def bar_state(bar_start: float, symbol: Optional[str], historical_candles: Optional[List[Dict]] = None,
+                  position_info: Optional[Dict] = None, **extra) -> str:
+        """
+        取代 user prompt 的快取鍵: 目前 K 棒的開始時間、幣種、最後一根已收盤 K 棒 (時間與收盤價)、
+        持倉方向 / 數量 / 開倉價，以及 extra (例如要審核的決策)
+        未收盤 K 棒的價格 / 成交量 / 指標與帳戶餘額、未實現損益不放進鍵
+
+        historical_candles 的最後一根是未收盤的 K 棒
+        """
+        closed = historical_candles[-2] if historical_candles and len(historical_candles) >= 2 else None
+        state = {
+            'bar_start': bar_start,
+            'symbol': symbol,
+            'last_closed': {key: closed.get(key) for key in ('timestamp', 'close')} if closed else None,
+            'position': {key: position_info.get(key) for key in ('side', 'size', 'entry_price')}
+            if position_info else None,
+            **extra
+        }
+        return json.dumps(state, ensure_ascii=False, sort_keys=True, default=str)
+
+    def current_bar_start(self, now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        return now - now % self.bar_seconds
+
+    def expires_at(self, now: Optional[float] = None) -> float:
+        """目前 K 棒的收盤時間"""
+        return self.current_bar_start(now) + self.bar_seconds
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.json"
+
+    def get(self, provider: str, model: str, system_prompt: str, user_prompt: str) -> Optional[Dict]:
+        """返回快取的回應 (副本)，沒有或已過期時返回 None"""
+        key = self.make_key(provider, model, system_prompt, user_prompt)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self.disk_dir:
+                entry = self._read_disk(key)
+                if entry is not None:
+                    self._store(key, entry)
+
+            if entry is not None and entry[0] <= now:
+                self.stats['expired'] += 1
+                self._drop(key)
+                entry = None
+
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return copy.deepcopy(entry[1])
+
+    def put(self, provider: str, model: str, system_prompt: str, user_prompt: str, result: Dict):
+        """儲存成功的回應，到目前 K 棒收盤為止有效"""
+        key = self.make_key(provider, model, system_prompt, user_prompt)
+        entry = (self.expires_at(), copy.deepcopy(result))
+
+        with self._lock:
+            self._store(key, entry)
+            if self.disk_dir:
+                self._write_disk(key, entry)
+
+    def _store(self, key: str, entry: Tuple[float, Dict]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def _drop(self, key: str):
+        self._entries.pop(key, None)
+        if self.disk_dir:
+            try:
+                self._disk_path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, Dict]]:
+        try:
+            with open(self._disk_path(key), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data['expires_at'], data['result']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_disk(self, key: str, entry: Tuple[float, Dict]):
+        path = self._disk_path(key)
+        tmp_path = path.with_suffix('.tmp')
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'expires_at': entry[0], 'result': entry[1]}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError) as e:
+            print(f"[WARNING] 寫入 LLM 快取失敗: {e}")
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+            if self.disk_dir:
+                for path in self.disk_dir.glob('*.json'):
+                    path.unlink()
+
+    def get_stats(self) -> Dict:
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'size': len(self._entries),
+            'hit_rate': (self.stats['hits'] / lookups) * 100 if lookups > 0 else 0
+        }
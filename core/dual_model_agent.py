@@ -7,7 +7,8 @@ import json
 import time
 import os
 from typing import Dict, Optional, List, Tuple
-import requests
+
+from core.llm_http_client import chat_content, get_provider_client
 
 
 class ModelInterface:
@@ -27,32 +28,20 @@ class OpenAICompatibleModel(ModelInterface):
     """OpenAI API 格式模型"""
     
     def analyze(self, system_prompt: str, user_prompt: str) -> Dict:
-        headers = {
-            'Authorization': f'Bearer {self.api_key}',
-            'Content-Type': 'application/json'
-        }
-        
-        payload = {
-            'model': self.model,
-            'messages': [
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': user_prompt}
-            ],
-            'temperature': 0.3,
-            'max_tokens': 2000
-        }
-        
         try:
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=30
+            result = get_provider_client().chat_completion(
+                self.base_url,
+                self.api_key,
+                self.model,
+                [
+                    {'role': 'system', 'content': system_prompt},
+                    {'role': 'user', 'content': user_prompt}
+                ],
+                timeout=30,
+                temperature=0.3,
+                max_tokens=2000
             )
-            response.raise_for_status()
-            
-            result = response.json()
-            content = result['choices'][0]['message']['content']
+            content = chat_content(result)
             
             return {
                 'success': True,
@@ -2,6 +2,7 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+from core.param_sweep import sweep_table
 
 def render_performance_metrics(metrics):
     """渲染性能指标"""
@@ -33,4 +34,16 @@ def render_trade_chart(data, signals):
     fig.add_scatter(x=short_signals["open_time"], y=short_signals["close"], 
                    mode="markers", marker=dict(color="red", size=10), name="做空")
     
-    st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+    st.plotly_chart(fig, use_container_width=True)
+
+def render_sweep_results(result_stream, total, sort_by="return_pct", ascending=False, refresh_every=10):
+    """逐筆顯示參數掃描結果 (依 sort_by 排序的表格)"""
+    progress = st.progress(0.0)
+    table = st.empty()
+    rows = []
+    for row in result_stream:
+        rows.append(row)
+        if len(rows) % refresh_every == 0 or len(rows) == total:
+            progress.progress(len(rows) / total, text=f"已完成 {len(rows)}/{total}")
+            table.dataframe(sweep_table(rows, sort_by, ascending), use_container_width=True)
+    return sweep_table(rows, sort_by, ascending)
@@ -0,0 +1,335 @@
+"""
+共用技術指標引擎
+以宣告式規格 (IndicatorSpec) 描述指標，單次向量化計算後返回 float64 欄位區塊
+
+取代各模組中重複的 talib 指標計算：
+- strategies/v13/market_features
+- core/market_analyzer
+- core/case_extractor
+- strategies/v*/backtester.prepare_features
+
+同一份 OHLCV 數據在同一輪分析中被多個模組使用時，
+已計算過的指標會從快取中取出，不會重算。
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import talib
+
+
+OHLCV_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+HLC = ('high', 'low', 'close')
+HLCV = ('high', 'low', 'close', 'volume')
+
+
+@dataclass(frozen=True)
+class IndicatorSpec:
+    """
+    單一指標的宣告式規格
+
+    Attributes:
+        func: talib 函數名稱 (e.g. 'EMA', 'MACD') 或自訂函數名稱 (e.g. 'ROLLING_MEAN')
+        outputs: 輸出欄位名稱，數量需與函數的輸出數量一致
+        inputs: 輸入欄位名稱 (依函數參數順序)
+        params: 函數參數 ((name, value), ...)
+    """
+    func: str
+    outputs: Tuple[str, ...]
+    inputs: Tuple[str, ...] = ('close',)
+    params: Tuple[Tuple[str, object], ...] = ()
+
+    @property
+    def key(self) -> Tuple:
+        """計算內容的唯一鍵 (與輸出命名無關)"""
+        return (self.func, self.inputs, self.params)
+
+
+def indicator(
+    func: str,
+    outputs: Union[str, Sequence[str]],
+    inputs: Sequence[str] = ('close',),
+    **params
+) -> IndicatorSpec:
+    """
+    建立 IndicatorSpec 的簡寫
+
+    Example:
+        indicator('EMA', 'ema50', timeperiod=50)
+        indicator('MACD', ('macd', 'macd_signal', 'macd_hist'))
+        indicator('ATR', 'atr', inputs=HLC, timeperiod=14)
+    """
+    if isinstance(outputs, str):
+        outputs = (outputs,)
+    return IndicatorSpec(
+        func=func,
+        outputs=tuple(outputs),
+        inputs=tuple(inputs),
+        params=tuple(sorted(params.items()))
+    )
+
+
+def _rolling_mean(values: np.ndarray, timeperiod: int) -> np.ndarray:
+    """pandas rolling mean (與原本 df[col].rolling(n).mean() 結果一致)"""
+    return pd.Series(values).rolling(timeperiod).mean().values
+
+
+def _rolling_max(values: np.ndarray, timeperiod: int) -> np.ndarray:
+    return pd.Series(values).rolling(timeperiod).max().values
+
+
+def _rolling_min(values: np.ndarray, timeperiod: int) -> np.ndarray:
+    return pd.Series(values).rolling(timeperiod).min().values
+
+
+# 非 talib 的自訂指標函數
+CUSTOM_FUNCTIONS = {
+    'ROLLING_MEAN': _rolling_mean,
+    'ROLLING_MAX': _rolling_max,
+    'ROLLING_MIN': _rolling_min,
+}
+
+
+def _resolve_function(name: str):
+    if name in CUSTOM_FUNCTIONS:
+        return CUSTOM_FUNCTIONS[name]
+    func = getattr(talib, name, None)
+    if func is None:
+        raise ValueError(f"未知的指標函數: {name}")
+    return func
+
+
+class IndicatorBlock:
+    """
+    指標計算結果：一個 (n_rows, n_columns) 的 float64 欄位區塊
+
+    以欄為主 (Fortran order) 儲存，每一欄都是連續記憶體，
+    block['ema50'] 返回的是區塊中的 view，不會複製數據。
+    """
+
+    def __init__(self, values: np.ndarray, columns: Sequence[str]):
+        self.values = values
+        self.columns = list(columns)
+        self._index = {name: i for i, name in enumerate(self.columns)}
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.values[:, self._index[name]]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._index
+
+    def __len__(self) -> int:
+        return self.values.shape[0]
+
+    def get(self, name: str, default=None):
+        if name not in self._index:
+            return default
+        return self[name]
+
+    def to_frame(self, index=None) -> pd.DataFrame:
+        """轉換為 DataFrame (會複製數據)"""
+        return pd.DataFrame(self.values, columns=self.columns, index=index)
+
+    def assign_to(self, df: pd.DataFrame, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """
+        將指標欄位寫入 df (就地修改並返回 df)
+
+        Args:
+            columns: 要寫入的欄位，預設為所有非 OHLCV 欄位
+        """
+        if columns is None:
+            columns = [c for c in self.columns if c not in OHLCV_COLUMNS]
+        for name in columns:
+            df[name] = self[name]
+        return df
+
+
+class IndicatorEngine:
+    """
+    向量化指標引擎
+
+    - 相同內容的規格 (func + inputs + params) 在一次計算中只執行一次
+    - 以 OHLCV 內容的雜湊值作為快取鍵，同一份數據的重複請求直接命中快取
+    """
+
+    def __init__(self, cache_size: int = 16):
+        """
+        Args:
+            cache_size: 最多保留幾份不同數據的指標快取 (0 表示停用)
+        """
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Dict[Tuple, Tuple[np.ndarray, ...]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'computed': 0, 'cache_hits': 0}
+
+    def compute(
+        self,
+        df: pd.DataFrame,
+        specs: Sequence[IndicatorSpec],
+        include_inputs: bool = True
+    ) -> IndicatorBlock:
+        """
+        單次計算所有指標並返回欄位區塊
+
+        Args:
+            df: 包含 OHLCV 欄位的 DataFrame
+            specs: 指標規格列表
+            include_inputs: 是否在區塊中包含 OHLCV 原始欄位
+
+        Returns:
+            IndicatorBlock
+        """
+        needed_inputs = {name for spec in specs for name in spec.inputs}
+        input_names = [c for c in OHLCV_COLUMNS if c in df.columns or c in needed_inputs]
+        for name in needed_inputs:
+            if name not in input_names:
+                input_names.append(name)
+
+        inputs = {
+            name: np.ascontiguousarray(df[name].values, dtype=np.float64)
+            for name in input_names
+        }
+
+        results = self._compute_arrays(inputs, specs)
+
+        columns: List[str] = list(input_names) if include_inputs else []
+        for spec in specs:
+            for name in spec.outputs:
+                if name in columns:
+                    raise ValueError(f"重複的指標欄位名稱: {name}")
+                columns.append(name)
+
+        values = np.empty((len(df), len(columns)), dtype=np.float64, order='F')
+        col = 0
+        if include_inputs:
+            for name in input_names:
+                values[:, col] = inputs[name]
+                col += 1
+        for spec in specs:
+            for output in results[spec.key]:
+                values[:, col] = output
+                col += 1
+
+        return IndicatorBlock(values, columns)
+
+    def _compute_arrays(
+        self,
+        inputs: Dict[str, np.ndarray],
+        specs: Sequence[IndicatorSpec]
+    ) -> Dict[Tuple, Tuple[np.ndarray, ...]]:
+        cached = self._lookup(inputs) if self.cache_size > 0 else None
+        fingerprint, cache_entry = cached if cached else (None, {})
+
+        results = {}
+        for spec in specs:
+            key = spec.key
+            if key in results:
+                continue
+            if key in cache_entry:
+                results[key] = cache_entry[key]
+                self.stats['cache_hits'] += 1
+                continue
+
+            func = _resolve_function(spec.func)
+            output = func(*(inputs[name] for name in spec.inputs), **dict(spec.params))
+            if not isinstance(output, tuple):
+                output = (output,)
+            if len(output) != len(spec.outputs):
+                raise ValueError(
+                    f"{spec.func} 返回 {len(output)} 個序列，但規格定義了 {len(spec.outputs)} 個輸出"
+                )
+            output = tuple(np.asarray(o, dtype=np.float64) for o in output)
+
+            results[key] = output
+            cache_entry[key] = output
+            self.stats['computed'] += 1
+
+        if fingerprint is not None:
+            self._store(fingerprint, cache_entry)
+
+        return results
+
+    def _lookup(self, inputs: Dict[str, np.ndarray]):
+        digest = hashlib.blake2b(digest_size=16)
+        for name in sorted(inputs):
+            digest.update(name.encode())
+            digest.update(inputs[name])
+        fingerprint = digest.hexdigest()
+
+        with self._lock:
+            entry = self._cache.get(fingerprint)
+            if entry is not None:
+                self._cache.move_to_end(fingerprint)
+                return fingerprint, entry
+        return fingerprint, {}
+
+    def _store(self, fingerprint: str, entry: Dict):
+        with self._lock:
+            self._cache[fingerprint] = entry
+            self._cache.move_to_end(fingerprint)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+
+# ==================== 標準指標組合 ====================
+
+# AI 市場特徵 (market_features / MarketAnalyzer / CaseExtractor 共用的核心指標)
+MARKET_INDICATORS = [
+    # 趨勢
+    indicator('EMA', 'ema9', timeperiod=9),
+    indicator('EMA', 'ema21', timeperiod=21),
+    indicator('EMA', 'ema50', timeperiod=50),
+    indicator('EMA', 'ema200', timeperiod=200),
+    indicator('MACD', ('macd', 'macd_signal', 'macd_hist')),
+    indicator('ADX', 'adx', inputs=HLC, timeperiod=14),
+
+    # 動能
+    indicator('RSI', 'rsi', timeperiod=14),
+    indicator('STOCH', ('stoch_k', 'stoch_d'), inputs=HLC),
+    indicator('CCI', 'cci', inputs=HLC, timeperiod=14),
+    indicator('MFI', 'mfi', inputs=HLCV, timeperiod=14),
+    indicator('WILLR', 'willr', inputs=HLC, timeperiod=14),
+
+    # 波動
+    indicator('ATR', 'atr', inputs=HLC, timeperiod=14),
+    indicator('BBANDS', ('bb_upper', 'bb_middle', 'bb_lower'), timeperiod=20),
+
+    # 成交量
+    indicator('OBV', 'obv', inputs=('close', 'volume')),
+]
+
+
+_default_engine = IndicatorEngine()
+
+
+def get_indicator_engine() -> IndicatorEngine:
+    """返回全域共用的指標引擎 (共用快取)"""
+    return _default_engine
+
+
+def compute_indicators(
+    df: pd.DataFrame,
+    specs: Sequence[IndicatorSpec] = MARKET_INDICATORS,
+    include_inputs: bool = True
+) -> IndicatorBlock:
+    """
+    使用全域引擎計算指標區塊
+
+    Args:
+        df: 包含 OHLCV 欄位的 DataFrame
+        specs: 指標規格列表，預設為 MARKET_INDICATORS
+        include_inputs: 是否在區塊中包含 OHLCV 原始欄位
+
+    Returns:
+        IndicatorBlock
+    """
+    return _default_engine.compute(df, specs, include_inputs=include_inputs)
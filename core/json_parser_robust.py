@@ -13,10 +13,308 @@
 9. None vs null
 10. NaN, Infinity 等非法值
 11. AI 輸出被截斷 (部分輸出)
+
+單次掃描: DecisionParser 以一個 token 正規表示式從頭到尾掃描一次，
+以狀態機 (目前的 key、是否在等待值、大括號深度、陣列) 直接取出 key / value，
+不再依序嘗試 json.loads -> 切出候選物件 -> 修復 -> 正則提取 (多次掃描 + 例外控制流程)
+
+- 物件內的欄位優先於物件外的文字 (例如 "action: OPEN_LONG" 這類純文字輸出)
+- 巢狀物件的欄位也會取出 (例如 {"decision": {...}})，同名時淺層優先；
+  巢狀物件本身也以 dict 保留在它的 key 之下 (包括空物件 {})
+- 陣列內的物件與陣列保持原本的巢狀結構 (例如 [{"name": "x"}]、[[1, 2], [3, 4]])
+- 第一個頂層物件結束後停止 (多個 JSON 物件取第一個)
+- <think>...</think>、// 與 /* */ 註釋略過
+- 可以逐段餵入 (串流)：結尾可能還沒輸出完的 token 等下一段再解析
 """
-import json
 import re
-from typing import Dict, Optional, Any
+from typing import Any, Dict, List, Optional, Sequence
+
+
+_TOKEN = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<think><think>)
+  | (?P<dq>"(?:[^"\\]|\\.)*")
+  | (?P<sq>'(?:[^'\\\n]|\\.)*')
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<punct>[{}\[\]:,：])
+  | (?P<word>[^\s{}\[\]:,："'<]+)
+  | (?P<other>.)
+""", re.S | re.X)
+# 最常見的 "key": value 一次比對 (數字要看到後面的分隔符號才算完整)
+_PAIR = re.compile(r"""
+    \s*(?:"(?P<dkey>(?:[^"\\]|\\.)*)"|'(?P<skey>(?:[^'\\\n]|\\.)*)')
+    \s*[:：]\s*
+    (?: "(?P<dval>(?:[^"\\]|\\.)*)"
+      | '(?P<sval>(?:[^'\\\n]|\\.)*)'
+      | (?:(?P<num>-?\d+(?P<frac>(?:\.\d+)?(?:[eE][+-]?\d+)?))|(?P<lit>true|false|null|True|False|None|NaN))
+        (?=\s*[,}\]\n])
+    )\s*,?
+""", re.X)
+_UNQUOTED = re.compile(r'[^,}\]\n]*')
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?')
+_KEY_SUFFIX = re.compile(r'[A-Za-z_][A-Za-z0-9_]*$')
+_ESCAPE = re.compile(r'\\(u[0-9a-fA-F]{4}|.)', re.S)
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f'}
+_LITERALS = {
+    'true': True, 'True': True, 'false': False, 'False': False, 'null': None, 'None': None,
+    'NaN': 0, 'Infinity': 999999, '-Infinity': -999999
+}
+# 這些 token 在緩衝區結尾時可能還沒輸出完
+_OPEN_ENDED = ('word', 'comment')
+
+
+def _unescape(body: str) -> str:
+    def replace(match):
+        code = match.group(1)
+        if len(code) == 5:
+            return chr(int(code[1:], 16))
+        return _ESCAPES.get(code, code)
+    return _ESCAPE.sub(replace, body) if '\\' in body else body
+
+
+def _scalar(text: str) -> Any:
+    """未加引號的值: 數字 / true / None / NaN ... 其餘當作字串"""
+    text = text.strip()
+    if text in _LITERALS:
+        return _LITERALS[text]
+    number = text.rstrip('%')                 # "confidence: 60%"
+    if _NUMBER.fullmatch(number):
+        return float(number) if any(c in number for c in '.eE') else int(number)
+    return text.strip('`')
+
+
+class DecisionParser:
+    """
+    單次掃描、可逐段餵入的寬鬆 JSON 欄位解析器
+
+    用法:
+        fields = DecisionParser().feed(content).finish()
+
+        parser = DecisionParser()
+        for chunk in chunks:
+            parser.feed(chunk)
+            parser.structured_fields      # 目前已完整輸出的物件內欄位
+        fields = parser.finish()
+    """
+
+    def __init__(self):
+        self._buf = ''
+        self._pos = 0
+        self._depth = 0
+        self._key: Optional[str] = None       # 等待值的 key
+        self._last: Optional[str] = None      # 可能成為 key 的上一個 token
+        self._array: Optional[List] = None    # 目前 key 的陣列值
+        self._stack: List = []                # 陣列內還沒結束的容器 (最外層是 _array)
+        self._item_key: Optional[str] = None  # 陣列內物件等待值的 key
+        self._item_last: Optional[str] = None
+        self._objects: List = []              # 巢狀物件: (key, 已取得的欄位)，每層一個
+        self._in_think = False
+        self._fields: Dict[str, Any] = {}
+        self._field_depth: Dict[str, int] = {}
+        self._loose: Dict[str, Any] = {}
+        self.done = False                     # 第一個頂層物件已結束
+
+    @property
+    def structured(self) -> bool:
+        """是否從 JSON 物件 (而不是純文字) 取得欄位"""
+        return bool(self._fields)
+
+    @property
+    def structured_fields(self) -> Dict[str, Any]:
+        return dict(self._fields)
+
+    @property
+    def fields(self) -> Dict[str, Any]:
+        """物件內的欄位優先，物件外的 key: value 補上缺少的欄位"""
+        return {**self._loose, **self._fields}
+
+    def feed(self, chunk: str) -> 'DecisionParser':
+        if chunk and not self.done:
+            self._buf += chunk
+            self._scan(final=False)
+        return self
+
+    def finish(self) -> Dict[str, Any]:
+        """輸入結束: 解析剩下的 token (截斷的字串 / 數字也會採用)"""
+        if not self.done:
+            self._scan(final=True)
+            if self._array is not None and self._key is not None:
+                self._set(self._array)
+        return self.fields
+
+    def _set(self, value: Any):
+        key = self._key
+        self._key = self._last = None
+        self._array = None
+        self._stack = []
+        if key is None:
+            return
+        if self._depth == 0:
+            self._loose.setdefault(key, value)
+            return
+        if self._objects:
+            self._objects[-1][1][key] = value
+        if key not in self._fields or self._depth < self._field_depth[key]:
+            self._fields[key] = value
+            self._field_depth[key] = self._depth
+
+    def _scan(self, final: bool):
+        buf, pos, end = self._buf, self._pos, len(self._buf)
+        while pos < end:
+            if self._in_think:
+                close = buf.find('</think>', pos)
+                if close == -1:
+                    pos = max(pos, end - len('</think>'))
+                    break
+                pos = close + len('</think>')
+                self._in_think = False
+                continue
+
+            char = buf[pos]
+            if self._key is None and self._array is None and char in ' \t\r\n"\'':
+                match = _PAIR.match(buf, pos)
+                if match:
+                    key, value, number, frac = match.group('dkey', 'dval', 'num', 'frac')
+                    if key is None:
+                        key = match.group('skey')
+                    self._key = _unescape(key).strip()
+                    if value is not None:
+                        self._set(_unescape(value))
+                    elif number is not None:
+                        self._set(float(number) if frac else int(number))
+                    elif match.group('lit') is not None:
+                        self._set(_LITERALS[match.group('lit')])
+                    else:
+                        self._set(_unescape(match.group('sval')))
+                    pos = match.end()
+                    continue
+
+            # 等待值時，未加引號的值讀到 , } ] 或換行為止
+            if self._key is not None and self._array is None and char not in ' \t\r\n"\'[{':
+                match = _UNQUOTED.match(buf, pos)
+                if match.end() == end and not final:
+                    break
+                if match.group().strip():
+                    self._set(_scalar(match.group()))
+                else:
+                    self._key = None                    # "stop_loss": , 沒有值
+                pos = match.end()
+                continue
+
+            match = _TOKEN.match(buf, pos)
+            kind, text = match.lastgroup, match.group()
+            if match.end() == end and not final and kind in _OPEN_ENDED:
+                break
+            if kind == 'other' and not final and (
+                char == '"'
+                or (char == "'" and buf.find('\n', pos) == -1)
+                or (char == '<' and '<think>'.startswith(buf[pos:pos + 7]))
+                or (char == '/' and buf.startswith('/*', pos))
+            ):
+                break                                   # 字串 / 標籤 / 註釋還沒結束
+            pos = match.end()
+
+            if kind in ('ws', 'comment'):
+                continue
+            if kind == 'think':
+                self._in_think = True
+            elif kind in ('dq', 'sq'):
+                self._value_or_key(_unescape(text[1:-1]))
+            elif kind == 'word':
+                if self._array is not None:
+                    self._item(text, quoted=False)
+                else:
+                    suffix = _KEY_SUFFIX.search(text)
+                    self._last = suffix.group() if suffix else text
+            elif kind == 'punct':
+                if self._punct(text):
+                    self.done = True
+                    break
+            elif char == '"' and final:
+                self._value_or_key(_unescape(buf[pos:]))       # 截斷的字串
+                pos = end
+        self._pos = pos
+
+    def _value_or_key(self, text: str):
+        if self._array is not None:
+            self._item(text, quoted=True)
+        elif self._key is not None:
+            self._set(text)
+        else:
+            self._last = text
+
+    def _item(self, text: str, quoted: bool):
+        """陣列內的字串 / 未加引號的值"""
+        container = self._stack[-1]
+        if isinstance(container, list):
+            container.append(text if quoted else _scalar(text))
+        elif self._item_key is not None:
+            container[self._item_key] = text if quoted else _scalar(text)
+            self._item_key = None
+        else:
+            self._item_last = text.strip()
+
+    def _open_item(self, container):
+        """陣列內開始新的物件 / 陣列"""
+        parent = self._stack[-1]
+        if isinstance(parent, list):
+            parent.append(container)
+        elif self._item_key is not None:
+            parent[self._item_key] = container
+        self._stack.append(container)
+        self._item_key = self._item_last = None
+
+    def _array_punct(self, char: str):
+        """陣列內的標點: 依原本的巢狀結構建立 list / dict"""
+        if char in ':：':
+            if isinstance(self._stack[-1], dict) and self._item_last is not None:
+                self._item_key, self._item_last = self._item_last, None
+        elif char == ',':
+            self._item_last = None
+        elif char == '[':
+            self._open_item([])
+        elif char == '{':
+            self._open_item({})
+        else:
+            closing = list if char == ']' else dict
+            if not isinstance(self._stack[-1], closing) and not any(isinstance(c, closing) for c in self._stack):
+                return                                  # 多餘的括號
+            while self._stack:
+                container = self._stack.pop()
+                if isinstance(container, closing):
+                    break
+            self._item_key = self._item_last = None
+            if not self._stack:
+                self._set(self._array)
+
+    def _punct(self, char: str) -> bool:
+        """處理標點；返回 True 表示第一個頂層物件已結束"""
+        if self._array is not None:
+            self._array_punct(char)
+        elif char in ':：':
+            if self._last is not None and self._key is None:
+                self._key, self._last = self._last.strip(), None
+        elif char == ',':
+            self._last = None
+        elif char == '[':
+            if self._key is not None:
+                self._array = []
+                self._stack = [self._array]
+        elif char == '{':
+            if self._depth > 0:
+                self._objects.append((self._key, {}))
+            self._depth += 1
+            self._key = self._last = None
+        elif char == '}':
+            self._key = self._last = None
+            self._depth = max(0, self._depth - 1)
+            if self._objects and len(self._objects) >= self._depth:
+                key, value = self._objects.pop()
+                if key is not None:
+                    self._key = key
+                    self._set(value)                    # 巢狀物件完整輸出後才以 dict 保留
+            return self._depth == 0 and bool(self._fields)
+        return False
 
 
 class RobustJSONParser:
@@ -24,180 +322,29 @@ class RobustJSONParser:
     強健的 JSON 解析器
     可以處理各種格式錯誤的模型輸出
     """
-    
-    @staticmethod
-    def clean_json_string(text: str) -> str:
-        """清理 JSON 字串"""
-        # 1. 移除 Markdown 代碼塊
-        text = re.sub(r'```json\s*', '', text)
-        text = re.sub(r'```\s*', '', text)
-        
-        # 2. 移除 HTML 標籤
-        text = re.sub(r'<[^>]+>', '', text)
-        
-        # 3. 替換 Python 常量為 JSON 格式
-        text = text.replace('True', 'true')
-        text = text.replace('False', 'false')
-        text = text.replace('None', 'null')
-        
-        # 4. 移除 NaN, Infinity
-        text = re.sub(r'\bNaN\b', '0', text)
-        text = re.sub(r'\bInfinity\b', '999999', text)
-        text = re.sub(r'-Infinity\b', '-999999', text)
-        
-        return text
-    
-    @staticmethod
-    def extract_json_candidates(text: str) -> list:
-        """提取所有可能的 JSON 候選"""
-        candidates = []
-        
-        # 嘗試找到所有 { ... } 結構
-        depth = 0
-        start = -1
-        
-        for i, char in enumerate(text):
-            if char == '{':
-                if depth == 0:
-                    start = i
-                depth += 1
-            elif char == '}':
-                depth -= 1
-                if depth == 0 and start != -1:
-                    candidates.append(text[start:i+1])
-                    start = -1
-        
-        return candidates
-    
-    @staticmethod
-    def fix_common_issues(json_str: str) -> str:
-        """修復常見的 JSON 格式問題"""
-        # 1. 修復單引號與雙引號混用 (簡單版本)
-        # 將 key 名稱的單引號改為雙引號
-        json_str = re.sub(r"'([a-zA-Z_][a-zA-Z0-9_]*)'", r'"\1"', json_str)
-        
-        # 2. 移除尾随逗號 (在大括號前)
-        json_str = re.sub(r',\s*}', '}', json_str)
-        json_str = re.sub(r',\s*]', ']', json_str)
-        
-        # 3. 修復缺少逗號的情況 (兩個字串間)
-        json_str = re.sub(r'"\s+"', '","', json_str)
-        
-        # 4. 移除行內註釋
-        json_str = re.sub(r'//.*?\n', '\n', json_str)
-        
-        # 5. 移除多行註釋
-        json_str = re.sub(r'/\*.*?\*/', '', json_str, flags=re.DOTALL)
-        
-        return json_str
-    
+
     @staticmethod
-    def parse(text: str, default: Optional[Dict] = None) -> Dict:
+    def parse(text: str, default: Optional[Dict] = None,
+              required: Sequence[str] = ('action', 'confidence')) -> Dict:
         """
         解析 JSON ，如果失敗則返回預設值
         
         Args:
             text: 模型輸出的文字
             default: 解析失敗時的預設值
+            required: 沒有 JSON 物件、只有純文字的 key: value 時，必須取得的欄位
         
         Returns:
             解析出的 Dict
         """
         if not text or not isinstance(text, str):
             return default or {}
-        
-        # 清理文字
-        text = RobustJSONParser.clean_json_string(text)
-        
-        # 策略 1: 直接解析
-        try:
-            return json.loads(text)
-        except:
-            pass
-        
-        # 策略 2: 提取第一個 JSON 候選
-        candidates = RobustJSONParser.extract_json_candidates(text)
-        
-        for candidate in candidates:
-            # 2.1: 直接解析
-            try:
-                return json.loads(candidate)
-            except:
-                pass
-            
-            # 2.2: 修復後解析
-            try:
-                fixed = RobustJSONParser.fix_common_issues(candidate)
-                return json.loads(fixed)
-            except:
-                pass
-        
-        # 策略 3: 使用正則提取關鍵資訊
-        extracted = RobustJSONParser.extract_by_regex(text)
-        if extracted:
-            return extracted
-        
-        # 所有策略失敗，返回預設值
+
+        parser = DecisionParser()
+        fields = parser.feed(text).finish()
+        if parser.structured or (fields and all(key in fields for key in required)):
+            return fields
         return default or {}
-    
-    @staticmethod
-    def extract_by_regex(text: str) -> Optional[Dict]:
-        """
-        使用正則表達式提取關鍵資訊
-        當 JSON 解析完全失敗時的備用方案
-        """
-        result = {}
-        
-        # 提取 action
-        action_match = re.search(r'["\']?action["\']?\s*:\s*["\']?(OPEN_LONG|OPEN_SHORT|CLOSE|HOLD)["\']?', text, re.IGNORECASE)
-        if action_match:
-            result['action'] = action_match.group(1).upper()
-        
-        # 提取 confidence
-        conf_match = re.search(r'["\']?confidence["\']?\s*:\s*(\d+)', text)
-        if conf_match:
-            result['confidence'] = int(conf_match.group(1))
-        
-        # 提取 leverage
-        lev_match = re.search(r'["\']?leverage["\']?\s*:\s*(\d+)', text)
-        if lev_match:
-            result['leverage'] = int(lev_match.group(1))
-        
-        # 提取數字欄位
-        for key in ['position_size_usdt', 'entry_price', 'stop_loss', 'take_profit']:
-            match = re.search(rf'["\']?{key}["\']?\s*:\s*([\d.]+)', text)
-            if match:
-                result[key] = float(match.group(1))
-        
-        # 提取 reasoning
-        reasoning_match = re.search(r'["\']?reasoning["\']?\s*:\s*["\']([^"\'}]+)["\']', text)
-        if reasoning_match:
-            result['reasoning'] = reasoning_match.group(1)
-        
-        # 提取 risk_assessment
-        risk_match = re.search(r'["\']?risk_assessment["\']?\s*:\s*["\']?(LOW|MEDIUM|HIGH)["\']?', text, re.IGNORECASE)
-        if risk_match:
-            result['risk_assessment'] = risk_match.group(1).upper()
-        
-        # 提取 is_counter_trend
-        counter_match = re.search(r'["\']?is_counter_trend["\']?\s*:\s*(true|false)', text, re.IGNORECASE)
-        if counter_match:
-            result['is_counter_trend'] = counter_match.group(1).lower() == 'true'
-        
-        # 如果提取到了主要欄位，則認為成功
-        if 'action' in result and 'confidence' in result:
-            # 補全缺失的預設值
-            result.setdefault('leverage', 1)
-            result.setdefault('position_size_usdt', 0)
-            result.setdefault('entry_price', 0)
-            result.setdefault('stop_loss', 0)
-            result.setdefault('take_profit', 0)
-            result.setdefault('reasoning', '正則提取的資訊')
-            result.setdefault('risk_assessment', 'MEDIUM')
-            result.setdefault('is_counter_trend', False)
-            return result
-        
-        return None
 
 
 def parse_trading_decision(content: str) -> Dict:
@@ -258,7 +405,7 @@ def parse_executor_review(content: str) -> Dict:
     }
     
     # 策略 1: 標準 JSON 解析
-    result = RobustJSONParser.parse(content, None)
+    result = RobustJSONParser.parse(content, None, required=('execution_decision',))
     
     if result is None or 'execution_decision' not in result:
         # 策略 2: 智能推斷 (部分輸出)
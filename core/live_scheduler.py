@@ -0,0 +1,204 @@
+"""
+多幣種即時交易排程
+取代每輪分析後固定 time.sleep(900) 的單幣種迴圈
+
+- 每一輪對齊K線收盤 (UTC epoch 對齊，與交易所相同)，再加上 settle_seconds 等交易所寫入收盤K線；
+  等待時間每輪依目前時間重新計算，分析花多久都不會累積成漂移
+- 所有幣種同時分析 (執行緒池)，LLM 呼叫由全域 llm_slots 限制同時數量
+- 每個幣種的狀態 (執行次數、最後結果 / 錯誤、是否執行中、幣種專用物件) 存在 SymbolRegistry
+- 上一輪還沒跑完的幣種在這一輪跳過，不會堆積
+
+run_symbol(state, candle_close) -> Any
+    分析並執行一個幣種；candle_close 是剛收盤K線的收盤時間 (epoch 秒)。
+    呼叫 LLM 時取得 scheduler.llm_slots 的名額，呼叫 (包括背景仍在串流的呼叫) 全部結束後才釋放
+"""
+import math
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from core.timeframe_resampler import TIMEFRAME_MS
+
+
+def next_candle_close(now: float, timeframe: str, settle_seconds: float = 0.0) -> float:
+    """now 之後 (不含) 下一次「K線收盤 + settle_seconds」的時間 (epoch 秒)"""
+    period = TIMEFRAME_MS[timeframe] / 1000
+    return (math.floor((now - settle_seconds) / period) + 1) * period + settle_seconds
+
+
+@dataclass
+class SymbolState:
+    """單一幣種的排程狀態"""
+    symbol: str
+    timeframe: str
+    runs: int = 0
+    skipped: int = 0
+    errors: int = 0
+    running: bool = False
+    last_close: Optional[float] = None      # 最後處理的K線收盤時間
+    last_started: Optional[float] = None
+    last_finished: Optional[float] = None
+    last_result: Any = None
+    last_error: Optional[str] = None
+    context: Dict[str, Any] = field(default_factory=dict)   # 幣種專用物件 (trader 等)
+
+    def summary(self) -> Dict:
+        """給前端顯示的狀態 (不含 context)"""
+        duration = None
+        if self.last_started is not None and self.last_finished is not None and self.last_finished >= self.last_started:
+            duration = round(self.last_finished - self.last_started, 3)
+        return {
+            'symbol': self.symbol,
+            'timeframe': self.timeframe,
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'running': self.running,
+            'last_close': self.last_close,
+            'last_duration': duration,
+            'last_error': self.last_error,
+        }
+
+
+class SymbolRegistry:
+    """各幣種的 SymbolState (執行緒安全)"""
+
+    def __init__(self):
+        self._states: Dict[tuple, SymbolState] = {}
+        self._lock = threading.Lock()
+
+    def get(self, symbol: str, timeframe: str) -> SymbolState:
+        with self._lock:
+            key = (symbol, timeframe)
+            if key not in self._states:
+                self._states[key] = SymbolState(symbol, timeframe)
+            return self._states[key]
+
+    def states(self) -> List[SymbolState]:
+        with self._lock:
+            return list(self._states.values())
+
+    def summary(self) -> List[Dict]:
+        return [state.summary() for state in self.states()]
+
+    def try_start(self, state: SymbolState) -> bool:
+        """標記為執行中；上一輪還在執行時返回 False"""
+        with self._lock:
+            if state.running:
+                state.skipped += 1
+                return False
+            state.running = True
+            return True
+
+
+class LiveScheduler:
+    """
+    對齊K線收盤的多幣種排程
+
+    用法:
+        scheduler = LiveScheduler(['BTCUSDT', 'ETHUSDT'], run_symbol, max_llm_concurrency=4)
+        scheduler.start()          # 背景執行緒，或 run_forever() 在目前執行緒阻塞
+        ...
+        scheduler.stop()
+    """
+
+    def __init__(self, symbols: List[str], run_symbol: Callable[[SymbolState, float], Any],
+                 timeframe: str = '15m', max_llm_concurrency: int = 4, max_workers: Optional[int] = None,
+                 settle_seconds: float = 2.0, registry: Optional[SymbolRegistry] = None,
+                 clock: Callable[[], float] = time.time):
+        """
+        Args:
+            max_llm_concurrency: 所有幣種合計同時進行的 LLM 呼叫數
+            max_workers: 同時分析的幣種數，None 表示全部幣種 (最多 32)
+            settle_seconds: K線收盤後等幾秒再開始 (交易所寫入收盤K線的延遲)
+            clock: 目前時間 (epoch 秒)，測試時可替換
+        """
+        if timeframe not in TIMEFRAME_MS:
+            raise ValueError(f"不支援的時間框架: {timeframe}")
+        if max_llm_concurrency < 1:
+            raise ValueError("max_llm_concurrency 至少為 1")
+        self.symbols = list(dict.fromkeys(symbols))
+        self.run_symbol = run_symbol
+        self.timeframe = timeframe
+        self.settle_seconds = settle_seconds
+        self.registry = registry or SymbolRegistry()
+        self.clock = clock
+        self.llm_slots = threading.BoundedSemaphore(max_llm_concurrency)
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers or min(32, max(1, len(self.symbols))),
+            thread_name_prefix='live-symbol'
+        )
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stop.is_set()
+
+    def _run(self, state: SymbolState, candle_close: float):
+        state.last_started = self.clock()
+        try:
+            state.last_result = self.run_symbol(state, candle_close)
+            state.last_error = None
+        except Exception as e:
+            state.errors += 1
+            state.last_error = str(e)
+            print(f"\n[{state.symbol}] 排程執行失敗: {e}")
+            traceback.print_exc()
+        finally:
+            state.last_close = candle_close
+            state.runs += 1
+            state.last_finished = self.clock()
+            state.running = False
+
+    def run_once(self, candle_close: Optional[float] = None) -> List[Future]:
+        """所有幣種各執行一次 (不等待完成)；candle_close 預設為最近一次收盤"""
+        if candle_close is None:
+            candle_close = next_candle_close(self.clock(), self.timeframe) - TIMEFRAME_MS[self.timeframe] / 1000
+        futures = []
+        for symbol in self.symbols:
+            state = self.registry.get(symbol, self.timeframe)
+            if not self.registry.try_start(state):
+                print(f"[{symbol}] 上一輪尚未完成，跳過本輪")
+                continue
+            try:
+                futures.append(self._pool.submit(self._run, state, candle_close))
+            except RuntimeError:
+                # stop() 已關閉執行緒池
+                state.running = False
+                break
+        return futures
+
+    def run_forever(self, run_immediately: bool = True):
+        """阻塞直到 stop()；每次K線收盤 (+ settle_seconds) 執行一輪"""
+        if run_immediately and not self._stop.is_set():
+            self.run_once()
+        while not self._stop.is_set():
+            target = next_candle_close(self.clock(), self.timeframe, self.settle_seconds)
+            # 依牆上時間重新計算剩餘秒數，避免提早醒來
+            while not self._stop.is_set():
+                remaining = target - self.clock()
+                if remaining <= 0:
+                    break
+                self._stop.wait(remaining)
+            if self._stop.is_set():
+                break
+            self.run_once(target - self.settle_seconds)
+
+    def start(self, run_immediately: bool = True) -> threading.Thread:
+        """在背景執行緒執行 run_forever"""
+        self._thread = threading.Thread(
+            target=self.run_forever, args=(run_immediately,), name='live-scheduler', daemon=True
+        )
+        self._thread.start()
+        return self._thread
+
+    def stop(self, wait: bool = False):
+        """停止排程；正在分析的幣種會跑完 (wait=True 時等待)"""
+        self._stop.set()
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+        if wait and self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
@@ -1,34 +1,50 @@
-from langchain_ollama import OllamaLLM
 import json
 import re
+from typing import Optional
+
 import pandas as pd
-from pathlib import Path
+
+from core.case_store import open_case_store
+from core.llm_replay import LLMReplay
 
 class DeepSeekTradingAgent:
     """DeepSeek-R1 14B 精確交易決策引擎 with Prompt Learning"""
     
-    def __init__(self):
-        self.model = OllamaLLM(
-            model="deepseek-r1:14b",
-            temperature=0.2,
-            num_predict=3072
-        )
+    MODEL_NAME = "deepseek-r1:14b"
+    
+    def __init__(self, replay: Optional[LLMReplay] = None):
+        """
+        Args:
+            replay: LLM 回應錄製 / 重播層；重播模式不需要 Ollama
+        """
+        llm = None
+        if replay is None or replay.mode != 'replay':
+            from langchain_ollama import OllamaLLM
+            llm = OllamaLLM(
+                model=self.MODEL_NAME,
+                temperature=0.2,
+                num_predict=3072
+            )
+        self.replay = replay
+        self.model = replay.wrap(llm, provider='ollama', model=self.MODEL_NAME) if replay else llm
+        self.case_store = open_case_store("data/success_cases.json")
         self.success_cases = []
         self.load_historical_cases()
     
     def load_historical_cases(self):
-        """從歷史數據中加載成功交易案例"""
-        cases_file = Path("data/success_cases.json")
-        if cases_file.exists():
-            try:
-                with open(cases_file, 'r', encoding='utf-8') as f:
-                    self.success_cases = json.load(f)
+        """從歷史數據中加載成功交易案例 (錄製 / 重播時從錄製檔的案例快照開始)"""
+        def load():
+            return self.case_store.load_all() if self.case_store.exists else []
+
+        try:
+            self.success_cases = self.replay.initial_cases(load) if self.replay else load()
+            if self.success_cases:
                 print(f"[V13] 已載入 {len(self.success_cases)} 個歷史成功案例")
-            except:
-                self.success_cases = []
+        except:
+            self.success_cases = []
     
-    def save_success_case(self, market_data, decision, actual_result):
-        """保存成功的交易案例供未來學習"""
+    def save_success_case(self, market_data, decision, actual_result, persist: bool = True):
+        """保存成功的交易案例供未來學習 (persist=False 時只保留在記憶體)"""
         if actual_result.get('profit', 0) > 0:
             case = {
                 'market_data': market_data,
@@ -37,13 +53,11 @@ class DeepSeekTradingAgent:
             }
             self.success_cases.append(case)
             
-            # 只保留最近 50 個成功案例
+            # 只保留最近 50 個成功案例 (追加一筆，舊案例以墓碑刪除)
             self.success_cases = self.success_cases[-50:]
-            
-            cases_file = Path("data/success_cases.json")
-            cases_file.parent.mkdir(exist_ok=True)
-            with open(cases_file, 'w', encoding='utf-8') as f:
-                json.dump(self.success_cases, f, ensure_ascii=False, indent=2)
+            if persist:
+                self.case_store.append([case])
+                self.case_store.trim(50)
     
     def _generate_learning_context(self):
         """將歷史成功案例轉換為學習上下文"""
@@ -101,12 +115,22 @@ class DeepSeekTradingAgent:
             }
         """
         
+        prompt = self.build_prompt(market_data)
+        
+        try:
+            response = self.model.invoke(prompt)
+            return self.parse_response(market_data, response)
+        except Exception as e:
+            return self._error_decision(market_data, e)
+    
+    def build_prompt(self, market_data: dict) -> str:
+        """analyze_market 送給模型的 prompt (含目前的歷史成功案例)"""
         bb_upper = market_data['close'] * (1 + 0.005)
         bb_lower = market_data['close'] * (1 - 0.005)
         
         learning_context = self._generate_learning_context()
         
-        prompt = f"""你是專業加密貨幣量化交易員。請根據以下市場數據給出精確的交易計劃。
+        return f"""你是專業加密貨幣量化交易員。請根據以下市場數據給出精確的交易計劃。
 
 {learning_context}
 
@@ -144,41 +168,50 @@ class DeepSeekTradingAgent:
   "wait_conditions": ["等待條件1", "等待條件2"]
 }}
 """
+    
+    def parse_response(self, market_data: dict, response: str) -> dict:
+        """模型原始回應 -> 交易計劃 (JSON 無法解析時拋出例外)"""
+        # 移除 Thinking 部分
+        response = response.split('...done thinking.')[-1].strip()
         
-        try:
-            response = self.model.invoke(prompt)
-            
-            # 移除 Thinking 部分
-            response = response.split('...done thinking.')[-1].strip()
-            
-            # 提取 JSON
-            json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', response, re.DOTALL)
-            
-            if json_match:
-                json_str = json_match.group(0)
-                json_str = json_str.replace('```json', '').replace('```', '').strip()
-                result = json.loads(json_str)
-                
-                # 計算實際盈虧比
-                if result['signal'] != 'HOLD':
-                    risk = abs(result['entry_price'] - result['stop_loss'])
-                    reward = abs(result['take_profit'] - result['entry_price'])
-                    result['risk_reward_ratio'] = round(reward / risk, 2) if risk > 0 else 0
-                
-                return result
+        # 提取 JSON
+        json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', response, re.DOTALL)
+        
+        if json_match:
+            json_str = json_match.group(0)
+            json_str = json_str.replace('```json', '').replace('```', '').strip()
+            result = json.loads(json_str)
             
-            return self._fallback_decision(market_data, response)
+            # 計算實際盈虧比
+            if result['signal'] != 'HOLD':
+                risk = abs(result['entry_price'] - result['stop_loss'])
+                reward = abs(result['take_profit'] - result['entry_price'])
+                result['risk_reward_ratio'] = round(reward / risk, 2) if risk > 0 else 0
             
+            return result
+        
+        return self._fallback_decision(market_data, response)
+    
+    def decision_from_result(self, market_data: dict, result: dict) -> dict:
+        """批次推論的結果 ({'success', 'content'} 或 {'success': False, 'error'}) -> 交易計劃"""
+        if not result.get('success'):
+            return self._error_decision(market_data, result.get('error', '模型呼叫失敗'))
+        try:
+            return self.parse_response(market_data, result['content'])
         except Exception as e:
-            return {
-                'signal': 'HOLD',
-                'confidence': 0,
-                'entry_price': market_data['close'],
-                'stop_loss': market_data['close'] * 0.98,
-                'take_profit': market_data['close'] * 1.02,
-                'position_size_percent': 0,
-                'error': str(e)
-            }
+            return self._error_decision(market_data, e)
+    
+    def _error_decision(self, market_data, error) -> dict:
+        """模型呼叫或解析失敗時的觀望決策"""
+        return {
+            'signal': 'HOLD',
+            'confidence': 0,
+            'entry_price': market_data['close'],
+            'stop_loss': market_data['close'] * 0.98,
+            'take_profit': market_data['close'] * 1.02,
+            'position_size_percent': 0,
+            'error': str(error)
+        }
     
     def _fallback_decision(self, market_data, raw_response):
         """當 JSON 解析失敗時的備用決策"""
@@ -9,6 +9,9 @@ from typing import Dict, List
 from langchain_ollama import OllamaLLM
 import pandas as pd
 
+from core.case_index import CaseIndex
+from core.case_store import open_case_store
+
 
 class EnhancedDeepSeekAgent:
     """強化版DeepSeek交易引擎，注入完整技術特徵的成功案例"""
@@ -20,19 +23,19 @@ class EnhancedDeepSeekAgent:
             num_predict=2048
         )
         self.cases_path = Path(cases_path)
+        self.case_store = open_case_store(self.cases_path)
         self.success_cases = self._load_cases()
+        self.case_index = CaseIndex(self.success_cases)
         
     def _load_cases(self) -> List[Dict]:
         """載入成功案例庫"""
-        if not self.cases_path.exists():
+        if not self.case_store.exists:
             return []
         
         try:
-            with open(self.cases_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                cases = data.get('cases', [])
-                print(f"✅ 已載入 {len(cases)} 個成功案例")
-                return cases
+            cases = self.case_store.load_all()
+            print(f"✅ 已載入 {len(cases)} 個成功案例")
+            return cases
         except Exception as e:
             print(f"⚠️ 載入案例失敗: {e}")
             return []
@@ -96,60 +99,7 @@ class EnhancedDeepSeekAgent:
         找到與當前市場相似的成功案例
         相似度計算：比較RSI/BB_position/volume_ratio/macd_hist/adx
         """
-        if not self.success_cases:
-            return []
-        
-        similarities = []
-        
-        for case in self.success_cases:
-            # 取得案例進場時刻的指標
-            entry_candle = next((c for c in case['candles'] if c['position'] == 'entry'), None)
-            if not entry_candle:
-                continue
-            
-            case_indicators = entry_candle['indicators']
-            
-            # 計算相似度（歐氏距離）
-            score = 0
-            weights = {
-                'rsi': 2.0,
-                'bb_position': 2.0,
-                'volume_ratio': 1.5,
-                'macd_hist': 1.5,
-                'adx': 1.0
-            }
-            
-            for key, weight in weights.items():
-                current_val = current_market.get(key, 0)
-                case_val = case_indicators.get(key, 0)
-                
-                if current_val == 0 and case_val == 0:
-                    continue
-                
-                # 正規化後計算差異
-                if key == 'rsi':
-                    diff = abs(current_val - case_val) / 100.0
-                elif key == 'bb_position':
-                    diff = abs(current_val - case_val)
-                elif key == 'volume_ratio':
-                    diff = abs(current_val - case_val) / max(current_val, case_val, 1.0)
-                elif key == 'macd_hist':
-                    diff = min(abs(current_val - case_val) * 100, 1.0)
-                elif key == 'adx':
-                    diff = abs(current_val - case_val) / 100.0
-                else:
-                    diff = 0
-                
-                score += weight * (1 - diff)
-            
-            similarities.append({
-                'case': case,
-                'score': score
-            })
-        
-        # 排序並返回最相似的
-        similarities.sort(key=lambda x: x['score'], reverse=True)
-        return [s['case'] for s in similarities[:max_cases]]
+        return self.case_index.query(current_market, max_cases)
     
     def _build_enhanced_prompt(self, current_market: Dict, similar_cases: List[Dict]) -> str:
         """構建強化版Prompt，注入完整案例特徵"""
@@ -309,4 +259,6 @@ BAD EXAMPLES (FORBIDDEN):
     
     def reload_cases(self):
         """重新載入案例庫（當添加新案例後）"""
+        self.case_store.reload()
         self.success_cases = self._load_cases()
+        self.case_index.update(self.success_cases)
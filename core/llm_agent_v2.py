@@ -9,6 +9,8 @@ from typing import Dict, List, Optional
 from langchain_ollama import OllamaLLM
 import pandas as pd
 
+from core.case_index import CaseIndex
+from core.case_store import open_case_store
 from core.market_analyzer import MarketAnalyzer
 from core.portfolio_manager import PortfolioManager
 from core.news_fetcher import CryptoNewsFetcher, NewsAwareTrading
@@ -38,7 +40,9 @@ class EnhancedDeepSeekAgentV2:
         )
         
         self.cases_path = Path(cases_path)
+        self.case_store = open_case_store(self.cases_path)
         self.success_cases = self._load_cases()
+        self.case_index = CaseIndex(self.success_cases)
         
         self.market_analyzer = MarketAnalyzer(
             use_completed_candles_only=True,
@@ -57,15 +61,13 @@ class EnhancedDeepSeekAgentV2:
     
     def _load_cases(self) -> List[Dict]:
         """Load learning cases"""
-        if not self.cases_path.exists():
+        if not self.case_store.exists:
             return []
         
         try:
-            with open(self.cases_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                cases = data.get('cases', [])
-                print(f"Loaded {len(cases)} learning cases")
-                return cases
+            cases = self.case_store.load_all()
+            print(f"Loaded {len(cases)} learning cases")
+            return cases
         except Exception as e:
             print(f"Failed to load cases: {e}")
             return []
@@ -173,59 +175,7 @@ class EnhancedDeepSeekAgentV2:
     
     def _find_similar_cases(self, market_features: Dict, max_cases: int) -> List[Dict]:
         """Find similar success cases based on current market"""
-        if not self.success_cases:
-            return []
-        
-        current = market_features['current_candle']
-        similarities = []
-        
-        for case in self.success_cases:
-            entry_candle = next((c for c in case['candles'] if c['position'] == 'entry'), None)
-            if not entry_candle:
-                continue
-            
-            case_indicators = entry_candle['indicators']
-            
-            # Calculate similarity score
-            score = 0
-            weights = {
-                'rsi': 2.0,
-                'bb_position': 2.0,
-                'volume_ratio': 1.5,
-                'macd_hist': 1.5,
-                'adx': 1.0
-            }
-            
-            for key, weight in weights.items():
-                current_val = current.get(key, 0)
-                case_val = case_indicators.get(key, 0)
-                
-                if current_val == 0 and case_val == 0:
-                    continue
-                
-                # Normalized difference
-                if key == 'rsi':
-                    diff = abs(current_val - case_val) / 100.0
-                elif key == 'bb_position':
-                    diff = abs(current_val - case_val)
-                elif key == 'volume_ratio':
-                    diff = abs(current_val - case_val) / max(current_val, case_val, 1.0)
-                elif key == 'macd_hist':
-                    diff = min(abs(current_val - case_val) * 100, 1.0)
-                elif key == 'adx':
-                    diff = abs(current_val - case_val) / 100.0
-                else:
-                    diff = 0
-                
-                score += weight * (1 - diff)
-            
-            similarities.append({
-                'case': case,
-                'score': score
-            })
-        
-        similarities.sort(key=lambda x: x['score'], reverse=True)
-        return [s['case'] for s in similarities[:max_cases]]
+        return self.case_index.query(market_features['current_candle'], max_cases)
     
     def _build_comprehensive_prompt(
         self,
@@ -391,4 +341,6 @@ Respond in JSON:
     
     def reload_cases(self):
         """Reload learning cases (after adding new ones)"""
+        self.case_store.reload()
         self.success_cases = self._load_cases()
+        self.case_index.update(self.success_cases)
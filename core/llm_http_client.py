@@ -0,0 +1,227 @@
+"""
+共用 LLM HTTP 客戶端
+所有 OpenAI 相容供應商 (Groq / OpenRouter / DeepSeek / GitHub ...) 共用同一組連線
+
+- 每個 base_url 一個 keep-alive 連線池，避免每次呼叫都重新 TLS 握手
+- 安裝 httpx (+ h2) 時使用 HTTP/2，否則使用 requests.Session 連線池
+- 每個 base_url 的同時請求數有上限 (避免觸發供應商限流)
+- 支援串流回應 (SSE)，逐段返回內容
+"""
+import json
+import threading
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+    HAS_HTTPX = True
+except ImportError:
+    HAS_HTTPX = False
+
+try:
+    import h2  # noqa: F401 (httpx 的 HTTP/2 支援需要)
+    HAS_HTTP2 = HAS_HTTPX
+except ImportError:
+    HAS_HTTP2 = False
+
+
+class ProviderHTTPClient:
+    """
+    供應商 HTTP 客戶端 (執行緒安全)
+
+    一般使用 get_provider_client() 取得全域共用的實例
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        pool_size: int = 10,
+        concurrency_limits: Optional[Dict[str, int]] = None,
+        use_httpx: Optional[bool] = None
+    ):
+        """
+        Args:
+            max_concurrency: 每個 base_url 預設的同時請求上限
+            pool_size: 每個 base_url 保留的連線數
+            concurrency_limits: 個別 base_url 的同時請求上限
+            use_httpx: None 表示有安裝 httpx 時自動使用
+        """
+        self.max_concurrency = max_concurrency
+        self.pool_size = pool_size
+        self.concurrency_limits = dict(concurrency_limits or {})
+        self.use_httpx = HAS_HTTPX if use_httpx is None else (use_httpx and HAS_HTTPX)
+
+        self._clients: Dict[str, object] = {}
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'streams': 0, 'pools': 0}
+
+    @staticmethod
+    def _origin(base_url: str) -> str:
+        parts = urlsplit(base_url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _get_client(self, base_url: str):
+        """取得 base_url 所屬主機的連線池 (第一次使用時建立)"""
+        origin = self._origin(base_url)
+        with self._lock:
+            client = self._clients.get(origin)
+            if client is None:
+                if self.use_httpx:
+                    client = httpx.Client(
+                        http2=HAS_HTTP2,
+                        limits=httpx.Limits(
+                            max_connections=self.pool_size,
+                            max_keepalive_connections=self.pool_size
+                        )
+                    )
+                else:
+                    client = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    client.mount('https://', adapter)
+                    client.mount('http://', adapter)
+                self._clients[origin] = client
+                self.stats['pools'] += 1
+            return client
+
+    def _get_semaphore(self, base_url: str) -> threading.BoundedSemaphore:
+        origin = self._origin(base_url)
+        with self._lock:
+            semaphore = self._semaphores.get(origin)
+            if semaphore is None:
+                limit = self.concurrency_limits.get(origin, self.concurrency_limits.get(base_url, self.max_concurrency))
+                semaphore = threading.BoundedSemaphore(limit)
+                self._semaphores[origin] = semaphore
+            return semaphore
+
+    @staticmethod
+    def _build_request(base_url, api_key, model, messages, headers, params, stream):
+        request_headers = {
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json'
+        }
+        if headers:
+            request_headers.update(headers)
+
+        payload = {'model': model, 'messages': messages}
+        payload.update(params)
+        if stream:
+            payload['stream'] = True
+
+        return f"{base_url.rstrip('/')}/chat/completions", request_headers, payload
+
+    def chat_completion(
+        self,
+        base_url: str,
+        api_key: str,
+        model: str,
+        messages: List[Dict],
+        timeout: float = 60,
+        headers: Optional[Dict] = None,
+        **params
+    ) -> Dict:
+        """
+        呼叫 /chat/completions
+
+        Args:
+            headers: 額外或覆蓋的 HTTP 標頭
+            **params: temperature, max_tokens 等參數
+
+        Returns:
+            API 返回的 JSON
+
+        Raises:
+            HTTP 錯誤 (requests.HTTPError / httpx.HTTPStatusError) 或連線錯誤
+        """
+        url, request_headers, payload = self._build_request(
+            base_url, api_key, model, messages, headers, params, stream=False
+        )
+        client = self._get_client(base_url)
+
+        with self._get_semaphore(base_url):
+            self.stats['requests'] += 1
+            response = client.post(url, headers=request_headers, json=payload, timeout=timeout)
+            response.raise_for_status()
+            return response.json()
+
+    def stream_chat_completion(
+        self,
+        base_url: str,
+        api_key: str,
+        model: str,
+        messages: List[Dict],
+        timeout: float = 60,
+        headers: Optional[Dict] = None,
+        **params
+    ) -> Iterator[str]:
+        """
+        以串流方式呼叫 /chat/completions，逐段返回 content
+
+        同時請求的名額在串流結束 (或 generator 被關閉) 時釋放
+        """
+        url, request_headers, payload = self._build_request(
+            base_url, api_key, model, messages, headers, params, stream=True
+        )
+        client = self._get_client(base_url)
+
+        with self._get_semaphore(base_url):
+            self.stats['streams'] += 1
+            if self.use_httpx:
+                with client.stream('POST', url, headers=request_headers, json=payload, timeout=timeout) as response:
+                    response.raise_for_status()
+                    yield from self._iter_sse(response.iter_lines())
+            else:
+                response = client.post(url, headers=request_headers, json=payload, timeout=timeout, stream=True)
+                try:
+                    response.raise_for_status()
+                    # SSE 一律是 UTF-8；沒有 charset 時 requests 會以 ISO-8859-1 解碼，所以逐行取 bytes 自行解碼
+                    yield from self._iter_sse(response.iter_lines())
+                finally:
+                    response.close()
+
+    @staticmethod
+    def _iter_sse(lines) -> Iterator[str]:
+        """解析 SSE: data: {...} / data: [DONE]"""
+        for line in lines:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            if not line or not line.startswith('data:'):
+                continue
+            data = line[5:].strip()
+            if data == '[DONE]':
+                return
+            try:
+                chunk = json.loads(data)
+            except ValueError:
+                continue
+            for choice in chunk.get('choices', []):
+                content = (choice.get('delta') or {}).get('content')
+                if content:
+                    yield content
+
+    def close(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+
+_shared_client: Optional[ProviderHTTPClient] = None
+_shared_lock = threading.Lock()
+
+
+def get_provider_client() -> ProviderHTTPClient:
+    """全域共用的供應商客戶端"""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = ProviderHTTPClient()
+        return _shared_client
+
+
+def chat_content(response: Dict) -> str:
+    """取出 chat completion 的文字內容"""
+    return response['choices'][0]['message']['content']
@@ -0,0 +1,243 @@
+"""
+LLM 回應錄製 / 重播
+即時交易或影子執行時把 (prompt 雜湊 -> 模型原始回應) 追加到本地錄製檔，
+回測時從錄製檔重播，不連網、結果可重現
+
+模式:
+    live    直接呼叫模型，不錄製
+    record  呼叫模型，成功的回應追加到錄製檔 (即時交易 / 影子執行)
+    replay  只讀錄製檔；沒有錄到的 prompt 交給本地 stub 模型，永遠不呼叫遠端模型
+
+- 鍵與 LLMResponseCache 相同: sha256(供應商, 模型, system prompt, user prompt)
+- 錄製檔是 JSONL，只追加 (每行 key / provider / model / content / recorded_at)；
+  同一個鍵錄了多次時以最後一筆為準
+- 開檔時一次讀入索引，重播只是字典查詢
+- stub 模型是確定性的函數 (預設返回 HOLD)，同一個 prompt 永遠得到同一個回應
+- prompt 會引用歷史成功案例，所以錄製檔旁邊另存一份初始案例快照 ({path}.cases.json)；
+  之後的錄製與重播都從這份快照開始，案例庫被即時回測改動也不影響重播
+- 重播的未命中率超過 MISS_RATE_WARNING 時，get_stats() 附上警告 (stub 的 HOLD 不代表模型的決策)
+"""
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+from core.decision_cache import LLMResponseCache
+
+
+MODES = ('live', 'record', 'replay')
+MISS_RATE_WARNING = 20.0          # 重播未命中率 (%) 超過時警告
+
+
+def stub_response(system_prompt: str, user_prompt: str) -> str:
+    """預設的本地 stub 模型: 沒有錄到回應時一律觀望"""
+    return json.dumps({
+        'signal': 'HOLD',
+        'action': 'HOLD',
+        'confidence': 0,
+        'leverage': 1,
+        'position_size_usdt': 0,
+        'position_size_percent': 0,
+        'entry_price': 0,
+        'stop_loss': 0,
+        'take_profit': 0,
+        'reasoning': '重播模式: 沒有錄製的回應 (stub)',
+        'risk_assessment': 'HIGH',
+        'is_counter_trend': False
+    }, ensure_ascii=False)
+
+
+class ReplayStore:
+    """只追加的 (prompt 雜湊 -> 原始回應) 錄製檔 (執行緒安全)"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._index: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """重新讀入錄製檔 (寫到一半的最後一行略過)"""
+        index = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                        index[row['key']] = row['content']
+                    except (ValueError, KeyError):
+                        continue
+        with self._lock:
+            self._index = index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def get(self, key: str) -> Optional[str]:
+        return self._index.get(key)
+
+    def append(self, key: str, content: str, provider: str = '', model: str = ''):
+        row = {'key': key, 'provider': provider, 'model': model, 'content': content, 'recorded_at': time.time()}
+        line = json.dumps(row, ensure_ascii=False) + '\n'
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self._index[key] = content
+
+
+class LLMReplay:
+    """
+    模型呼叫的錄製 / 重播層
+
+    用法:
+        replay = LLMReplay('data/llm_replay.jsonl', mode='record')
+        result = replay.complete(provider, model, system_prompt, user_prompt,
+                                 lambda: model.analyze(system_prompt, user_prompt))
+        llm = replay.wrap(OllamaLLM(...), provider='ollama', model='deepseek-r1:14b')   # .invoke(prompt)
+    """
+
+    def __init__(self, path: Union[str, Path, ReplayStore], mode: str = 'replay',
+                 stub: Callable[[str, str], str] = stub_response):
+        """
+        Args:
+            path: 錄製檔路徑 (或已開啟的 ReplayStore)
+            mode: live / record / replay
+            stub: 重播模式沒有錄到回應時的本地模型 (system_prompt, user_prompt) -> 原始回應
+        """
+        if mode not in MODES:
+            raise ValueError(f"不支援的重播模式: {mode}")
+        self.store = path if isinstance(path, ReplayStore) else ReplayStore(path)
+        self.mode = mode
+        self.stub = stub
+        self.stats = {'hits': 0, 'misses': 0, 'recorded': 0, 'live_calls': 0}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def cases_path(self) -> Path:
+        """錄製檔的初始案例快照"""
+        return self.store.path.with_name(self.store.path.name + '.cases.json')
+
+    def initial_cases(self, load: Callable[[], List]) -> List:
+        """
+        錄製 / 重播開始時的歷史案例
+
+        record: 第一次錄製時把 load() 的結果存成快照，之後的錄製都從同一份快照開始
+        replay: 使用快照；沒有快照的舊錄製檔退回 load()
+        live: load()
+        """
+        path = self.cases_path
+        if self.mode != 'live' and path.exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        cases = load()
+        if self.mode == 'record':
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(path.name + '.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(cases, f, ensure_ascii=False)
+            tmp.replace(path)
+        elif self.mode == 'replay':
+            print(f"⚠️ 錄製檔沒有案例快照 ({path.name})，改用目前的案例庫，重播可能無法命中")
+        return cases
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def complete(self, provider: str, model: str, system_prompt: str, user_prompt: str,
+                 live_call: Callable[[], Dict]) -> Dict:
+        """
+        返回與 ModelInterface.analyze 相同格式的結果 ({'success', 'content', ...})
+        live_call 在 live / record 模式才會被呼叫
+        """
+        if self.mode != 'replay':
+            self._count('live_calls')
+            result = live_call()
+            if self.mode == 'record' and result.get('success') and isinstance(result.get('content'), str):
+                key = LLMResponseCache.make_key(provider, model, system_prompt, user_prompt)
+                self.store.append(key, result['content'], provider, model)
+                self._count('recorded')
+            return result
+
+        key = LLMResponseCache.make_key(provider, model, system_prompt, user_prompt)
+        content = self.store.get(key)
+        if content is not None:
+            self._count('hits')
+            return {'success': True, 'content': content, 'model': model, 'elapsed_time': 0.0, 'replayed': True}
+        self._count('misses')
+        return {
+            'success': True,
+            'content': self.stub(system_prompt, user_prompt),
+            'model': model,
+            'elapsed_time': 0.0,
+            'replayed': True,
+            'stub': True
+        }
+
+    def complete_many(self, provider: str, model: str, system_prompt: str, prompts: List[str],
+                      live_batch: Callable[[List[str]], List[Dict]]) -> List[Dict]:
+        """批次版的 complete；live_batch(prompts) 返回同順序的結果，只在 live / record 模式呼叫"""
+        if self.mode == 'replay':
+            return [self.complete(provider, model, system_prompt, prompt, None) for prompt in prompts]
+
+        results = live_batch(prompts)
+        with self._stats_lock:
+            self.stats['live_calls'] += len(prompts)
+        if self.mode == 'record':
+            for prompt, result in zip(prompts, results):
+                if result.get('success') and isinstance(result.get('content'), str):
+                    key = LLMResponseCache.make_key(provider, model, system_prompt, prompt)
+                    self.store.append(key, result['content'], provider, model)
+                    self._count('recorded')
+        return results
+
+    def wrap(self, llm, provider: str, model: str) -> 'ReplayLLM':
+        """包裝 LangChain 風格的 llm.invoke(prompt)"""
+        return ReplayLLM(self, llm, provider, model)
+
+    def get_stats(self) -> Dict:
+        lookups = self.stats['hits'] + self.stats['misses']
+        miss_rate = (self.stats['misses'] / lookups) * 100 if lookups > 0 else 0
+        stats = {
+            **self.stats,
+            'mode': self.mode,
+            'size': len(self.store),
+            'hit_rate': (self.stats['hits'] / lookups) * 100 if lookups > 0 else 0,
+            'miss_rate': miss_rate
+        }
+        if self.mode == 'replay' and miss_rate > MISS_RATE_WARNING:
+            stats['warning'] = (f"重播未命中率 {miss_rate:.1f}% ({self.stats['misses']}/{lookups})，"
+                                f"未命中的決策是 stub 的 HOLD，結果不代表錄製的模型")
+        return stats
+
+
+class ReplayLLM:
+    """invoke(prompt) -> str 的模型經過 LLMReplay (llm 在重播模式可以是 None)"""
+
+    def __init__(self, replay: LLMReplay, llm, provider: str, model: str):
+        self.replay = replay
+        self.llm = llm
+        self.provider = provider
+        self.model = model
+
+    def invoke(self, prompt: str) -> str:
+        def live_call():
+            return {'success': True, 'content': self.llm.invoke(prompt)}
+
+        return self.replay.complete(self.provider, self.model, '', prompt, live_call)['content']
+
+
+def open_replay(config: Optional[Dict]) -> Optional[LLMReplay]:
+    """
+    由設定建立 LLMReplay，live 或沒有設定時返回 None
+
+    config: {'mode': 'record', 'path': 'data/llm_replay.jsonl'}
+    """
+    if not config or config.get('mode', 'live') == 'live':
+        return None
+    return LLMReplay(config.get('path', 'data/llm_replay.jsonl'), mode=config['mode'])
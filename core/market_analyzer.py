@@ -4,9 +4,14 @@
 """
 import pandas as pd
 import numpy as np
-import talib
 from typing import Dict, List
 from datetime import datetime
+from core.indicator_engine import MARKET_INDICATORS, compute_indicators, indicator
+
+
+ANALYZER_INDICATORS = MARKET_INDICATORS + [
+    indicator('SMA', 'volume_ma20', inputs=('volume',), timeperiod=20),
+]
 
 
 class MarketAnalyzer:
@@ -64,44 +69,24 @@ class MarketAnalyzer:
         return features
     
     def _calculate_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
-        """計算所有技術指標"""
+        """計算所有技術指標 (由共用指標引擎單次計算)"""
         df = df.copy()
         
-        close = df['close'].values
-        high = df['high'].values
-        low = df['low'].values
-        volume = df['volume'].values
-        
-        # 趋勢指標
-        df['ema9'] = talib.EMA(close, timeperiod=9)
-        df['ema21'] = talib.EMA(close, timeperiod=21)
-        df['ema50'] = talib.EMA(close, timeperiod=50)
-        df['ema200'] = talib.EMA(close, timeperiod=200)
-        macd, macd_signal, macd_hist = talib.MACD(close)
-        df['macd'] = macd
-        df['macd_signal'] = macd_signal
-        df['macd_hist'] = macd_hist
-        df['adx'] = talib.ADX(high, low, close, timeperiod=14)
-        
-        # 動能指標
-        df['rsi'] = talib.RSI(close, timeperiod=14)
-        df['stoch_k'], df['stoch_d'] = talib.STOCH(high, low, close)
-        df['cci'] = talib.CCI(high, low, close, timeperiod=14)
-        df['mfi'] = talib.MFI(high, low, close, volume, timeperiod=14)
-        df['willr'] = talib.WILLR(high, low, close, timeperiod=14)
+        block = compute_indicators(df, ANALYZER_INDICATORS)
+        block.assign_to(df)
+        
+        close = block['close']
+        high = block['high']
+        low = block['low']
+        volume = block['volume']
+        bb_upper = block['bb_upper']
+        bb_lower = block['bb_lower']
         
         # 波動指標
-        df['atr'] = talib.ATR(high, low, close, timeperiod=14)
-        bb_upper, bb_middle, bb_lower = talib.BBANDS(close, timeperiod=20)
-        df['bb_upper'] = bb_upper
-        df['bb_middle'] = bb_middle
-        df['bb_lower'] = bb_lower
         df['bb_position'] = (close - bb_lower) / (bb_upper - bb_lower + 1e-10)
         
         # 成交量指標
-        df['volume_ma20'] = talib.SMA(volume, timeperiod=20)
         df['volume_ratio'] = volume / (df['volume_ma20'] + 1e-10)
-        df['obv'] = talib.OBV(close, volume)
         
         # 支撐/壓力
         df['pivot'] = (high + low + close) / 3
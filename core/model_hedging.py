@@ -0,0 +1,86 @@
+"""
+模型呼叫對沖 (hedged requests)
+
+依優先順序呼叫一組模型：
+- 先呼叫第一個模型
+- 超過 hedge_delay 秒還沒有回應，或呼叫失敗時，立即加開下一個備用模型
+- 任一模型先成功就返回 (其餘仍在執行的呼叫在背景結束，結果丟棄)
+- 超過 deadline 秒仍沒有成功的結果則放棄
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+def hedged_call(
+    models: List,
+    call: Callable[[object], Dict],
+    executor: Executor,
+    hedge_delay: Optional[float] = 15.0,
+    deadline: Optional[float] = 90.0,
+    on_launch: Optional[Callable[[object, int], None]] = None,
+    on_failure: Optional[Callable[[object, Dict], None]] = None
+) -> Tuple[Optional[object], Optional[Dict]]:
+    """
+    Args:
+        models: 依優先順序排列的模型
+        call: call(model) -> {'success': bool, ...}
+        executor: 執行呼叫的 thread pool
+        hedge_delay: 等待多久後加開下一個模型，None 或 <= 0 表示只在失敗時才換下一個
+        deadline: 整體期限 (秒)，None 表示不限
+        on_launch: 啟動呼叫時的回呼 on_launch(model, index)
+        on_failure: 呼叫失敗時的回呼 on_failure(model, result)
+
+    Returns:
+        (model, result)，全部失敗或超過期限時返回 (None, None)
+    """
+    models = [m for m in models if m is not None]
+    if not models:
+        return None, None
+
+    hedging = hedge_delay is not None and hedge_delay > 0
+    end_time = time.monotonic() + deadline if deadline else None
+    pending = {}
+    next_index = 0
+
+    def launch():
+        nonlocal next_index
+        model = models[next_index]
+        if on_launch:
+            on_launch(model, next_index)
+        pending[executor.submit(call, model)] = model
+        next_index += 1
+
+    launch()
+    while pending:
+        timeout = None
+        if end_time is not None:
+            timeout = end_time - time.monotonic()
+            if timeout <= 0:
+                break
+        if hedging and next_index < len(models):
+            timeout = hedge_delay if timeout is None else min(timeout, hedge_delay)
+
+        done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+
+        if not done:
+            # 對沖：目前的呼叫太慢，加開下一個備用模型 (等待是因期限到了才結束時不再加開)
+            if hedging and next_index < len(models) and (end_time is None or time.monotonic() < end_time):
+                launch()
+            continue
+
+        for future in done:
+            model = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
+            if result.get('success'):
+                return model, result
+            if on_failure:
+                on_failure(model, result)
+            # 失敗的呼叫由下一個備用模型接手
+            if next_index < len(models):
+                launch()
+
+    return None, None
@@ -4,9 +4,9 @@
 """
 import json
 from typing import Dict, List, Optional, Any
-from openai import OpenAI
 import google.generativeai as genai
 from core.multi_api_manager import MultiAPIManager, APIProvider
+from core.llm_http_client import chat_content, get_provider_client
 
 
 class MultiModelEnsemble:
@@ -19,16 +19,14 @@ class MultiModelEnsemble:
     def _call_openai_compatible(self, provider: APIProvider, prompt: str) -> Optional[Dict]:
         """調用 OpenAI 兼容的 API"""
         try:
-            client = OpenAI(
-                api_key=provider.api_key,
-                base_url=provider.base_url
-            )
-            
             provider.record_request()
             
-            response = client.chat.completions.create(
-                model=provider.model,
-                messages=[
+            # 共用連線池，不再每次建立新的 client
+            response = get_provider_client().chat_completion(
+                provider.base_url,
+                provider.api_key,
+                provider.model,
+                [
                     {"role": "system", "content": self.system_prompt},
                     {"role": "user", "content": prompt}
                 ],
@@ -41,7 +39,7 @@ class MultiModelEnsemble:
             return {
                 'provider': provider.name,
                 'model': provider.model,
-                'content': response.choices[0].message.content,
+                'content': chat_content(response),
                 'success': True
             }
             
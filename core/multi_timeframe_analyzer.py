@@ -1,11 +1,14 @@
 """
 多時間框架分析器
 負責獲取並處理 15m, 1h, 4h 的市場數據
+1h, 4h 由 15m 重採樣推導，每次只需要載入一個時間框架
 讓 AI 可以看清大趨勢，同時允許高信心度逆勢操作
 """
+import numpy as np
 import pandas as pd
 from typing import Dict, List, Optional
-from strategies.v13.market_features import prepare_market_features
+from strategies.v13.market_features import calculate_market_indicators, extract_market_features
+from core.timeframe_resampler import TimeframeResampler, can_resample, resample_ratio
 
 
 class MultiTimeframeAnalyzer:
@@ -16,12 +19,16 @@ class MultiTimeframeAnalyzer:
     輔助時間框架：1h, 4h (大趨勢判斷)
     """
     
-    def __init__(self, data_loader):
+    def __init__(self, data_loader, history_bars: int = 500):
         """
         Args:
             data_loader: RealtimeDataLoader 實例
+            history_bars: 每個時間框架使用的 K 棒數量
         """
         self.data_loader = data_loader
+        self.history_bars = history_bars
+        # 輔助時間框架由主時間框架推導，已收盤的 K 棒會快取
+        self.resampler = TimeframeResampler(max_bars=history_bars)
     
     def prepare_multi_timeframe_data(
         self,
@@ -48,8 +55,17 @@ class MultiTimeframeAnalyzer:
         """
         result = {}
         
-        # 處理主時間框架
-        primary_df = self.data_loader.load_data(symbol, primary_timeframe)
+        # 可由主時間框架推導的輔助框架不再另外下載
+        derived = [tf for tf in secondary_timeframes if can_resample(primary_timeframe, tf)]
+        ratio = max([resample_ratio(primary_timeframe, tf) for tf in derived], default=1)
+        
+        # 處理主時間框架 (一次載入足夠推導所有輔助框架的長度)
+        base_df = self.data_loader.load_data(
+            symbol, primary_timeframe, limit=self.history_bars * ratio + ratio
+        )
+        primary_df = None
+        if base_df is not None:
+            primary_df = base_df.iloc[-self.history_bars:].reset_index(drop=True)
         if primary_df is not None and len(primary_df) >= 200:
             result[primary_timeframe] = self._process_timeframe_data(
                 primary_df,
@@ -60,7 +76,14 @@ class MultiTimeframeAnalyzer:
         # 處理輔助時間框架
         for tf in secondary_timeframes:
             try:
-                df = self.data_loader.load_data(symbol, tf)
+                if tf in derived:
+                    if base_df is None:
+                        continue
+                    df = self.resampler.resample(
+                        symbol, base_df, primary_timeframe, tf, limit=self.history_bars
+                    )
+                else:
+                    df = self.data_loader.load_data(symbol, tf)
                 if df is not None and len(df) >= 200:
                     result[tf] = self._process_timeframe_data(
                         df,
@@ -85,22 +108,29 @@ class MultiTimeframeAnalyzer:
             {
                 'timeframe': '1h',
                 'current': {...},  # 當前 K 棒的所有指標
-                'candles': [...],  # 前 N 根 K 棒的所有指標
+                'candles': [...],  # 前 N 根 K 棒的所有指標 (含每根的 trend / strength)
                 'trend': 'UP' | 'DOWN' | 'SIDEWAYS',
                 'strength': 0-100
             }
         """
-        # 當前 K 棒的完整指標
-        current_candle = df.iloc[-1]
-        current_features = prepare_market_features(current_candle, df)
+        # 指標對整個時間框架只計算一次 (所有指標都只依賴過去的數據，
+        # 第 i 根的值與只用前 i 根計算的結果相同)
+        indicators = calculate_market_indicators(df)
+        
+        # 最後 N 根 K 棒 (最後一根即當前 K 棒)
+        start = max(len(df) - num_candles, 0)
+        rows = [df.iloc[i] for i in range(start, len(df))]
+        features_list = [
+            extract_market_features(indicators, row, i)
+            for i, row in zip(range(start, len(df)), rows)
+        ]
+        current_features = features_list[-1]
+        
+        # 一次算出 N 根 K 棒的趨勢和強度
+        trends, strengths = self._score_trends(features_list)
         
-        # 歷史 K 棒
         candles = []
-        for i in range(-num_candles, 0):
-            df_slice = df.iloc[:len(df) + i + 1].copy()
-            row = df.iloc[i]
-            features = prepare_market_features(row, df_slice)
-            
+        for row, features, trend, strength in zip(rows, features_list, trends, strengths):
             candles.append({
                 'timestamp': row['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
                 'open': float(row['open']),
@@ -108,11 +138,13 @@ class MultiTimeframeAnalyzer:
                 'low': float(row['low']),
                 'close': float(row['close']),
                 'volume': float(row['volume']),
-                'features': features
+                'features': features,
+                'trend': trend,
+                'strength': float(strength)
             })
         
         # 判斷趨勢和強度
-        trend_info = self._analyze_trend(df, current_features)
+        trend_info = self._analyze_trend(df, current_features, trends[-1], float(strengths[-1]))
         
         return {
             'timeframe': timeframe,
@@ -123,10 +155,49 @@ class MultiTimeframeAnalyzer:
             'summary': trend_info['summary']
         }
     
-    def _analyze_trend(self, df: pd.DataFrame, features: Dict) -> Dict:
+    @staticmethod
+    def _score_trends(features_list: List[Dict]):
+        """
+        向量化計算多根 K 棒的趨勢方向和強度
+        
+        規則:
+            close > ema9 > ema21 > ema50 -> UP,   強度 min(adx * 1.5, 100)
+            close < ema9 < ema21 < ema50 -> DOWN, 強度 min(adx * 1.5, 100)
+            其他                          -> SIDEWAYS, 強度 max(25 - adx, 0)
+        
+        Returns:
+            (trends, strengths): 趨勢字串列表, 強度陣列
+        """
+        close = np.array([f.get('close', 0) for f in features_list], dtype=np.float64)
+        ema9 = np.array([f.get('ema9', c) for f, c in zip(features_list, close)], dtype=np.float64)
+        ema21 = np.array([f.get('ema21', c) for f, c in zip(features_list, close)], dtype=np.float64)
+        ema50 = np.array([f.get('ema50', c) for f, c in zip(features_list, close)], dtype=np.float64)
+        adx = np.array([f.get('adx', 0) for f in features_list], dtype=np.float64)
+        
+        is_up = (close > ema9) & (ema9 > ema21) & (ema21 > ema50)
+        is_down = ~is_up & (close < ema9) & (ema9 < ema21) & (ema21 < ema50)
+        
+        trends = np.where(is_up, 'UP', np.where(is_down, 'DOWN', 'SIDEWAYS')).tolist()
+        strengths = np.where(
+            is_up | is_down,
+            np.minimum(adx * 1.5, 100),
+            np.maximum(25 - adx, 0)
+        )
+        return trends, strengths
+    
+    def _analyze_trend(
+        self,
+        df: pd.DataFrame,
+        features: Dict,
+        trend: Optional[str] = None,
+        strength: Optional[float] = None
+    ) -> Dict:
         """
         分析趨勢方向和強度
         
+        Args:
+            trend / strength: 已由 _score_trends 算好時直接傳入
+        
         Returns:
             {
                 'trend': 'UP' | 'DOWN' | 'SIDEWAYS',
@@ -134,25 +205,13 @@ class MultiTimeframeAnalyzer:
                 'summary': '文字描述'
             }
         """
-        close = features.get('close', 0)
-        ema9 = features.get('ema9', close)
-        ema21 = features.get('ema21', close)
-        ema50 = features.get('ema50', close)
-        ema200 = features.get('ema200', close)
         adx = features.get('adx', 0)
         rsi = features.get('rsi', 50)
-        macd_hist = features.get('macd_hist', 0)
         
         # 判斷趨勢方向
-        if close > ema9 > ema21 > ema50:
-            trend = 'UP'
-            strength = min(adx * 1.5, 100)
-        elif close < ema9 < ema21 < ema50:
-            trend = 'DOWN'
-            strength = min(adx * 1.5, 100)
-        else:
-            trend = 'SIDEWAYS'
-            strength = max(25 - adx, 0)
+        if trend is None or strength is None:
+            trends, strengths = self._score_trends([features])
+            trend, strength = trends[0], float(strengths[0])
         
         # 生成摘要
         if trend == 'UP':
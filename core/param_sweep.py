@@ -0,0 +1,231 @@
+"""
+策略參數掃描
+對 V*Config dataclass 做網格 / 隨機搜尋，回測分散到多個行程平行執行
+
+- 指標只計算一次: 依回測器的 SWEEP_FEATURE_FIELDS (會影響指標的參數) 分組，
+  每組呼叫 backtester.prepare(df) 一次
+- 計算好的數據放進 shared memory (SharedFrame)，工作行程以唯讀、零複製的方式讀取
+- 結果以 generator 逐筆返回 (完成順序)，可即時更新表格；sweep_table() 轉成可排序的 DataFrame
+
+回測器需要提供:
+    SWEEP_FEATURE_FIELDS: 會影響 prepare() 結果的 config 欄位
+    prepare(df) -> DataFrame: 計算指標 (只依賴 SWEEP_FEATURE_FIELDS)
+    run_prepared(df) -> dict: 在 prepare() 的結果上回測，不可修改 df
+"""
+import itertools
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, fields, replace
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def grid_space(params: Dict[str, Sequence]) -> List[Dict[str, Any]]:
+    """網格搜尋: 所有參數值的組合"""
+    names = list(params)
+    return [dict(zip(names, values)) for values in itertools.product(*(list(params[n]) for n in names))]
+
+
+def random_space(params: Dict[str, Any], n_samples: int, seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    隨機搜尋
+
+    Args:
+        params: 每個參數的取樣方式
+            list: 從中隨機選一個
+            (low, high) tuple: 兩端都是整數時取整數 (含兩端)，否則均勻分布的浮點數
+        n_samples: 取樣數
+    """
+    rng = random.Random(seed)
+    points = []
+    for _ in range(n_samples):
+        point = {}
+        for name, spec in params.items():
+            if isinstance(spec, tuple):
+                low, high = spec
+                if isinstance(low, int) and isinstance(high, int):
+                    point[name] = rng.randint(low, high)
+                else:
+                    point[name] = rng.uniform(low, high)
+            else:
+                point[name] = rng.choice(list(spec))
+        points.append(point)
+    return points
+
+
+class SharedFrame:
+    """
+    DataFrame 的 shared memory 副本
+    每個欄位依自己的 dtype 依序放在同一塊記憶體 (8 bytes 對齊)，不支援 object 欄位
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        layout = []
+        offset = 0
+        for column in df.columns:
+            values = df[column].to_numpy()
+            if values.dtype == object:
+                continue
+            layout.append((column, values.dtype.str, offset))
+            offset += -(-values.nbytes // 8) * 8
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 8))
+        for column, dtype, col_offset in layout:
+            target = np.ndarray(len(df), dtype=dtype, buffer=self.shm.buf, offset=col_offset)
+            target[:] = df[column].to_numpy()
+
+        self.spec = {'name': self.shm.name, 'n_rows': len(df), 'layout': layout}
+
+    @staticmethod
+    def attach(spec: Dict) -> Tuple[shared_memory.SharedMemory, pd.DataFrame]:
+        """連接到已存在的 SharedFrame，返回 (shm, 唯讀的 DataFrame)"""
+        shm = shared_memory.SharedMemory(name=spec['name'])
+        columns = {}
+        for column, dtype, offset in spec['layout']:
+            values = np.ndarray(spec['n_rows'], dtype=dtype, buffer=shm.buf, offset=offset)
+            values.flags.writeable = False
+            columns[column] = values
+        return shm, pd.DataFrame(columns, copy=False)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+# 工作行程的狀態 (由 _init_worker 設定)
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(backtester_cls, base_config, frame_specs: Dict[Tuple, Dict]):
+    _worker['backtester_cls'] = backtester_cls
+    _worker['base_config'] = base_config
+    _worker['handles'] = []
+    _worker['frames'] = {}
+    for key, spec in frame_specs.items():
+        shm, frame = SharedFrame.attach(spec)
+        _worker['handles'].append(shm)
+        _worker['frames'][key] = frame
+
+
+def _summarize(params: Dict, result: Dict) -> Dict:
+    """只保留純量指標 (略過交易明細、權益曲線等)"""
+    row = dict(params)
+    for name, value in result.items():
+        if isinstance(value, (int, float, str, bool, np.integer, np.floating)):
+            row[name] = value.item() if isinstance(value, np.generic) else value
+    return row
+
+
+def _run_point(index: int, key: Tuple, params: Dict) -> Dict:
+    config = replace(_worker['base_config'], **params)
+    try:
+        result = _worker['backtester_cls'](config).run_prepared(_worker['frames'][key])
+    except Exception as e:
+        result = {'error': str(e)}
+    row = _summarize(params, result)
+    row['_index'] = index
+    return row
+
+
+class ParameterSweep:
+    """
+    參數掃描
+
+    用法:
+        sweep = ParameterSweep(V10Backtester, V10Config(symbol='BTCUSDT'))
+        for row in sweep.run(df, grid_space({'rsi_momentum': [55, 60, 65], 'volume_surge': [1.2, 1.5]})):
+            ...
+    """
+
+    def __init__(self, backtester_cls, base_config, max_workers: Optional[int] = None):
+        """
+        Args:
+            backtester_cls: 回測器類別 (需可被工作行程 import)
+            base_config: 基準設定，每個參數點以 dataclasses.replace 覆蓋
+            max_workers: 工作行程數，None 表示 CPU 核心數，<= 1 表示在目前行程執行
+        """
+        self.backtester_cls = backtester_cls
+        self.base_config = base_config
+        self.max_workers = os.cpu_count() if max_workers is None else max_workers
+        self.feature_fields = tuple(getattr(backtester_cls, 'SWEEP_FEATURE_FIELDS', ()))
+
+        valid = {f.name for f in fields(base_config)}
+        self._valid_fields = valid
+        self.stats = {'points': 0, 'prepared': 0, 'errors': 0}
+
+    def _feature_key(self, params: Dict) -> Tuple:
+        config = asdict(self.base_config)
+        config.update(params)
+        return tuple(config[name] for name in self.feature_fields)
+
+    def _prepare_frames(self, df: pd.DataFrame, space: List[Dict]) -> Dict[Tuple, pd.DataFrame]:
+        """每組會影響指標的參數只計算一次"""
+        frames = {}
+        for params in space:
+            key = self._feature_key(params)
+            if key not in frames:
+                overrides = dict(zip(self.feature_fields, key))
+                backtester = self.backtester_cls(replace(self.base_config, **overrides))
+                frames[key] = backtester.prepare(df)
+                self.stats['prepared'] += 1
+        return frames
+
+    def run(self, df: pd.DataFrame, space: List[Dict]) -> Iterator[Dict]:
+        """
+        執行掃描，依完成順序逐筆返回結果
+
+        每筆結果包含參數、回測的純量指標與 _index (在 space 中的位置)；
+        回測失敗時包含 error
+        """
+        for params in space:
+            unknown = set(params) - self._valid_fields
+            if unknown:
+                raise ValueError(f"未知的設定欄位: {sorted(unknown)}")
+
+        frames = self._prepare_frames(df, space)
+        tasks = [(index, self._feature_key(params), params) for index, params in enumerate(space)]
+
+        if self.max_workers <= 1:
+            _init_worker(self.backtester_cls, self.base_config, {})
+            _worker['frames'] = frames
+            for task in tasks:
+                yield self._record(_run_point(*task))
+            return
+
+        shared = {key: SharedFrame(frame) for key, frame in frames.items()}
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(self.backtester_cls, self.base_config, {k: s.spec for k, s in shared.items()})
+            ) as pool:
+                futures = [pool.submit(_run_point, *task) for task in tasks]
+                try:
+                    for future in as_completed(futures):
+                        yield self._record(future.result())
+                finally:
+                    for future in futures:
+                        future.cancel()
+        finally:
+            for frame in shared.values():
+                frame.close()
+
+    def _record(self, row: Dict) -> Dict:
+        self.stats['points'] += 1
+        if 'error' in row:
+            self.stats['errors'] += 1
+        return row
+
+
+def sweep_table(rows: List[Dict], sort_by: str = 'return_pct', ascending: bool = False) -> pd.DataFrame:
+    """把掃描結果整理成表格 (依 sort_by 排序)"""
+    table = pd.DataFrame(rows)
+    if table.empty:
+        return table
+    if sort_by in table.columns:
+        table = table.sort_values(sort_by, ascending=ascending, kind='stable')
+    return table.drop(columns=['_index'], errors='ignore').reset_index(drop=True)
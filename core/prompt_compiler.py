@@ -0,0 +1,244 @@
+"""
+Token 預算的 Prompt 編譯器
+取代仲裁者原本以 json.dumps(indent=2) 直接嵌入所有資料、再手動裁剪 (20->10 根K棒、10->3 個案例) 的作法
+
+- estimate_tokens: 不依賴 tokenizer 的估計 (中日韓字元約 1 token，其他字元約 3.5 個一個 token)
+- 數值以有效位數四捨五入，但不丟掉整數位 (65432.123 -> 65432，0.00351234 -> 0.0035123)
+- 多筆同結構的資料 (K棒、最近決策) 編成 CSV：欄位名只出現一次，巢狀欄位攤平成 a.b
+- 其他資料用緊湊 JSON (無縮排、無空白)
+- 每個區段可以有多個版本 (由詳細到精簡，例如 20 / 10 / 5 根K棒)，
+  依優先度在預算內選擇最詳細、放得下的版本；放不下的區段省略，必要區段至少放最精簡的版本
+- 輸出時區段維持原本的順序 (與優先度無關)
+"""
+import csv
+import io
+import json
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+
+_CJK = re.compile('[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估計 token 數 (偏保守)"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 3.5)
+
+
+def round_sig(value: float, digits: int = 5) -> float:
+    """四捨五入到有效位數，但保留所有整數位"""
+    if value == 0 or not math.isfinite(value):
+        return value
+    decimals = max(0, digits - 1 - int(math.floor(math.log10(abs(value)))))
+    return round(value, decimals)
+
+
+def format_number(value: float, digits: int = 5) -> str:
+    """緊湊的數字字串 (不使用科學記號、去掉結尾的 0)"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, int):
+        return str(value)
+    if not math.isfinite(value):
+        return ''
+    rounded = round_sig(value, digits)
+    if rounded == int(rounded) and abs(rounded) < 1e15:
+        return str(int(rounded))
+    decimals = max(0, digits - 1 - int(math.floor(math.log10(abs(rounded)))))
+    return f'{rounded:.{decimals}f}'.rstrip('0').rstrip('.')
+
+
+def compact_value(obj: Any, digits: int = 5) -> Any:
+    """遞迴四捨五入所有浮點數 (numpy 數值也轉成 Python 型別)"""
+    if isinstance(obj, dict):
+        return {k: compact_value(v, digits) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [compact_value(v, digits) for v in obj]
+    if isinstance(obj, bool) or obj is None or isinstance(obj, str):
+        return obj
+    if isinstance(obj, int):
+        return obj
+    if isinstance(obj, (float, np.generic)):
+        value = obj.item() if isinstance(obj, np.generic) else obj
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                return None
+            rounded = round_sig(value, digits)
+            # 56585.0 -> 56585
+            return int(rounded) if rounded == int(rounded) and abs(rounded) < 1e15 else rounded
+        return value
+    return obj
+
+
+def compact_json(obj: Any, digits: int = 5) -> str:
+    """無縮排的 JSON，浮點數四捨五入到有效位數"""
+    return json.dumps(compact_value(obj, digits), ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def _flatten(row: Dict, prefix: str = '') -> Dict[str, Any]:
+    flat = {}
+    for key, value in row.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f'{name}.'))
+        else:
+            flat[name] = value
+    return flat
+
+
+def to_csv(rows: Sequence[Dict], digits: int = 5, columns: Optional[Sequence[str]] = None) -> str:
+    """
+    同結構的多筆資料 -> CSV (第一行是欄位名)
+    巢狀 dict 攤平成 a.b；list 以緊湊 JSON 放在同一格
+    """
+    flat_rows = [_flatten(row) for row in rows]
+    if columns is None:
+        columns = list(dict.fromkeys(key for row in flat_rows for key in row))
+
+    def cell(value):
+        if value is None:
+            return ''
+        if isinstance(value, str):
+            return value
+        if isinstance(value, (list, tuple, dict)):
+            return compact_json(value, digits)
+        value = value.item() if isinstance(value, np.generic) else value
+        if isinstance(value, (int, float)):
+            return format_number(value, digits)
+        return str(value)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(columns)
+    for row in flat_rows:
+        writer.writerow([cell(row.get(col)) for col in columns])
+    return buffer.getvalue().rstrip('\n')
+
+
+@dataclass
+class PromptSection:
+    """
+    prompt 的一個區段
+
+    variants: 由詳細到精簡的內容 (不含標題)；空字串的版本會被忽略
+    priority: 越大越優先放入預算
+    required: 預算不足時仍放入最精簡的版本
+    """
+    name: str
+    title: str
+    variants: List[str]
+    priority: int = 0
+    required: bool = False
+
+    def __post_init__(self):
+        self.variants = [v for v in self.variants if v]
+
+    def render(self, variant: int) -> str:
+        return f'{self.title}\n{self.variants[variant]}' if self.title else self.variants[variant]
+
+
+@dataclass
+class CompiledPrompt:
+    text: str
+    tokens: int
+    budget: int
+    chosen: Dict[str, int] = field(default_factory=dict)     # 區段 -> 使用的版本 (0 = 最詳細)
+    dropped: List[str] = field(default_factory=list)
+
+    def report(self) -> Dict:
+        """不含內容的統計 (存入分析記錄)"""
+        return {'tokens': self.tokens, 'budget': self.budget, 'chosen': dict(self.chosen), 'dropped': list(self.dropped)}
+
+    def summary(self) -> str:
+        degraded = [f'{name}(v{v})' for name, v in self.chosen.items() if v > 0]
+        parts = [f'約 {self.tokens:,} tokens / 預算 {self.budget:,}']
+        if degraded:
+            parts.append(f"精簡: {', '.join(degraded)}")
+        if self.dropped:
+            parts.append(f"省略: {', '.join(self.dropped)}")
+        return ' | '.join(parts)
+
+
+class PromptCompiler:
+    """
+    依優先度在 token 預算內組合區段
+
+    用法:
+        compiler = PromptCompiler(max_tokens=3000)
+        prompt = compiler.compile([
+            PromptSection('market', '=== 市場數據 ===', [compact_json(market_data)], priority=100, required=True),
+            PromptSection('candles', '=== 歷史K棒 ===', [to_csv(c[-n:]) for n in (20, 10, 5)], priority=60),
+        ], reserved_tokens=estimate_tokens(system_prompt))
+    """
+
+    SEPARATOR = '\n\n'
+
+    def __init__(self, max_tokens: int = 3000):
+        self.max_tokens = max_tokens
+
+    def compile(self, sections: Iterable[PromptSection], reserved_tokens: int = 0) -> CompiledPrompt:
+        """
+        Args:
+            reserved_tokens: 預算中已被佔用的部分 (例如 system prompt)
+        """
+        sections = [s for s in sections if s.variants]
+        sep_tokens = estimate_tokens(self.SEPARATOR)
+        cost = {
+            s.name: [estimate_tokens(s.render(v)) + sep_tokens for v in range(len(s.variants))]
+            for s in sections
+        }
+        remaining = self.max_tokens - reserved_tokens
+        # 必要區段先保留最精簡版本的預算
+        reserved = {s.name: cost[s.name][-1] for s in sections if s.required}
+        remaining -= sum(reserved.values())
+
+        chosen: Dict[str, int] = {}
+        for section in sorted(sections, key=lambda s: -s.priority):
+            available = remaining + reserved.get(section.name, 0)
+            pick = next((v for v, c in enumerate(cost[section.name]) if c <= available), None)
+            if pick is None and section.required:
+                pick = len(section.variants) - 1
+            if pick is None:
+                continue
+            chosen[section.name] = pick
+            remaining = available - cost[section.name][pick]
+
+        text = self.SEPARATOR.join(s.render(chosen[s.name]) for s in sections if s.name in chosen)
+        return CompiledPrompt(
+            text=text,
+            tokens=estimate_tokens(text) + reserved_tokens,
+            budget=self.max_tokens,
+            chosen={s.name: chosen[s.name] for s in sections if s.name in chosen},
+            dropped=[s.name for s in sections if s.name not in chosen]
+        )
+
+
+def tail_variants(items: Sequence, sizes: Iterable[int], render) -> List[str]:
+    """取最後 n 筆的多個版本 (去重、由多到少)，例如 K棒 20 / 10 / 5 根"""
+    variants, seen = [], set()
+    for n in sizes:
+        n = min(n, len(items))
+        if n <= 0 or n in seen:
+            continue
+        seen.add(n)
+        variants.append(render(items[-n:]))
+    return variants
+
+
+def head_variants(items: Sequence, sizes: Iterable[int], render) -> List[str]:
+    """取前 n 筆的多個版本 (成功案例、最近決策已依重要性排序)"""
+    variants, seen = [], set()
+    for n in sizes:
+        n = min(n, len(items))
+        if n <= 0 or n in seen:
+            continue
+        seen.add(n)
+        variants.append(render(items[:n]))
+    return variants
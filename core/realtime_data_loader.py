@@ -1,75 +1,61 @@
 """
 即時數據加載器 - 直接調用 Binance API
+已收盤的 K 棒存在本地 CandleStore，每次只下載上次之後的新 K 棒
 """
 import requests
+import numpy as np
 import pandas as pd
 from datetime import datetime
+from typing import Dict, List, Optional
+
+from core.candle_store import CandleStore
 
 
 class RealtimeDataLoader:
-    def __init__(self):
-        self.base_url = "https://fapi.binance.com"  # Binance Futures API
-    
+    # Binance Futures klines 單次請求上限
+    MAX_KLINES_PER_REQUEST = 1500
+
+    def __init__(self, base_url: str = "https://fapi.binance.com", store_dir: Optional[str] = 'data/candles'):
+        """
+        Args:
+            base_url: Binance Futures API
+            store_dir: 本地 K 線儲存目錄，None 表示不使用本地儲存 (每次下載完整視窗)
+        """
+        self.base_url = base_url
+        self.store = CandleStore(store_dir) if store_dir else None
+
     def load_data(self, symbol="BTCUSDT", timeframe="15m", limit=500):
         """
         獲取即時 OHLCV 數據
-        
+
         Args:
             symbol: 交易對，例如 "BTCUSDT"
             timeframe: K 線周期，例如 "15m", "1h", "4h"
             limit: 獲取數量，預設 500
-        
+
         Returns:
             pd.DataFrame: 包含 timestamp, open, high, low, close, volume
         """
         try:
             print(f"Fetching realtime data for {symbol} {timeframe}...")
-            
-            # Binance API endpoint
-            url = f"{self.base_url}/fapi/v1/klines"
-            
-            params = {
-                'symbol': symbol,
-                'interval': timeframe,
-                'limit': limit
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            if not data:
+
+            if self.store is None:
+                candles = self._parse_klines(self._fetch_window(symbol, timeframe, limit))
+            else:
+                candles = self._load_with_store(symbol, timeframe, limit)
+
+            if candles is None or len(candles['open_time']) == 0:
                 print(f"No data returned for {symbol} {timeframe}")
                 return None
-            
-            # 轉換為 DataFrame
-            # Binance klines format:
-            # [open_time, open, high, low, close, volume, close_time, ...]
-            df = pd.DataFrame(data, columns=[
-                'open_time', 'open', 'high', 'low', 'close', 'volume',
-                'close_time', 'quote_volume', 'trades', 'taker_buy_base',
-                'taker_buy_quote', 'ignore'
-            ])
-            
-            # 只保留需要的欄位
-            df = df[['open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time']]
-            
-            # 轉換時間格式 (Binance 使用毫秒)
-            df['timestamp'] = pd.to_datetime(df['open_time'], unit='ms')
-            df['open_time'] = pd.to_datetime(df['open_time'], unit='ms')
-            df['close_time'] = pd.to_datetime(df['close_time'], unit='ms')
-            
-            # 確保數値類型
-            for col in ['open', 'high', 'low', 'close', 'volume']:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-            
+
+            df = self._to_dataframe(candles)
+
             print(f"Successfully loaded {len(df)} candles")
             print(f"Latest price: ${df['close'].iloc[-1]:,.2f}")
             print(f"Latest time: {df['timestamp'].iloc[-1]}")
-            
+
             return df
-            
+
         except requests.exceptions.RequestException as e:
             print(f"Network error loading realtime data: {e}")
             return None
@@ -78,7 +64,136 @@ class RealtimeDataLoader:
             import traceback
             traceback.print_exc()
             return None
-    
+
+    def _fetch_klines(
+        self,
+        symbol: str,
+        timeframe: str,
+        limit: int,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None
+    ) -> List:
+        """呼叫 /fapi/v1/klines"""
+        url = f"{self.base_url}/fapi/v1/klines"
+
+        params = {
+            'symbol': symbol,
+            'interval': timeframe,
+            'limit': limit
+        }
+        if start_time is not None:
+            params['startTime'] = start_time
+        if end_time is not None:
+            params['endTime'] = end_time
+
+        response = requests.get(url, params=params, timeout=10)
+        response.raise_for_status()
+        return response.json()
+
+    def _fetch_window(self, symbol: str, timeframe: str, limit: int) -> List:
+        """下載最後 limit 根 K 棒，超過單次上限時往前分頁"""
+        if limit <= self.MAX_KLINES_PER_REQUEST:
+            return self._fetch_klines(symbol, timeframe, limit=limit)
+
+        data = []
+        end_time = None
+        while len(data) < limit:
+            page = self._fetch_klines(
+                symbol, timeframe,
+                limit=min(self.MAX_KLINES_PER_REQUEST, limit - len(data)),
+                end_time=end_time
+            )
+            if not page:
+                break
+            data = page + data
+            if len(page) < self.MAX_KLINES_PER_REQUEST:
+                break
+            end_time = int(page[0][0]) - 1
+        return data
+
+    @staticmethod
+    def _parse_klines(data: List) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Binance klines format:
+        [open_time, open, high, low, close, volume, close_time, ...]
+        """
+        if not data:
+            return None
+        rows = [row[:7] for row in data]
+        columns = list(zip(*rows))
+        return {
+            'open_time': np.array(columns[0], dtype=np.int64),
+            'open': np.array(columns[1], dtype=np.float64),
+            'high': np.array(columns[2], dtype=np.float64),
+            'low': np.array(columns[3], dtype=np.float64),
+            'close': np.array(columns[4], dtype=np.float64),
+            'volume': np.array(columns[5], dtype=np.float64),
+            'close_time': np.array(columns[6], dtype=np.int64),
+        }
+
+    @staticmethod
+    def _split_live(candles: Dict[str, np.ndarray]):
+        """最後一根是尚未收盤的 K 棒，不寫入本地儲存"""
+        closed = {k: v[:-1] for k, v in candles.items()}
+        live = {k: v[-1:] for k, v in candles.items()}
+        return closed, live
+
+    def _load_with_store(self, symbol: str, timeframe: str, limit: int) -> Optional[Dict[str, np.ndarray]]:
+        """同步本地儲存 (只下載新 K 棒) 並返回最後 limit 根"""
+        store = self.store
+        with store.lock(symbol, timeframe):
+            last_open_time = store.last_open_time(symbol, timeframe)
+
+            if last_open_time is None or store.count(symbol, timeframe) < limit - 1:
+                # 首次同步或本地歷史不足：下載完整視窗
+                candles = self._parse_klines(self._fetch_window(symbol, timeframe, limit))
+                if candles is None:
+                    return None
+                closed, live = self._split_live(candles)
+                store.replace(symbol, timeframe, closed)
+            else:
+                # 增量同步：只下載 last_open_time 之後的 K 棒
+                pages = []
+                start_time = last_open_time + 1
+                while True:
+                    data = self._fetch_klines(
+                        symbol, timeframe, limit=self.MAX_KLINES_PER_REQUEST, start_time=start_time
+                    )
+                    if data:
+                        pages.extend(data)
+                    if len(data) < self.MAX_KLINES_PER_REQUEST:
+                        break
+                    start_time = int(data[-1][0]) + 1
+
+                candles = self._parse_klines(pages)
+                if candles is None:
+                    return None
+                closed, live = self._split_live(candles)
+                new_rows = store.append(symbol, timeframe, closed)
+                if new_rows:
+                    print(f"Synced {new_rows} new closed candles for {symbol} {timeframe}")
+
+            stored = store.tail(symbol, timeframe, limit - 1)
+            if stored is None:
+                return live
+            return {k: np.concatenate([stored[k], live[k]]) for k in live}
+
+    @staticmethod
+    def _to_dataframe(candles: Dict[str, np.ndarray]) -> pd.DataFrame:
+        # 只保留需要的欄位，轉換時間格式 (Binance 使用毫秒)
+        open_time = pd.to_datetime(candles['open_time'], unit='ms')
+        df = pd.DataFrame({
+            'open_time': open_time,
+            'open': candles['open'],
+            'high': candles['high'],
+            'low': candles['low'],
+            'close': candles['close'],
+            'volume': candles['volume'],
+            'close_time': pd.to_datetime(candles['close_time'], unit='ms'),
+        })
+        df['timestamp'] = df['open_time']
+        return df
+
     def get_latest_price(self, symbol="BTCUSDT"):
         """
         獲取最新價格
@@ -86,13 +201,13 @@ class RealtimeDataLoader:
         try:
             url = f"{self.base_url}/fapi/v1/ticker/price"
             params = {'symbol': symbol}
-            
+
             response = requests.get(url, params=params, timeout=5)
             response.raise_for_status()
-            
+
             data = response.json()
             return float(data['price'])
-            
+
         except Exception as e:
             print(f"Error fetching latest price: {e}")
             return None
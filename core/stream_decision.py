@@ -0,0 +1,76 @@
+"""
+串流回應的提早決策
+模型以串流 (SSE) 返回時逐段解析，action 與 confidence 一出現就發布決策，
+不必等到完整的 reasoning 輸出完畢；剩下的文字繼續推送給前端
+
+- 以 json_parser_robust.DecisionParser 逐段解析 (每段只解析新的部分)，
+  數字要看到後面的分隔符號才算完整 (避免 "confidence": 7|5 被切在中間)
+- 只有 JSON 物件內的欄位會觸發提早決策 (物件前的說明文字不算)
+- <think>...</think> 思考區塊內的草稿不解析
+"""
+import threading
+from typing import Callable, Dict, Optional, Sequence
+
+from core.json_parser_robust import DecisionParser
+
+
+class DecisionStream:
+    """
+    逐段餵入模型輸出，提早取得決策
+
+    用法:
+        stream = DecisionStream(on_decision=lambda d: print(d['action'], d['confidence']))
+        for chunk in chunks:
+            stream.feed(chunk)
+        stream.finish()
+    """
+
+    EARLY_FIELDS = ('action', 'confidence')
+
+    def __init__(self, on_decision: Optional[Callable[[Dict], None]] = None,
+                 on_delta: Optional[Callable[[str], None]] = None,
+                 early_fields: Sequence[str] = EARLY_FIELDS):
+        """
+        Args:
+            on_decision: early_fields 全部出現時呼叫一次 (目前已解析的欄位)
+            on_delta: 每段新文字
+        """
+        self.on_decision = on_decision
+        self.on_delta = on_delta
+        self.early_fields = tuple(early_fields)
+        self.text = ''
+        self.parser = DecisionParser()
+        self.decision: Optional[Dict] = None
+        self.ready = threading.Event()       # 提早決策已發布或串流結束
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def fields(self) -> Dict:
+        """目前已完整輸出的 JSON 物件內欄位"""
+        return self.parser.structured_fields
+
+    def feed(self, chunk: str):
+        if not chunk:
+            return
+        publish = None
+        with self._lock:
+            self.text += chunk
+            fields = self.parser.feed(chunk).structured_fields
+            if self.decision is None and all(f in fields for f in self.early_fields):
+                self.decision = fields
+                publish = fields
+        if self.on_delta:
+            self.on_delta(chunk)
+        if publish is not None:
+            if self.on_decision:
+                self.on_decision(dict(publish))
+            self.ready.set()
+
+    def finish(self):
+        """串流結束 (成功或失敗)"""
+        self.ready.set()
+        self.done.set()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self.ready.wait(timeout)
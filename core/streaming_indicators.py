@@ -0,0 +1,691 @@
+"""
+串流 (增量) 技術指標狀態
+每根已收盤 K 棒以 O(1) 更新 EMA / Wilder 平滑 / 滾動視窗狀態，
+不需要每個週期重新下載並重算整段歷史
+
+計算方式與 talib 相同 (包括 EMA 的 SMA 種子、MACD 的對齊方式、
+RSI/ATR/ADX 的 Wilder 平滑)，輸出與 talib 在同一段數據上的結果一致。
+
+支援 checkpoint() / restore() 以便在重啟後接續計算。
+"""
+import copy
+import json
+import math
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional
+
+NAN = float('nan')
+
+
+def _is_zero(value: float) -> bool:
+    """與 talib 的 TA_IS_ZERO 相同"""
+    return -1e-8 < value < 1e-8
+
+
+class _State:
+    """增量指標狀態的基底類別 (提供 checkpoint 序列化)"""
+
+    def to_dict(self) -> Dict:
+        data = {}
+        for key, value in self.__dict__.items():
+            data[key] = list(value) if isinstance(value, deque) else value
+        return data
+
+    def load_dict(self, data: Dict):
+        for key, value in data.items():
+            if isinstance(getattr(self, key, None), deque):
+                value = deque(value, maxlen=getattr(self, key).maxlen)
+            setattr(self, key, value)
+
+
+class EMAState(_State):
+    """EMA：前 period 根以 SMA 作為種子，之後 ema += (x - ema) * k"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.k = 2.0 / (period + 1)
+        self.count = 0
+        self.seed_sum = 0.0
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        self.count += 1
+        if self.count < self.period:
+            self.seed_sum += x
+        elif self.count == self.period:
+            self.seed_sum += x
+            self.value = self.seed_sum / self.period
+        else:
+            self.value = ((x - self.value) * self.k) + self.value
+        return self.value
+
+
+class RollingWindow(_State):
+    """固定長度的滾動視窗"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.values = deque(maxlen=period)
+
+    def update(self, x: float):
+        self.values.append(x)
+
+    @property
+    def full(self) -> bool:
+        return len(self.values) == self.period
+
+    def mean(self) -> float:
+        return sum(self.values) / self.period if self.full else NAN
+
+
+class MACDState(_State):
+    """
+    MACD (talib 對齊方式)
+
+    talib 的快線 EMA 以「慢線週期結束前 fast 根」的 SMA 為種子，
+    與慢線同時在第 slow 根開始輸出；訊號線再以前 signal 根 MACD 的 SMA 為種子。
+    """
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self.fast = fast
+        self.slow = slow
+        self.signal = signal
+        self.k_fast = 2.0 / (fast + 1)
+        self.k_slow = 2.0 / (slow + 1)
+        self.k_signal = 2.0 / (signal + 1)
+        self.count = 0
+        self.slow_seed_sum = 0.0
+        self.recent = deque(maxlen=fast)
+        self.fast_ema = NAN
+        self.slow_ema = NAN
+        self.signal_count = 0
+        self.signal_seed_sum = 0.0
+        self.signal_ema = NAN
+        self.macd = NAN
+        self.macd_signal = NAN
+        self.macd_hist = NAN
+
+    def update(self, x: float):
+        self.count += 1
+        if self.count < self.slow:
+            self.slow_seed_sum += x
+            self.recent.append(x)
+            return self.macd, self.macd_signal, self.macd_hist
+
+        if self.count == self.slow:
+            self.slow_seed_sum += x
+            self.recent.append(x)
+            self.slow_ema = self.slow_seed_sum / self.slow
+            self.fast_ema = sum(self.recent) / self.fast
+        else:
+            self.fast_ema = ((x - self.fast_ema) * self.k_fast) + self.fast_ema
+            self.slow_ema = ((x - self.slow_ema) * self.k_slow) + self.slow_ema
+
+        line = self.fast_ema - self.slow_ema
+        self.signal_count += 1
+        if self.signal_count < self.signal:
+            self.signal_seed_sum += line
+            return self.macd, self.macd_signal, self.macd_hist
+        if self.signal_count == self.signal:
+            self.signal_seed_sum += line
+            self.signal_ema = self.signal_seed_sum / self.signal
+        else:
+            self.signal_ema = ((line - self.signal_ema) * self.k_signal) + self.signal_ema
+
+        self.macd = line
+        self.macd_signal = self.signal_ema
+        self.macd_hist = line - self.signal_ema
+        return self.macd, self.macd_signal, self.macd_hist
+
+
+class RSIState(_State):
+    """RSI (Wilder 平滑)"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.count = 0
+        self.prev_close = NAN
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        self.count += 1
+        if self.count == 1:
+            self.prev_close = x
+            return self.value
+
+        diff = x - self.prev_close
+        self.prev_close = x
+
+        if self.count <= self.period + 1:
+            if diff < 0:
+                self.avg_loss -= diff
+            else:
+                self.avg_gain += diff
+            if self.count < self.period + 1:
+                return self.value
+            self.avg_loss /= self.period
+            self.avg_gain /= self.period
+        else:
+            self.avg_loss *= (self.period - 1)
+            self.avg_gain *= (self.period - 1)
+            if diff < 0:
+                self.avg_loss -= diff
+            else:
+                self.avg_gain += diff
+            self.avg_loss /= self.period
+            self.avg_gain /= self.period
+
+        total = self.avg_gain + self.avg_loss
+        self.value = 100.0 * (self.avg_gain / total) if not _is_zero(total) else 0.0
+        return self.value
+
+
+def _true_range(high: float, low: float, prev_close: float) -> float:
+    out = high - low
+    out = max(out, abs(high - prev_close))
+    return max(out, abs(low - prev_close))
+
+
+class ATRState(_State):
+    """ATR (Wilder 平滑，種子為前 period 根 TR 的平均)"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.count = 0
+        self.prev_close = NAN
+        self.seed_sum = 0.0
+        self.value = NAN
+
+    def update(self, high: float, low: float, close: float) -> float:
+        self.count += 1
+        if self.count == 1:
+            self.prev_close = close
+            return self.value
+
+        tr = _true_range(high, low, self.prev_close)
+        self.prev_close = close
+
+        if self.count <= self.period + 1:
+            self.seed_sum += tr
+            if self.count == self.period + 1:
+                self.value = self.seed_sum / self.period
+        else:
+            self.value = (self.value * (self.period - 1) + tr) / self.period
+        return self.value
+
+
+class ADXState(_State):
+    """ADX (talib 演算法：+DM/-DM/TR 的 Wilder 累積，DX 平均後再 Wilder 平滑)"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.count = 0
+        self.prev_high = NAN
+        self.prev_low = NAN
+        self.prev_close = NAN
+        self.plus_dm = 0.0
+        self.minus_dm = 0.0
+        self.tr = 0.0
+        self.sum_dx = 0.0
+        self.value = NAN
+
+    def update(self, high: float, low: float, close: float) -> float:
+        self.count += 1
+        period = self.period
+        if self.count == 1:
+            self.prev_high, self.prev_low, self.prev_close = high, low, close
+            return self.value
+
+        diff_p = high - self.prev_high
+        diff_m = self.prev_low - low
+        self.prev_high, self.prev_low = high, low
+        tr = _true_range(high, low, self.prev_close)
+        self.prev_close = close
+
+        if self.count <= period:
+            # 前 period-1 根：直接累加
+            if diff_m > 0 and diff_p < diff_m:
+                self.minus_dm += diff_m
+            elif diff_p > 0 and diff_p > diff_m:
+                self.plus_dm += diff_p
+            self.tr += tr
+            return self.value
+
+        self.minus_dm -= self.minus_dm / period
+        self.plus_dm -= self.plus_dm / period
+        if diff_m > 0 and diff_p < diff_m:
+            self.minus_dm += diff_m
+        elif diff_p > 0 and diff_p > diff_m:
+            self.plus_dm += diff_p
+        self.tr = self.tr - (self.tr / period) + tr
+
+        dx = None
+        if not _is_zero(self.tr):
+            minus_di = 100.0 * (self.minus_dm / self.tr)
+            plus_di = 100.0 * (self.plus_dm / self.tr)
+            di_sum = minus_di + plus_di
+            if not _is_zero(di_sum):
+                dx = 100.0 * (abs(minus_di - plus_di) / di_sum)
+
+        if self.count < 2 * period:
+            # 累積初始 DX
+            if dx is not None:
+                self.sum_dx += dx
+        elif self.count == 2 * period:
+            if dx is not None:
+                self.sum_dx += dx
+            self.value = self.sum_dx / period
+        elif dx is not None:
+            self.value = ((self.value * (period - 1)) + dx) / period
+        return self.value
+
+
+class StochState(_State):
+    """STOCH (fastk=5, slowk=3, slowd=3，均為 SMA)"""
+
+    def __init__(self, fastk: int = 5, slowk: int = 3, slowd: int = 3):
+        self.fastk = fastk
+        self.slowk = slowk
+        self.slowd = slowd
+        self.highs = deque(maxlen=fastk)
+        self.lows = deque(maxlen=fastk)
+        self.fastk_values = deque(maxlen=slowk)
+        self.slowk_values = deque(maxlen=slowd)
+        self.count = 0
+        self.value_k = NAN
+        self.value_d = NAN
+
+    def update(self, high: float, low: float, close: float):
+        self.count += 1
+        self.highs.append(high)
+        self.lows.append(low)
+        if len(self.highs) < self.fastk:
+            return self.value_k, self.value_d
+
+        highest = max(self.highs)
+        lowest = min(self.lows)
+        diff = (highest - lowest) / 100.0
+        self.fastk_values.append((close - lowest) / diff if diff != 0 else 0.0)
+        if len(self.fastk_values) < self.slowk:
+            return self.value_k, self.value_d
+
+        self.slowk_values.append(sum(self.fastk_values) / self.slowk)
+        if len(self.slowk_values) < self.slowd:
+            return self.value_k, self.value_d
+
+        self.value_k = self.slowk_values[-1]
+        self.value_d = sum(self.slowk_values) / self.slowd
+        return self.value_k, self.value_d
+
+
+class CCIState(_State):
+    """CCI (典型價格與平均絕對偏差)"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.window = deque(maxlen=period)
+        self.value = NAN
+
+    def update(self, high: float, low: float, close: float) -> float:
+        self.window.append((high + low + close) / 3)
+        if len(self.window) < self.period:
+            return self.value
+        average = sum(self.window) / self.period
+        mean_dev = sum(abs(tp - average) for tp in self.window)
+        diff = self.window[-1] - average
+        if diff != 0.0 and mean_dev != 0.0:
+            self.value = diff / (0.015 * (mean_dev / self.period))
+        else:
+            self.value = 0.0
+        return self.value
+
+
+class MFIState(_State):
+    """MFI (正/負資金流的滾動總和)"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev_tp = NAN
+        self.flows = deque(maxlen=period)
+        self.value = NAN
+
+    def update(self, high: float, low: float, close: float, volume: float) -> float:
+        tp = (high + low + close) / 3
+        if math.isnan(self.prev_tp):
+            self.prev_tp = tp
+            return self.value
+
+        flow = tp * volume
+        if tp > self.prev_tp:
+            self.flows.append((flow, 0.0))
+        elif tp < self.prev_tp:
+            self.flows.append((0.0, flow))
+        else:
+            self.flows.append((0.0, 0.0))
+        self.prev_tp = tp
+
+        if len(self.flows) < self.period:
+            return self.value
+        pos = sum(f[0] for f in self.flows)
+        neg = sum(f[1] for f in self.flows)
+        total = pos + neg
+        self.value = 100.0 * (pos / total) if total >= 1.0 else 0.0
+        return self.value
+
+    def load_dict(self, data: Dict):
+        super().load_dict(data)
+        self.flows = deque((tuple(f) for f in self.flows), maxlen=self.period)
+
+
+class WillRState(_State):
+    """Williams %R"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.highs = deque(maxlen=period)
+        self.lows = deque(maxlen=period)
+        self.value = NAN
+
+    def update(self, high: float, low: float, close: float) -> float:
+        self.highs.append(high)
+        self.lows.append(low)
+        if len(self.highs) < self.period:
+            return self.value
+        highest = max(self.highs)
+        lowest = min(self.lows)
+        diff = (highest - lowest) / -100.0
+        self.value = (highest - close) / diff if diff != 0.0 else 0.0
+        return self.value
+
+
+class BBandsState(_State):
+    """布林帶 (SMA 中軌 + 母體標準差)"""
+
+    def __init__(self, period: int = 20, nbdev: float = 2.0):
+        self.period = period
+        self.nbdev = nbdev
+        self.window = deque(maxlen=period)
+        self.upper = NAN
+        self.middle = NAN
+        self.lower = NAN
+
+    def update(self, x: float):
+        self.window.append(x)
+        if len(self.window) < self.period:
+            return self.upper, self.middle, self.lower
+        mean = sum(self.window) / self.period
+        variance = sum(v * v for v in self.window) / self.period - mean * mean
+        std = math.sqrt(variance) if variance >= 1e-8 else 0.0
+        self.middle = mean
+        self.upper = mean + std * self.nbdev
+        self.lower = mean - std * self.nbdev
+        return self.upper, self.middle, self.lower
+
+
+class OBVState(_State):
+    """OBV"""
+
+    def __init__(self):
+        self.prev_close = NAN
+        self.value = NAN
+
+    def update(self, close: float, volume: float) -> float:
+        if math.isnan(self.value):
+            self.value = volume
+        elif close > self.prev_close:
+            self.value += volume
+        elif close < self.prev_close:
+            self.value -= volume
+        self.prev_close = close
+        return self.value
+
+
+class StreamingIndicatorState:
+    """
+    單一交易對 / 時間框架的增量指標狀態
+
+    指標與 strategies/v13/market_features 的 MARKET_FEATURE_INDICATORS 相同：
+    ema9/21/50/200, macd, adx, rsi, stoch, cci, mfi, willr, atr, bbands, volume_ma, obv
+
+    Example:
+        state = StreamingIndicatorState('BTCUSDT', '15m')
+        state.warm_up(df.iloc[:-1])          # 以已收盤 K 棒初始化
+        values = state.update(new_candle)    # 新 K 棒收盤時 O(1) 更新
+        preview = state.preview(open_candle) # 未收盤 K 棒的暫時數值 (不改變狀態)
+    """
+
+    VERSION = 1
+
+    def __init__(self, symbol: str = 'UNKNOWN', timeframe: str = '15m', history_size: int = 20):
+        """
+        Args:
+            symbol: 交易對
+            timeframe: 時間框架
+            history_size: 保留最近幾根 K 棒的指標數值 (供歷史 K 棒特徵使用)
+        """
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.history_size = history_size
+        self.bars = 0
+        self.last_open_time: Optional[int] = None
+        self.history = deque(maxlen=history_size)
+        self._states = self._build_states()
+
+    @staticmethod
+    def _build_states() -> Dict[str, _State]:
+        return {
+            'ema9': EMAState(9),
+            'ema21': EMAState(21),
+            'ema50': EMAState(50),
+            'ema200': EMAState(200),
+            'macd': MACDState(12, 26, 9),
+            'adx': ADXState(14),
+            'rsi': RSIState(14),
+            'stoch': StochState(5, 3, 3),
+            'cci': CCIState(14),
+            'mfi': MFIState(14),
+            'willr': WillRState(14),
+            'atr': ATRState(14),
+            'bbands': BBandsState(20, 2.0),
+            'volume_ma': RollingWindow(20),
+            'obv': OBVState(),
+        }
+
+    @staticmethod
+    def _open_time_ms(candle) -> Optional[int]:
+        """取得 K 棒開盤時間 (毫秒)，支援 pd.Timestamp / datetime / int"""
+        value = candle.get('open_time', candle.get('timestamp')) if hasattr(candle, 'get') else None
+        if value is None:
+            return None
+        if hasattr(value, 'value') and not isinstance(value, (int, float)):
+            return int(value.value // 1_000_000)  # pd.Timestamp (ns)
+        if hasattr(value, 'timestamp'):
+            return int(value.timestamp() * 1000)
+        return int(value)
+
+    def _apply(self, states: Dict[str, _State], high: float, low: float, close: float, volume: float) -> Dict[str, float]:
+        macd, macd_signal, macd_hist = states['macd'].update(close)
+        stoch_k, stoch_d = states['stoch'].update(high, low, close)
+        bb_upper, bb_middle, bb_lower = states['bbands'].update(close)
+        states['volume_ma'].update(volume)
+        return {
+            'close': close,
+            'high': high,
+            'low': low,
+            'volume': volume,
+            'ema9': states['ema9'].update(close),
+            'ema21': states['ema21'].update(close),
+            'ema50': states['ema50'].update(close),
+            'ema200': states['ema200'].update(close),
+            'macd': macd,
+            'macd_signal': macd_signal,
+            'macd_hist': macd_hist,
+            'adx': states['adx'].update(high, low, close),
+            'rsi': states['rsi'].update(close),
+            'stoch_k': stoch_k,
+            'stoch_d': stoch_d,
+            'cci': states['cci'].update(high, low, close),
+            'mfi': states['mfi'].update(high, low, close, volume),
+            'willr': states['willr'].update(high, low, close),
+            'atr': states['atr'].update(high, low, close),
+            'bb_upper': bb_upper,
+            'bb_middle': bb_middle,
+            'bb_lower': bb_lower,
+            'volume_ma': states['volume_ma'].mean(),
+            'obv': states['obv'].update(close, volume),
+        }
+
+    @staticmethod
+    def _ohlcv(candle):
+        return (
+            float(candle['high']),
+            float(candle['low']),
+            float(candle['close']),
+            float(candle['volume'])
+        )
+
+    def update(self, candle) -> Optional[Dict[str, float]]:
+        """
+        以一根已收盤 K 棒更新狀態 (O(1))
+
+        Args:
+            candle: dict 或 pd.Series，包含 high/low/close/volume 及 open_time/timestamp
+
+        Returns:
+            該 K 棒的所有指標數值；若 K 棒已處理過則返回 None
+        """
+        open_time = self._open_time_ms(candle)
+        if open_time is not None and self.last_open_time is not None and open_time <= self.last_open_time:
+            return None
+
+        values = self._apply(self._states, *self._ohlcv(candle))
+        self.bars += 1
+        if open_time is not None:
+            self.last_open_time = open_time
+        self.history.append(values)
+        return values
+
+    def preview(self, candle) -> Dict[str, float]:
+        """計算未收盤 K 棒的暫時指標數值，不改變狀態"""
+        return self._apply(copy.deepcopy(self._states), *self._ohlcv(candle))
+
+    def warm_up(self, df) -> int:
+        """
+        以 DataFrame 的已收盤 K 棒初始化 / 追上狀態
+
+        Returns:
+            實際處理的新 K 棒數量
+        """
+        processed = 0
+        for row in df[[c for c in ('open_time', 'timestamp', 'high', 'low', 'close', 'volume') if c in df.columns]].to_dict('records'):
+            if self.update(row) is not None:
+                processed += 1
+        return processed
+
+    @property
+    def current(self) -> Optional[Dict[str, float]]:
+        """最後一根已收盤 K 棒的指標數值"""
+        return self.history[-1] if self.history else None
+
+    # ==================== Checkpoint ====================
+
+    def checkpoint(self) -> Dict:
+        """輸出可 JSON 序列化的完整狀態"""
+        return {
+            'version': self.VERSION,
+            'symbol': self.symbol,
+            'timeframe': self.timeframe,
+            'history_size': self.history_size,
+            'bars': self.bars,
+            'last_open_time': self.last_open_time,
+            'history': list(self.history),
+            'states': {name: state.to_dict() for name, state in self._states.items()}
+        }
+
+    @classmethod
+    def restore(cls, data: Dict) -> 'StreamingIndicatorState':
+        """從 checkpoint() 的輸出還原狀態"""
+        if data.get('version') != cls.VERSION:
+            raise ValueError(f"不支援的 checkpoint 版本: {data.get('version')}")
+
+        state = cls(data['symbol'], data['timeframe'], data['history_size'])
+        state.bars = data['bars']
+        state.last_open_time = data['last_open_time']
+        state.history = deque(data['history'], maxlen=state.history_size)
+        for name, state_data in data['states'].items():
+            state._states[name].load_dict(state_data)
+        return state
+
+    def save(self, filepath: str):
+        """將 checkpoint 寫入 JSON 檔案"""
+        Path(filepath).parent.mkdir(parents=True, exist_ok=True)
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(self.checkpoint(), f)
+
+    @classmethod
+    def load(cls, filepath: str) -> 'StreamingIndicatorState':
+        """從 JSON 檔案還原狀態"""
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return cls.restore(json.load(f))
+
+
+class StreamingIndicatorRegistry:
+    """
+    多交易對 / 時間框架的增量指標狀態集合
+
+    指定 checkpoint_dir 時，狀態會在 save() 時寫入磁碟，
+    重啟後 get() 會自動從 checkpoint 還原。
+    """
+
+    def __init__(self, history_size: int = 20, checkpoint_dir: Optional[str] = None):
+        self.history_size = history_size
+        self.checkpoint_dir = Path(checkpoint_dir) if checkpoint_dir else None
+        self._states: Dict[tuple, StreamingIndicatorState] = {}
+
+    def _checkpoint_path(self, symbol: str, timeframe: str) -> Optional[Path]:
+        if self.checkpoint_dir is None:
+            return None
+        return self.checkpoint_dir / f"{symbol}_{timeframe}.json"
+
+    def get(self, symbol: str, timeframe: str) -> StreamingIndicatorState:
+        key = (symbol, timeframe)
+        if key not in self._states:
+            state = None
+            path = self._checkpoint_path(symbol, timeframe)
+            if path is not None and path.exists():
+                try:
+                    state = StreamingIndicatorState.load(str(path))
+                except Exception as e:
+                    print(f"[WARNING] 無法還原指標狀態 {path}: {e}")
+            if state is None or state.history_size != self.history_size:
+                state = StreamingIndicatorState(symbol, timeframe, self.history_size)
+            self._states[key] = state
+        return self._states[key]
+
+    def sync(self, symbol: str, timeframe: str, closed_df) -> StreamingIndicatorState:
+        """
+        以最新的已收盤 K 棒同步狀態，只處理比 last_open_time 新的 K 棒
+
+        若 closed_df 的第一根已晚於狀態的最後一根 (中間可能有缺口，
+        例如程式停止一段時間)，會以 closed_df 重建狀態。
+        """
+        state = self.get(symbol, timeframe)
+        if state.last_open_time is not None and len(closed_df) > 0:
+            first_open_time = state._open_time_ms(closed_df.iloc[0])
+            if first_open_time is not None and first_open_time > state.last_open_time:
+                state = StreamingIndicatorState(symbol, timeframe, self.history_size)
+                self._states[(symbol, timeframe)] = state
+        state.warm_up(closed_df)
+        return state
+
+    def save(self, symbol: str, timeframe: str):
+        """將指定狀態寫入 checkpoint_dir"""
+        path = self._checkpoint_path(symbol, timeframe)
+        if path is not None and (symbol, timeframe) in self._states:
+            self._states[(symbol, timeframe)].save(str(path))
+
+    def symbols(self) -> List[tuple]:
+        return list(self._states.keys())
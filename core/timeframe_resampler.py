@@ -0,0 +1,198 @@
+"""
+時間框架重採樣
+由 15m 基礎 K 線推導 1h / 4h / 1d K 線，不需要再分別下載
+
+- 以 UTC epoch 對齊 (與 Binance 相同：1h 整點、4h 為 0/4/8/12/16/20 點、1d 為 00:00)
+- open 取桶內第一根、close 取最後一根、high/low 取極值、volume 加總
+- 基礎數據最後一根是進行中的 K 棒，因此其所在的桶也是進行中的 K 棒 (與 Binance klines 一致)
+- 已收盤的推導 K 棒會快取，下一次只聚合新的基礎 K 棒
+"""
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+TIMEFRAME_MS = {
+    '1m': 60_000,
+    '3m': 3 * 60_000,
+    '5m': 5 * 60_000,
+    '15m': 15 * 60_000,
+    '30m': 30 * 60_000,
+    '1h': 60 * 60_000,
+    '2h': 2 * 60 * 60_000,
+    '4h': 4 * 60 * 60_000,
+    '6h': 6 * 60 * 60_000,
+    '8h': 8 * 60 * 60_000,
+    '12h': 12 * 60 * 60_000,
+    '1d': 24 * 60 * 60_000,
+}
+
+_DAY_MS = TIMEFRAME_MS['1d']
+_COLUMNS = ('open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time')
+
+
+def can_resample(base_timeframe: str, target_timeframe: str) -> bool:
+    """target 是否能由 base 推導 (整數倍且在一天內以 epoch 對齊)"""
+    base_ms = TIMEFRAME_MS.get(base_timeframe)
+    target_ms = TIMEFRAME_MS.get(target_timeframe)
+    if base_ms is None or target_ms is None or target_ms <= base_ms:
+        return False
+    return target_ms % base_ms == 0 and _DAY_MS % target_ms == 0
+
+
+def resample_ratio(base_timeframe: str, target_timeframe: str) -> int:
+    """一根 target K 棒包含幾根 base K 棒"""
+    return TIMEFRAME_MS[target_timeframe] // TIMEFRAME_MS[base_timeframe]
+
+
+def _to_ms(values) -> np.ndarray:
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ms]').astype(np.int64)
+    return values.astype(np.int64)
+
+
+def frame_to_arrays(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """RealtimeDataLoader 格式的 DataFrame 轉成欄位陣列 (時間為毫秒)"""
+    return {
+        'open_time': _to_ms(df['open_time'].values),
+        'open': df['open'].values.astype(np.float64),
+        'high': df['high'].values.astype(np.float64),
+        'low': df['low'].values.astype(np.float64),
+        'close': df['close'].values.astype(np.float64),
+        'volume': df['volume'].values.astype(np.float64),
+    }
+
+
+def arrays_to_frame(bars: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """欄位陣列轉回 RealtimeDataLoader 格式的 DataFrame"""
+    df = pd.DataFrame({
+        'open_time': pd.to_datetime(bars['open_time'], unit='ms'),
+        'open': bars['open'],
+        'high': bars['high'],
+        'low': bars['low'],
+        'close': bars['close'],
+        'volume': bars['volume'],
+        'close_time': pd.to_datetime(bars['close_time'], unit='ms'),
+    })
+    df['timestamp'] = df['open_time']
+    return df
+
+
+def aggregate(base: Dict[str, np.ndarray], target_ms: int) -> Dict[str, np.ndarray]:
+    """
+    向量化聚合 (base 需依 open_time 排序)
+
+    Returns:
+        每個桶一根 K 棒的欄位陣列
+    """
+    open_time = base['open_time']
+    n = len(open_time)
+    if n == 0:
+        return {column: np.empty(0, dtype=np.int64 if column.endswith('time') else np.float64)
+                for column in _COLUMNS}
+
+    bucket = open_time - open_time % target_ms
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:] - 1, n - 1]
+
+    return {
+        'open_time': bucket[starts],
+        'open': base['open'][starts],
+        'high': np.maximum.reduceat(base['high'], starts),
+        'low': np.minimum.reduceat(base['low'], starts),
+        'close': base['close'][ends],
+        'volume': np.add.reduceat(base['volume'], starts),
+        'close_time': bucket[starts] + target_ms - 1,
+    }
+
+
+def _take(bars: Dict[str, np.ndarray], index) -> Dict[str, np.ndarray]:
+    return {column: values[index] for column, values in bars.items()}
+
+
+def _concat(*parts: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    return {column: np.concatenate([p[column] for p in parts]) for column in _COLUMNS}
+
+
+class TimeframeResampler:
+    """
+    帶快取的增量重採樣器
+
+    每個 (交易對, 基礎框架, 目標框架) 快取已收盤的推導 K 棒；
+    resample 時只聚合快取最後一根之後的基礎 K 棒
+    """
+
+    def __init__(self, max_bars: int = 1000):
+        """
+        Args:
+            max_bars: 每個目標框架最多保留的已收盤 K 棒數
+        """
+        self.max_bars = max_bars
+        self._closed: Dict[Tuple[str, str, str], Dict[str, np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self.stats = {'rebuilds': 0, 'incremental': 0}
+
+    def clear(self):
+        with self._lock:
+            self._closed.clear()
+
+    def resample(
+        self,
+        symbol: str,
+        base_df: pd.DataFrame,
+        base_timeframe: str,
+        target_timeframe: str,
+        limit: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        由基礎 K 線推導目標框架 K 線
+
+        Args:
+            base_df: RealtimeDataLoader 格式，最後一根為進行中的 K 棒
+            limit: 返回最後 limit 根 (含進行中的一根)，None 表示全部
+
+        Returns:
+            RealtimeDataLoader 格式的 DataFrame
+        """
+        if not can_resample(base_timeframe, target_timeframe):
+            raise ValueError(f"無法由 {base_timeframe} 推導 {target_timeframe}")
+
+        target_ms = TIMEFRAME_MS[target_timeframe]
+        base = frame_to_arrays(base_df)
+        key = (symbol, base_timeframe, target_timeframe)
+
+        with self._lock:
+            cached = self._closed.get(key)
+            first_open = int(base['open_time'][0])
+            last_open = int(base['open_time'][-1])
+
+            if cached is not None and len(cached['open_time']) > 0:
+                next_bucket = int(cached['open_time'][-1]) + target_ms
+                if first_open <= next_bucket <= last_open:
+                    # 增量：只聚合快取之後的基礎 K 棒
+                    self.stats['incremental'] += 1
+                    start = int(np.searchsorted(base['open_time'], next_bucket, side='left'))
+                    fresh = aggregate(_take(base, slice(start, None)), target_ms)
+                    closed = _concat(cached, _take(fresh, slice(None, -1)))
+                    return self._store_and_build(key, closed, _take(fresh, slice(-1, None)), limit)
+
+            self.stats['rebuilds'] += 1
+            bars = aggregate(base, target_ms)
+            # 基礎數據從桶的中間開始時，第一個桶的 open / volume 不完整，捨棄
+            if len(bars['open_time']) > 1 and first_open != int(bars['open_time'][0]):
+                bars = _take(bars, slice(1, None))
+            closed = _take(bars, slice(None, -1))
+            return self._store_and_build(key, closed, _take(bars, slice(-1, None)), limit)
+
+    def _store_and_build(self, key, closed, live, limit) -> pd.DataFrame:
+        if len(closed['open_time']) > self.max_bars:
+            closed = _take(closed, slice(-self.max_bars, None))
+        self._closed[key] = closed
+
+        bars = _concat(closed, live)
+        if limit is not None:
+            bars = _take(bars, slice(-limit, None))
+        return arrays_to_frame(bars)
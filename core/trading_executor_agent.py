@@ -35,10 +35,11 @@
 import json
 import os
 from typing import Dict, Optional, List
-import requests
 import time
 import re
 
+from core.llm_http_client import chat_content, get_provider_client
+
 # 導入強健 JSON 解析器
 try:
     from core.json_parser_robust import parse_executor_review
@@ -62,6 +63,8 @@ class TradingExecutorAgent:
         
         self.execution_history: List[Dict] = []
         self.last_raw_response = None  # 儲存最後一次 AI 完整回應
+        self.response_cache = None  # LLMResponseCache (由 ArbitratorConsensusAgent 設定)
+        self.llm_replay = None  # LLMReplay 錄製 / 重播 (由 ArbitratorConsensusAgent 設定)
         
         # 使用 Gemini Flash 作為審核員 (快速且穩定)
         self.executor_model = self._init_executor_model()
@@ -97,11 +100,14 @@ class TradingExecutorAgent:
         market_data: Dict,
         account_info: Dict,
         position_info: Optional[Dict] = None,
-        multi_timeframe_data: Optional[Dict] = None
+        multi_timeframe_data: Optional[Dict] = None,
+        cache_state: Optional[str] = None
     ) -> Dict:
         """
         審核仲裁者的決策，決定是否執行
         
+        cache_state: 快取用的正規化狀態 (LLMResponseCache.bar_state)，None 時以 user prompt 為鍵
+        
         Returns:
             {
                 "execution_decision": "EXECUTE" | "REJECT" | "REDUCE_SIZE",
@@ -290,10 +296,35 @@ class TradingExecutorAgent:
         try:
             print("\n[AI EXECUTOR] 正在審核...")
             
-            if self.executor_model['provider'] == 'google':
-                result = self._call_gemini(system_prompt, user_prompt)
+            replay_args = (self.executor_model['provider'], self.executor_model['model'], system_prompt, user_prompt)
+            cache_key = user_prompt
+            if cache_state:
+                reviewed = ('action', 'confidence', 'leverage', 'position_size_usdt', 'entry_price',
+                            'stop_loss', 'take_profit', 'is_counter_trend')
+                cache_key = json.dumps({'state': cache_state, 'decision': {k: arbitrator_decision.get(k) for k in reviewed}},
+                                       ensure_ascii=False, sort_keys=True, default=str)
+            cache_args = replay_args[:3] + (cache_key,)
+            
+            def call_model():
+                result = None
+                if self.response_cache:
+                    result = self.response_cache.get(*cache_args)
+                    if result:
+                        print("[CACHE] 同一根 K 棒的相同審核請求，使用快取回應")
+                
+                if result is None:
+                    if self.executor_model['provider'] == 'google':
+                        result = self._call_gemini(system_prompt, user_prompt)
+                    else:
+                        result = self._call_openai_compatible(system_prompt, user_prompt)
+                    if self.response_cache and result['success']:
+                        self.response_cache.put(*cache_args, result)
+                return result
+            
+            if self.llm_replay:
+                result = self.llm_replay.complete(*replay_args, call_model)
             else:
-                result = self._call_openai_compatible(system_prompt, user_prompt)
+                result = call_model()
             
             if result['success']:
                 raw_content = result['content']
@@ -452,33 +483,21 @@ class TradingExecutorAgent:
     
     def _call_openai_compatible(self, system_prompt: str, user_prompt: str) -> Dict:
         try:
-            headers = {
-                'Authorization': f'Bearer {self.executor_model["api_key"]}',
-                'Content-Type': 'application/json'
-            }
-            
-            payload = {
-                'model': self.executor_model['model'],
-                'messages': [
+            start_time = time.time()
+            result = get_provider_client().chat_completion(
+                self.executor_model['base_url'],
+                self.executor_model['api_key'],
+                self.executor_model['model'],
+                [
                     {'role': 'system', 'content': system_prompt},
                     {'role': 'user', 'content': user_prompt}
                 ],
-                'temperature': 0.1,
-                'max_tokens': 4000  # 增加到 4000
-            }
-            
-            start_time = time.time()
-            response = requests.post(
-                f"{self.executor_model['base_url']}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=30
+                timeout=30,
+                temperature=0.1,
+                max_tokens=4000  # 增加到 4000
             )
             elapsed = time.time() - start_time
-            
-            response.raise_for_status()
-            result = response.json()
-            content = result['choices'][0]['message']['content']
+            content = chat_content(result)
             
             return {'success': True, 'content': content, 'elapsed': elapsed}
         except Exception as e:
@@ -0,0 +1,162 @@
+"""
+向量化三重障礙標籤 (Triple Barrier Method)
+V3 / V12 / V8 共用，取代逐根 K 棒的 Python 迴圈
+
+- 以 sliding_window_view 建立未來 horizon 根 K 棒的視窗 (不複製數據)
+- 每一列找出第一根碰到上軌 / 下軌的 K 棒，得到標籤與首次觸碰位置
+- 分塊處理，記憶體用量與數據長度無關
+- 障礙價格由呼叫端決定: vol_barriers (波動率比例) / atr_barriers (ATR 倍數)
+
+標籤: 1 = 先碰上軌, -1 = 先碰下軌, 0 = 時間障礙 (horizon 內都沒碰到)
+首次觸碰位置: 1..horizon (距離進場 K 棒的根數)，0 表示沒碰到
+"""
+import warnings
+from typing import Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# 同一根 K 棒同時碰到上下軌時的處理方式
+TIE_POLICIES = ('stop', 'profit', 'neutral')
+
+# 每塊處理的列數 (chunk_rows * horizon 個布林值)
+DEFAULT_CHUNK_ROWS = 65536
+
+
+def vol_barriers(
+    close: np.ndarray,
+    vol: np.ndarray,
+    pt_mult: float,
+    sl_mult: float,
+    min_return: float = 0.0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    波動率比例障礙: close * (1 ± max(mult * vol, min_return))
+    與 V3LabelGenerator 原本的計算順序相同
+    """
+    close = np.asarray(close, dtype=np.float64)
+    vol = np.asarray(vol, dtype=np.float64)
+    pt_target = np.maximum(pt_mult * vol, min_return)
+    sl_target = np.maximum(sl_mult * vol, min_return)
+    # np.maximum 會傳遞 NaN，NaN 障礙永遠不會被碰到
+    return close * (1 + pt_target), close * (1 - sl_target)
+
+
+def atr_barriers(
+    close: np.ndarray,
+    atr: np.ndarray,
+    tp_mult: float,
+    sl_mult: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """ATR 倍數障礙: close ± atr * mult (與 V12 原本的計算順序相同)"""
+    close = np.asarray(close, dtype=np.float64)
+    atr = np.asarray(atr, dtype=np.float64)
+    return close + atr * tp_mult, close - atr * sl_mult
+
+
+def _first_touch(hits: np.ndarray) -> np.ndarray:
+    """每列第一個 True 的位置 (1 起算)，沒有 True 時為 0"""
+    first = hits.argmax(axis=1) + 1
+    first[~hits.any(axis=1)] = 0
+    return first
+
+
+def triple_barrier_labels(
+    high: np.ndarray,
+    low: np.ndarray,
+    upper: np.ndarray,
+    lower: np.ndarray,
+    horizon: int,
+    tie: str = 'stop',
+    valid: Optional[np.ndarray] = None,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    計算三重障礙標籤
+
+    第 i 列檢查 i+1 .. i+horizon 根 K 棒: high >= upper[i] 為碰到上軌，
+    low <= lower[i] 為碰到下軌。最後 horizon 列的未來數據不足，標籤為 0。
+
+    Args:
+        high, low: 每根 K 棒的最高 / 最低價
+        upper, lower: 每列的上軌 / 下軌價格 (NaN 表示不會碰到)
+        horizon: 時間障礙 (往後看的 K 棒數)
+        tie: 同一根 K 棒同時碰到上下軌時 'stop' = -1 (視為止損),
+             'profit' = 1, 'neutral' = 0
+        valid: 布林遮罩，False 的列直接記為 0
+        chunk_rows: 每塊處理的列數
+
+    Returns:
+        (labels int8, touch int32): 標籤與首次觸碰位置 (0 = 沒碰到)
+    """
+    if tie not in TIE_POLICIES:
+        raise ValueError(f"tie 必須是 {TIE_POLICIES} 之一: {tie}")
+    if horizon < 1:
+        raise ValueError(f"horizon 必須 >= 1: {horizon}")
+
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    upper = np.asarray(upper, dtype=np.float64)
+    lower = np.asarray(lower, dtype=np.float64)
+
+    n_rows = len(high)
+    labels = np.zeros(n_rows, dtype=np.int8)
+    touch = np.zeros(n_rows, dtype=np.int32)
+    n_events = n_rows - horizon
+    if n_events <= 0:
+        return labels, touch
+
+    # 第 i 個視窗 = high[i+1 : i+1+horizon]
+    high_windows = sliding_window_view(high[1:], horizon)
+    low_windows = sliding_window_view(low[1:], horizon)
+
+    for start in range(0, n_events, chunk_rows):
+        stop = min(start + chunk_rows, n_events)
+        first_up = _first_touch(high_windows[start:stop] >= upper[start:stop, None])
+        first_dn = _first_touch(low_windows[start:stop] <= lower[start:stop, None])
+
+        up_hit = first_up > 0
+        dn_hit = first_dn > 0
+        up_first = up_hit & (~dn_hit | (first_up < first_dn))
+        dn_first = dn_hit & (~up_hit | (first_dn < first_up))
+        same_bar = up_hit & dn_hit & (first_up == first_dn)
+
+        chunk = labels[start:stop]
+        chunk[up_first] = 1
+        chunk[dn_first] = -1
+        if tie == 'stop':
+            chunk[same_bar] = -1
+        elif tie == 'profit':
+            chunk[same_bar] = 1
+
+        touch[start:stop] = np.where(up_first | same_bar, first_up, np.where(dn_first, first_dn, 0))
+
+    if valid is not None:
+        invalid = ~np.asarray(valid, dtype=bool)
+        labels[invalid] = 0
+        touch[invalid] = 0
+
+    return labels, touch
+
+
+def forward_extremes(high: np.ndarray, low: np.ndarray, horizon: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    未來 horizon 根 K 棒 (i+1 .. i+horizon) 的最高價與最低價
+
+    尾端不足 horizon 根時使用剩餘的 K 棒，最後一列為 NaN
+    (第 horizon-1 列起與 shift(-horizon).rolling(horizon, min_periods=1) 的結果相同，
+    rolling 在開頭的 horizon-1 列視窗會被截斷)
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    pad = np.full(horizon, np.nan)
+
+    high_windows = sliding_window_view(np.concatenate([high[1:], pad]), horizon)
+    low_windows = sliding_window_view(np.concatenate([low[1:], pad]), horizon)
+
+    with warnings.catch_warnings():
+        # 最後一列全是 NaN (All-NaN slice)
+        warnings.simplefilter('ignore', RuntimeWarning)
+        future_high = np.nanmax(high_windows, axis=1)
+        future_low = np.nanmin(low_windows, axis=1)
+    return future_high, future_low
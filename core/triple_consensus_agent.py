@@ -9,9 +9,10 @@ import json
 import time
 import os
 from typing import Dict, Optional, List, Tuple
-import requests
 from datetime import datetime
 
+from core.llm_http_client import chat_content, get_provider_client
+
 
 class ModelInterface:
     def __init__(self, name: str, api_key: str, base_url: str, model: str, weight: float = 1.0):
@@ -27,34 +28,22 @@ class ModelInterface:
 
 class OpenAICompatibleModel(ModelInterface):
     def analyze(self, system_prompt: str, user_prompt: str) -> Dict:
-        headers = {
-            'Authorization': f'Bearer {self.api_key}',
-            'Content-Type': 'application/json'
-        }
-        
-        payload = {
-            'model': self.model,
-            'messages': [
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': user_prompt}
-            ],
-            'temperature': 0.2,
-            'max_tokens': 3000
-        }
-        
         try:
             start_time = time.time()
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=45
+            result = get_provider_client().chat_completion(
+                self.base_url,
+                self.api_key,
+                self.model,
+                [
+                    {'role': 'system', 'content': system_prompt},
+                    {'role': 'user', 'content': user_prompt}
+                ],
+                timeout=45,
+                temperature=0.2,
+                max_tokens=3000
             )
             elapsed = time.time() - start_time
-            
-            response.raise_for_status()
-            result = response.json()
-            content = result['choices'][0]['message']['content']
+            content = chat_content(result)
             
             return {
                 'success': True,
@@ -0,0 +1,138 @@
+"""
+滾動前進 (walk-forward) 驗證
+把一次 80/20 切分換成多個連續的 訓練 -> 測試 視窗，每個視窗重新訓練，只在樣本外評估
+
+- 特徵與標籤只計算一次 (整段數據)，各個 fold 只是切片
+- fold 之間互相獨立，分散到多個行程平行訓練；數據透過 SharedFrame 零複製共用
+- 訓練視窗尾端 purge_bars 根K線會被丟掉，避免標籤往前看進測試視窗 (look-ahead 洩漏)
+- stitch() 把各個 fold 的樣本外預測接回原本的索引，用於一次性回測出連續的樣本外權益曲線
+
+fit_predict(train_df, test_df) -> dict
+    在 train_df 上訓練，返回 test_df 上的預測 (長度等於 len(test_df) 的陣列) 與評估指標；
+    必須可被工作行程 pickle (模組層級函數或回測器的方法)，且不可修改傳入的 DataFrame
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from core.param_sweep import SharedFrame
+
+
+class Fold(NamedTuple):
+    index: int
+    train_start: int
+    train_end: int   # 不含
+    test_start: int
+    test_end: int    # 不含
+
+
+# 工作行程的狀態 (由 _init_worker 設定)
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(fit_predict: Callable, frame_spec: Dict):
+    shm, frame = SharedFrame.attach(frame_spec)
+    _worker['fit_predict'] = fit_predict
+    _worker['handle'] = shm
+    _worker['frame'] = frame
+
+
+def _run_fold(fold: Fold) -> Dict:
+    frame = _worker['frame']
+    train_df = frame.iloc[fold.train_start:fold.train_end]
+    test_df = frame.iloc[fold.test_start:fold.test_end]
+    result = dict(_worker['fit_predict'](train_df, test_df))
+    result['fold'] = fold
+    return result
+
+
+class WalkForward:
+    """
+    滾動 / 錨定視窗
+
+    用法:
+        wf = WalkForward(train_bars=96 * 90, test_bars=96 * 30, purge_bars=36)
+        results = wf.run(dataset, backtester.fit_predict_fold)
+        probs = wf.stitch(len(dataset), results, 'score')
+    """
+
+    def __init__(self, train_bars: int, test_bars: int, step_bars: Optional[int] = None,
+                 anchored: bool = False, purge_bars: int = 0, max_workers: Optional[int] = None):
+        """
+        Args:
+            train_bars: 訓練視窗長度 (錨定模式下為第一個視窗的長度)
+            test_bars: 測試視窗長度
+            step_bars: 每個 fold 往前移動的K線數，預設等於 test_bars (測試視窗首尾相接)
+            anchored: True 時訓練視窗起點固定在 0，逐步變長
+            purge_bars: 訓練視窗尾端丟掉的K線數 (通常是標籤往前看的K線數)
+            max_workers: 工作行程數，None 表示 CPU 核心數，<= 1 表示在目前行程執行
+        """
+        if train_bars <= purge_bars or test_bars <= 0:
+            raise ValueError("train_bars 必須大於 purge_bars，test_bars 必須大於 0")
+        self.train_bars = train_bars
+        self.test_bars = test_bars
+        self.step_bars = step_bars or test_bars
+        self.anchored = anchored
+        self.purge_bars = purge_bars
+        self.max_workers = os.cpu_count() if max_workers is None else max_workers
+
+    def folds(self, n_rows: int) -> List[Fold]:
+        """切出所有 fold (最後一個測試視窗可能不足 test_bars)"""
+        folds = []
+        test_start = self.train_bars
+        while test_start < n_rows:
+            train_start = 0 if self.anchored else test_start - self.train_bars
+            folds.append(Fold(
+                index=len(folds),
+                train_start=train_start,
+                train_end=test_start - self.purge_bars,
+                test_start=test_start,
+                test_end=min(test_start + self.test_bars, n_rows)
+            ))
+            test_start += self.step_bars
+        return folds
+
+    def run(self, dataset: pd.DataFrame, fit_predict: Callable) -> List[Dict]:
+        """
+        每個 fold 訓練一次，返回依 fold 順序排列的結果 (每筆附上 'fold')
+
+        dataset 應該只包含數值欄位 (特徵與標籤)，object 欄位不會傳到工作行程
+        """
+        folds = self.folds(len(dataset))
+        if not folds:
+            raise ValueError(f"數據不足: {len(dataset)} 根K線，至少需要 {self.train_bars + 1} 根")
+
+        if self.max_workers <= 1 or len(folds) == 1:
+            _worker.update(fit_predict=fit_predict, frame=dataset)
+            return [_run_fold(fold) for fold in folds]
+
+        shared = SharedFrame(dataset)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=min(self.max_workers, len(folds)),
+                initializer=_init_worker,
+                initargs=(fit_predict, shared.spec)
+            ) as pool:
+                futures = [pool.submit(_run_fold, fold) for fold in folds]
+                results = [future.result() for future in as_completed(futures)]
+        finally:
+            shared.close()
+        return sorted(results, key=lambda result: result['fold'].index)
+
+    @staticmethod
+    def stitch(n_rows: int, results: List[Dict], key: str, fill: float = np.nan) -> np.ndarray:
+        """把各個 fold 的樣本外預測接回原本的索引 (不在任何測試視窗的位置為 fill)"""
+        stitched = np.full(n_rows, fill, dtype=float)
+        for result in results:
+            fold = result['fold']
+            stitched[fold.test_start:fold.test_end] = result[key]
+        return stitched
+
+    @staticmethod
+    def test_rows(results: List[Dict]) -> np.ndarray:
+        """所有測試視窗涵蓋的列 (依時間排序，重疊的部分只算一次)"""
+        rows = [np.arange(r['fold'].test_start, r['fold'].test_end) for r in results]
+        return np.unique(np.concatenate(rows)) if rows else np.array([], dtype=int)
@@ -2,11 +2,20 @@
 WebSocket 事件處理模塊
 負責 Bybit 自動交易的 WebSocket 事件
 修復: 所有 prepare_market_features 調用都添加 symbol 參數
+多幣種: 由 LiveScheduler 在每根 15m K線收盤時同時分析所有幣種
 """
+import threading
 import time
 from datetime import datetime
-from strategies.v13.market_features import prepare_market_features
+from strategies.v13.market_features import extract_market_features, stack_indicator_values
+from core.live_scheduler import LiveScheduler
 from core.realtime_data_loader import RealtimeDataLoader
+from core.streaming_indicators import StreamingIndicatorRegistry
+
+INDICATOR_STATE_DIR = 'data/indicator_states'
+TRADING_TIMEFRAME = '15m'
+DEFAULT_LLM_CONCURRENCY = 4
+STREAM_EMIT_INTERVAL = 0.25
 
 
 def register_websocket_handlers(socketio, app_state):
@@ -40,105 +49,219 @@ def register_websocket_handlers(socketio, app_state):
     @socketio.on('stop_bybit_trading')
     def handle_stop_bybit_trading():
         app_state['bybit_trading'] = False
+        scheduler = app_state.get('bybit_scheduler')
+        if scheduler is not None:
+            scheduler.stop()
         socketio.emit('bybit_trading_stopped', {})
+    
+    @socketio.on('get_bybit_schedule')
+    def handle_get_bybit_schedule():
+        scheduler = app_state.get('bybit_scheduler')
+        socketio.emit('bybit_schedule', {
+            'symbols': scheduler.registry.summary() if scheduler is not None else []
+        })
+
+
+def _watchlist(config) -> list:
+    """要交易的幣種: symbols (列表或逗號分隔字串)，沒有時使用 symbol"""
+    symbols = config.get('symbols') or []
+    if isinstance(symbols, str):
+        symbols = symbols.split(',')
+    symbols = [s.strip().upper() for s in symbols if s and s.strip()]
+    return symbols or [config.get('symbol', 'BTCUSDT')]
 
 
 def bybit_trading_worker(socketio, app_state, config):
     """
     Bybit 自動交易工作線程
+    等待 Bybit 連接後，由 LiveScheduler 在每根K線收盤時同時分析所有幣種 (阻塞直到停止)
     修復: 所有 prepare_market_features 調用都添加 symbol 參數
     """
+    symbols = _watchlist(config)
+    
     print("\n" + "=" * 50)
-    print("Bybit 自動交易已啟動")
+    print(f"Bybit 自動交易已啟動: {', '.join(symbols)}")
     print("=" * 50)
     
-    while app_state['bybit_trading']:
+    while app_state['bybit_trading'] and not app_state['bybit_trader']:
+        print("等待 Bybit 連接...")
+        time.sleep(5)
+    
+    if app_state['bybit_trading']:
+        # 共用物件在排程開始前建立，避免多個執行緒同時建立
+        if not app_state['data_loader']:
+            app_state['data_loader'] = RealtimeDataLoader()
+        if app_state.get('indicator_states') is None:
+            app_state['indicator_states'] = StreamingIndicatorRegistry(
+                history_size=20, checkpoint_dir=INDICATOR_STATE_DIR
+            )
+        
+        max_llm_concurrency = int(config.get('max_llm_concurrency', DEFAULT_LLM_CONCURRENCY))
+        # 所有幣種共用同一個仲裁者，它的執行緒池要容納 max_llm_concurrency 個幣種同時分析
+        if app_state['use_arbitrator_consensus'] and app_state.get('HAS_ARBITRATOR'):
+            agent = app_state['arbitrator_agent']
+            if not agent or getattr(agent, 'max_concurrency', 0) < max_llm_concurrency:
+                from core.arbitrator_consensus_agent import ArbitratorConsensusAgent
+                app_state['arbitrator_agent'] = ArbitratorConsensusAgent(max_concurrency=max_llm_concurrency)
+        
+        scheduler = LiveScheduler(
+            symbols,
+            lambda state, candle_close: run_symbol_cycle(socketio, app_state, scheduler, state),
+            timeframe=TRADING_TIMEFRAME,
+            max_llm_concurrency=max_llm_concurrency
+        )
+        app_state['bybit_scheduler'] = scheduler
         try:
-            if not app_state['bybit_trader']:
-                print("等待 Bybit 連接...")
-                time.sleep(5)
-                continue
-            
-            trader = app_state['bybit_trader']
-            symbol = config.get('symbol', 'BTCUSDT')
-            timeframe = '15m'
-            
-            print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 執行 AI 分析...")
-            
-            if not app_state['data_loader']:
-                app_state['data_loader'] = RealtimeDataLoader()
-            
-            df = app_state['data_loader'].load_data(symbol, timeframe)
-            
-            if df is not None and len(df) > 200:
-                current_candle = df.iloc[-1]
-                # 修復: 添加 symbol 參數
-                market_data = prepare_market_features(current_candle, df, symbol=symbol)
-                
-                from routes.analysis_routes import _prepare_historical_candles, _get_ai_decision
-                historical_candles = _prepare_historical_candles(df, symbol=symbol, num_candles=20)
-                account_info = trader.get_account_info()
-                position_info = trader.get_position()
-                
-                # 獲取多時間框架數據
-                multi_timeframe_data = None
-                if app_state.get('HAS_MULTI_TIMEFRAME') and app_state['mt_analyzer']:
-                    try:
-                        multi_timeframe_data = app_state['mt_analyzer'].prepare_multi_timeframe_data(
-                            symbol=symbol,
-                            primary_timeframe=timeframe,
-                            secondary_timeframes=['1h', '4h'],
-                            num_candles=20
-                        )
-                    except Exception as e:
-                        print(f"[WARNING] 多時間框架分析失敗: {e}")
-                
-                decision = _get_ai_decision(
-                    app_state=app_state,
-                    market_data=market_data,
-                    account_info=account_info,
-                    position_info=position_info,
-                    historical_candles=historical_candles,
-                    successful_cases=app_state['cases'][:10],
-                    multi_timeframe_data=multi_timeframe_data
-                )
-                
-                from core.ai_log_utils import save_ai_prediction_log
-                save_ai_prediction_log(
-                    app_state=app_state,
-                    timestamp=current_candle['timestamp'],
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    price=float(current_candle['close']),
-                    decision=decision,
-                    market_data=market_data
-                )
-                
-                result = trader.execute_ai_decision(decision, market_data)
-                
-                print(f"\n交易執行: {result['action']} - {result['message']}")
-                
-                socketio.emit('bybit_trade_executed', {
-                    'action': result['action'],
-                    'message': result['message'],
-                    'balance': trader.get_balance(),
-                    'position': trader.get_position(),
-                    'timestamp': datetime.now().isoformat()
-                })
-                
-                socketio.emit('ai_log_updated', {
-                    'logs': app_state['ai_prediction_logs']
-                })
-            
-            print(f"\n等待下次執行 (15 分鐘後)...")
-            time.sleep(900)
-            
-        except Exception as e:
-            print(f"\nBybit trading error: {e}")
-            import traceback
-            traceback.print_exc()
-            time.sleep(60)
+            scheduler.run_forever()
+        finally:
+            scheduler.stop()
+            if app_state.get('bybit_scheduler') is scheduler:
+                app_state['bybit_scheduler'] = None
     
     print("\n" + "=" * 50)
     print("Bybit 自動交易已停止")
     print("=" * 50)
+
+
+def make_stream_emitter(socketio, symbol: str, interval: float = STREAM_EMIT_INTERVAL):
+    """
+    把仲裁者的串流事件推送到前端 ('ai_stream')
+    
+    decision / done 立即送出；delta 文字依模型累積，每 interval 秒最多送一次
+    """
+    buffers = {}
+    last_emit = {}
+    lock = threading.Lock()
+    
+    def flush(label):
+        text = buffers.pop(label, '')
+        last_emit[label] = time.monotonic()
+        if text:
+            socketio.emit('ai_stream', {'symbol': symbol, 'event': 'delta', 'label': label, 'text': text})
+    
+    def on_stream(event, payload):
+        label = payload.get('label', '')
+        with lock:
+            if event == 'delta':
+                buffers[label] = buffers.get(label, '') + payload.get('text', '')
+                if time.monotonic() - last_emit.get(label, 0.0) >= interval:
+                    flush(label)
+                return
+            flush(label)
+            socketio.emit('ai_stream', {'symbol': symbol, 'event': event, **payload})
+    
+    return on_stream
+
+
+def acquire_llm_slot(slots):
+    """
+    取得一個 LLM 同時呼叫名額，返回只會釋放一次的 release
+    
+    提早完成的決策返回後模型仍在背景串流，名額要等 on_settled 才釋放
+    """
+    slots.acquire()
+    released = threading.Lock()
+    
+    def release():
+        if released.acquire(blocking=False):
+            slots.release()
+    
+    return release
+
+
+def run_symbol_cycle(socketio, app_state, scheduler, state):
+    """分析並執行單一幣種 (由 LiveScheduler 在K線收盤時呼叫)"""
+    symbol = state.symbol
+    timeframe = state.timeframe
+    
+    trader = state.context.get('trader')
+    if trader is None:
+        trader = app_state['bybit_trader'].for_symbol(symbol)
+        state.context['trader'] = trader
+    
+    print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {symbol} 執行 AI 分析...")
+    
+    df = app_state['data_loader'].load_data(symbol, timeframe)
+    
+    if df is None or len(df) <= 200:
+        return {'action': 'SKIP', 'message': '數據不足'}
+    
+    current_candle = df.iloc[-1]
+    
+    # 增量指標：只處理新收盤的 K 棒，未收盤的最後一根以 preview 計算
+    registry = app_state['indicator_states']
+    indicator_state = registry.sync(symbol, timeframe, df.iloc[:-1])
+    registry.save(symbol, timeframe)
+    
+    recent_values = list(indicator_state.history)[-19:] + [indicator_state.preview(current_candle)]
+    indicators = stack_indicator_values(recent_values)
+    recent_df = df.iloc[-len(recent_values):]
+    market_data = extract_market_features(indicators, current_candle, len(recent_df) - 1, symbol=symbol)
+    
+    from routes.analysis_routes import _prepare_historical_candles, _get_ai_decision
+    historical_candles = _prepare_historical_candles(
+        recent_df, symbol=symbol, num_candles=20, indicators=indicators
+    )
+    account_info = trader.get_account_info()
+    position_info = trader.get_position()
+    
+    # 獲取多時間框架數據
+    multi_timeframe_data = None
+    if app_state.get('HAS_MULTI_TIMEFRAME') and app_state['mt_analyzer']:
+        try:
+            multi_timeframe_data = app_state['mt_analyzer'].prepare_multi_timeframe_data(
+                symbol=symbol,
+                primary_timeframe=timeframe,
+                secondary_timeframes=['1h', '4h'],
+                num_candles=20
+            )
+        except Exception as e:
+            print(f"[WARNING] {symbol} 多時間框架分析失敗: {e}")
+    
+    # 所有幣種合計的 LLM 同時呼叫數受 llm_slots 限制 (包括提早完成後仍在背景串流的呼叫)
+    release_slot = acquire_llm_slot(scheduler.llm_slots)
+    try:
+        decision = _get_ai_decision(
+            app_state=app_state,
+            market_data=market_data,
+            account_info=account_info,
+            position_info=position_info,
+            historical_candles=historical_candles,
+            successful_cases=app_state['cases'][:10],
+            multi_timeframe_data=multi_timeframe_data,
+            on_stream=make_stream_emitter(socketio, symbol),
+            on_settled=release_slot
+        )
+    except BaseException:
+        release_slot()
+        raise
+    
+    from core.ai_log_utils import save_ai_prediction_log
+    save_ai_prediction_log(
+        app_state=app_state,
+        timestamp=current_candle['timestamp'],
+        symbol=symbol,
+        timeframe=timeframe,
+        price=float(current_candle['close']),
+        decision=decision,
+        market_data=market_data
+    )
+    
+    result = trader.execute_ai_decision(decision, market_data)
+    
+    print(f"\n{symbol} 交易執行: {result['action']} - {result['message']}")
+    
+    socketio.emit('bybit_trade_executed', {
+        'symbol': symbol,
+        'action': result['action'],
+        'message': result['message'],
+        'balance': trader.get_balance(),
+        'position': trader.get_position(),
+        'timestamp': datetime.now().isoformat()
+    })
+    
+    socketio.emit('ai_log_updated', {
+        'logs': app_state['ai_prediction_logs']
+    })
+    
+    return {'action': result['action'], 'message': result['message']}
@@ -5,7 +5,10 @@
 """
 from flask import jsonify, request
 from datetime import datetime
-from strategies.v13.market_features import prepare_market_features
+from strategies.v13.market_features import (
+    calculate_market_indicators,
+    extract_market_features
+)
 from strategies.v13.config import V13Config
 from strategies.v13.backtester import V13Backtester
 from core.realtime_data_loader import RealtimeDataLoader
@@ -13,26 +16,35 @@ import pandas as pd
 from typing import Dict, List, Optional
 
 
-def _prepare_historical_candles(df: pd.DataFrame, symbol: str, num_candles: int = 20) -> List[Dict]:
+def _prepare_historical_candles(
+    df: pd.DataFrame,
+    symbol: str,
+    num_candles: int = 20,
+    indicators: Optional[Dict] = None
+) -> List[Dict]:
     """
     準備歷史 K 棒數據 (包含完整的40種技術指標)
     讓 AI 能看到每根 K 棒的完整市場狀態
     修復: 添加 symbol 參數
+    優化: 指標只對完整 df 計算一次，每根 K 棒按索引讀取
+    
+    Args:
+        indicators: 已計算好的 calculate_market_indicators(df)，可由呼叫端共用
     """
     if len(df) < num_candles:
         num_candles = len(df)
     
+    if indicators is None:
+        indicators = calculate_market_indicators(df)
+    
     result = []
     
     # 從倒數 num_candles 根開始處理
-    for i in range(-num_candles, 0):
-        # 對每一根 K 棒使用 prepare_market_features 計算完整指標
-        # 使用直至當前 K 棒的資料
-        df_slice = df.iloc[:len(df) + i + 1].copy()
+    for i in range(len(df) - num_candles, len(df)):
         row = df.iloc[i]
         
         # 修復: 添加 symbol 參數
-        features = prepare_market_features(row, df_slice, symbol=symbol)
+        features = extract_market_features(indicators, row, i, symbol=symbol)
         
         # 加入時間戳和基本 OHLCV
         candle_info = {
@@ -59,9 +71,16 @@ def _get_ai_decision(
     position_info: Optional[Dict],
     historical_candles: Optional[List[Dict]] = None,
     successful_cases: Optional[List[Dict]] = None,
-    multi_timeframe_data: Optional[Dict] = None
+    multi_timeframe_data: Optional[Dict] = None,
+    on_stream=None,
+    on_settled=None
 ):
-    """獲取 AI 決策（單模型/雙模型/三階段仲裁）"""
+    """
+    獲取 AI 決策（單模型/雙模型/三階段仲裁）
+    
+    on_stream(event, payload): 三階段仲裁的串流事件 (提早決策 / reasoning 文字)
+    on_settled(): 所有 LLM 呼叫都結束時呼叫一次 (三階段仲裁提早完成時，在背景串流結束後才呼叫)
+    """
     
     # 優先檢查三階段仲裁（雙模型 + 仲裁者 + 執行審核）
     if app_state['use_arbitrator_consensus'] and app_state.get('HAS_ARBITRATOR'):
@@ -76,7 +95,9 @@ def _get_ai_decision(
             position_info=position_info,
             historical_candles=historical_candles,
             successful_cases=successful_cases,
-            multi_timeframe_data=multi_timeframe_data
+            multi_timeframe_data=multi_timeframe_data,
+            on_stream=on_stream,
+            on_settled=on_settled
         )
         result['model_type'] = 'arbitrator'
         return result
@@ -88,11 +109,15 @@ def _get_ai_decision(
             app_state['dual_agent'] = DualModelDecisionAgent()
         
         print("[DECISION] Using Dual Model")
-        decision = app_state['dual_agent'].analyze_with_dual_models(
-            market_data=market_data,
-            account_info=account_info,
-            position_info=position_info
-        )
+        try:
+            decision = app_state['dual_agent'].analyze_with_dual_models(
+                market_data=market_data,
+                account_info=account_info,
+                position_info=position_info
+            )
+        finally:
+            if on_settled:
+                on_settled()
         decision['model_type'] = 'dual'
         return decision
     
@@ -103,11 +128,15 @@ def _get_ai_decision(
             app_state['ai_agent'] = PositionAwareDeepSeekAgent()
         
         print("[DECISION] Using Single Model")
-        decision = app_state['ai_agent'].analyze_with_position(
-            market_data=market_data,
-            account_info=account_info,
-            position_info=position_info
-        )
+        try:
+            decision = app_state['ai_agent'].analyze_with_position(
+                market_data=market_data,
+                account_info=account_info,
+                position_info=position_info
+            )
+        finally:
+            if on_settled:
+                on_settled()
         decision['model_type'] = 'single'
         return decision
 
@@ -137,9 +166,12 @@ def register_analysis_routes(app, app_state):
             if df is None or len(df) < 200:
                 return jsonify({'error': '數據不足，至少需要 200 根 K 線'}), 400
             
-            # 修復: 添加 symbol 參數
-            latest_data = prepare_market_features(df.iloc[-1], df, symbol=symbol)
-            historical_candles = _prepare_historical_candles(df, symbol=symbol, num_candles=20)
+            # 指標只計算一次，當前與歷史 K 棒共用
+            indicators = calculate_market_indicators(df)
+            latest_data = extract_market_features(indicators, df.iloc[-1], len(df) - 1, symbol=symbol)
+            historical_candles = _prepare_historical_candles(
+                df, symbol=symbol, num_candles=20, indicators=indicators
+            )
             
             # 獲取多時間框架數據
             multi_timeframe_data = None
@@ -279,9 +311,12 @@ def register_analysis_routes(app, app_state):
                 return jsonify({'error': '數據不足'}), 400
             
             current_candle = df.iloc[-1]
-            # 修復: 添加 symbol 參數
-            market_data = prepare_market_features(current_candle, df, symbol=symbol)
-            historical_candles = _prepare_historical_candles(df, symbol=symbol, num_candles=20)
+            # 指標只計算一次，當前與歷史 K 棒共用
+            indicators = calculate_market_indicators(df)
+            market_data = extract_market_features(indicators, current_candle, len(df) - 1, symbol=symbol)
+            historical_candles = _prepare_historical_candles(
+                df, symbol=symbol, num_candles=20, indicators=indicators
+            )
             
             # 獲取多時間框架數據
             multi_timeframe_data = None
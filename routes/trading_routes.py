@@ -24,12 +24,16 @@ def register_trading_routes(app, app_state):
                 api_key=api_key,
                 api_secret=api_secret,
                 demo_mode='demo',
-                symbol=symbol
+                symbol=symbol,
+                use_websocket=True
             )
             
             balance = trader.get_balance()
             position = trader.get_position()
             
+            # 重新連線時關閉舊的 WebSocket 推送
+            if app_state['bybit_trader'] is not None:
+                app_state['bybit_trader'].close()
             app_state['bybit_trader'] = trader
             
             return jsonify({
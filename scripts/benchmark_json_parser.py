@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+模型輸出解析器微基準測試
+
+比較:
+- 舊版: 清理 -> json.loads -> 切出候選物件 -> 修復後 json.loads -> 正則提取 (多次掃描 + 例外控制流程)
+- 新版: DecisionParser 單次掃描的狀態機
+
+語料: tests/test_json_parser.py 的 7 個案例，加上每個案例的變形
+(前置 <think> 區塊、尾隨逗號與註釋、外層包一層物件、截斷)
+串流: 每 8 個字元餵入一次；舊版只能每次重新解析整個緩衝區
+
+使用方法:
+    python scripts/benchmark_json_parser.py [--repeat 200] [--chunk 8]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from core.json_parser_robust import DecisionParser, parse_executor_review, parse_trading_decision
+
+
+class LegacyRobustJSONParser:
+    """舊版實作 (僅供比較)"""
+
+    @staticmethod
+    def clean_json_string(text):
+        text = re.sub(r'```json\s*', '', text)
+        text = re.sub(r'```\s*', '', text)
+        text = re.sub(r'<[^>]+>', '', text)
+        text = text.replace('True', 'true')
+        text = text.replace('False', 'false')
+        text = text.replace('None', 'null')
+        text = re.sub(r'\bNaN\b', '0', text)
+        text = re.sub(r'\bInfinity\b', '999999', text)
+        text = re.sub(r'-Infinity\b', '-999999', text)
+        return text
+
+    @staticmethod
+    def extract_json_candidates(text):
+        candidates = []
+        depth = 0
+        start = -1
+        for i, char in enumerate(text):
+            if char == '{':
+                if depth == 0:
+                    start = i
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth == 0 and start != -1:
+                    candidates.append(text[start:i + 1])
+                    start = -1
+        return candidates
+
+    @staticmethod
+    def fix_common_issues(json_str):
+        json_str = re.sub(r"'([a-zA-Z_][a-zA-Z0-9_]*)'", r'"\1"', json_str)
+        json_str = re.sub(r',\s*}', '}', json_str)
+        json_str = re.sub(r',\s*]', ']', json_str)
+        json_str = re.sub(r'"\s+"', '","', json_str)
+        json_str = re.sub(r'//.*?\n', '\n', json_str)
+        json_str = re.sub(r'/\*.*?\*/', '', json_str, flags=re.DOTALL)
+        return json_str
+
+    @staticmethod
+    def parse(text, default=None):
+        if not text or not isinstance(text, str):
+            return default or {}
+        text = LegacyRobustJSONParser.clean_json_string(text)
+        try:
+            return json.loads(text)
+        except Exception:
+            pass
+        for candidate in LegacyRobustJSONParser.extract_json_candidates(text):
+            try:
+                return json.loads(candidate)
+            except Exception:
+                pass
+            try:
+                return json.loads(LegacyRobustJSONParser.fix_common_issues(candidate))
+            except Exception:
+                pass
+        return LegacyRobustJSONParser.extract_by_regex(text) or default or {}
+
+    @staticmethod
+    def extract_by_regex(text):
+        result = {}
+        action_match = re.search(r'["\']?action["\']?\s*:\s*["\']?(OPEN_LONG|OPEN_SHORT|CLOSE|HOLD)["\']?', text, re.IGNORECASE)
+        if action_match:
+            result['action'] = action_match.group(1).upper()
+        conf_match = re.search(r'["\']?confidence["\']?\s*:\s*(\d+)', text)
+        if conf_match:
+            result['confidence'] = int(conf_match.group(1))
+        lev_match = re.search(r'["\']?leverage["\']?\s*:\s*(\d+)', text)
+        if lev_match:
+            result['leverage'] = int(lev_match.group(1))
+        for key in ['position_size_usdt', 'entry_price', 'stop_loss', 'take_profit']:
+            match = re.search(rf'["\']?{key}["\']?\s*:\s*([\d.]+)', text)
+            if match:
+                result[key] = float(match.group(1))
+        reasoning_match = re.search(r'["\']?reasoning["\']?\s*:\s*["\']([^"\'}]+)["\']', text)
+        if reasoning_match:
+            result['reasoning'] = reasoning_match.group(1)
+        risk_match = re.search(r'["\']?risk_assessment["\']?\s*:\s*["\']?(LOW|MEDIUM|HIGH)["\']?', text, re.IGNORECASE)
+        if risk_match:
+            result['risk_assessment'] = risk_match.group(1).upper()
+        if 'action' in result and 'confidence' in result:
+            return result
+        return None
+
+
+DECISION = {
+    'action': 'OPEN_LONG', 'confidence': 75, 'leverage': 3, 'position_size_usdt': 1000,
+    'entry_price': 67800, 'stop_loss': 67000, 'take_profit': 69000,
+    'reasoning': 'BTC 失敗線超賣反彈', 'risk_assessment': 'MEDIUM'
+}
+
+# tests/test_json_parser.py 的案例: (名稱, 內容, 預期欄位)
+BASE_CASES = [
+    ('markdown', '```json\n' + json.dumps(DECISION, ensure_ascii=False, indent=2) + '\n```',
+     {'action': 'OPEN_LONG', 'confidence': 75}),
+    ('single_quotes', """{
+  'action': 'OPEN_SHORT',
+  'confidence': 68,
+  'leverage': 2,
+  'position_size_usdt': 800,
+  'entry_price': 67900,
+  'stop_loss': 68500,
+  'take_profit': 66800,
+  'reasoning': '阻力位反轉',
+  'risk_assessment': 'LOW'
+}""", {'action': 'OPEN_SHORT', 'confidence': 68}),
+    ('mixed_text', '根據當前市場狀況分析，我建議：\n\n' + json.dumps(
+        {**DECISION, 'action': 'HOLD', 'confidence': 55, 'reasoning': '市場方向不明確，等待更好機會'},
+        ensure_ascii=False, indent=2) + '\n\n以上是我的分析。', {'action': 'HOLD', 'confidence': 55}),
+    ('python_style', json.dumps({**DECISION, 'action': 'CLOSE', 'confidence': 80, 'is_counter_trend': False},
+                                ensure_ascii=False, indent=2).replace('false', 'False'),
+     {'action': 'CLOSE', 'confidence': 80, 'is_counter_trend': False}),
+    ('plain_text', """我認為應該 action: OPEN_LONG, confidence: 72, 因為市場出現反彈訊號。
+leverage: 2, position_size_usdt: 900, entry_price: 67850
+stop_loss: 67200, take_profit: 68800
+reasoning: 技術指標超賣反彈
+risk_assessment: MEDIUM""", {'action': 'OPEN_LONG', 'confidence': 72, 'stop_loss': 67200}),
+    ('executor', """```json
+{
+  "execution_decision": "REDUCE_SIZE",
+  "confidence_adjustment": -10,
+  "position_size_ratio": 0.5,
+  "reasoning": "信心度中等，市場波動較大",
+  "risk_factors": ["波動性高", "信心度不足"]
+}
+```""", {'execution_decision': 'REDUCE_SIZE', 'position_size_ratio': 0.5}),
+    ('broken', '這是一段完全無法解析的文字，沒有任何 JSON 資訊。', {'action': 'HOLD', 'confidence': 30}),
+]
+
+
+def variants(name, content, expected):
+    """每個結構化案例的變形"""
+    yield name, content, expected
+    if '{' not in content:
+        return
+    body = content[content.index('{'):content.rindex('}') + 1]
+    yield f'{name}+think', '<think>先想一下 {"action": "OPEN_SHORT", "confidence": 90}</think>\n' + content, expected
+    yield f'{name}+comments', body.replace('\n}', ',\n  // 結束\n}').replace('{', '{ /* 決策 */', 1), expected
+    yield f'{name}+wrapped', '{"decision": ' + body + ', "version": 2}', expected
+    yield f'{name}+escaped', body.replace('\n}', ',\n  "note": "他說 \\"action\\": \\"CLOSE\\" 不對"\n}'), expected
+    reasoning_at = body.find('reasoning')
+    if reasoning_at > 0:
+        yield f'{name}+truncated', body[:reasoning_at + 20], expected
+
+
+CORPUS = [case for base in BASE_CASES for case in variants(*base)]
+
+
+def parse_new(content, expected):
+    if 'execution_decision' in expected:
+        return parse_executor_review(content)
+    return parse_trading_decision(content)
+
+
+def parse_legacy(content, expected):
+    if 'execution_decision' in expected:
+        return LegacyRobustJSONParser.parse(content, None) or {}
+    default = {'action': 'HOLD', 'confidence': 30}
+    result = LegacyRobustJSONParser.parse(content, dict(default))
+    for key, value in default.items():
+        result.setdefault(key, value)
+    return result
+
+
+def correct(result, expected):
+    return all(result.get(key) == value for key, value in expected.items())
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--chunk', type=int, default=8)
+    args = parser.parse_args()
+
+    print('=' * 72)
+    print(f"{'case':<28}{'legacy':>8}{'new':>6}{'legacy us':>12}{'new us':>10}")
+    print('=' * 72)
+    totals = {'legacy': 0, 'new': 0, 'legacy_time': 0.0, 'new_time': 0.0}
+    for name, content, expected in CORPUS:
+        legacy_ok = correct(parse_legacy(content, expected), expected)
+        new_ok = correct(parse_new(content, expected), expected)
+        legacy_us = measure(lambda: parse_legacy(content, expected), args.repeat)
+        new_us = measure(lambda: parse_new(content, expected), args.repeat)
+        totals['legacy'] += legacy_ok
+        totals['new'] += new_ok
+        totals['legacy_time'] += legacy_us
+        totals['new_time'] += new_us
+        print(f"{name:<28}{'ok' if legacy_ok else 'FAIL':>8}{'ok' if new_ok else 'FAIL':>6}{legacy_us:>12.1f}{new_us:>10.1f}")
+
+    print('-' * 72)
+    print(f"正確: 舊版 {totals['legacy']}/{len(CORPUS)}   新版 {totals['new']}/{len(CORPUS)}")
+    print(f"單次解析合計: 舊版 {totals['legacy_time']:.0f} us   新版 {totals['new_time']:.0f} us   "
+          f"加速 {totals['legacy_time'] / totals['new_time']:.1f}x")
+
+    # 串流: 舊版每收到一段就重新解析整個緩衝區，新版只解析新的部分
+    streamed = [content for _, content, _ in CORPUS]
+
+    def stream_legacy():
+        for content in streamed:
+            for end in range(args.chunk, len(content) + args.chunk, args.chunk):
+                LegacyRobustJSONParser.parse(content[:end], None)
+
+    def stream_new():
+        for content in streamed:
+            decision_parser = DecisionParser()
+            for start in range(0, len(content), args.chunk):
+                decision_parser.feed(content[start:start + args.chunk])
+            decision_parser.finish()
+
+    repeat = max(1, args.repeat // 20)
+    legacy_ms = measure(stream_legacy, repeat) / 1000
+    new_ms = measure(stream_new, repeat) / 1000
+    print(f"串流 (每 {args.chunk} 字元): 舊版 {legacy_ms:.1f} ms   新版 {new_ms:.1f} ms   加速 {legacy_ms / new_ms:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+MultiTimeframeAnalyzer._process_timeframe_data 微基準測試
+
+比較:
+- 舊版: 每根歷史 K 棒複製 df.iloc[:i+1] 並重新計算全部指標 (N+1 次)
+- 新版: 每個時間框架只計算一次指標，再讀取最後 N 根
+
+使用方法:
+    python scripts/benchmark_multi_timeframe.py [--bars 500] [--candles 20] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from core.multi_timeframe_analyzer import MultiTimeframeAnalyzer
+from strategies.v13.market_features import prepare_market_features
+
+
+def make_ohlcv(n, seed=42):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    open_time = pd.date_range('2026-01-01', periods=n, freq='15min')
+    return pd.DataFrame({
+        'open_time': open_time,
+        'open': open_,
+        'high': np.maximum(open_, close) * (1 + rng.uniform(0, 0.003, n)),
+        'low': np.minimum(open_, close) * (1 - rng.uniform(0, 0.003, n)),
+        'close': close,
+        'volume': rng.uniform(50, 500, n),
+        'timestamp': open_time,
+    })
+
+
+def legacy_process_timeframe_data(analyzer, df, timeframe, num_candles):
+    """舊版實作 (僅供比較)"""
+    current_features = prepare_market_features(df.iloc[-1], df)
+
+    candles = []
+    for i in range(-num_candles, 0):
+        df_slice = df.iloc[:len(df) + i + 1].copy()
+        row = df.iloc[i]
+        candles.append({
+            'timestamp': row['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
+            'open': float(row['open']),
+            'high': float(row['high']),
+            'low': float(row['low']),
+            'close': float(row['close']),
+            'volume': float(row['volume']),
+            'features': prepare_market_features(row, df_slice)
+        })
+
+    trend_info = analyzer._analyze_trend(df, current_features)
+    return {
+        'timeframe': timeframe,
+        'current': current_features,
+        'candles': candles,
+        'trend': trend_info['trend'],
+        'strength': trend_info['strength'],
+        'summary': trend_info['summary']
+    }
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1000, np.min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, default=500)
+    parser.add_argument('--candles', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    df = make_ohlcv(args.bars)
+    analyzer = MultiTimeframeAnalyzer(data_loader=None)
+
+    legacy = legacy_process_timeframe_data(analyzer, df, '15m', args.candles)
+    current = analyzer._process_timeframe_data(df, '15m', args.candles)
+
+    # 結果一致性 (新版在每根 K 棒多了 trend / strength)
+    assert legacy['current'] == current['current']
+    assert legacy['trend'] == current['trend'] and legacy['summary'] == current['summary']
+    for old, new in zip(legacy['candles'], current['candles']):
+        assert old == {k: v for k, v in new.items() if k not in ('trend', 'strength')}
+
+    # 避免指標快取影響舊版計時
+    from core.indicator_engine import get_indicator_engine
+    engine = get_indicator_engine()
+
+    def run_legacy():
+        engine.clear_cache()
+        legacy_process_timeframe_data(analyzer, df, '15m', args.candles)
+
+    def run_current():
+        engine.clear_cache()
+        analyzer._process_timeframe_data(df, '15m', args.candles)
+
+    legacy_median, legacy_min = measure(run_legacy, args.repeat)
+    current_median, current_min = measure(run_current, args.repeat)
+
+    print("=" * 60)
+    print(f"_process_timeframe_data ({args.bars} bars, {args.candles} candles, {args.repeat} runs)")
+    print("=" * 60)
+    print(f"舊版 (逐根重算): median {legacy_median:8.2f} ms   min {legacy_min:8.2f} ms")
+    print(f"新版 (一次計算): median {current_median:8.2f} ms   min {current_min:8.2f} ms")
+    print(f"加速: {legacy_median / current_median:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -399,6 +399,45 @@ class ArbitratorUI {
         document.getElementById('model-b-reasoning').textContent = data.reasoning || '分析中...';
     }
     
+    // 仲裁者的串流事件: action / confidence 先顯示，reasoning 文字邊收邊顯示
+    handleStream(data) {
+        const prefix = data.label === 'Model B' ? 'model-b' : 'model-a';
+        const reasoningEl = document.getElementById(`${prefix}-reasoning`);
+        if (!reasoningEl) return;
+        
+        if (data.event === 'decision') {
+            document.getElementById(`${prefix}-name`).textContent = `${data.symbol} · ${data.model}`;
+            const actionEl = document.getElementById(`${prefix}-action`);
+            actionEl.textContent = data.action || '-';
+            actionEl.className = `decision-action ${data.action || ''}`;
+            document.getElementById(`${prefix}-confidence`).textContent = data.confidence ? `${data.confidence}%` : '-';
+        } else if (data.event === 'delta') {
+            if (reasoningEl.dataset.streaming !== 'true') {
+                reasoningEl.dataset.streaming = 'true';
+                reasoningEl.textContent = '';
+            }
+            reasoningEl.textContent += data.text;
+            reasoningEl.scrollTop = reasoningEl.scrollHeight;
+        } else if (data.event === 'done') {
+            reasoningEl.dataset.streaming = 'false';
+            if (!data.success) {
+                reasoningEl.textContent = '所有模型都失敗';
+                return;
+            }
+            const update = data.label === 'Model B' ? this.updateModelB : this.updateModelA;
+            update.call(this, {
+                model: `${data.symbol} · ${data.model}`,
+                action: data.action,
+                confidence: data.confidence,
+                reasoning: data.reasoning
+            });
+        } else if (data.event === 'completed') {
+            // 提早完成的決策: 背景串流結束後補上完整理由
+            reasoningEl.dataset.streaming = 'false';
+            reasoningEl.textContent = data.reasoning || '';
+        }
+    }
+    
     updateConsensusStatus(agreed, actionA, actionB) {
         const statusEl = document.getElementById('consensus-status');
         
@@ -478,3 +517,7 @@ class ArbitratorUI {
 
 // 暴露到全局
 window.arbitratorUI = arbitratorUI;
+
+if (typeof socket !== 'undefined') {
+    socket.on('ai_stream', (data) => arbitratorUI.handleStream(data));
+}
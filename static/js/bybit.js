@@ -13,6 +13,7 @@ const bybitElements = {
     apiKey: document.getElementById('bybitApiKey'),
     apiSecret: document.getElementById('bybitApiSecret'),
     symbol: document.getElementById('bybitSymbol'),
+    watchlist: document.getElementById('bybitWatchlist'),
     testBtn: document.getElementById('bybitTestBtn'),
     startBtn: document.getElementById('bybitStartBtn'),
     stopBtn: document.getElementById('bybitStopBtn'),
@@ -143,12 +144,18 @@ async function startBybitTrading() {
     bybitElements.startBtn.disabled = true;
     bybitElements.stopBtn.disabled = false;
     
-    showBybitStatus('自動交易已啟動 (每 15 分鐘執行一次)', 'success');
+    const symbols = bybitElements.watchlist.value
+        .split(',')
+        .map(s => s.trim().toUpperCase())
+        .filter(s => s);
+    
+    showBybitStatus(`自動交易已啟動 (每根 15m K線收盤時執行，${symbols.length || 1} 個幣種)`, 'success');
     
     socket.emit('start_bybit_trading', {
         api_key: bybitElements.apiKey.value,
         api_secret: bybitElements.apiSecret.value,
-        symbol: bybitElements.symbol.value
+        symbol: bybitElements.symbol.value,
+        symbols: symbols
     });
 }
 
@@ -193,7 +200,8 @@ function showBybitStatus(message, type) {
 socket.on('bybit_trade_executed', (data) => {
     console.log('Bybit trade executed:', data);
     updateBybitAccountInfo(data.balance, data.position);
-    showBybitStatus(`交易執行: ${data.action} - ${data.message}`, 'success');
+    const symbolText = data.symbol ? `${data.symbol} ` : '';
+    showBybitStatus(`${symbolText}交易執行: ${data.action} - ${data.message}`, 'success');
 });
 
 socket.on('bybit_account_updated', (data) => {
@@ -2,6 +2,8 @@ import streamlit as st
 from .config import V10Config
 from .backtester import V10Backtester
 from core.data_loader import DataLoader
+from core.gui_components import render_sweep_results
+from core.param_sweep import ParameterSweep, random_space
 
 def render():
     st.header("V10 - 波動爆發狙擊手 (BB Squeeze Breakout)")
@@ -112,4 +114,44 @@ def render():
                         st.warning("⚠️ **策略虧損**。可能原因：\n1. 該幣種近期處於無聊的震盪市，假突破太多。\n2. 要求太寬鬆，嘗試提高「成交量爆發倍數」到 2.0，過濾掉沒力的突破。")
                         
                 else:
-                    st.error("無法載入數據")
\ No newline at end of file
+                    st.error("無法載入數據")
+    
+    render_sweep(symbol, capital, simulation_days, exit_mode, tp_r, base_risk, max_leverage)
+
+def render_sweep(symbol, capital, simulation_days, exit_mode, tp_r, base_risk, max_leverage):
+    """參數掃描：隨機搜尋爆發過濾條件，多核心平行回測"""
+    st.markdown("---")
+    with st.expander("🔬 參數掃描 (多核心平行回測)"):
+        st.caption("以左側設定為基準，隨機搜尋爆發過濾條件。指標只計算一次並以共享記憶體分給各個行程。")
+        
+        squeeze_range = st.slider("擠壓期長度範圍", 10, 50, (10, 40), 5)
+        rsi_range = st.slider("RSI 動能要求範圍", 50, 70, (50, 70), 1)
+        volume_range = st.slider("成交量爆發倍數範圍", 1.0, 3.0, (1.0, 2.5), 0.1)
+        n_samples = st.number_input("取樣數", 10, 2000, 200, 10)
+        sort_by = st.selectbox("排序依據", ['return_pct', 'sharpe_ratio', 'profit_factor', 'win_rate', 'max_drawdown'])
+        
+        if st.button("🔬 開始參數掃描", use_container_width=True):
+            df = DataLoader().load_data(symbol, '15m')
+            if df is None or df.empty:
+                st.error("無法載入數據")
+                return
+            
+            base_config = V10Config(
+                symbol=symbol,
+                capital=capital,
+                simulation_days=simulation_days,
+                exit_mode=exit_mode,
+                tp_r=tp_r,
+                base_risk=base_risk,
+                max_leverage=max_leverage
+            )
+            space = random_space({
+                'squeeze_length': squeeze_range,
+                'rsi_momentum': rsi_range,
+                'volume_surge': volume_range,
+            }, int(n_samples))
+            
+            sweep = ParameterSweep(V10Backtester, base_config)
+            table = render_sweep_results(sweep.run(df, space), len(space), sort_by=sort_by,
+                                         ascending=(sort_by == 'max_drawdown'))
+            st.success(f"✅ 掃描完成：{len(table)} 組參數，指標計算 {sweep.stats['prepared']} 次")
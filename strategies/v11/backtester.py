@@ -1,10 +1,26 @@
 import pandas as pd
 import numpy as np
-import talib
 from datetime import timedelta
 import xgboost as xgb
 from sklearn.metrics import roc_auc_score
 from sklearn.model_selection import train_test_split
+from core.backtest_kernel import BacktestSpec, EntryArrays, run_backtest
+from core.indicator_engine import HLC, compute_indicators, indicator
+
+
+V11_INDICATORS = [
+    indicator('EMA', 'ema_9', timeperiod=9),
+    indicator('EMA', 'ema_20', timeperiod=20),
+    indicator('EMA', 'ema_50', timeperiod=50),
+    indicator('RSI', 'rsi_14', timeperiod=14),
+    indicator('RSI', 'rsi_7', timeperiod=7),
+    indicator('MACD', ('macd', 'macd_signal', 'macd_hist')),
+    indicator('ROC', 'roc_5', timeperiod=5),
+    indicator('ROC', 'roc_15', timeperiod=15),
+    indicator('ATR', 'atr_14', inputs=HLC, timeperiod=14),
+    indicator('BBANDS', ('bb_upper', 'bb_middle', 'bb_lower')),
+    indicator('ROLLING_MEAN', 'vol_ma20', inputs=('volume',), timeperiod=20),
+]
 
 class V11Backtester:
     """V11 AI 機器學習回測引擎"""
@@ -17,25 +33,20 @@ class V11Backtester:
     def prepare_features(self, df):
         """生成供 AI 學習的大量特徵 (Feature Engineering)"""
         df = df.copy()
+        block = compute_indicators(df, V11_INDICATORS)
         
         # 1. 趨勢特徵
-        df['ema_9'] = talib.EMA(df['close'], timeperiod=9)
-        df['ema_20'] = talib.EMA(df['close'], timeperiod=20)
-        df['ema_50'] = talib.EMA(df['close'], timeperiod=50)
+        block.assign_to(df, ['ema_9', 'ema_20', 'ema_50'])
         df['dist_ema20'] = (df['close'] - df['ema_20']) / df['close']
         df['dist_ema50'] = (df['close'] - df['ema_50']) / df['close']
         
         # 2. 動能特徵
-        df['rsi_14'] = talib.RSI(df['close'], timeperiod=14)
-        df['rsi_7'] = talib.RSI(df['close'], timeperiod=7)
-        df['macd'], df['macd_signal'], df['macd_hist'] = talib.MACD(df['close'])
-        df['roc_5'] = talib.ROC(df['close'], timeperiod=5) # 變化率
-        df['roc_15'] = talib.ROC(df['close'], timeperiod=15)
+        block.assign_to(df, ['rsi_14', 'rsi_7', 'macd', 'macd_signal', 'macd_hist', 'roc_5', 'roc_15'])
         
         # 3. 波動率特徵
-        df['atr_14'] = talib.ATR(df['high'], df['low'], df['close'], timeperiod=14)
+        block.assign_to(df, ['atr_14'])
         df['atr_ratio'] = df['atr_14'] / df['close']
-        df['bb_upper'], df['bb_middle'], df['bb_lower'] = talib.BBANDS(df['close'])
+        block.assign_to(df, ['bb_upper', 'bb_middle', 'bb_lower'])
         df['bb_width'] = (df['bb_upper'] - df['bb_lower']) / df['bb_middle']
         df['bb_pos'] = (df['close'] - df['bb_lower']) / (df['bb_upper'] - df['bb_lower'])
         
@@ -45,7 +56,7 @@ class V11Backtester:
         df['lower_shadow'] = (df[['open', 'close']].min(axis=1) - df['low']) / df['close']
         
         # 5. 成交量特徵
-        df['vol_ma20'] = df['volume'].rolling(20).mean()
+        df['vol_ma20'] = block['vol_ma20']
         df['vol_ratio'] = df['volume'] / df['vol_ma20']
         
         # 清理缺失值
@@ -110,9 +121,8 @@ class V11Backtester:
         
         return auc, feat_imp
 
-    def run(self, df):
-        print(f"[V11] Preparing features for AI Model...")
-        
+    def build_dataset(self, df):
+        """截取回測區間、計算特徵與標籤 (walk-forward 的各個 fold 共用這一份)"""
         if 'open_time' in df.columns:
             df['open_time'] = pd.to_datetime(df['open_time'])
             
@@ -122,7 +132,11 @@ class V11Backtester:
             df = df[df['open_time'] >= start_time].reset_index(drop=True)
             
         df = self.prepare_features(df)
-        df = self.generate_labels(df)
+        return self.generate_labels(df)
+
+    def run(self, df):
+        print(f"[V11] Preparing features for AI Model...")
+        df = self.build_dataset(df)
         
         # 劃分訓練集與測試集 (Time-series split)
         split_idx = int(len(df) * self.config.train_test_split)
@@ -137,68 +151,94 @@ class V11Backtester:
         test_df = test_df.copy()
         test_df['ai_prob'] = self.model.predict_proba(test_df[self.features])[:, 1]
         
+        results = self._simulate(test_df)
+        results['model_auc'] = auc_score
+        results['feature_importance'] = feature_importance
+        return results
+
+    def fit_predict_fold(self, train_df, test_df):
+        """walk-forward 的單一 fold: 在 train_df 上訓練，返回 test_df 的上漲機率"""
+        train_auc, feature_importance = self.train_ai_model(train_df)
+        probs = self.model.predict_proba(test_df[self.features])[:, 1]
+        y_test = test_df['target'].values
+        test_auc = roc_auc_score(y_test, probs) if len(np.unique(y_test)) > 1 else 0.5
+        return {
+            'score': probs,
+            'train_auc': train_auc,
+            'test_auc': test_auc,
+            'feature_importance': feature_importance
+        }
+
+    def run_walk_forward(self, df, walk_forward):
+        """
+        滾動前進驗證: 每個 fold 重新訓練，所有樣本外預測接起來後一次回測
+        
+        Args:
+            walk_forward: core.walk_forward.WalkForward
+        """
+        print(f"[V11] Walk-forward: preparing features once...")
+        df = self.build_dataset(df)
+        
+        dataset = df[self.features + ['target']]
+        results = walk_forward.run(dataset, self.fit_predict_fold)
+        print(f"[V11] Walk-forward: {len(results)} folds trained")
+        
+        test_df = df.copy()
+        test_df['ai_prob'] = walk_forward.stitch(len(df), results, 'score')
+        test_df = test_df.iloc[walk_forward.test_rows(results)].reset_index(drop=True)
+        
+        summary = self._simulate(test_df)
+        summary['model_auc'] = float(np.mean([r['test_auc'] for r in results]))
+        summary['feature_importance'] = results[-1]['feature_importance']
+        summary['folds'] = [
+            {
+                'fold': r['fold'].index,
+                'train_start': df['open_time'].iloc[r['fold'].train_start],
+                'test_start': df['open_time'].iloc[r['fold'].test_start],
+                'test_end': df['open_time'].iloc[r['fold'].test_end - 1],
+                'train_auc': r['train_auc'],
+                'test_auc': r['test_auc']
+            }
+            for r in results
+        ]
+        return summary
+
+    def _simulate(self, test_df):
+        """依 test_df['ai_prob'] 模擬交易"""
         capital = self.config.capital
         initial_capital = capital
-        peak_capital = capital
-        
-        position = 0
-        entry_price = 0
-        sl_price = 0
-        tp_price = 0
-        position_size_usd = 0
-        entry_time = None
-        
-        trades = []
-        equity_curve = []
         
         start_time = test_df['open_time'].iloc[0] if 'open_time' in test_df.columns else None
         end_time = test_df['open_time'].iloc[-1] if 'open_time' in test_df.columns else None
         
-        total_fee_rate = self.config.fee_rate + self.config.slippage
+        # AI 驅動進場：AI 預測上漲機率大於閾值，並加上基礎趨勢過濾 (確保 AI 沒有瘋掉)
+        close = test_df['close'].values
+        signal = (test_df['ai_prob'].values > self.config.ai_confidence_threshold) & \
+                 (test_df['ema_20'].values > test_df['ema_50'].values)
+        sl_distance = test_df['atr_14'].values * self.config.atr_multiplier
+        entries = EntryArrays(
+            direction=signal.astype(int),
+            sl=close - sl_distance,
+            tp=close + (sl_distance * self.config.tp_r),
+            sl_pct=sl_distance / close
+        )
         
-        for i in range(len(test_df)):
-            row = test_df.iloc[i]
-            equity_curve.append(capital)
-            
-            if capital > peak_capital: peak_capital = capital
-            if (peak_capital - capital) / peak_capital > self.config.max_drawdown_stop: break
-            
-            # 1. 檢查出場
-            if position == 1:
-                exit_price = 0
-                if row['high'] >= tp_price:
-                    exit_price = tp_price
-                elif row['low'] <= sl_price:
-                    exit_price = sl_price
-                    
-                if exit_price > 0:
-                    pnl_pct = (exit_price - entry_price) / entry_price
-                    pnl_usd = position_size_usd * pnl_pct - (position_size_usd * total_fee_rate * 2)
-                    capital += pnl_usd
-                    position = 0
-                    
-                    holding_hours = (row['open_time'] - entry_time).total_seconds() / 3600 if entry_time else 0
-                    trades.append({'pnl_usd': pnl_usd, 'return': pnl_pct, 'holding_hours': holding_hours})
-            
-            # 2. AI 驅動進場
-            if position == 0:
-                # 核心邏輯：AI 預測上漲機率大於閾值
-                if row['ai_prob'] > self.config.ai_confidence_threshold:
-                    
-                    # 額外的基礎趨勢過濾 (確保 AI 沒有瘋掉)
-                    if row['ema_20'] > row['ema_50']:
-                        
-                        position = 1
-                        entry_price = row['close']
-                        entry_time = row['open_time'] if 'open_time' in test_df.columns else None
-                        
-                        sl_distance = row['atr_14'] * self.config.atr_multiplier
-                        sl_price = entry_price - sl_distance
-                        tp_price = entry_price + (sl_distance * self.config.tp_r)
-                        
-                        sl_pct = sl_distance / entry_price
-                        max_loss = capital * self.config.base_risk
-                        position_size_usd = min(max_loss / sl_pct, capital * self.config.max_leverage)
+        spec = BacktestSpec(
+            capital=capital,
+            base_risk=self.config.base_risk,
+            max_leverage=self.config.max_leverage,
+            fee_rate=self.config.fee_rate + self.config.slippage,
+            max_drawdown_stop=self.config.max_drawdown_stop,
+            exit_priority='tp_first'
+        )
+        result = run_backtest(test_df, spec, entries=entries)
+        
+        capital = result.capital
+        equity_curve = result.equity_curve
+        trades = [
+            {'pnl_usd': t['pnl_usd'], 'return': t['return'], 'holding_hours': t['holding_hours']}
+            for t in result.trades
+        ]
 
         # 統計
         wins = len([t for t in trades if t['pnl_usd'] > 0])
@@ -229,8 +269,7 @@ class V11Backtester:
             'sharpe_ratio': sharpe_ratio,
             'profit_factor': profit_factor,
             'avg_holding_hours': avg_holding_hours,
-            'model_auc': auc_score,
-            'feature_importance': feature_importance
+            'equity_curve': equity_curve
         }
     
     def _calculate_max_drawdown(self, equity_curve):
@@ -2,6 +2,7 @@ import streamlit as st
 from .config import V12Config
 from .backtester import V12Backtester
 from core.data_loader import DataLoader
+from core.walk_forward import WalkForward
 
 def render():
     st.header("V12 - 高階量化神經網路 (精準打擊模型)")
@@ -37,6 +38,13 @@ def render():
         base_risk = st.slider("單筆風險 (%)", 1.0, 5.0, 2.0, 0.5) / 100.0
         max_leverage = st.slider("最大槓桿", 1, 10, 3, 1)
         
+        st.markdown("### 🔁 滾動前進驗證")
+        use_walk_forward = st.checkbox("啟用 Walk-Forward (每段重新訓練，只看樣本外)", value=False)
+        if use_walk_forward:
+            wf_train_days = st.slider("訓練視窗 (天)", 15, 180, 60, 5)
+            wf_test_days = st.slider("測試視窗 (天)", 5, 60, 15, 5)
+            wf_anchored = st.checkbox("錨定訓練起點 (訓練視窗逐步變長)", value=False)
+        
         test_btn = st.button("🧠 啟動 V12 深度訓練與回測", type="primary", use_container_width=True)
         
     with col2:
@@ -58,7 +66,16 @@ def render():
                 
                 if df is not None and not df.empty:
                     bt = V12Backtester(config)
-                    results = bt.run(df)
+                    if use_walk_forward:
+                        walk_forward = WalkForward(
+                            train_bars=wf_train_days * 96,
+                            test_bars=wf_test_days * 96,
+                            anchored=wf_anchored,
+                            purge_bars=config.look_forward_bars
+                        )
+                        results = bt.run_walk_forward(df, walk_forward)
+                    else:
+                        results = bt.run(df)
                     
                     st.success(f"✅ V12 訓練與回測完成！({symbol}) - 測試天數: {results.get('days_tested', 0)} 天")
                     
@@ -93,6 +110,11 @@ def render():
                     col_c3.metric("日均交易次數", f"{avg_daily_trades:.1f} 次/天")
                     col_c4.metric("盈虧比", f"{results.get('profit_factor', 0):.2f}")
                     
+                    if 'folds' in results:
+                        st.markdown("### 🔁 Walk-Forward 樣本外結果")
+                        st.line_chart(results['equity_curve'])
+                        st.dataframe(results['folds'], use_container_width=True)
+                    
                     if avg_daily_trades > 3:
                         st.warning("⚠️ 日均交易次數大於 3，建議在左側調低「每日最多交易次數」。")
                     elif avg_daily_trades < 0.5:
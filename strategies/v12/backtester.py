@@ -1,13 +1,30 @@
 import pandas as pd
 import numpy as np
-import talib
 from datetime import timedelta
 import xgboost as xgb
 from sklearn.metrics import roc_auc_score, precision_score, recall_score, f1_score
+from core.backtest_kernel import BacktestSpec, EntryArrays, run_backtest
+from core.indicator_engine import HLC, compute_indicators, indicator
+from core.triple_barrier import atr_barriers, triple_barrier_labels
+
+
+V12_INDICATORS = [
+    indicator('ATR', 'atr', inputs=HLC, timeperiod=14),
+    indicator('BBANDS', ('bb_upper', 'bb_middle', 'bb_lower'), timeperiod=20),
+    indicator('EMA', 'ema_9', timeperiod=9),
+    indicator('EMA', 'ema_50', timeperiod=50),
+    indicator('EMA', 'ema_200', timeperiod=200),
+    indicator('RSI', 'rsi_14', timeperiod=14),
+    indicator('MACD', ('macd', 'macd_signal', 'macd_hist')),
+    indicator('ROLLING_MEAN', 'vol_ma', inputs=('volume',), timeperiod=24),
+]
 
 class V12Backtester:
     """V12 高階 AI 回測引擎 (Triple Barrier & Auto-Threshold)"""
     
+    # 會影響 prepare() 結果的設定欄位 (參數掃描用)
+    SWEEP_FEATURE_FIELDS = ('simulation_days',)
+    
     def __init__(self, config):
         self.config = config
         self.model = None
@@ -17,6 +34,7 @@ class V12Backtester:
     def prepare_features(self, df):
         """建構高階量化特徵"""
         df = df.copy()
+        block = compute_indicators(df, V12_INDICATORS)
         
         # 1. 價格動能與回報率 (Returns & Momentum)
         df['ret_1'] = df['close'].pct_change(1)
@@ -25,24 +43,21 @@ class V12Backtester:
         df['ret_24'] = df['close'].pct_change(24) # 6小時
         
         # 2. 波動率 (Volatility)
-        df['atr'] = talib.ATR(df['high'], df['low'], df['close'], timeperiod=14)
+        block.assign_to(df, ['atr'])
         df['atr_ratio'] = df['atr'] / df['close']
-        df['bb_upper'], df['bb_middle'], df['bb_lower'] = talib.BBANDS(df['close'], timeperiod=20)
+        block.assign_to(df, ['bb_upper', 'bb_middle', 'bb_lower'])
         df['bb_width'] = (df['bb_upper'] - df['bb_lower']) / df['bb_middle']
         
         # 3. 趨勢與發散度 (Divergence)
-        df['ema_9'] = talib.EMA(df['close'], timeperiod=9)
-        df['ema_50'] = talib.EMA(df['close'], timeperiod=50)
-        df['ema_200'] = talib.EMA(df['close'], timeperiod=200)
+        block.assign_to(df, ['ema_9', 'ema_50', 'ema_200'])
         df['dist_ema50'] = (df['close'] - df['ema_50']) / df['close']
         df['dist_ema200'] = (df['close'] - df['ema_200']) / df['close']
         
         # 4. 經典震盪指標
-        df['rsi_14'] = talib.RSI(df['close'], timeperiod=14)
-        df['macd'], df['macd_signal'], df['macd_hist'] = talib.MACD(df['close'])
+        block.assign_to(df, ['rsi_14', 'macd', 'macd_signal', 'macd_hist'])
         
         # 5. 成交量特徵
-        df['vol_ma'] = df['volume'].rolling(24).mean()
+        df['vol_ma'] = block['vol_ma']
         df['vol_ratio'] = df['volume'] / df['vol_ma']
         
         # 清理
@@ -63,43 +78,17 @@ class V12Backtester:
         print("[V12] Generating Triple-Barrier Labels...")
         
         # 預先計算每一行的止盈與止損絕對價格
-        tp_prices = df['close'] + (df['atr'] * self.config.tp_atr_mult)
-        sl_prices = df['close'] - (df['atr'] * self.config.sl_atr_mult)
-        
-        high_vals = df['high'].values
-        low_vals = df['low'].values
-        tp_vals = tp_prices.values
-        sl_vals = sl_prices.values
+        tp_vals, sl_vals = atr_barriers(
+            df['close'].values, df['atr'].values, self.config.tp_atr_mult, self.config.sl_atr_mult
+        )
         
-        n_rows = len(df)
         look_forward = self.config.look_forward_bars
-        targets = np.zeros(n_rows)
         
-        # Vectorized-like loop for accurate barrier hit detection
-        for i in range(n_rows - look_forward):
-            window_high = high_vals[i+1 : i+1+look_forward]
-            window_low = low_vals[i+1 : i+1+look_forward]
-            
-            target_tp = tp_vals[i]
-            target_sl = sl_vals[i]
-            
-            # Find index where barriers are crossed
-            hit_tp_idx = np.argmax(window_high >= target_tp)
-            hit_sl_idx = np.argmax(window_low <= target_sl)
-            
-            # np.argmax returns 0 if not found, we must verify if it actually hit
-            did_hit_tp = window_high[hit_tp_idx] >= target_tp
-            did_hit_sl = window_low[hit_sl_idx] <= target_sl
-            
-            if did_hit_tp and not did_hit_sl:
-                targets[i] = 1  # Hit TP perfectly
-            elif did_hit_tp and did_hit_sl:
-                if hit_tp_idx < hit_sl_idx:
-                    targets[i] = 1  # Hit TP before SL
-                else:
-                    targets[i] = 0  # Hit SL first
-            else:
-                targets[i] = 0  # Hit SL only, or timed out
+        # 先撞到止盈為 1；止損、同一根K線同時撞到 (視為止損) 或超時為 0
+        hit_labels, _ = triple_barrier_labels(
+            df['high'].values, df['low'].values, tp_vals, sl_vals, look_forward, tie='stop'
+        )
+        targets = (hit_labels == 1).astype(float)
                 
         df['target'] = targets
         
@@ -110,8 +99,12 @@ class V12Backtester:
         print(f"[V12] Labeling complete. Class 1 (Win) ratio: {class_1_ratio:.1%}")
         return df
     
-    def train_and_optimize(self, train_df):
-        """訓練模型並自動尋找最佳閾值以滿足 Precision>0.6, Recall>0.6"""
+    def train_and_optimize(self, train_df, threshold_df=None):
+        """
+        訓練模型並自動尋找最佳閾值以滿足 Precision>0.6, Recall>0.6
+        
+        threshold_df: 用來挑選閾值的驗證集 (預設在訓練集上挑選)
+        """
         X_train = train_df[self.features]
         y_train = train_df['target']
         
@@ -131,6 +124,9 @@ class V12Backtester:
         
         self.model.fit(X_train, y_train)
         
+        if threshold_df is not None:
+            X_train = threshold_df[self.features]
+            y_train = threshold_df['target']
         train_probs = self.model.predict_proba(X_train)[:, 1]
         
         # 尋找最佳閾值 (Auto-Thresholding)
@@ -157,7 +153,8 @@ class V12Backtester:
         self.best_threshold = best_th
         print(f"[V12] Auto-Threshold selected: {self.best_threshold:.2f}")
 
-    def run(self, df):
+    def prepare(self, df):
+        """截取回測區間並計算特徵 (只依賴 simulation_days，參數掃描時共用)"""
         if 'open_time' in df.columns:
             df['open_time'] = pd.to_datetime(df['open_time'])
             
@@ -166,8 +163,14 @@ class V12Backtester:
             start_time = end_time - timedelta(days=self.config.simulation_days)
             df = df[df['open_time'] >= start_time].reset_index(drop=True)
             
-        df = self.prepare_features(df)
-        df = self.generate_triple_barrier_labels(df)
+        return self.prepare_features(df)
+
+    def run(self, df):
+        return self.run_prepared(self.prepare(df))
+
+    def run_prepared(self, df):
+        """在 prepare() 的結果上標註、訓練並回測 (不修改 df)"""
+        df = self.generate_triple_barrier_labels(df.copy())
         
         # 劃分數據集
         split_idx = int(len(df) * self.config.train_test_split)
@@ -189,85 +192,114 @@ class V12Backtester:
         
         print(f"[V12] Test Metrics - AUC: {test_auc:.3f}, Precision: {test_prec:.3f}, Recall: {test_rec:.3f}")
         
-        # ----------------------------------------
-        # 模擬交易 (Backtest Execution)
-        # ----------------------------------------
-        test_df = test_df.copy()
-        test_df['ai_prob'] = test_probs
+        results = self._simulate(test_df, test_probs > self.best_threshold)
+        results.update({
+            'test_auc': test_auc,
+            'test_precision': test_prec,
+            'test_recall': test_rec,
+            'best_threshold': self.best_threshold
+        })
+        return results
+
+    def fit_predict_fold(self, train_df, test_df, validation_frac=0.25):
+        """
+        walk-forward 的單一 fold
+        訓練視窗最後 validation_frac 的部分只用來挑選閾值 (與訓練部分之間再隔開 look_forward_bars)，
+        避免在樣本內預測上挑閾值
+        """
+        n_val = int(len(train_df) * validation_frac)
+        fit_end = len(train_df) - n_val - self.config.look_forward_bars
+        if n_val > 0 and fit_end > 0:
+            self.train_and_optimize(train_df.iloc[:fit_end], threshold_df=train_df.iloc[-n_val:])
+        else:
+            self.train_and_optimize(train_df)
+        
+        probs = self.model.predict_proba(test_df[self.features])[:, 1]
+        y_test = test_df['target'].values
+        preds = (probs > self.best_threshold).astype(int)
+        return {
+            'score': probs,
+            'signal': preds.astype(float),
+            'threshold': self.best_threshold,
+            'test_auc': roc_auc_score(y_test, probs) if len(np.unique(y_test)) > 1 else 0.5,
+            'test_precision': precision_score(y_test, preds, zero_division=0),
+            'test_recall': recall_score(y_test, preds, zero_division=0)
+        }
+
+    def run_walk_forward(self, df, walk_forward):
+        """
+        滾動前進驗證: 特徵與標籤只算一次，每個 fold 重新訓練並挑選閾值，
+        所有樣本外信號接起來後一次回測
         
+        Args:
+            walk_forward: core.walk_forward.WalkForward (purge_bars 建議設為 look_forward_bars)
+        """
+        df = self.generate_triple_barrier_labels(self.prepare(df))
+        
+        results = walk_forward.run(df[self.features + ['target']], self.fit_predict_fold)
+        print(f"[V12] Walk-forward: {len(results)} folds trained")
+        
+        signal = walk_forward.stitch(len(df), results, 'signal', fill=0.0)
+        rows = walk_forward.test_rows(results)
+        test_df = df.iloc[rows].reset_index(drop=True)
+        
+        summary = self._simulate(test_df, signal[rows] > 0)
+        summary['folds'] = [
+            {
+                'fold': r['fold'].index,
+                'train_start': df['open_time'].iloc[r['fold'].train_start],
+                'test_start': df['open_time'].iloc[r['fold'].test_start],
+                'test_end': df['open_time'].iloc[r['fold'].test_end - 1],
+                'threshold': r['threshold'],
+                'test_auc': r['test_auc'],
+                'test_precision': r['test_precision'],
+                'test_recall': r['test_recall']
+            }
+            for r in results
+        ]
+        for name in ('test_auc', 'test_precision', 'test_recall'):
+            summary[name] = float(np.mean([r[name] for r in results]))
+        return summary
+
+    def _simulate(self, test_df, signal):
+        """模擬交易 (Backtest Execution)，signal 為每根K線是否進場"""
         capital = self.config.capital
         initial_capital = capital
-        peak_capital = capital
-        
-        position = 0
-        entry_price = 0
-        sl_price = 0
-        tp_price = 0
-        position_size_usd = 0
-        entry_time = None
-        
-        trades = []
-        equity_curve = []
-        
-        trades_today = 0
-        last_trade_date = None
-        total_fee_rate = self.config.fee_rate + self.config.slippage
         
         real_start_time = test_df['open_time'].iloc[0]
         real_end_time = test_df['open_time'].iloc[-1]
         
-        for i in range(len(test_df)):
-            row = test_df.iloc[i]
-            equity_curve.append(capital)
-            
-            if capital > peak_capital: peak_capital = capital
-            if (peak_capital - capital) / peak_capital > self.config.max_drawdown_stop: break
-            
-            current_date = row['open_time'].date()
-            if current_date != last_trade_date:
-                trades_today = 0
-                last_trade_date = current_date
-            
-            # 1. 檢查出場
-            if position == 1:
-                exit_price = 0
-                if row['high'] >= tp_price:
-                    exit_price = tp_price
-                elif row['low'] <= sl_price:
-                    exit_price = sl_price
-                    
-                # 超時強平 (如果超過 look_forward_bars 還沒碰到 TP/SL)
-                time_in_trade = (row['open_time'] - entry_time).total_seconds() / 60 / 15 # 15m bars
-                if exit_price == 0 and time_in_trade >= self.config.look_forward_bars:
-                    exit_price = row['close']
-                    
-                if exit_price > 0:
-                    pnl_pct = (exit_price - entry_price) / entry_price
-                    pnl_usd = position_size_usd * pnl_pct - (position_size_usd * total_fee_rate * 2)
-                    capital += pnl_usd
-                    position = 0
-                    
-                    holding_hours = (row['open_time'] - entry_time).total_seconds() / 3600
-                    trades.append({'pnl_usd': pnl_usd, 'return': pnl_pct, 'holding_hours': holding_hours})
-            
-            # 2. 進場邏輯
-            if position == 0 and trades_today < self.config.max_daily_trades:
-                # 修復了這個 Bug，改用 self.best_threshold
-                if row['ai_prob'] > self.best_threshold:
-                    
-                    position = 1
-                    entry_price = row['close']
-                    entry_time = row['open_time']
-                    
-                    sl_distance = row['atr'] * self.config.sl_atr_mult
-                    sl_price = entry_price - sl_distance
-                    tp_price = entry_price + (row['atr'] * self.config.tp_atr_mult)
-                    
-                    sl_pct = sl_distance / entry_price
-                    max_loss = capital * self.config.base_risk
-                    position_size_usd = min(max_loss / sl_pct, capital * self.config.max_leverage)
-                    
-                    trades_today += 1
+        # 進場：AI 機率大於閾值 (self.best_threshold 或各 fold 自己的閾值)
+        close = test_df['close'].values
+        atr = test_df['atr'].values
+        sl_distance = atr * self.config.sl_atr_mult
+        entries = EntryArrays(
+            direction=signal.astype(int),
+            sl=close - sl_distance,
+            tp=close + (atr * self.config.tp_atr_mult),
+            sl_pct=sl_distance / close
+        )
+        
+        # 出場：先檢查止盈再檢查止損，超過 look_forward_bars 還沒碰到 TP/SL 時以收盤價強平
+        spec = BacktestSpec(
+            capital=capital,
+            base_risk=self.config.base_risk,
+            max_leverage=self.config.max_leverage,
+            fee_rate=self.config.fee_rate + self.config.slippage,
+            max_drawdown_stop=self.config.max_drawdown_stop,
+            max_daily_trades=self.config.max_daily_trades,
+            exit_priority='tp_first',
+            max_hold_bars=self.config.look_forward_bars,
+            bar_seconds=15 * 60  # 15m bars
+        )
+        result = run_backtest(test_df, spec, entries=entries)
+        
+        capital = result.capital
+        equity_curve = result.equity_curve
+        trades = [
+            {'pnl_usd': t['pnl_usd'], 'return': t['return'], 'holding_hours': t['holding_hours']}
+            for t in result.trades
+        ]
 
         # 統計與結算
         wins = len([t for t in trades if t['pnl_usd'] > 0])
@@ -298,10 +330,7 @@ class V12Backtester:
             'sharpe_ratio': sharpe_ratio,
             'profit_factor': profit_factor,
             'avg_holding_hours': avg_holding_hours,
-            'test_auc': test_auc,
-            'test_precision': test_prec,
-            'test_recall': test_rec,
-            'best_threshold': self.best_threshold
+            'equity_curve': equity_curve
         }
     
     def _calculate_max_drawdown(self, equity_curve):
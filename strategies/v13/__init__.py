@@ -104,6 +104,20 @@ def render_trading_interface():
             help="整合 CryptoPanic API 的新聞情緒分析"
         )
         
+        llm_replay_mode = st.selectbox(
+            "[REPLAY] 回測 LLM 回應",
+            ['live', 'record', 'replay'],
+            index=0,
+            format_func=lambda m: {'live': '即時呼叫', 'record': '即時呼叫並錄製', 'replay': '從錄製檔重播 (離線)'}[m],
+            help="重播模式從 data/llm_replay.jsonl 讀取錄製的回應，沒有錄到的決策點視為 HOLD"
+        )
+        
+        llm_batch = st.checkbox(
+            "[BATCH] 批次推論",
+            value=False,
+            help="先收集所有決策點的 prompt，同時送到已設定的免費 API (依各自 RPM 限制)，再跑持倉模擬"
+        )
+        
         st.divider()
         
         # 實時訊號分析
@@ -220,11 +234,14 @@ def render_trading_interface():
                         timeframe=timeframe,
                         capital=capital,
                         simulation_days=simulation_days,
-                        ai_confidence_threshold=ai_confidence_min / 100.0
+                        ai_confidence_threshold=ai_confidence_min / 100.0,
+                        llm_replay_mode=llm_replay_mode,
+                        llm_batch=llm_batch
                     )
                     
                     loader = DataLoader()
-                    df = loader.load_data(symbol, timeframe)
+                    # 只讀取回測天數範圍內的數據 (與 V13Backtester 的時間過濾一致)
+                    df = loader.load_data(symbol, timeframe, days=simulation_days)
                     
                     if df is not None and not df.empty:
                         bt = V13Backtester(config)
@@ -273,6 +290,13 @@ def render_trading_interface():
                                 )
                                 st.plotly_chart(fig, use_container_width=True)
                             
+                            replay_stats = results.get('llm_replay')
+                            if replay_stats:
+                                st.caption(
+                                    f"[REPLAY] {replay_stats['mode']}: 重播 {replay_stats['hits']} 次 | "
+                                    f"stub {replay_stats['misses']} 次 | 錄製 {replay_stats['recorded']} 筆"
+                                )
+                            
                             # 成功案例學習狀況
                             if results.get('learned_cases', 0) > 0:
                                 st.info(f"[LEARNED] 本次回測新增 {results['learned_cases']} 個成功案例到 AI 學習庫")
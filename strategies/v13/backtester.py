@@ -1,34 +1,53 @@
 import pandas as pd
 import numpy as np
-import talib
 from datetime import timedelta
+from core.backtest_kernel import BacktestSpec, Order, run_backtest
+from core.batch_inference import BatchInference
 from core.llm_agent import DeepSeekTradingAgent
+from core.llm_replay import open_replay
+from core.indicator_engine import HLC, compute_indicators, indicator
+
+
+V13_INDICATORS = [
+    indicator('RSI', 'rsi', timeperiod=14),
+    indicator('MACD', ('macd', 'macd_signal', 'macd_hist')),
+    indicator('BBANDS', ('bb_upper', 'bb_middle', 'bb_lower'), timeperiod=20),
+    indicator('EMA', 'ema50', timeperiod=50),
+    indicator('EMA', 'ema200', timeperiod=200),
+    indicator('ATR', 'atr', inputs=HLC, timeperiod=14),
+    indicator('ROLLING_MEAN', 'vol_ma', inputs=('volume',), timeperiod=24),
+]
+
+# _extract_market_data 使用的欄位 (欄位不存在時的預設值以收盤價計算)
+MARKET_FIELDS = ('close', 'rsi', 'macd_hist', 'bb_position', 'volume_ratio', 'ema50', 'ema200', 'atr')
 
 class V13Backtester:
     """V13 DeepSeek-R1 AI 回測引擎"""
     
     def __init__(self, config):
         self.config = config
-        self.agent = DeepSeekTradingAgent()
+        # 錄製 / 重播模式下 LLM 回應經過本地錄製檔；重播時完全不呼叫 Ollama
+        self.replay = open_replay({
+            'mode': getattr(config, 'llm_replay_mode', 'live'),
+            'path': getattr(config, 'llm_replay_path', 'data/llm_replay.jsonl')
+        })
+        self.agent = DeepSeekTradingAgent(replay=self.replay)
         
     def prepare_features(self, df):
         """計算技術指標特徵"""
         df = df.copy()
         
         # 技術指標
-        df['rsi'] = talib.RSI(df['close'], timeperiod=14)
-        df['macd'], df['macd_signal'], df['macd_hist'] = talib.MACD(df['close'])
-        df['bb_upper'], df['bb_middle'], df['bb_lower'] = talib.BBANDS(df['close'], timeperiod=20)
-        df['ema50'] = talib.EMA(df['close'], timeperiod=50)
-        df['ema200'] = talib.EMA(df['close'], timeperiod=200)
-        df['atr'] = talib.ATR(df['high'], df['low'], df['close'], timeperiod=14)
+        block = compute_indicators(df, V13_INDICATORS)
+        block.assign_to(df, ['rsi', 'macd', 'macd_signal', 'macd_hist', 'bb_upper', 'bb_middle', 'bb_lower',
+                             'ema50', 'ema200', 'atr'])
         
         # 布林帶位置
         df['bb_position'] = (df['close'] - df['bb_lower']) / (df['bb_upper'] - df['bb_lower'])
         df['bb_position'] = df['bb_position'].clip(0, 1)
         
         # 成交量比率
-        df['vol_ma'] = df['volume'].rolling(24).mean()
+        df['vol_ma'] = block['vol_ma']
         df['volume_ratio'] = df['volume'] / df['vol_ma']
         
         df.dropna(inplace=True)
@@ -55,23 +74,9 @@ class V13Backtester:
             # 初始化
             capital = self.config.capital
             initial_capital = capital
-            peak_capital = capital
-            
-            position = 0
-            entry_price = 0
-            sl_price = 0
-            tp_price = 0
-            position_size_usd = 0
-            entry_time = None
-            entry_decision = None
-            
-            trades = []
-            equity_curve = []
-            ai_decisions = []  # 記錄所有 AI 決策
             
-            trades_today = 0
-            last_trade_date = None
-            total_fee_rate = self.config.fee_rate + self.config.slippage
+            ai_decisions = []  # 記錄所有 AI 決策
+            entry_decisions = {}  # 進場K線 -> AI 決策 (學習成功案例用)
             
             real_start_time = df['open_time'].iloc[0]
             real_end_time = df['open_time'].iloc[-1]
@@ -82,94 +87,87 @@ class V13Backtester:
             
             # 每 N 根 K 線調用一次 AI（減少推理次數）
             decision_interval = 4  # 15m * 4 = 每小時決策一次
+            closes = df['close'].values
+            market_arrays = self._market_arrays(df)
+            decision_points = np.arange(len(df)) % decision_interval == 0
+            # 錄製 / 重播都從錄製檔的案例快照開始，學到的案例只留在記憶體，同一份錄製檔重播的 prompt 才會相同
+            persist_cases = self.replay is None
+            
+            # 批次模式: 先取得所有決策點的決策，再跑持倉模擬
+            batched = None
+            if getattr(self.config, 'llm_batch', False):
+                batched = self._batch_decisions(market_arrays, np.flatnonzero(decision_points))
             
-            for i in range(len(df)):
-                row = df.iloc[i]
-                equity_curve.append(capital)
+            def ai_entry(i, capital):
+                market_data = self._market_data_at(market_arrays, i)
                 
-                if capital > peak_capital:
-                    peak_capital = capital
-                if (peak_capital - capital) / peak_capital > self.config.max_drawdown_stop:
-                    print(f"[V13] 觸發最大回撤停損 ({self.config.max_drawdown_stop*100}%)")
-                    break
+                # 調用 DeepSeek-R1 進行決策
+                decision = batched[i] if batched is not None else self.agent.analyze_market(market_data)
+                ai_decisions.append(decision)
                 
-                current_date = row['open_time'].date()
-                if current_date != last_trade_date:
-                    trades_today = 0
-                    last_trade_date = current_date
+                # 只有當 AI 信心度足夠高時才開倉 (目前只做多)
+                if not (decision['signal'] == 'LONG' and
+                        decision.get('confidence', 0) >= self.config.ai_confidence_threshold * 100):
+                    return None
                 
-                # 1. 檢查出場
-                if position == 1:
-                    exit_price = 0
-                    exit_reason = ''
-                    
-                    if row['high'] >= tp_price:
-                        exit_price = tp_price
-                        exit_reason = 'TP'
-                    elif row['low'] <= sl_price:
-                        exit_price = sl_price
-                        exit_reason = 'SL'
-                    
-                    if exit_price > 0:
-                        pnl_pct = (exit_price - entry_price) / entry_price
-                        pnl_usd = position_size_usd * pnl_pct - (position_size_usd * total_fee_rate * 2)
-                        capital += pnl_usd
-                        position = 0
-                        
-                        holding_hours = (row['open_time'] - entry_time).total_seconds() / 3600
-                        
-                        trade_record = {
-                            'entry_time': entry_time,
-                            'exit_time': row['open_time'],
-                            'entry_price': entry_price,
-                            'exit_price': exit_price,
-                            'pnl_usd': pnl_usd,
-                            'pnl_pct': pnl_pct,
-                            'holding_hours': holding_hours,
-                            'exit_reason': exit_reason
-                        }
-                        trades.append(trade_record)
-                        
-                        # 學習成功案例
-                        if self.config.enable_learning and pnl_pct > self.config.min_profit_to_learn:
-                            actual_result = {
-                                'profit': pnl_usd,
-                                'profit_percent': pnl_pct * 100,
-                                'hold_hours': holding_hours
-                            }
-                            market_snapshot = self._extract_market_data(row)
-                            self.agent.save_success_case(market_snapshot, entry_decision, actual_result)
+                entry_decisions[i] = decision
                 
-                # 2. 進場邏輯（每 N 根 K 線調用 AI）
-                if position == 0 and trades_today < self.config.max_daily_trades:
-                    if i % decision_interval == 0:  # 降低 AI 調用頻率
-                        market_data = self._extract_market_data(row)
-                        
-                        # 調用 DeepSeek-R1 進行決策
-                        decision = self.agent.analyze_market(market_data)
-                        ai_decisions.append(decision)
-                        
-                        # 只有當 AI 信心度足夠高時才開倉
-                        if decision['signal'] in ['LONG', 'SHORT'] and \
-                           decision.get('confidence', 0) >= self.config.ai_confidence_threshold * 100:
-                            
-                            if decision['signal'] == 'LONG':
-                                position = 1
-                                entry_price = row['close']
-                                entry_time = row['open_time']
-                                entry_decision = decision
-                                
-                                # 使用 AI 建議的止損與止盈
-                                sl_price = decision['stop_loss']
-                                tp_price = decision['take_profit']
-                                
-                                # 計算倉位大小
-                                sl_distance = abs(entry_price - sl_price)
-                                sl_pct = sl_distance / entry_price
-                                max_loss = capital * self.config.base_risk
-                                position_size_usd = min(max_loss / sl_pct, capital * self.config.max_leverage)
-                                
-                                trades_today += 1
+                # 使用 AI 建議的止損與止盈，依止損距離計算倉位大小
+                entry_price = closes[i]
+                sl_distance = abs(entry_price - decision['stop_loss'])
+                return Order(
+                    direction=1,
+                    sl=decision['stop_loss'],
+                    tp=decision['take_profit'],
+                    sl_pct=sl_distance / entry_price
+                )
+            
+            def learn_from_exit(i, trade):
+                # 學習成功案例
+                if self.config.enable_learning and trade['return'] > self.config.min_profit_to_learn:
+                    actual_result = {
+                        'profit': trade['pnl_usd'],
+                        'profit_percent': trade['return'] * 100,
+                        'hold_hours': trade['holding_hours']
+                    }
+                    market_snapshot = self._market_data_at(market_arrays, i)
+                    self.agent.save_success_case(market_snapshot, entry_decisions[trade['entry_idx']], actual_result,
+                                                 persist=persist_cases)
+            
+            spec = BacktestSpec(
+                capital=capital,
+                base_risk=self.config.base_risk,
+                max_leverage=self.config.max_leverage,
+                fee_rate=self.config.fee_rate + self.config.slippage,
+                max_drawdown_stop=self.config.max_drawdown_stop,
+                max_daily_trades=self.config.max_daily_trades,
+                exit_priority='tp_first'
+            )
+            result = run_backtest(
+                df, spec,
+                entry_fn=ai_entry,
+                candidates=decision_points,  # 降低 AI 調用頻率
+                on_exit=learn_from_exit
+            )
+            if result.halted:
+                print(f"[V13] 觸發最大回撤停損 ({self.config.max_drawdown_stop*100}%)")
+            
+            capital = result.capital
+            equity_curve = result.equity_curve
+            open_times = df['open_time']
+            trades = [
+                {
+                    'entry_time': open_times.iloc[t['entry_idx']],
+                    'exit_time': open_times.iloc[t['exit_idx']],
+                    'entry_price': t['entry_price'],
+                    'exit_price': t['exit_price'],
+                    'pnl_usd': t['pnl_usd'],
+                    'pnl_pct': t['return'],
+                    'holding_hours': t['holding_hours'],
+                    'exit_reason': t['reason'].upper()
+                }
+                for t in result.trades
+            ]
             
             # 統計結算
             wins = len([t for t in trades if t['pnl_usd'] > 0])
@@ -199,6 +197,11 @@ class V13Backtester:
             print(f"[V13] 回測完成！")
             print(f"[V13] 總報酬: {total_return:.2f}% | 勝率: {win_rate:.1f}% | 總交易: {total}")
             print(f"[V13] AI 信號數: {ai_signals_count} | 實際開倉: {total} | 執行率: {execution_rate:.1f}%")
+            replay_stats = self.replay.get_stats() if self.replay else None
+            if replay_stats:
+                print(f"[V13] LLM {replay_stats['mode']}: 命中 {replay_stats['hits']} | stub {replay_stats['misses']} | 錄製 {replay_stats['recorded']}")
+                if replay_stats.get('warning'):
+                    print(f"[V13] ⚠️ {replay_stats['warning']}")
             
             return {
                 'final_capital': capital,
@@ -215,7 +218,8 @@ class V13Backtester:
                 'ai_signals_count': ai_signals_count,
                 'ai_avg_confidence': ai_avg_confidence,
                 'execution_rate': execution_rate,
-                'learned_cases': learned_cases
+                'learned_cases': learned_cases,
+                'llm_replay': replay_stats
             }
             
         except Exception as e:
@@ -235,6 +239,60 @@ class V13Backtester:
             'atr': float(row.get('atr', row['close'] * 0.02))
         }
     
+    def _batch_decisions(self, market_arrays, indices):
+        """
+        批次推論所有決策點，返回 {K線索引: 決策}
+        prompt 一次建好 (歷史案例為回測開始時的狀態)，由 BatchInference 分散到各供應商
+        """
+        points = [self._market_data_at(market_arrays, i) for i in indices]
+        prompts = [self.agent.build_prompt(md) for md in points]
+        print(f"[V13] 批次推論 {len(prompts)} 個決策點")
+        
+        def live_batch(pending):
+            from core.multi_api_manager import MultiAPIManager
+            batch = BatchInference(
+                MultiAPIManager().providers,
+                max_in_flight=getattr(self.config, 'llm_batch_max_in_flight', 8)
+            )
+            if not batch.providers:
+                raise RuntimeError('批次推論需要至少一個可用的 API 提供商')
+            results = batch.run(pending)
+            print(f"[V13] 批次推論完成: {batch.stats}")
+            return results
+        
+        if self.replay:
+            results = self.replay.complete_many('multi_api', 'batch', '', prompts, live_batch)
+        else:
+            results = live_batch(prompts)
+        
+        return {
+            int(i): self.agent.decision_from_result(md, result)
+            for i, md, result in zip(indices, points, results)
+        }
+    
+    def _market_arrays(self, df):
+        """一次取出 _extract_market_data 用到的欄位 (numpy)，逐根K線不再建立 Series"""
+        return {col: df[col].to_numpy(dtype=float) for col in MARKET_FIELDS if col in df.columns}
+    
+    def _market_data_at(self, arrays, i):
+        """與 _extract_market_data(df.iloc[i]) 相同的結果"""
+        close = float(arrays['close'][i])
+        
+        def value(col, default):
+            return float(arrays[col][i]) if col in arrays else float(default)
+        
+        return {
+            'symbol': self.config.symbol,
+            'close': close,
+            'rsi': value('rsi', 50),
+            'macd_hist': value('macd_hist', 0),
+            'bb_position': value('bb_position', 0.5),
+            'volume_ratio': value('volume_ratio', 1.0),
+            'ema50': value('ema50', close),
+            'ema200': value('ema200', close),
+            'atr': value('atr', close * 0.02)
+        }
+    
     def _calculate_max_drawdown(self, equity_curve):
         if not equity_curve:
             return 0.0
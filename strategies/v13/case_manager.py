@@ -4,12 +4,16 @@ V13 案例管理器 GUI
 """
 import streamlit as st
 import pandas as pd
-import json
 from pathlib import Path
 from core.case_extractor import CaseExtractor
-from core.data_loader import DataLoader
+from core.case_import import bulk_import_cases
+from core.case_store import CaseStore, open_case_store
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
+
+
+CASES_PER_PAGE = 20
+CASE_SORT_FIELDS = {"獲利率降序": 'profit', "時間降序": 'entry_time', "持倉時間降序": 'holding_bars'}
+IMPORT_SYMBOLS = ['BTCUSDT', 'ETHUSDT', 'BNBUSDT', 'SOLUSDT']
 
 
 def render_case_manager():
@@ -24,80 +28,68 @@ def render_case_manager():
     """)
     
     cases_path = Path("data/detailed_success_cases.json")
+    store = open_case_store(cases_path)
     
     # Tab分頁
     tab1, tab2, tab3 = st.tabs(["📋 案例列表", "➕ 批量導入", "📈 統計分析"])
     
     # === Tab 1: 案例列表 ===
     with tab1:
-        if not cases_path.exists():
+        if not store.exists:
             st.warning("📁 尚無學習案例，請至「批量導入」頁面提取歷史數據")
+        elif len(store) == 0:
+            st.warning("📁 案例庫為空")
         else:
-            cases_data = load_cases(cases_path)
+            info = store.info()
+            st.success(f"✅ 已載入 {info['total_cases']} 個案例（特徵數：{info['feature_count']}）")
+            st.caption(f"最後更新：{info['last_updated']}")
             
-            if cases_data['total_cases'] == 0:
-                st.warning("📁 案例庫為空")
-            else:
-                st.success(f"✅ 已載入 {cases_data['total_cases']} 個案例（特徵數：{cases_data['feature_count']}）")
-                st.caption(f"最後更新：{cases_data.get('last_updated', 'N/A')}")
-                
-                # 篩選器
-                col_f1, col_f2, col_f3 = st.columns(3)
-                with col_f1:
-                    filter_direction = st.multiselect(
-                        "方向篩選",
-                        ['LONG', 'SHORT'],
-                        default=['LONG', 'SHORT']
-                    )
-                with col_f2:
-                    filter_min_profit = st.number_input(
-                        "最低獲利%",
-                        0.0, 10.0, 1.0, 0.5
-                    )
-                with col_f3:
-                    sort_by = st.selectbox(
-                        "排序方式",
-                        ["獲利率降序", "時間降序", "持倉時間降序"]
-                    )
-                
-                # 篩選案例
-                filtered_cases = []
-                for case in cases_data['cases']:
-                    if case['direction'] not in filter_direction:
-                        continue
-                    
-                    profit = float(case['outcome'].replace('profit_', '').replace('%', ''))
-                    if profit < filter_min_profit:
-                        continue
+            # 篩選器
+            col_f1, col_f2, col_f3 = st.columns(3)
+            with col_f1:
+                filter_direction = st.multiselect(
+                    "方向篩選",
+                    ['LONG', 'SHORT'],
+                    default=['LONG', 'SHORT']
+                )
+            with col_f2:
+                filter_min_profit = st.number_input(
+                    "最低獲利%",
+                    0.0, 10.0, 1.0, 0.5
+                )
+            with col_f3:
+                sort_by = st.selectbox(
+                    "排序方式",
+                    ["獲利率降序", "時間降序", "持倉時間降序"]
+                )
+            
+            # 篩選與排序只讀取索引欄位，只解析目前這一頁的案例
+            filters = {
+                'directions': filter_direction,
+                'min_profit': filter_min_profit,
+                'sort_by': CASE_SORT_FIELDS[sort_by]
+            }
+            total = len(store.select(**filters))
+            n_pages = max(1, -(-total // CASES_PER_PAGE))
+            page_no = st.number_input("頁數", 1, n_pages, 1, 1) if n_pages > 1 else 1
+            offset = (page_no - 1) * CASES_PER_PAGE
+            page_cases, total = store.page(offset, CASES_PER_PAGE, **filters)
+            
+            st.divider()
+            st.caption(f"🔍 顯示 {total} / {info['total_cases']} 個案例（第 {page_no}/{n_pages} 頁）")
+            
+            # 卡片式顯示
+            for idx, case in enumerate(page_cases, start=offset):
+                with st.expander(
+                    f"{idx+1}. {case['symbol']} {case['direction']} - {case['outcome']} | {case['entry_time']}",
+                    expanded=(idx == 0)
+                ):
+                    render_case_detail(case)
                     
-                    filtered_cases.append(case)
-                
-                # 排序
-                if sort_by == "獲利率降序":
-                    filtered_cases.sort(
-                        key=lambda x: float(x['outcome'].replace('profit_', '').replace('%', '')),
-                        reverse=True
-                    )
-                elif sort_by == "時間降序":
-                    filtered_cases.sort(key=lambda x: x['entry_time'], reverse=True)
-                elif sort_by == "持倉時間降序":
-                    filtered_cases.sort(key=lambda x: x['holding_bars'], reverse=True)
-                
-                st.divider()
-                st.caption(f"🔍 顯示 {len(filtered_cases)} / {cases_data['total_cases']} 個案例")
-                
-                # 卡片式顯示
-                for idx, case in enumerate(filtered_cases):
-                    with st.expander(
-                        f"{idx+1}. {case['symbol']} {case['direction']} - {case['outcome']} | {case['entry_time']}",
-                        expanded=(idx == 0)
-                    ):
-                        render_case_detail(case)
-                        
-                        # 刪除按鈕
-                        if st.button(f"🗑️ 刪除此案例", key=f"delete_{case['trade_id']}"):
-                            delete_case(cases_path, case['trade_id'])
-                            st.rerun()
+                    # 刪除按鈕
+                    if st.button(f"🗑️ 刪除此案例", key=f"delete_{case['trade_id']}"):
+                        delete_case(store, case['trade_id'])
+                        st.rerun()
     
     # === Tab 2: 批量導入 ===
     with tab2:
@@ -105,9 +97,10 @@ def render_case_manager():
         
         col_i1, col_i2 = st.columns(2)
         with col_i1:
-            import_symbol = st.selectbox(
+            import_symbols = st.multiselect(
                 "💰 選擇幣種",
-                ['BTCUSDT', 'ETHUSDT', 'BNBUSDT', 'SOLUSDT']
+                IMPORT_SYMBOLS,
+                default=IMPORT_SYMBOLS
             )
             import_timeframe = st.selectbox(
                 "⏰ 時間框架",
@@ -118,14 +111,14 @@ def render_case_manager():
         with col_i2:
             import_days = st.number_input(
                 "📆 歷史天數",
-                30, 365, 90, 30
+                30, 365 * 5, 90, 30
             )
             min_profit_pct = st.number_input(
                 "🎯 最低獲利%",
                 0.5, 5.0, 1.0, 0.5
             )
         
-        st.info("""
+        st.info(f"""
         **提取邏輯**：
         1. 從 HuggingFace/本地緩存 載入歷史K線數據
         2. 截取最近N天的數據
@@ -133,111 +126,46 @@ def render_case_manager():
         4. 識別潛在交易訊號（基於RSI超買/超賣 + 成交量爆發）
         5. 模擬交易並篩選獲利 > {min_profit_pct}% 的案例
         6. 提取進場時刻完整特徵並儲存
+        
+        多個幣種會分散到多個行程同時處理
         """)
         
-        if st.button("🚀 開始提取", type="primary"):
-            with st.spinner(f"正在載入 {import_symbol} {import_timeframe} 歷史數據..."):
-                try:
-                    # 載入完整數據
-                    loader = DataLoader()
-                    df_full = loader.load_data(import_symbol, import_timeframe)
-                    
-                    if df_full is None or len(df_full) < 200:
-                        st.error("❌ 數據不足，至少需要200根K線")
-                        return
-                    
-                    st.success(f"✅ 已載入 {len(df_full)} 根K線（完整歷史）")
-                    
-                    # 截取最近N天的數據
-                    with st.spinner(f"🕒 截取最近 {import_days} 天數據..."):
-                        df = filter_recent_days(df_full, import_timeframe, import_days)
-                    
-                    if df is None or len(df) < 200:
-                        st.error(f"❌ 最近{import_days}天數據不足，請增加天數或確認數據源")
-                        return
-                    
-                    st.success(f"✅ 截取完成：{len(df)} 根K線（約 {import_days} 天）")
-                    
-                    # 模擬交易找到獲利案例
-                    with st.spinner("🤖 正在識別獲利交易訊號..."):
-                        trades = simulate_trades(df, import_symbol, min_profit_pct)
-                    
-                    if not trades:
-                        st.warning(f"⚠️ 未找到獲利 > {min_profit_pct}% 的交易，嘗試：\n- 降低最低獲利%\n- 增加歷史天數")
-                        return
-                    
-                    st.success(f"✅ 識別到 {len(trades)} 筆獲利交易")
-                    
-                    # 提取案例
-                    with st.spinner("🔍 正在提取40+技術指標特徵..."):
-                        extractor = CaseExtractor()
-                        cases = extractor.extract_from_trades(df, trades)
+        if st.button("🚀 開始提取", type="primary", disabled=not import_symbols):
+            extractor = CaseExtractor()
+            progress = st.progress(0.0)
+            total_new = 0
+            
+            with st.spinner(f"正在處理 {len(import_symbols)} 個幣種 {import_timeframe} 最近 {import_days} 天..."):
+                # 每個幣種一個工作行程，案例庫只在這裡寫入
+                results = bulk_import_cases(import_symbols, import_timeframe, import_days, min_profit_pct)
+                for done, result in enumerate(results, start=1):
+                    progress.progress(done / len(import_symbols))
+                    symbol = result['symbol']
                     
-                    if cases:
-                        new_count = extractor.save_cases(cases, str(cases_path))
-                        st.success(f"🎉 成功新增 {new_count} 個案例到學習庫！")
-                        st.balloons()
+                    if 'error' in result:
+                        st.error(f"❌ {symbol} 提取失敗：{result['error']}")
+                    elif not result['trades']:
+                        st.warning(f"⚠️ {symbol} 未找到獲利 > {min_profit_pct}% 的交易，嘗試：\n- 降低最低獲利%\n- 增加歷史天數")
+                    elif not result['cases']:
+                        st.warning(f"⚠️ {symbol} 未能提取有效案例")
                     else:
-                        st.warning("⚠️ 未能提取有效案例")
-                
-                except Exception as e:
-                    st.error(f"❌ 提取失敗：{str(e)}")
-                    import traceback
-                    st.code(traceback.format_exc())
+                        new_count = extractor.save_cases(result['cases'], str(cases_path))
+                        total_new += new_count
+                        st.success(
+                            f"✅ {symbol}：{result['bars']} 根K線，{result['trades']} 筆獲利交易，"
+                            f"新增 {new_count} 個案例"
+                        )
+            
+            if total_new:
+                st.success(f"🎉 成功新增 {total_new} 個案例到學習庫！")
+                st.balloons()
     
     # === Tab 3: 統計分析 ===
     with tab3:
-        if not cases_path.exists():
+        if len(store) == 0:
             st.warning("📁 尚無案例數據")
         else:
-            cases_data = load_cases(cases_path)
-            render_statistics(cases_data)
-
-
-def filter_recent_days(df: pd.DataFrame, timeframe: str, days: int) -> pd.DataFrame:
-    """
-    截取最近N天的數據
-    
-    Args:
-        df: 完整歷史數據
-        timeframe: 時間框架 (15m/1h/4h/1d)
-        days: 要截取多少天
-    
-    Returns:
-        截取後的DataFrame
-    """
-    # 確定時間欄位
-    time_col = None
-    for col in ['timestamp', 'open_time', 'close_time', 'time']:
-        if col in df.columns:
-            time_col = col
-            break
-    
-    if time_col is None:
-        # 嘗試使用index
-        if isinstance(df.index, pd.DatetimeIndex):
-            df = df.copy()
-            df['timestamp'] = df.index
-            time_col = 'timestamp'
-        else:
-            raise ValueError("無法找到時間欄位")
-    
-    # 確保是datetime類型
-    if not pd.api.types.is_datetime64_any_dtype(df[time_col]):
-        df[time_col] = pd.to_datetime(df[time_col])
-    
-    # 計算截取時間點
-    latest_time = df[time_col].max()
-    cutoff_time = latest_time - timedelta(days=days)
-    
-    # 截取
-    df_filtered = df[df[time_col] >= cutoff_time].copy()
-    
-    # 恢復timestamp欄（如果是從index複製的）
-    if 'timestamp' not in df.columns and time_col == 'timestamp':
-        df_filtered = df_filtered.drop('timestamp', axis=1)
-    
-    return df_filtered
+            render_statistics(store)
 
 
 def render_case_detail(case: dict):
@@ -272,129 +200,33 @@ def render_case_detail(case: dict):
             st.dataframe(indicators_df, use_container_width=True)
 
 
-def load_cases(filepath: Path) -> dict:
-    """載入案例數據"""
-    with open(filepath, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-
-def delete_case(filepath: Path, trade_id: str):
-    """刪除指定案例"""
-    data = load_cases(filepath)
-    data['cases'] = [c for c in data['cases'] if c['trade_id'] != trade_id]
-    data['total_cases'] = len(data['cases'])
-    data['last_updated'] = pd.Timestamp.now().isoformat()
-    
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-    
-    st.success(f"✅ 已刪除案例: {trade_id}")
-
-
-def simulate_trades(df: pd.DataFrame, symbol: str, min_profit_pct: float) -> list:
-    """
-    模擬簡單的RSI超買/超賣策略，找到獲利交易
-    這只是示範，實際應使用你的V13回測引擎的交易記錄
-    """
-    import talib
-    
-    # 確定時間欄位
-    time_col = None
-    for col in ['timestamp', 'open_time', 'close_time', 'time']:
-        if col in df.columns:
-            time_col = col
-            break
-    if time_col is None and isinstance(df.index, pd.DatetimeIndex):
-        df = df.copy()
-        df['timestamp'] = df.index
-        time_col = 'timestamp'
-    
-    close = df['close'].values
-    high = df['high'].values
-    low = df['low'].values
-    volume = df['volume'].values
-    
-    rsi = talib.RSI(close, timeperiod=14)
-    volume_ma = pd.Series(volume).rolling(20).mean().values
-    
-    trades = []
-    position = None
-    
-    for i in range(100, len(df) - 20):  # 保留前100根計算指標，後20根看結果
-        if position is None:
-            # LONG條件：RSI<30 + 成交量>1.5x
-            if rsi[i] < 30 and volume[i] > volume_ma[i] * 1.5:
-                position = {
-                    'direction': 'LONG',
-                    'entry_idx': i,
-                    'entry_time': str(df.iloc[i][time_col]),
-                    'entry_price': close[i]
-                }
-            # SHORT條件：RSI>70 + 成交量>1.5x
-            elif rsi[i] > 70 and volume[i] > volume_ma[i] * 1.5:
-                position = {
-                    'direction': 'SHORT',
-                    'entry_idx': i,
-                    'entry_time': str(df.iloc[i][time_col]),
-                    'entry_price': close[i]
-                }
-        else:
-            # 檢查是否獲利
-            if position['direction'] == 'LONG':
-                pnl_pct = (close[i] - position['entry_price']) / position['entry_price'] * 100
-                if pnl_pct >= min_profit_pct or pnl_pct <= -2.0:  # 止盈或止損
-                    if pnl_pct >= min_profit_pct:
-                        trades.append({
-                            'symbol': symbol,
-                            'direction': position['direction'],
-                            'entry_time': position['entry_time'],
-                            'exit_time': str(df.iloc[i][time_col]),
-                            'entry_price': position['entry_price'],
-                            'exit_price': close[i],
-                            'pnl_pct': pnl_pct,
-                            'exit_reason': 'TP' if pnl_pct > 0 else 'SL'
-                        })
-                    position = None
-            else:  # SHORT
-                pnl_pct = (position['entry_price'] - close[i]) / position['entry_price'] * 100
-                if pnl_pct >= min_profit_pct or pnl_pct <= -2.0:
-                    if pnl_pct >= min_profit_pct:
-                        trades.append({
-                            'symbol': symbol,
-                            'direction': position['direction'],
-                            'entry_time': position['entry_time'],
-                            'exit_time': str(df.iloc[i][time_col]),
-                            'entry_price': position['entry_price'],
-                            'exit_price': close[i],
-                            'pnl_pct': pnl_pct,
-                            'exit_reason': 'TP' if pnl_pct > 0 else 'SL'
-                        })
-                    position = None
-    
-    return trades
+def delete_case(store: CaseStore, trade_id: str):
+    """刪除指定案例 (寫入墓碑，不重寫整個案例庫)"""
+    if store.delete(trade_id):
+        st.success(f"✅ 已刪除案例: {trade_id}")
 
 
-def render_statistics(cases_data: dict):
+def render_statistics(store: CaseStore):
     """渲染案例統計分析"""
-    cases = cases_data['cases']
+    summary = store.summary()
     
-    if not cases:
+    if summary.empty:
         st.warning("📁 無案例數據")
         return
     
     # 基礎統計
     col_s1, col_s2, col_s3, col_s4 = st.columns(4)
     
-    long_count = sum(1 for c in cases if c['direction'] == 'LONG')
-    short_count = sum(1 for c in cases if c['direction'] == 'SHORT')
+    long_count = int((summary['direction'] == 'LONG').sum())
+    short_count = int((summary['direction'] == 'SHORT').sum())
     
-    profits = [float(c['outcome'].replace('profit_', '').replace('%', '')) for c in cases]
+    profits = summary['profit'].tolist()
     avg_profit = sum(profits) / len(profits)
     max_profit = max(profits)
     
-    avg_holding = sum(c['holding_bars'] for c in cases) / len(cases)
+    avg_holding = summary['holding_bars'].mean()
     
-    col_s1.metric("📈 總案例數", len(cases))
+    col_s1.metric("📈 總案例數", len(summary))
     col_s2.metric("🔴 LONG / 🔵 SHORT", f"{long_count} / {short_count}")
     col_s3.metric("🎯 平均獲利", f"{avg_profit:.2f}%")
     col_s4.metric("⏱️ 平均持倉", f"{avg_holding:.1f} bars")
@@ -417,7 +249,7 @@ def render_statistics(cases_data: dict):
     
     # Top 10 最佳案例
     st.subheader("🏆 Top 10 最佳獲利案例")
-    top_cases = sorted(cases, key=lambda x: float(x['outcome'].replace('profit_', '').replace('%', '')), reverse=True)[:10]
+    top_cases, _ = store.page(0, 10, sort_by='profit')
     
     top_df = pd.DataFrame([{
         '排名': idx + 1,
@@ -28,4 +28,13 @@ class V13Config:
     
     # AI 學習參數
     enable_learning: bool = True  # 啟用從成功交易中學習
-    min_profit_to_learn: float = 0.01  # 最低獲利 1% 才記錄為成功案例
\ No newline at end of file
+    min_profit_to_learn: float = 0.01  # 最低獲利 1% 才記錄為成功案例
+    
+    # LLM 回應錄製 / 重播 (live: 直接呼叫, record: 呼叫並錄製, replay: 只從錄製檔重播)
+    llm_replay_mode: str = 'live'
+    llm_replay_path: str = 'data/llm_replay.jsonl'
+    
+    # 批次推論: 先收集所有決策點的 prompt，分散到 MultiAPIManager 的供應商同時執行 (受各自 RPM 限制)
+    # 決策點的歷史案例固定為回測開始時的案例庫；錄製 / 重播的鍵與逐次呼叫 (Ollama) 分開
+    llm_batch: bool = False
+    llm_batch_max_in_flight: int = 8  # 每個供應商同時進行的請求數
@@ -2,53 +2,90 @@
 市場特徵提取工具
 將 K 線數據轉換為 AI 所需的 40+ 技術指標
 修復: 添加 symbol 參數支持
+優化: 指標只需對完整 DataFrame 計算一次，多根 K 棒按索引讀取
 """
+import numpy as np
 import pandas as pd
-import talib
+from core.indicator_engine import MARKET_INDICATORS, compute_indicators, indicator
 
 
-def prepare_market_features(row, df, symbol='UNKNOWN'):
+# AI 特徵所需指標：核心指標 + 成交量均線 (pandas rolling)
+MARKET_FEATURE_INDICATORS = MARKET_INDICATORS + [
+    indicator('ROLLING_MEAN', 'volume_ma', inputs=('volume',), timeperiod=20),
+]
+
+
+def calculate_market_indicators(df):
     """
-    將 DataFrame 的一行轉換為 DeepSeek 需要的格式（強化版：40+指標）
+    對完整的 DataFrame 計算一次所有技術指標序列
+    
+    所有指標皆為因果計算 (只依賴當前及之前的 K 棒)，
+    因此第 i 根的數值與只用 df.iloc[:i+1] 計算的結果完全相同。
     
     Args:
-        row: DataFrame 的一行數據
         df: 完整的 DataFrame
-        symbol: 交易對符號 (例如 'BTCUSDT')
     
     Returns:
-        dict: 包含所有市場特徵的字典
+        IndicatorBlock: 指標名稱 -> 欄位 (長度與 df 相同)
     """
-    # 計算技術指標
-    close = df['close'].values
-    high = df['high'].values
-    low = df['low'].values
-    volume = df['volume'].values
+    return compute_indicators(df, MARKET_FEATURE_INDICATORS)
+
+
+def stack_indicator_values(values_list):
+    """
+    將多根 K 棒的指標數值 (例如 StreamingIndicatorState 的 history) 
+    疊成與 calculate_market_indicators() 相同形式的欄位，供 extract_market_features 使用
     
-    # 趋勢
-    ema9 = talib.EMA(close, timeperiod=9)
-    ema21 = talib.EMA(close, timeperiod=21)
-    ema50 = talib.EMA(close, timeperiod=50)
-    ema200 = talib.EMA(close, timeperiod=200)
-    macd, macd_signal, macd_hist = talib.MACD(close)
-    adx = talib.ADX(high, low, close, timeperiod=14)
+    Args:
+        values_list: [{指標名稱: 數值}, ...]，依時間排序
     
-    # 動能
-    rsi = talib.RSI(close, timeperiod=14)
-    stoch_k, stoch_d = talib.STOCH(high, low, close)
-    cci = talib.CCI(high, low, close, timeperiod=14)
-    mfi = talib.MFI(high, low, close, volume, timeperiod=14)
-    willr = talib.WILLR(high, low, close, timeperiod=14)
+    Returns:
+        dict: 指標名稱 -> numpy array
+    """
+    return {
+        name: np.array([values[name] for values in values_list], dtype=np.float64)
+        for name in values_list[0]
+    }
+
+
+def extract_market_features(indicators, row, idx, symbol='UNKNOWN'):
+    """
+    從預先計算好的指標序列中讀取第 idx 根 K 棒的特徵
     
-    # 波動
-    atr = talib.ATR(high, low, close, timeperiod=14)
-    bb_upper, bb_middle, bb_lower = talib.BBANDS(close, timeperiod=20)
+    Args:
+        indicators: calculate_market_indicators() 的返回值
+        row: 第 idx 根 K 棒的數據
+        idx: K 棒的位置索引 (從 0 開始)
+        symbol: 交易對符號 (例如 'BTCUSDT')
     
-    # 成交量
-    volume_ma = pd.Series(volume).rolling(20).mean().values
-    obv = talib.OBV(close, volume)
+    Returns:
+        dict: 包含所有市場特徵的字典
+    """
+    close = indicators['close']
+    high = indicators['high']
+    low = indicators['low']
+    volume = indicators['volume']
     
-    idx = len(df) - 1
+    ema9 = indicators['ema9']
+    ema21 = indicators['ema21']
+    ema50 = indicators['ema50']
+    ema200 = indicators['ema200']
+    macd = indicators['macd']
+    macd_signal = indicators['macd_signal']
+    macd_hist = indicators['macd_hist']
+    adx = indicators['adx']
+    rsi = indicators['rsi']
+    stoch_k = indicators['stoch_k']
+    stoch_d = indicators['stoch_d']
+    cci = indicators['cci']
+    mfi = indicators['mfi']
+    willr = indicators['willr']
+    atr = indicators['atr']
+    bb_upper = indicators['bb_upper']
+    bb_middle = indicators['bb_middle']
+    bb_lower = indicators['bb_lower']
+    volume_ma = indicators['volume_ma']
+    obv = indicators['obv']
     
     # 布林帶位置
     bb_pos = 0.5
@@ -100,3 +137,19 @@ def prepare_market_features(row, df, symbol='UNKNOWN'):
         'dist_to_resistance': float((resistance - close[idx]) / close[idx] * 100),
         'dist_to_support': float((close[idx] - support) / close[idx] * 100)
     }
+
+
+def prepare_market_features(row, df, symbol='UNKNOWN'):
+    """
+    將 DataFrame 的一行轉換為 DeepSeek 需要的格式（強化版：40+指標）
+    
+    Args:
+        row: DataFrame 的一行數據
+        df: 完整的 DataFrame
+        symbol: 交易對符號 (例如 'BTCUSDT')
+    
+    Returns:
+        dict: 包含所有市場特徵的字典
+    """
+    indicators = calculate_market_indicators(df)
+    return extract_market_features(indicators, row, len(df) - 1, symbol=symbol)
@@ -13,9 +13,8 @@ class V3Trainer:
         self.short_model = None
         self.feature_names = []
         
-    def train(self, df):
-        print("[V3 Triple Barrier Strategy Training - Optimized]")
-        
+    def build_dataset(self, df):
+        """計算特徵與標籤，只保留有標籤的列 (walk-forward 的各個 fold 共用這一份)"""
         fe = V3FeatureEngine(self.config)
         df = fe.generate(df)
         
@@ -23,18 +22,70 @@ class V3Trainer:
         df = lg.generate(df)
         
         self.feature_names = fe.get_feature_names(df)
-        X = df[self.feature_names]
+        return df[df['label_long'].notna()]
         
-        valid = df['label_long'].notna()
-        X = X[valid]
-        y_long = df['label_long'][valid]
-        y_short = df['label_short'][valid]
+    def train(self, df):
+        print("[V3 Triple Barrier Strategy Training - Optimized]")
+        
+        df = self.build_dataset(df)
+        X = df[self.feature_names]
+        y_long = df['label_long']
+        y_short = df['label_short']
         
         train_size = int(len(X) * 0.8)
         X_train, X_test = X.iloc[:train_size], X.iloc[train_size:]
         yl_train, yl_test = y_long.iloc[:train_size], y_long.iloc[train_size:]
         ys_train, ys_test = y_short.iloc[:train_size], y_short.iloc[train_size:]
         
+        self._fit_models(X_train, yl_train, ys_train)
+        
+        # Eval
+        long_prob = self.long_model.predict_proba(X_test)[:, 1]
+        short_prob = self.short_model.predict_proba(X_test)[:, 1]
+        
+        return {
+            'long_metrics': self._metrics(yl_test, long_prob),
+            'short_metrics': self._metrics(ys_test, short_prob)
+        }
+        
+    def fit_predict_fold(self, train_df, test_df):
+        """walk-forward 的單一 fold: 在 train_df 上訓練多空模型，返回 test_df 的機率與樣本外指標"""
+        self._fit_models(train_df[self.feature_names], train_df['label_long'], train_df['label_short'])
+        X_test = test_df[self.feature_names]
+        long_prob = self.long_model.predict_proba(X_test)[:, 1]
+        short_prob = self.short_model.predict_proba(X_test)[:, 1]
+        return {
+            'long_prob': long_prob,
+            'short_prob': short_prob,
+            'long_metrics': self._metrics(test_df['label_long'], long_prob),
+            'short_metrics': self._metrics(test_df['label_short'], short_prob)
+        }
+        
+    def walk_forward(self, df, walk_forward):
+        """
+        滾動前進驗證: 特徵與標籤只算一次，每個 fold 重新訓練，
+        返回各 fold 與接起來的整段樣本外指標
+        
+        Args:
+            walk_forward: core.walk_forward.WalkForward (purge_bars 建議設為 t_events_bars)
+        """
+        df = self.build_dataset(df)
+        dataset = df[self.feature_names + ['label_long', 'label_short']].astype(float)
+        results = walk_forward.run(dataset, self.fit_predict_fold)
+        
+        rows = walk_forward.test_rows(results)
+        long_prob = walk_forward.stitch(len(df), results, 'long_prob')[rows]
+        short_prob = walk_forward.stitch(len(df), results, 'short_prob')[rows]
+        return {
+            'folds': [
+                {'fold': r['fold'].index, 'long_metrics': r['long_metrics'], 'short_metrics': r['short_metrics']}
+                for r in results
+            ],
+            'long_metrics': self._metrics(df['label_long'].values[rows], long_prob),
+            'short_metrics': self._metrics(df['label_short'].values[rows], short_prob)
+        }
+        
+    def _fit_models(self, X_train, yl_train, ys_train):
         print(f"Original Long samples: {yl_train.sum()} ({yl_train.sum()/len(yl_train)*100:.1f}%)")
         print(f"Original Short samples: {ys_train.sum()} ({ys_train.sum()/len(ys_train)*100:.1f}%)")
         
@@ -76,27 +127,12 @@ class V3Trainer:
         self.short_model = lgb.LGBMClassifier(**params)
         self.short_model.fit(X_train_short_sm, ys_train_sm)
         
-        # Eval
-        long_prob = self.long_model.predict_proba(X_test)[:, 1]
-        short_prob = self.short_model.predict_proba(X_test)[:, 1]
-        
-        # 放寬預測閾值以提升 Recall
-        pred_threshold = 0.55
-        
-        long_pred = (long_prob > pred_threshold).astype(int)
-        short_pred = (short_prob > pred_threshold).astype(int)
-        
-        results = {
-            'long_metrics': {
-                'auc': float(roc_auc_score(yl_test, long_prob)),
-                'precision': float(precision_score(yl_test, long_pred, zero_division=0)),
-                'recall': float(recall_score(yl_test, long_pred, zero_division=0))
-            },
-            'short_metrics': {
-                'auc': float(roc_auc_score(ys_test, short_prob)),
-                'precision': float(precision_score(ys_test, short_pred, zero_division=0)),
-                'recall': float(recall_score(ys_test, short_pred, zero_division=0))
-            }
+    @staticmethod
+    def _metrics(y_true, prob, pred_threshold=0.55):
+        """AUC / Precision / Recall (放寬預測閾值以提升 Recall)"""
+        pred = (prob > pred_threshold).astype(int)
+        return {
+            'auc': float(roc_auc_score(y_true, prob)) if len(np.unique(y_true)) > 1 else 0.5,
+            'precision': float(precision_score(y_true, pred, zero_division=0)),
+            'recall': float(recall_score(y_true, pred, zero_division=0))
         }
-        
-        return results
\ No newline at end of file
@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 from datetime import timedelta
+from core.backtest_kernel import BacktestSpec, EntryArrays, run_backtest
 
 class V7Backtester:
     """V7 回測引擎 - 高勝率技術組合版"""
@@ -25,138 +26,66 @@ class V7Backtester:
         
         capital = self.config.capital
         initial_capital = capital
-        peak_capital = capital
-        
-        position = 0
-        entry_price = 0
-        sl_price = 0
-        tp_price = 0
-        position_size_usd = 0
-        
-        trades = []
-        equity_curve = []
-        daily_trades_count = 0
-        last_trade_date = None
-        last_exit_idx = -self.config.cooldown_bars
         
         start_time = df['open_time'].iloc[0] if 'open_time' in df.columns else None
         end_time = df['open_time'].iloc[-1] if 'open_time' in df.columns else None
         
-        total_fee_rate = self.config.fee_rate + self.config.slippage
+        # ==========================================
+        # 1. 高勝率進場邏輯（多重過濾，向量化）
+        # ==========================================
+        direction = self._check_high_probability_setup(df)
+        
+        # 動態止損距離（基於 ATR），1:2.5 盈虧比
+        close = df['close'].values
+        sl_distance = df['atr'].values * 1.0  # 1 倍 ATR
+        entries = EntryArrays(
+            direction=direction,
+            sl=np.where(direction > 0, close - sl_distance, close + sl_distance),
+            tp=np.where(direction > 0, close + sl_distance * 2.5, close - sl_distance * 2.5),
+            sl_pct=sl_distance / close
+        )
+        
+        # 計算當前風險 (複利模式依目前報酬調整)
+        def current_risk(capital):
+            current_return = (capital - initial_capital) / initial_capital
+            risk = self.config.base_risk
+            if self.config.enable_compound:
+                if current_return >= self.config.compound_profit_threshold_2:
+                    risk *= self.config.risk_multiplier_profit_2
+                elif current_return >= self.config.compound_profit_threshold_1:
+                    risk *= self.config.risk_multiplier_profit_1
+                elif current_return <= self.config.compound_loss_threshold:
+                    risk *= self.config.risk_multiplier_loss
+            return risk
         
-        for i in range(60, len(df)):
-            row = df.iloc[i]
-            equity_curve.append(capital)
-            
-            if capital > peak_capital:
-                peak_capital = capital
-            
-            current_dd = (peak_capital - capital) / peak_capital
-            if current_dd > self.config.max_drawdown_stop:
-                print(f"[V7] 回撤超過 {self.config.max_drawdown_stop*100}%，停止交易")
-                break
-            
-            if 'open_time' in df.columns:
-                current_date = row['open_time'].date()
-                if last_trade_date != current_date:
-                    daily_trades_count = 0
-                    last_trade_date = current_date
-            
-            # ==========================================
-            # 1. 倉位管理（加入移動止盈）
-            # ==========================================
-            if position != 0:
-                # 計算當前盈虧 R 倍數
-                if position > 0:
-                    current_profit = row['high'] - entry_price
-                    sl_distance = entry_price - sl_price
-                    current_r = current_profit / sl_distance if sl_distance > 0 else 0
-                    
-                    # 移動止盈：達到 1.5R 時把止損移到保本
-                    if current_r >= 1.5 and sl_price < entry_price:
-                        sl_price = entry_price * 1.0005  # 微幅保本
-                    
-                    if row['low'] <= sl_price:
-                        exit_price = sl_price
-                        pnl_pct = (exit_price - entry_price) / entry_price
-                        pnl_usd = position_size_usd * pnl_pct - (position_size_usd * total_fee_rate * 2)
-                        capital += pnl_usd
-                        position = 0
-                        last_exit_idx = i
-                        trades.append({'type': 'sl', 'pnl_usd': pnl_usd, 'return': pnl_pct, 'capital': capital})
-                    elif row['high'] >= tp_price:
-                        exit_price = tp_price
-                        pnl_pct = (exit_price - entry_price) / entry_price
-                        pnl_usd = position_size_usd * pnl_pct - (position_size_usd * total_fee_rate * 2)
-                        capital += pnl_usd
-                        position = 0
-                        last_exit_idx = i
-                        trades.append({'type': 'tp', 'pnl_usd': pnl_usd, 'return': pnl_pct, 'capital': capital})
-                else:  # 空頭
-                    current_profit = entry_price - row['low']
-                    sl_distance = sl_price - entry_price
-                    current_r = current_profit / sl_distance if sl_distance > 0 else 0
-                    
-                    if current_r >= 1.5 and sl_price > entry_price:
-                        sl_price = entry_price * 0.9995
-                    
-                    if row['high'] >= sl_price:
-                        exit_price = sl_price
-                        pnl_pct = (entry_price - exit_price) / entry_price
-                        pnl_usd = position_size_usd * pnl_pct - (position_size_usd * total_fee_rate * 2)
-                        capital += pnl_usd
-                        position = 0
-                        last_exit_idx = i
-                        trades.append({'type': 'sl', 'pnl_usd': pnl_usd, 'return': pnl_pct, 'capital': capital})
-                    elif row['low'] <= tp_price:
-                        exit_price = tp_price
-                        pnl_pct = (entry_price - exit_price) / entry_price
-                        pnl_usd = position_size_usd * pnl_pct - (position_size_usd * total_fee_rate * 2)
-                        capital += pnl_usd
-                        position = 0
-                        last_exit_idx = i
-                        trades.append({'type': 'tp', 'pnl_usd': pnl_usd, 'return': pnl_pct, 'capital': capital})
-            
-            # ==========================================
-            # 2. 高勝率進場邏輯（多重過濾）
-            # ==========================================
-            if position == 0 and (i - last_exit_idx) >= self.config.cooldown_bars:
-                if daily_trades_count >= self.config.max_daily_trades:
-                    continue
-                
-                # 計算當前風險
-                current_return = (capital - initial_capital) / initial_capital
-                current_risk = self.config.base_risk
-                
-                if self.config.enable_compound:
-                    if current_return >= self.config.compound_profit_threshold_2:
-                        current_risk *= self.config.risk_multiplier_profit_2
-                    elif current_return >= self.config.compound_profit_threshold_1:
-                        current_risk *= self.config.risk_multiplier_profit_1
-                    elif current_return <= self.config.compound_loss_threshold:
-                        current_risk *= self.config.risk_multiplier_loss
-                
-                # 多重技術過濾器
-                signal = self._check_high_probability_setup(df, i)
-                
-                if signal != 0:
-                    position = signal
-                    entry_price = row['close']
-                    
-                    # 動態止損距離（基於 ATR）
-                    sl_distance = row['atr'] * 1.0  # 1 倍 ATR
-                    
-                    if position > 0:
-                        sl_price = entry_price - sl_distance
-                        tp_price = entry_price + sl_distance * 2.5  # 1:2.5 盈虧比
-                    else:
-                        sl_price = entry_price + sl_distance
-                        tp_price = entry_price - sl_distance * 2.5
-                    
-                    sl_pct = sl_distance / entry_price
-                    max_loss = capital * current_risk
-                    position_size_usd = min(max_loss / sl_pct, capital * self.config.max_leverage)
-                    daily_trades_count += 1
+        # ==========================================
+        # 2. 倉位管理（移動止盈：達到 1.5R 時把止損移到保本）
+        # ==========================================
+        spec = BacktestSpec(
+            capital=capital,
+            base_risk=self.config.base_risk,
+            max_leverage=self.config.max_leverage,
+            fee_rate=self.config.fee_rate + self.config.slippage,
+            max_drawdown_stop=self.config.max_drawdown_stop,
+            start=60,
+            cooldown_bars=self.config.cooldown_bars,
+            max_daily_trades=self.config.max_daily_trades,
+            exit_priority='sl_first',
+            break_even_r=1.5,
+            break_even_mult=1.0005,        # 微幅保本
+            break_even_mult_short=0.9995,
+            risk_fn=current_risk
+        )
+        result = run_backtest(df, spec, entries=entries)
+        if result.halted:
+            print(f"[V7] 回撤超過 {self.config.max_drawdown_stop*100}%，停止交易")
+        
+        capital = result.capital
+        equity_curve = result.equity_curve
+        trades = [
+            {'type': t['reason'], 'pnl_usd': t['pnl_usd'], 'return': t['return'], 'capital': t['capital']}
+            for t in result.trades
+        ]
         
         # 統計
         wins = len([t for t in trades if t['pnl_usd'] > 0])
@@ -187,79 +116,70 @@ class V7Backtester:
             'ml_filtered_winrate': win_rate * 100
         }
     
-    def _check_high_probability_setup(self, df, i):
+    def _check_high_probability_setup(self, df):
         """
         高勝率設置：需要多個時間框架 + 技術指標 + 量價確認
         這是經過市場驗證的高勝率組合
+
+        Returns:
+            每根K線的進場方向 (1=做多, -1=做空, 0=不交易)
         """
-        if i < 60:
-            return 0
-        
-        row = df.iloc[i]
-        prev_row = df.iloc[i-1]
-        
-        score = 0  # 累積評分，需達到 4 分以上才進場
-        direction = 0  # 1=做多, -1=做空
+        close = df['close'].values
+        rsi = df['rsi'].values
+        macd = df['macd'].values
+        macd_signal = df['macd_signal'].values
+        macd_hist = df['macd_hist'].values
+        prev_macd_hist = np.empty_like(macd_hist)
+        prev_macd_hist[0] = np.nan
+        prev_macd_hist[1:] = macd_hist[:-1]
         
         # ==========================================
         # 過濾器 1：趨勢過濾（必須）
         # ==========================================
-        if row['ema_trend'] == 1:  # 多頭排列
-            direction = 1
-            score += 1
-        elif row['ema_trend'] == -1:  # 空頭排列
-            direction = -1
-            score += 1
-        else:
-            return 0  # 沒有明確趨勢，不交易
+        ema_trend = df['ema_trend'].values
+        direction = np.where(ema_trend == 1, 1, np.where(ema_trend == -1, -1, 0))  # 多頭排列 / 空頭排列
+        is_long = direction == 1
+        score = (direction != 0).astype(float)
         
         # ==========================================
         # 過濾器 2：RSI 回調但未超賣/超買
         # ==========================================
-        if direction == 1:
-            if 35 < row['rsi'] < 55:  # RSI 回調但未過度
-                score += 1.5
-        else:
-            if 45 < row['rsi'] < 65:
-                score += 1.5
+        rsi_ok = np.where(is_long, (35 < rsi) & (rsi < 55), (45 < rsi) & (rsi < 65))
+        score += np.where(rsi_ok, 1.5, 0)
         
         # ==========================================
         # 過濾器 3：MACD 獲緱
         # ==========================================
-        if direction == 1:
-            if row['macd'] > row['macd_signal'] and row['macd_hist'] > prev_row['macd_hist']:
-                score += 1.5
-        else:
-            if row['macd'] < row['macd_signal'] and row['macd_hist'] < prev_row['macd_hist']:
-                score += 1.5
+        macd_ok = np.where(
+            is_long,
+            (macd > macd_signal) & (macd_hist > prev_macd_hist),
+            (macd < macd_signal) & (macd_hist < prev_macd_hist)
+        )
+        score += np.where(macd_ok, 1.5, 0)
         
         # ==========================================
         # 過濾器 4：價格回調到 EMA20 附近
         # ==========================================
-        distance_to_ema = abs(row['close'] - row['ema_20']) / row['close']
-        if distance_to_ema < 0.005:  # 距離 EMA20 在 0.5% 以內
-            score += 2  # 重要加分
+        distance_to_ema = np.abs(close - df['ema_20'].values) / close
+        score += np.where(distance_to_ema < 0.005, 2, 0)  # 距離 EMA20 在 0.5% 以內，重要加分
         
         # ==========================================
         # 過濾器 5：成交量確認
         # ==========================================
-        if row['volume_ratio'] > 1.2:  # 成交量比平均高 20%
-            score += 1
+        score += np.where(df['volume_ratio'].values > 1.2, 1, 0)  # 成交量比平均高 20%
         
         # ==========================================
         # 過濾器 6：Bollinger Bands 擠壓
         # ==========================================
-        bb_width = (row['bb_upper'] - row['bb_lower']) / row['bb_middle']
-        if bb_width < 0.04:  # BB 縮窄，波動即將爆發
-            score += 1.5
+        bb_width = (df['bb_upper'].values - df['bb_lower'].values) / df['bb_middle'].values
+        score += np.where(bb_width < 0.04, 1.5, 0)  # BB 縮窄，波動即將爆發
         
         # ==========================================
-        # 最終判斷
+        # 最終判斷：需要至少 5 分，且前 60 根K線不交易
         # ==========================================
-        if score >= 5.0:  # 需要至少 5 分
-            return direction
-        
-        return 0
+        signal = np.where((direction != 0) & (score >= 5.0), direction, 0)
+        signal[:60] = 0
+        return signal
     
     def _calculate_max_drawdown(self, equity_curve):
         if not equity_curve:
@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 from datetime import timedelta
+from core.backtest_kernel import BacktestSpec, Order, run_backtest
 
 class V8Backtester:
     """V8 回測引擎 - LSTM 反轉預測"""
@@ -39,148 +40,93 @@ class V8Backtester:
         
         capital = self.config.capital
         initial_capital = capital
-        peak_capital = capital
-        
-        position = 0
-        entry_price = 0
-        sl_price = 0
-        tp_price = 0
-        position_size_usd = 0
-        entry_time = None
-        
-        trades = []
-        equity_curve = []
-        daily_trades_count = 0
-        last_trade_date = None
-        last_exit_idx = -self.config.cooldown_bars
         
         start_time = df_15m_test['open_time'].iloc[0] if 'open_time' in df_15m_test.columns else None
         end_time = df_15m_test['open_time'].iloc[-1] if 'open_time' in df_15m_test.columns else None
         
-        total_fee_rate = self.config.fee_rate + self.config.slippage
-        
         lstm_predictions = 0
-        lstm_correct = 0
-        
-        for i in range(self.config.lstm_lookback, len(df_15m_test)):
-            row = df_15m_test.iloc[i]
-            equity_curve.append(capital)
+        open_times = df_15m_test['open_time'].tolist() if 'open_time' in df_15m_test.columns else None
+        closes = df_15m_test['close'].values
+        atrs = df_15m_test['atr'].values
+        
+        # ==========================================
+        # LSTM 預測 + 多重過濾 (空倉、冷卻完畢且未達每日上限時逐根呼叫)
+        # ==========================================
+        def lstm_entry(i, capital):
+            nonlocal lstm_predictions
+            
+            # LSTM 預測
+            direction, confidence = self.lstm_model.predict(df_15m_test, i)
+            lstm_predictions += 1
             
-            if capital > peak_capital:
-                peak_capital = capital
+            if direction == 1:
+                self.filter_stats['lstm_signals'] += 1
             
-            current_dd = (peak_capital - capital) / peak_capital
-            if current_dd > self.config.max_drawdown_stop:
-                print(f"[V8] 回撤超過 {self.config.max_drawdown_stop*100}%，停止交易")
-                break
+            if confidence < self.config.lstm_confidence:
+                return None
             
-            if 'open_time' in df_15m_test.columns:
-                current_date = row['open_time'].date()
-                if last_trade_date != current_date:
-                    daily_trades_count = 0
-                    last_trade_date = current_date
+            if direction != 1:
+                return None
             
-            # ==========================================
-            # 1. 倉位管理
-            # ==========================================
-            if position != 0:
-                if position > 0:
-                    current_profit = row['high'] - entry_price
-                    sl_distance = entry_price - sl_price
-                    current_r = current_profit / sl_distance if sl_distance > 0 else 0
-                    
-                    if current_r >= self.config.trailing_stop_trigger and sl_price < entry_price:
-                        sl_price = entry_price * 1.001
-                    
-                    if row['low'] <= sl_price:
-                        exit_price = sl_price
-                        pnl_pct = (exit_price - entry_price) / entry_price
-                        pnl_usd = position_size_usd * pnl_pct - (position_size_usd * total_fee_rate * 2)
-                        capital += pnl_usd
-                        
-                        if pnl_usd > 0:
-                            lstm_correct += 1
-                        
-                        position = 0
-                        last_exit_idx = i
-                        
-                        holding_hours = (row['open_time'] - entry_time).total_seconds() / 3600 if entry_time else 0
-                        trades.append({
-                            'type': 'sl',
-                            'pnl_usd': pnl_usd,
-                            'return': pnl_pct,
-                            'capital': capital,
-                            'holding_hours': holding_hours
-                        })
-                    elif row['high'] >= tp_price:
-                        exit_price = tp_price
-                        pnl_pct = (exit_price - entry_price) / entry_price
-                        pnl_usd = position_size_usd * pnl_pct - (position_size_usd * total_fee_rate * 2)
-                        capital += pnl_usd
-                        lstm_correct += 1
-                        position = 0
-                        last_exit_idx = i
-                        
-                        holding_hours = (row['open_time'] - entry_time).total_seconds() / 3600 if entry_time else 0
-                        trades.append({
-                            'type': 'tp',
-                            'pnl_usd': pnl_usd,
-                            'return': pnl_pct,
-                            'capital': capital,
-                            'holding_hours': holding_hours
-                        })
+            self.filter_stats['pass_confidence'] += 1
             
-            # ==========================================
-            # 2. LSTM 預測 + 多重過濾
-            # ==========================================
-            if position == 0 and (i - last_exit_idx) >= self.config.cooldown_bars:
-                if daily_trades_count >= self.config.max_daily_trades:
-                    continue
-                
-                # LSTM 預測
-                direction, confidence = self.lstm_model.predict(df_15m_test, i)
-                lstm_predictions += 1
-                
-                if direction == 1:
-                    self.filter_stats['lstm_signals'] += 1
-                
-                if confidence < self.config.lstm_confidence:
-                    continue
-                
-                if direction != 1:
-                    continue
-                
-                self.filter_stats['pass_confidence'] += 1
-                
-                # 雙時間框架確認
-                if self.config.enable_dual_timeframe:
-                    if not self._check_1h_trend(df_1h, row['open_time']):
-                        continue
-                
-                self.filter_stats['pass_trend'] += 1
-                
-                # 反轉形態過濾
-                if self.config.enable_pattern_filter:
-                    if not self._check_reversal_pattern(df_15m_test, i):
-                        continue
-                
-                self.filter_stats['pass_pattern'] += 1
-                
-                # 開倉
-                position = 1
-                entry_price = row['close']
-                entry_time = row['open_time'] if 'open_time' in df_15m_test.columns else None
-                
-                sl_distance = row['atr'] * self.config.atr_multiplier
-                sl_price = entry_price - sl_distance
-                tp_price = entry_price + sl_distance * self.config.tp_ratio
-                
-                sl_pct = sl_distance / entry_price
-                max_loss = capital * self.config.base_risk
-                position_size_usd = min(max_loss / sl_pct, capital * self.config.max_leverage)
-                
-                daily_trades_count += 1
-                self.filter_stats['final_trades'] += 1
+            # 雙時間框架確認
+            if self.config.enable_dual_timeframe:
+                if not self._check_1h_trend(df_1h, open_times[i]):
+                    return None
+            
+            self.filter_stats['pass_trend'] += 1
+            
+            # 反轉形態過濾
+            if self.config.enable_pattern_filter:
+                if not self._check_reversal_pattern(df_15m_test, i):
+                    return None
+            
+            self.filter_stats['pass_pattern'] += 1
+            self.filter_stats['final_trades'] += 1
+            
+            # 開倉
+            sl_distance = atrs[i] * self.config.atr_multiplier
+            entry_price = closes[i]
+            return Order(
+                direction=1,
+                sl=entry_price - sl_distance,
+                tp=entry_price + sl_distance * self.config.tp_ratio,
+                sl_pct=sl_distance / entry_price
+            )
+        
+        # 倉位管理：浮盈達到 trailing_stop_trigger R 時把止損移到保本
+        spec = BacktestSpec(
+            capital=capital,
+            base_risk=self.config.base_risk,
+            max_leverage=self.config.max_leverage,
+            fee_rate=self.config.fee_rate + self.config.slippage,
+            max_drawdown_stop=self.config.max_drawdown_stop,
+            start=self.config.lstm_lookback,
+            cooldown_bars=self.config.cooldown_bars,
+            max_daily_trades=self.config.max_daily_trades,
+            exit_priority='sl_first',
+            break_even_r=self.config.trailing_stop_trigger,
+            break_even_mult=1.001
+        )
+        result = run_backtest(df_15m_test, spec, entry_fn=lstm_entry)
+        if result.halted:
+            print(f"[V8] 回撤超過 {self.config.max_drawdown_stop*100}%，停止交易")
+        
+        capital = result.capital
+        equity_curve = result.equity_curve
+        trades = [
+            {
+                'type': t['reason'],
+                'pnl_usd': t['pnl_usd'],
+                'return': t['return'],
+                'capital': t['capital'],
+                'holding_hours': t['holding_hours']
+            }
+            for t in result.trades
+        ]
+        # 止盈出場，或止損出場但仍獲利 (保本止損) 視為預測正確
+        lstm_correct = sum(1 for t in trades if t['type'] == 'tp' or t['pnl_usd'] > 0)
         
         # 統計
         wins = len([t for t in trades if t['pnl_usd'] > 0])
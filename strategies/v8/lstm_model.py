@@ -3,6 +3,7 @@ import pandas as pd
 from sklearn.preprocessing import StandardScaler
 from sklearn.utils.class_weight import compute_class_weight
 import warnings
+from core.triple_barrier import forward_extremes
 warnings.filterwarnings('ignore')
 
 try:
@@ -39,8 +40,9 @@ class V8LSTMModel:
         # 如果原始閾值是 1.5%，這裡先用 0.8% 建立模型
         threshold = min(self.config.reversal_threshold, 0.008) 
         
-        future_high = df['high'].shift(-forward).rolling(forward, min_periods=1).max()
-        future_low = df['low'].shift(-forward).rolling(forward, min_periods=1).min()
+        future_high, future_low = forward_extremes(df['high'].values, df['low'].values, forward)
+        future_high = pd.Series(future_high, index=df.index)
+        future_low = pd.Series(future_low, index=df.index)
         
         max_gain = (future_high - df['close']) / df['close']
         max_loss = (df['close'] - future_low) / df['close']
@@ -0,0 +1,151 @@
+"""
+共用回測核心測試
+
+1. 與原本逐根 df.iloc[i] 的回測迴圈 (V11 寫法) 交易紀錄、權益曲線完全一致
+2. 保本移損、冷卻 K 棒數、每日交易上限
+3. 啟動後追蹤止損、分批止盈、持倉時間上限
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+
+from core.backtest_kernel import BacktestSpec, EntryArrays, Order, run_backtest
+
+
+def _make_df(n=3000, seed=5):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    return pd.DataFrame({
+        'open_time': pd.date_range('2024-01-01', periods=n, freq='15min'),
+        'high': np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.002, n))),
+        'low': np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.002, n))),
+        'close': close,
+        'signal': rng.random(n) < 0.05,
+        'atr': close * 0.004,
+    })
+
+
+def _legacy_loop(df, capital, fee):
+    """原本 V11 的迴圈: 先檢查止盈再檢查止損，同一根K線可以出場後再進場"""
+    peak_capital = capital
+    position = 0
+    entry_price = sl_price = tp_price = position_size_usd = 0
+    entry_time = None
+    trades, equity_curve = [], []
+    for i in range(len(df)):
+        row = df.iloc[i]
+        equity_curve.append(capital)
+        if capital > peak_capital: peak_capital = capital
+        if (peak_capital - capital) / peak_capital > 0.25: break
+        if position == 1:
+            exit_price = 0
+            if row['high'] >= tp_price:
+                exit_price = tp_price
+            elif row['low'] <= sl_price:
+                exit_price = sl_price
+            if exit_price > 0:
+                pnl_pct = (exit_price - entry_price) / entry_price
+                pnl_usd = position_size_usd * pnl_pct - (position_size_usd * fee * 2)
+                capital += pnl_usd
+                position = 0
+                holding_hours = (row['open_time'] - entry_time).total_seconds() / 3600
+                trades.append({'pnl_usd': pnl_usd, 'return': pnl_pct, 'holding_hours': holding_hours})
+        if position == 0 and row['signal']:
+            position = 1
+            entry_price = row['close']
+            entry_time = row['open_time']
+            sl_distance = row['atr'] * 1.5
+            sl_price = entry_price - sl_distance
+            tp_price = entry_price + sl_distance * 2.0
+            sl_pct = sl_distance / entry_price
+            position_size_usd = min(capital * 0.02 / sl_pct, capital * 3)
+    return trades, equity_curve, capital
+
+
+def _spec(**kwargs):
+    params = dict(capital=10000.0, base_risk=0.02, max_leverage=3, fee_rate=0.0008, max_drawdown_stop=0.25)
+    params.update(kwargs)
+    return BacktestSpec(**params)
+
+
+def test_matches_legacy_loop():
+    """測試1: 與原本的迴圈一致"""
+    df = _make_df()
+    close = df['close'].values
+    sl_distance = df['atr'].values * 1.5
+    entries = EntryArrays(
+        direction=df['signal'].values.astype(int),
+        sl=close - sl_distance,
+        tp=close + sl_distance * 2.0,
+        sl_pct=sl_distance / close
+    )
+    result = run_backtest(df, _spec(exit_priority='tp_first'), entries=entries)
+    trades, equity_curve, capital = _legacy_loop(df, 10000.0, 0.0008)
+
+    assert len(trades) > 20
+    assert [{k: t[k] for k in ('pnl_usd', 'return', 'holding_hours')} for t in result.trades] == trades
+    assert result.equity_curve == equity_curve
+    assert result.capital == capital
+
+
+def test_break_even_cooldown_and_daily_cap():
+    """測試2: 保本移損、冷卻、每日上限"""
+    # 第 0 根進場 (止損 99 / 止盈 104)，第 1 根浮盈 2R 移到保本，第 2 根回落觸發保本止損
+    df = pd.DataFrame({
+        'open_time': pd.date_range('2024-01-01 22:00', periods=10, freq='1h'),
+        'high': [100, 102.5, 100.5, 100, 100, 100, 100, 100, 100, 100],
+        'low': [100, 100.5, 99.5, 100, 100, 100, 100, 100, 100, 100],
+        'close': [100.0] * 10,
+    })
+    orders = []
+
+    def entry_fn(i, capital):
+        orders.append(i)
+        return Order(direction=1, sl=99.0, tp=104.0, sl_pct=0.01)
+
+    spec = _spec(cooldown_bars=2, max_daily_trades=2, break_even_r=1.5, break_even_mult=1.001)
+    result = run_backtest(df, spec, entry_fn=entry_fn)
+
+    first = result.trades[0]
+    assert (first['entry_idx'], first['exit_idx'], first['reason']) == (0, 2, 'sl')
+    assert first['exit_price'] == 100.0 * 1.001 and first['return'] > 0
+    assert result.stats['break_even'] == 1
+    # 第 2 根出場後冷卻 2 根，第 4 根 (隔天) 才再進場；隔天最多 2 筆
+    assert orders[:2] == [0, 4]
+    assert len([i for i in orders if i >= 2]) == 1
+
+
+def test_trailing_partial_and_time_exit():
+    """測試3: 追蹤止損、分批止盈、持倉時間上限"""
+    df = pd.DataFrame({
+        'open_time': pd.date_range('2024-01-01', periods=6, freq='15min'),
+        'high': [100, 101.6, 103.0, 102.0, 102.0, 102.0],
+        'low': [100, 100.7, 102.2, 101.0, 101.0, 101.0],
+        'close': [100.0, 101.0, 102.5, 101.5, 101.5, 101.5],
+    })
+    direction = np.array([1, 0, 0, 0, 0, 0])
+    entries = EntryArrays(
+        direction=direction, sl=np.full(6, 99.0), tp=np.full(6, 105.0), sl_pct=np.full(6, 0.01),
+        tp1=np.full(6, 101.5), r_unit=np.full(6, 1.0)
+    )
+
+    # 追蹤: 第 1 根啟動 (移保本)，第 2 根最高 3R -> 止損 102，第 3 根跌破
+    trailing = run_backtest(df, _spec(exit_priority='tp_first', activation_mult=1.002, trail_r=1.0), entries=entries)
+    trade = trailing.trades[0]
+    assert (trade['exit_idx'], trade['exit_price'], trade['activated']) == (3, 102.0, True)
+    assert trailing.stats['activations'] == 1
+
+    # 分批: 第 1 根平倉一半並移保本 (同一根K線不檢查其他出場)，剩餘倉位在第 2 根止盈
+    entries.tp = np.full(6, 102.8)
+    partial = run_backtest(df, _spec(exit_priority='tp_first', activation_mult=1.002, partial_pct=0.5), entries=entries)
+    assert partial.stats['partials'] == 1
+    assert [(t['exit_idx'], t['reason']) for t in partial.trades] == [(2, 'tp')]
+
+    # 持倉時間: 沒碰到止盈止損，持倉滿 4 根以收盤價出場
+    plain = EntryArrays(direction=direction, sl=np.full(6, 90.0), tp=np.full(6, 110.0), sl_pct=np.full(6, 0.1))
+    timed = run_backtest(df, _spec(exit_priority='tp_first', max_hold_bars=4), entries=plain)
+    assert [(t['exit_idx'], t['reason'], t['exit_price']) for t in timed.trades] == [(4, 'time', 101.5)]
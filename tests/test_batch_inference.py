@@ -0,0 +1,91 @@
+"""
+批次 LLM 推論測試
+
+1. 多個供應商同時處理，每個供應商在任何視窗內不超過 rpm_limit，總時間由吞吐量決定
+2. 失敗的 prompt 由其他供應商重試，連續失敗的供應商被停用，每日上限被遵守
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import threading
+import time
+
+from core.batch_inference import BatchInference, RPMLimiter
+from core.multi_api_manager import APIProvider
+
+
+def _provider(name, rpm, daily=10000):
+    return APIProvider(name=name, api_key='k', base_url=f'https://{name}.example/v1', model=f'{name}-model',
+                       rpm_limit=rpm, daily_limit=daily)
+
+
+def test_batches_bounded_by_each_provider_rpm():
+    """測試1: 吞吐量受 RPM 限制，不受逐次延遲限制"""
+    window = 0.5
+    sent = {}
+    lock = threading.Lock()
+
+    def call(provider, system_prompt, prompt):
+        with lock:
+            sent.setdefault(provider.name, []).append(time.monotonic())
+        time.sleep(0.05)                              # 模擬往返延遲
+        return {'success': True, 'content': f'{provider.name}:{prompt}', 'model': provider.model}
+
+    providers = [_provider('a', 10), _provider('b', 10), _provider('c', 20)]
+    prompts = [f'p{i}' for i in range(80)]
+    start = time.perf_counter()
+    results = BatchInference(providers, call=call, max_in_flight=8, window_seconds=window).run(prompts)
+    elapsed = time.perf_counter() - start
+
+    assert [r['content'].split(':')[1] for r in results] == prompts          # 與 prompts 同順序
+    assert all(r['success'] and r['content'].startswith(r['provider']) for r in results)
+    assert elapsed < 1.5                                                      # 逐一呼叫需要 4 秒
+    for provider in providers:
+        times = sent[provider.name]
+        assert provider.daily_count == len(times)
+        for t in times:
+            # 任何視窗內的請求數不超過 rpm_limit (時間戳在取得名額之後記錄，容許些微誤差)
+            assert sum(1 for u in times if t <= u < t + window - 0.02) <= provider.rpm_limit
+    assert len(sent['c']) > len(sent['a'])
+
+    now = [0.0]
+    limiter = RPMLimiter(2, window_seconds=10, clock=lambda: now[0])
+    unused = limiter.acquire()
+    assert unused == 0.0
+    now[0] = 5.0
+    assert limiter.acquire() == 5.0                                           # 另一個執行緒實際送出的請求
+    stop = threading.Event()
+    stop.set()
+    assert limiter.acquire(stop) is None                                      # 名額用完且被停止
+    limiter.release_unused(unused)                                            # 只歸還自己沒用到的名額
+    assert list(limiter._sent) == [5.0]
+    assert limiter.acquire(stop) == 5.0 and limiter.acquire(stop) is None
+
+
+def test_failures_retry_on_other_providers():
+    """測試2: 重試、停用與每日上限"""
+    def call(provider, system_prompt, prompt):
+        if provider.name == 'broken':
+            raise ConnectionError('down')
+        if prompt == 'poison':
+            return {'success': False, 'error': 'bad request'}
+        return {'success': True, 'content': prompt, 'model': provider.model}
+
+    broken, small, good = _provider('broken', 30), _provider('small', 30, daily=5), _provider('good', 30)
+    offline = _provider('offline', 30)
+    offline.is_available = False
+    batch = BatchInference([broken, small, offline, good], call=call, max_in_flight=1, max_attempts=3, window_seconds=0.2)
+    prompts = [f'p{i}' for i in range(40)] + ['poison']
+    results = batch.run(prompts)
+
+    assert [r['content'] for r in results[:-1]] == prompts[:-1]
+    assert results[-1]['success'] is False and results[-1]['error'] == 'bad request'
+    assert not broken.is_available and batch.stats['broken']['failures'] == 3
+    assert small.daily_count <= 5 and 'offline' not in batch.stats
+    failures = sum(s['failures'] for s in batch.stats.values())
+    assert sum(s['requests'] for s in batch.stats.values()) == 40 + failures
+    assert failures <= 3 + 3                                                  # broken 3 次 + poison 最多 3 次
+
+    # 沒有可用的供應商
+    assert BatchInference([offline], call=call).run(['x']) == [{'success': False, 'error': '沒有可用的 API 提供商'}]
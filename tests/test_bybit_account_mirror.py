@@ -0,0 +1,163 @@
+"""
+Bybit 帳戶狀態鏡像測試 (模擬的 WebSocket 推送與 REST)
+
+1. REST 快照 + 推送 (持倉 / 錢包 / 成交 / tickers delta) 維護的狀態，同步期間的推送不被舊快照覆蓋
+2. 推送由背景執行緒送達；讀取不打 REST，重新連線後才重新同步
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import threading
+
+from core.bybit_account_mirror import BybitAccountMirror, BybitAccountStreams, parse_position
+
+
+def _ok(rows):
+    return {'retCode': 0, 'retMsg': 'OK', 'result': {'list': rows}}
+
+
+class FakeSession:
+    """pybit HTTP 的替身，記錄呼叫次數"""
+
+    def __init__(self):
+        self.calls = []
+        self.on_get_positions = None
+        self.wallet = {'accountType': 'UNIFIED', 'coin': [
+            {'coin': 'USDT', 'equity': '1000', 'walletBalance': '900', 'unrealisedPnl': '5'},
+        ]}
+        self.positions = [{'symbol': 'BTCUSDT', 'side': 'Buy', 'size': '0.01', 'avgPrice': '60000',
+                           'markPrice': '60500', 'unrealisedPnl': '5', 'leverage': '5', 'updatedTime': '1'}]
+        self.prices = {'BTCUSDT': '60500', 'ETHUSDT': '3000'}
+
+    def get_wallet_balance(self, **params):
+        self.calls.append('wallet')
+        return _ok([self.wallet])
+
+    def get_positions(self, **params):
+        self.calls.append('positions')
+        if self.on_get_positions:
+            self.on_get_positions()
+        return _ok(list(self.positions))
+
+    def get_tickers(self, symbol, **params):
+        self.calls.append(f'ticker:{symbol}')
+        return _ok([{'symbol': symbol, 'lastPrice': self.prices[symbol], 'markPrice': self.prices[symbol]}])
+
+
+class FakeWebSocket:
+    """pybit WebSocket 的替身：訂閱時記錄 callback，push() 由背景執行緒送出推送"""
+
+    instances = []
+
+    def __init__(self, channel_type, **kwargs):
+        self.channel_type = channel_type
+        self.callbacks = {}
+        self.connected = True
+        FakeWebSocket.instances.append(self)
+
+    def _subscribe(self, topic, callback):
+        self.callbacks[topic] = callback
+
+    def position_stream(self, callback):
+        self._subscribe('position', callback)
+
+    def wallet_stream(self, callback):
+        self._subscribe('wallet', callback)
+
+    def execution_stream(self, callback):
+        self._subscribe('execution', callback)
+
+    def ticker_stream(self, symbol, callback):
+        self._subscribe(f'tickers.{symbol}', callback)
+
+    def is_connected(self):
+        return self.connected
+
+    def exit(self):
+        self.connected = False
+
+    def push(self, messages):
+        def run():
+            for message in messages:
+                self.callbacks[message['topic']](message)
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+
+
+def test_snapshot_and_push_merge():
+    """測試1: REST 快照與推送"""
+    session = FakeSession()
+    mirror = BybitAccountMirror(session)
+    mirror.is_connected = lambda: True
+    mirror.track(['BTCUSDT', 'ETHUSDT'])
+    assert mirror.ready()
+    assert session.calls == ['wallet', 'positions', 'ticker:BTCUSDT', 'ticker:ETHUSDT']
+
+    assert mirror.balance() == {'total_equity': 1000.0, 'available_balance': 900.0, 'unrealized_pnl': 5.0}
+    assert mirror.position('BTCUSDT') == parse_position(session.positions[0])
+    assert mirror.position('ETHUSDT') is None and mirror.last_price('ETHUSDT') == 3000.0
+
+    # 推送: ETH 開倉 (推送用 entryPrice)、錢包只推送變動的幣種、tickers delta 只有部分欄位
+    mirror.on_message({'topic': 'position', 'data': [
+        {'category': 'linear', 'symbol': 'ETHUSDT', 'side': 'Sell', 'size': '0.5', 'entryPrice': '3000',
+         'markPrice': '3000', 'unrealisedPnl': '0', 'leverage': '3'}]})
+    mirror.on_message({'topic': 'wallet', 'data': [
+        {'accountType': 'UNIFIED', 'coin': [{'coin': 'BTC', 'equity': '0.1', 'walletBalance': '0.1', 'unrealisedPnl': '0'}]}]})
+    mirror.on_message({'topic': 'tickers.ETHUSDT', 'type': 'delta', 'data': {'symbol': 'ETHUSDT', 'markPrice': '2990'}})
+    mirror.on_message({'topic': 'execution', 'data': [{'symbol': 'ETHUSDT', 'execQty': '0.5', 'execPrice': '3000'}]})
+
+    eth = mirror.position('ETHUSDT')
+    assert eth['side'] == 'Sell' and eth['entry_price'] == 3000.0 and eth['leverage'] == 3
+    assert eth['current_price'] == 2990.0 and abs(eth['unrealized_pnl'] - 5.0) < 1e-9
+    assert mirror.last_price('ETHUSDT') == 3000.0                 # delta 沒有 lastPrice，保留原值
+    assert mirror.balance()['total_equity'] == 1000.0             # USDT 沒有被只含 BTC 的推送洗掉
+    assert mirror.executions('ETHUSDT')[0]['execQty'] == '0.5' and mirror.executions('BTCUSDT') == []
+
+    # 同步期間 BTC 被平倉的推送比 REST 快照新，不被覆蓋；ETH 沒有新推送，以快照為準 (快照沒有 = 空倉)
+    session.on_get_positions = lambda: mirror.on_message({'topic': 'position', 'data': [
+        {'category': 'linear', 'symbol': 'BTCUSDT', 'side': '', 'size': '0', 'entryPrice': '0', 'leverage': '5'}]})
+    mirror.resync()
+    assert mirror.position('BTCUSDT') is None
+    assert mirror.position('ETHUSDT') is None
+
+
+def test_streams_reads_from_memory_and_resync_on_reconnect():
+    """測試2: 讀取不打 REST，重新連線後重新同步"""
+    FakeWebSocket.instances = []
+    session = FakeSession()
+    mirror = BybitAccountMirror(session)
+    streams = BybitAccountStreams(mirror, 'key', 'secret', ws_factory=FakeWebSocket)
+    streams.start(['BTCUSDT'])
+    private, public = FakeWebSocket.instances
+    assert set(private.callbacks) == {'position', 'wallet', 'execution'} and set(public.callbacks) == {'tickers.BTCUSDT'}
+
+    assert mirror.ready()
+    n_calls = len(session.calls)
+    public.push([{'topic': 'tickers.BTCUSDT', 'type': 'snapshot', 'data': {'symbol': 'BTCUSDT', 'lastPrice': '61000', 'markPrice': '61000'}}])
+    private.push([{'topic': 'wallet', 'data': [{'accountType': 'UNIFIED', 'coin': [
+        {'coin': 'USDT', 'equity': '1010', 'walletBalance': '900', 'unrealisedPnl': '10'}]}]}])
+    for _ in range(50):
+        # 一次決策原本要打的 get_balance / get_position / get_current_price
+        assert mirror.ready()
+        assert mirror.balance()['total_equity'] == 1010.0
+        assert mirror.position('BTCUSDT')['unrealized_pnl'] == (61000 - 60000) * 0.01
+        assert mirror.last_price('BTCUSDT') == 61000.0
+    assert len(session.calls) == n_calls
+
+    # 新增幣種: 訂閱行情並在下一次讀取時同步
+    streams.add_symbol('ETHUSDT')
+    assert 'tickers.ETHUSDT' in public.callbacks
+    assert mirror.ready() and 'ticker:ETHUSDT' in session.calls[n_calls:]
+
+    # 斷線時改用 REST，重新連線後先同步
+    private.connected = False
+    assert not mirror.ready()
+    private.connected = True
+    n_calls = len(session.calls)
+    assert mirror.ready() and len(session.calls) > n_calls
+    assert mirror.stats['resyncs'] == 3
+
+    streams.stop()
+    assert not mirror.ready() and not public.connected
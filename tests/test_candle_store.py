@@ -0,0 +1,89 @@
+"""
+本地 K 線儲存測試
+
+1. 只追加比最後一根更新的 K 棒，tail 返回 memmap view
+2. RealtimeDataLoader 第二次載入只請求新 K 棒，結果與完整下載一致
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+
+from core.candle_store import CandleStore
+from core.realtime_data_loader import RealtimeDataLoader
+
+
+INTERVAL_MS = 15 * 60 * 1000
+
+
+def _make_klines(n, start=1767225600000, seed=3):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    rows = []
+    for i in range(n):
+        open_time = start + i * INTERVAL_MS
+        o = close[i - 1] if i else close[0]
+        rows.append([
+            open_time, f"{o:.2f}", f"{max(o, close[i]) * 1.001:.2f}", f"{min(o, close[i]) * 0.999:.2f}",
+            f"{close[i]:.2f}", f"{100 + i:.3f}", open_time + INTERVAL_MS - 1, "0", 0, "0", "0", "0"
+        ])
+    return rows
+
+
+class FakeBinanceLoader(RealtimeDataLoader):
+    """以記憶體中的 K 線模擬 /fapi/v1/klines"""
+
+    def __init__(self, klines, store_dir):
+        super().__init__(base_url="http://fake", store_dir=store_dir)
+        self.klines = klines
+        self.requests = []
+
+    def _fetch_klines(self, symbol, timeframe, limit, start_time=None):
+        self.requests.append({'limit': limit, 'start_time': start_time})
+        if start_time is None:
+            return self.klines[-limit:]
+        return [row for row in self.klines if row[0] >= start_time][:limit]
+
+
+def _candles(rows):
+    return RealtimeDataLoader._parse_klines(rows)
+
+
+def test_append_only_newer_rows(tmp_path):
+    """測試1: 重疊的 K 棒不會重複寫入"""
+    store = CandleStore(str(tmp_path))
+    rows = _make_klines(50)
+
+    assert store.append('BTCUSDT', '15m', _candles(rows[:30])) == 30
+    assert store.append('BTCUSDT', '15m', _candles(rows[20:50])) == 20
+    assert store.count('BTCUSDT', '15m') == 50
+
+    tail = store.tail('BTCUSDT', '15m', 10)
+    assert isinstance(tail['close'].base, np.memmap) or isinstance(tail['close'], np.memmap)
+    np.testing.assert_array_equal(tail['open_time'], _candles(rows)['open_time'][-10:])
+    assert store.last_open_time('BTCUSDT', '15m') == rows[-1][0]
+
+
+def test_loader_incremental_sync(tmp_path):
+    """測試2: 第二次載入只下載新 K 棒，結果與完整下載相同"""
+    klines = _make_klines(600)
+    loader = FakeBinanceLoader(klines[:520], str(tmp_path))
+
+    first = loader.load_data('BTCUSDT', '15m', limit=500)
+    assert len(first) == 500
+    assert loader.requests == [{'limit': 500, 'start_time': None}]
+
+    # 新收盤 80 根，最後一根仍在進行中
+    loader.klines = klines
+    loader.requests.clear()
+    second = loader.load_data('BTCUSDT', '15m', limit=500)
+    assert len(loader.requests) == 1
+    assert loader.requests[0]['start_time'] == klines[518][0] + 1
+
+    full = FakeBinanceLoader(klines, None).load_data('BTCUSDT', '15m', limit=500)
+    pd.testing.assert_frame_equal(second, full)
+    assert list(second.columns) == [
+        'open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'timestamp'
+    ]
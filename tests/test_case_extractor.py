@@ -0,0 +1,97 @@
+"""
+成功案例提取測試
+
+1. 批次提取與逐筆提取的結果完全相同，趨勢斜率與 np.polyfit 一致
+2. 找不到K線 / 時間格式不一致 / 索引不從 0 開始 / 時間未排序時的處理
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+
+from core.case_extractor import CaseExtractor
+
+
+def _make_klines(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    return pd.DataFrame({
+        'open_time': pd.date_range('2025-01-01', periods=n, freq='15min'),
+        'open': open_,
+        'high': np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.002, n))),
+        'low': np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.002, n))),
+        'close': close,
+        'volume': rng.lognormal(3, 0.6, n),
+    })
+
+
+def _make_trades(df, n, seed=1):
+    rng = np.random.default_rng(seed)
+    trades = []
+    for k in range(n):
+        # 前幾筆落在指標暖機期 (指標有 NaN)，進場時間不一定對齊K線
+        i = int(rng.integers(0, 40)) if k < 5 else int(rng.integers(0, len(df) - 60))
+        j = i + int(rng.integers(0, 50))
+        entry = df['open_time'][i] + pd.Timedelta(minutes=int(rng.integers(0, 15)))
+        trades.append({
+            'symbol': 'BTCUSDT',
+            'direction': 'LONG' if k % 2 else 'SHORT',
+            'entry_time': str(entry),
+            'exit_time': str(df['open_time'][j]),
+            'entry_price': float(df['close'][i]),
+            'exit_price': float(df['close'][j]),
+            'pnl_pct': float(rng.uniform(0.5, 4)),
+            'exit_reason': 'TP'
+        })
+    return trades
+
+
+def test_batch_matches_single_case():
+    """測試1: 批次與逐筆一致"""
+    extractor = CaseExtractor()
+    df = _make_klines()
+    trades = _make_trades(df, 200)
+
+    batch = extractor.extract_from_trades(df, trades)
+    prepared = extractor._calculate_all_indicators(extractor._standardize_time_column(df))
+    single = extractor._extract_each(prepared, [t for t in trades if t['pnl_pct'] >= 1.0])
+    assert len(batch) == len(single) > 100
+    assert batch == single
+    assert [list(c) for c in batch] == [list(c) for c in single]      # 欄位順序 (JSON 順序) 也相同
+
+    for case in batch:
+        for name, trend in case['indicator_trends'].items():
+            slope = np.polyfit(np.arange(len(trend['values'])), [
+                c['indicators'][name] for c in case['candles']
+                if 'entry' in c['position'] and name in c['indicators']
+            ], 1)[0]
+            assert abs(trend['slope'] - slope) < 1e-4
+
+
+def test_missing_candles_and_fallbacks(capsys):
+    """測試2: 找不到K線時跳過，時間格式不一致、索引不從 0 開始、時間未排序"""
+    extractor = CaseExtractor()
+    df = _make_klines(800, seed=2)
+    trades = _make_trades(df, 30, seed=3)
+    trades[3]['pnl_pct'] = 2.0
+    trades[4] = dict(trades[4], entry_time='2020-01-01', exit_time='2020-01-02', pnl_pct=3.0)
+    trades[6] = dict(trades[6], entry_time=pd.Timestamp(trades[6]['entry_time']), pnl_pct=3.0)
+
+    expected = extractor.extract_from_trades(df, trades)
+    assert '找不到進場時間 2020-01-01 00:00:00' in capsys.readouterr().out
+    assert len(expected) == sum(t['pnl_pct'] >= 1.0 for t in trades) - 1
+    assert expected[3]['trade_id'].startswith('BTCUSDT_')
+
+    # 只取最近一段K線 (索引不從 0 開始) 仍走批次路徑，結果與逐筆相同
+    recent = df.iloc[300:]
+    prepared = extractor._calculate_all_indicators(extractor._standardize_time_column(recent))
+    assert extractor._supports_batch(prepared)
+    kept = [t for t in trades if t['pnl_pct'] >= 1.0]
+    assert extractor.extract_from_trades(recent, trades) == extractor._extract_each(prepared, kept)
+
+    # K線順序打亂時改走逐筆路徑
+    shuffled = df.sample(frac=1.0, random_state=0)
+    assert not extractor._supports_batch(extractor._standardize_time_column(shuffled))
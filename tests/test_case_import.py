@@ -0,0 +1,106 @@
+"""
+成功案例批量導入測試
+
+1. 向量化的模擬交易與原本逐根K線的版本完全相同
+2. 多個幣種平行導入與單行程一致，數據不足的幣種回報錯誤
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+import talib
+
+from core.case_import import bulk_import_cases, simulate_trades
+
+
+def _legacy_simulate_trades(df, symbol, min_profit_pct):
+    """原本 case_manager.simulate_trades 的逐根K線版本"""
+    time_col = next((c for c in ['timestamp', 'open_time', 'close_time', 'time'] if c in df.columns), None)
+    if time_col is None and isinstance(df.index, pd.DatetimeIndex):
+        df = df.copy()
+        df['timestamp'] = df.index
+        time_col = 'timestamp'
+    close = df['close'].values
+    volume = df['volume'].values
+    rsi = talib.RSI(close, timeperiod=14)
+    volume_ma = pd.Series(volume).rolling(20).mean().values
+
+    trades = []
+    position = None
+    for i in range(100, len(df) - 20):
+        if position is None:
+            if rsi[i] < 30 and volume[i] > volume_ma[i] * 1.5:
+                position = {'direction': 'LONG', 'entry_time': str(df.iloc[i][time_col]), 'entry_price': close[i]}
+            elif rsi[i] > 70 and volume[i] > volume_ma[i] * 1.5:
+                position = {'direction': 'SHORT', 'entry_time': str(df.iloc[i][time_col]), 'entry_price': close[i]}
+        else:
+            if position['direction'] == 'LONG':
+                pnl_pct = (close[i] - position['entry_price']) / position['entry_price'] * 100
+            else:
+                pnl_pct = (position['entry_price'] - close[i]) / position['entry_price'] * 100
+            if pnl_pct >= min_profit_pct or pnl_pct <= -2.0:
+                if pnl_pct >= min_profit_pct:
+                    trades.append({
+                        'symbol': symbol,
+                        'direction': position['direction'],
+                        'entry_time': position['entry_time'],
+                        'exit_time': str(df.iloc[i][time_col]),
+                        'entry_price': position['entry_price'],
+                        'exit_price': close[i],
+                        'pnl_pct': pnl_pct,
+                        'exit_reason': 'TP' if pnl_pct > 0 else 'SL'
+                    })
+                position = None
+    return trades
+
+
+def _make_klines(n, seed):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.006, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    return pd.DataFrame({
+        'open_time': pd.date_range('2023-01-01', periods=n, freq='1h'),
+        'open': open_,
+        'high': np.maximum(open_, close) * 1.001,
+        'low': np.minimum(open_, close) * 0.999,
+        'close': close,
+        'volume': rng.lognormal(3, 0.7, n),
+    })
+
+
+def _load(symbol, timeframe, days):
+    """測試用的K線來源 (模組層級函數，工作行程可以 pickle)"""
+    if symbol == 'SHORTUSDT':
+        return _make_klines(150, 0)
+    return _make_klines(24 * 400, sum(map(ord, symbol)))
+
+
+def test_simulate_matches_bar_loop():
+    """測試1: 與逐根K線的版本一致"""
+    for seed, min_profit in ((0, 1.0), (1, 0.5), (2, 3.0)):
+        df = _make_klines(6000, seed)
+        expected = _legacy_simulate_trades(df, 'ETHUSDT', min_profit)
+        assert len(expected) > 10
+        assert simulate_trades(df, 'ETHUSDT', min_profit) == expected
+
+    # 時間在 DatetimeIndex 上
+    indexed = _make_klines(3000, 3).set_index('open_time')
+    assert simulate_trades(indexed, 'BTCUSDT', 1.0) == _legacy_simulate_trades(indexed, 'BTCUSDT', 1.0)
+    assert simulate_trades(_make_klines(110, 4), 'BTCUSDT', 1.0) == []
+
+
+def test_bulk_import_pooled_matches_inline():
+    """測試2: 多行程導入"""
+    symbols = ['BTCUSDT', 'ETHUSDT', 'SHORTUSDT']
+    inline = {r['symbol']: r for r in bulk_import_cases(symbols, '1h', 365, 1.0, max_workers=1, load=_load)}
+    pooled = {r['symbol']: r for r in bulk_import_cases(symbols, '1h', 365, 1.0, max_workers=2, load=_load)}
+
+    assert inline.keys() == pooled.keys() == set(symbols)
+    assert 'error' in pooled['SHORTUSDT'] and pooled['SHORTUSDT']['cases'] == []
+    for symbol in ('BTCUSDT', 'ETHUSDT'):
+        assert 'error' not in pooled[symbol]
+        assert pooled[symbol]['bars'] == 24 * 365 + 1        # 只保留最近 365 天
+        assert pooled[symbol]['trades'] > 0 and len(pooled[symbol]['cases']) == pooled[symbol]['trades']
+        assert pooled[symbol]['cases'] == inline[symbol]['cases']
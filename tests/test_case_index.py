@@ -0,0 +1,109 @@
+"""
+成功案例相似度索引測試
+
+1. 與原本逐案例計算的排序完全一致 (包括同分、指標為 0、缺少進場K線)
+2. 重新載入時只編入新增的案例，案例庫被改寫時整個重建
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import random
+
+from core.case_index import CaseIndex
+
+
+def _legacy_find_similar(cases, current_market, max_cases):
+    """原本 EnhancedDeepSeekAgent._find_similar_cases 的逐案例計算"""
+    similarities = []
+    for case in cases:
+        entry_candle = next((c for c in case['candles'] if c['position'] == 'entry'), None)
+        if not entry_candle:
+            continue
+        case_indicators = entry_candle['indicators']
+        score = 0
+        weights = {'rsi': 2.0, 'bb_position': 2.0, 'volume_ratio': 1.5, 'macd_hist': 1.5, 'adx': 1.0}
+        for key, weight in weights.items():
+            current_val = current_market.get(key, 0)
+            case_val = case_indicators.get(key, 0)
+            if current_val == 0 and case_val == 0:
+                continue
+            if key == 'rsi':
+                diff = abs(current_val - case_val) / 100.0
+            elif key == 'bb_position':
+                diff = abs(current_val - case_val)
+            elif key == 'volume_ratio':
+                diff = abs(current_val - case_val) / max(current_val, case_val, 1.0)
+            elif key == 'macd_hist':
+                diff = min(abs(current_val - case_val) * 100, 1.0)
+            elif key == 'adx':
+                diff = abs(current_val - case_val) / 100.0
+            else:
+                diff = 0
+            score += weight * (1 - diff)
+        similarities.append({'case': case, 'score': score})
+    similarities.sort(key=lambda x: x['score'], reverse=True)
+    return [s['case'] for s in similarities[:max_cases]]
+
+
+def _make_cases(n, seed=0):
+    rng = random.Random(seed)
+    cases = []
+    for i in range(n):
+        # 粗粒度的數值製造大量同分與 0 值
+        indicators = {
+            'rsi': rng.choice([0, 30, 50, 70]),
+            'bb_position': rng.choice([0.0, 0.2, 0.5, 0.8]),
+            'volume_ratio': rng.choice([0, 0.5, 1.5, 3.0]),
+            'macd_hist': rng.choice([0, -0.002, 0.004]),
+        }
+        if rng.random() < 0.7:
+            indicators['adx'] = rng.choice([0, 20, 40])
+        candles = [{'position': 'before', 'indicators': {}}]
+        if rng.random() < 0.95:
+            candles.append({'position': 'entry', 'indicators': indicators})
+        cases.append({'trade_id': f'T{i}', 'candles': candles})
+    return cases
+
+
+def _ids(cases):
+    return [c['trade_id'] for c in cases]
+
+
+def test_query_matches_linear_scan():
+    """測試1: 與原本的逐案例計算一致"""
+    cases = _make_cases(3000)
+    index = CaseIndex(cases)
+    rng = random.Random(1)
+    for _ in range(30):
+        current = {
+            'rsi': rng.choice([0, 45, 61.5]),
+            'bb_position': rng.choice([0, 0.3]),
+            'volume_ratio': rng.choice([0, 1.2, 2.5]),
+            'macd_hist': rng.choice([0, 0.001]),
+            'adx': rng.choice([0, 25]),
+        }
+        for k in (1, 5, 50, 5000):
+            assert _ids(index.query(current, k)) == _ids(_legacy_find_similar(cases, current, k))
+
+    assert CaseIndex([]).query({'rsi': 50}, 5) == []
+    assert index.query({'rsi': 50}, 0) == []
+
+
+def test_incremental_update_and_rebuild():
+    """測試2: 重新載入"""
+    cases = _make_cases(500, seed=2)
+    current = {'rsi': 55, 'bb_position': 0.4, 'volume_ratio': 1.3, 'macd_hist': 0.001, 'adx': 22}
+
+    index = CaseIndex(cases[:300])
+    reloaded = [dict(c) for c in cases]  # 重新從 JSON 載入: 內容相同但是新的物件
+    index.update(reloaded)
+    assert len(index) == len(CaseIndex(cases))
+    result = index.query(current, 20)
+    assert _ids(result) == _ids(_legacy_find_similar(cases, current, 20))
+    assert all(any(r is c for c in reloaded) for r in result)
+
+    # 案例庫被改寫 (不是在尾端追加) 時整個重建
+    rewritten = cases[100:]
+    index.update(rewritten)
+    assert _ids(index.query(current, 20)) == _ids(_legacy_find_similar(rewritten, current, 20))
@@ -0,0 +1,132 @@
+"""
+案例庫二進位儲存測試
+
+1. 從舊 JSON 匯入、完整還原案例、依 trade_id 去重、分頁篩選排序
+2. 墓碑刪除、保留最近 N 筆、壓縮、寫到一半中斷後的修復
+3. 兩個實例輪流追加時不會截掉對方已提交的資料
+4. 對方刪除並壓縮 (紀錄重新編號) 後，過期的實例刪除 / 追加的仍是正確的案例
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import json
+import random
+
+from core.case_store import CaseStore, open_case_store, parse_profit
+
+
+def _make_case(i, rng):
+    candles = []
+    for j in range(4):
+        indicators = {'rsi': round(rng.uniform(0, 100), 4), 'macd_hist': round(rng.gauss(0, 0.01), 4)}
+        if rng.random() < 0.3:
+            del indicators['macd_hist']      # 部分K棒缺少指標
+        if j == 3:
+            indicators['note'] = 'text'      # 非數值指標留在本體
+        candles.append({
+            'time': f'2025-01-01 0{j}:00:00',
+            'position': 'entry' if j == 2 else f'entry-{2 - j}',
+            'ohlcv': [1.0, 2.0, 0.5, 1.5, 10.0],
+            'indicators': indicators
+        })
+    return {
+        'trade_id': f'BTCUSDT_{i}',
+        'symbol': 'BTCUSDT',
+        'direction': rng.choice(['LONG', 'SHORT']),
+        'outcome': f"profit_{rng.uniform(1, 5):.2f}%",
+        'entry_time': f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 10:00:00",
+        'holding_bars': rng.randint(1, 30),
+        'candles': candles,
+        'entry_logic': 'RSI超賣(25.0<30) + 成交量爆發(2.1x)',
+    }
+
+
+def test_import_round_trip_and_pages(tmp_path):
+    """測試1: 匯入、還原、去重、分頁"""
+    rng = random.Random(0)
+    cases = [_make_case(i, rng) for i in range(300)]
+    json_path = tmp_path / 'detailed_success_cases.json'
+    json_path.write_text(json.dumps({'feature_count': 42, 'cases': cases[:200]}, ensure_ascii=False), encoding='utf-8')
+
+    store = open_case_store(json_path)
+    assert len(store) == 200 and store.info()['feature_count'] == 42
+    assert store.append(cases[150:]) == 100           # 前 50 個重複
+    assert len(store) == 300
+
+    reopened = CaseStore(tmp_path / 'detailed_success_cases.store')
+    assert reopened.load_all() == cases
+    assert reopened.get('BTCUSDT_7') == cases[7]
+
+    expected = [c for c in cases if c['direction'] == 'LONG' and parse_profit(c['outcome']) >= 2.0]
+    expected.sort(key=lambda c: parse_profit(c['outcome']), reverse=True)
+    page, total = reopened.page(20, 20, directions=['LONG'], min_profit=2.0, sort_by='profit')
+    assert total == len(expected) and page == expected[20:40]
+
+    by_time, _ = reopened.page(0, 300, sort_by='entry_time')
+    assert [c['entry_time'] for c in by_time] == sorted((c['entry_time'] for c in cases), reverse=True)
+    summary = reopened.summary()
+    assert list(summary['trade_id']) == [c['trade_id'] for c in cases]
+
+
+def test_delete_trim_compact_and_recovery(tmp_path):
+    """測試2: 墓碑、保留最近 N 筆、壓縮、中斷修復"""
+    rng = random.Random(1)
+    cases = [_make_case(i, rng) for i in range(60)]
+    store = CaseStore(tmp_path / 'cases.store')
+    store.append(cases)
+
+    size = (store.root / 'cases.jsonl').stat().st_size
+    assert store.delete('BTCUSDT_3') and not store.delete('BTCUSDT_3')
+    assert (store.root / 'cases.jsonl').stat().st_size == size     # 刪除不重寫本體
+    assert store.trim(50) == 9                                       # 存活 59 筆，刪掉最舊的 9 筆
+    alive = [c for c in cases if c['trade_id'] != 'BTCUSDT_3'][9:]
+    assert CaseStore(store.root).load_all() == alive
+
+    store.compact()
+    assert len(store._records) == 50
+    assert CaseStore(store.root).load_all() == alive
+
+    # 寫到一半中斷: 本體 / 指標 / trade_id 有多出來的資料但 records 沒寫入
+    for name, junk in (('cases.jsonl', b'{"partial'), ('indicators.f64', b'\x00' * 12), ('trade_ids.txt', b'BROKEN\n')):
+        with open(store.root / name, 'ab') as f:
+            f.write(junk)
+    recovered = CaseStore(store.root)
+    assert recovered.load_all() == alive
+    extra = _make_case(99, rng)
+    assert recovered.append([extra]) == 1
+    assert CaseStore(store.root).load_all() == alive + [extra]
+    assert 'BTCUSDT_99' in CaseStore(store.root)
+
+
+def test_two_instances_append_in_turn(tmp_path):
+    """測試3: 兩個長時間開啟的實例輪流追加"""
+    rng = random.Random(2)
+    cases = [_make_case(i, rng) for i in range(12)]
+    first = CaseStore(tmp_path / 'cases.store')
+    first.append(cases[:2])
+    second = CaseStore(first.root)                    # 例如另一個回測 session 的 DeepSeekTradingAgent
+
+    assert first.append(cases[2:5]) == 3
+    assert second.append(cases[5:8] + [cases[3]]) == 3          # 對方剛提交的 trade_id 也會去重
+    assert first.append(cases[8:10]) == 2
+    assert second.append(cases[10:]) == 2
+
+    assert CaseStore(first.root).load_all() == cases
+    assert second.load_all() == cases
+
+
+def test_delete_after_other_instance_compacts(tmp_path):
+    """測試4: 對方壓縮 (紀錄重新編號) 後刪除"""
+    rng = random.Random(3)
+    cases = [_make_case(i, rng) for i in range(6)]
+    first = CaseStore(tmp_path / 'cases.store')
+    first.append(cases[:5])
+    second = CaseStore(first.root)
+    assert first.delete('BTCUSDT_0')
+    first.compact()
+    assert second.delete('BTCUSDT_2') and not second.delete('BTCUSDT_0')
+    assert CaseStore(first.root).load_all() == [cases[1], cases[3], cases[4]]
+    assert first.trim(2) == 1 and second.append([cases[5]]) == 1
+    assert CaseStore(first.root).load_all() == [cases[3], cases[4], cases[5]] == second.load_all()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['cases.store', 'cases.store.lock']    # 鎖檔在目錄外
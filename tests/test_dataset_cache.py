@@ -0,0 +1,57 @@
+"""
+歷史數據欄式快取測試
+
+1. 寫入後完整讀回與原始 DataFrame 相同
+2. 時間範圍 / 最後 N 天切片與 pandas 過濾結果相同
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+
+from core.dataset_cache import HistoricalDatasetCache
+
+
+def _make_history(n=5000, seed=5):
+    rng = np.random.default_rng(seed)
+    open_time = pd.date_range('2025-01-01', periods=n, freq='15min')
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    return pd.DataFrame({
+        'open_time': open_time,
+        'open': np.r_[close[0], close[:-1]],
+        'high': close * 1.002,
+        'low': close * 0.998,
+        'close': close,
+        'volume': rng.uniform(50, 500, n),
+        'close_time': open_time + pd.Timedelta(minutes=15) - pd.Timedelta(milliseconds=1),
+        'trades': rng.integers(100, 1000, n),
+    })
+
+
+def test_roundtrip(tmp_path):
+    """測試1: 完整讀回"""
+    df = _make_history()
+    cache = HistoricalDatasetCache(str(tmp_path))
+    assert cache.ingest('BTCUSDT', '15m', df, source=[1, 2])
+
+    assert cache.is_fresh('BTCUSDT', '15m', [1, 2])
+    assert not cache.is_fresh('BTCUSDT', '15m', [1, 3])
+    pd.testing.assert_frame_equal(cache.load('BTCUSDT', '15m'), df)
+
+
+def test_time_slicing(tmp_path):
+    """測試2: 時間切片與 pandas 過濾一致"""
+    df = _make_history()
+    cache = HistoricalDatasetCache(str(tmp_path))
+    cache.ingest('BTCUSDT', '15m', df)
+
+    end_time = df['open_time'].max()
+    expected = df[df['open_time'] >= end_time - pd.Timedelta(days=30)].reset_index(drop=True)
+    pd.testing.assert_frame_equal(cache.load('BTCUSDT', '15m', days=30), expected)
+
+    start, end = pd.Timestamp('2025-01-10 03:07'), pd.Timestamp('2025-01-12')
+    expected = df[(df['open_time'] >= start) & (df['open_time'] <= end)].reset_index(drop=True)
+    actual = cache.load('BTCUSDT', '15m', start=start, end=end, columns=['open_time', 'close'])
+    pd.testing.assert_frame_equal(actual, expected[['open_time', 'close']])
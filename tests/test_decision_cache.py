@@ -0,0 +1,100 @@
+"""
+LLM 回應快取測試
+
+1. 相同 (供應商, 模型, prompt) 命中，任一不同則未命中
+2. K 棒收盤後過期、LRU 淘汰
+3. 磁碟後端在新的實例中仍可命中
+4. 仲裁者: 同一根 K 棒內未收盤價格與帳戶餘額不同也命中，持倉改變則重新呼叫
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from core.arbitrator_consensus_agent import ArbitratorConsensusAgent, ModelInterface
+from core.decision_cache import LLMResponseCache
+
+
+RESULT = {'success': True, 'content': '{"action": "HOLD"}', 'elapsed_time': 1.2}
+
+
+def test_hit_and_miss():
+    """測試1: 命中與未命中"""
+    cache = LLMResponseCache()
+    cache.put('groq', 'llama', 'system', 'user', RESULT)
+
+    hit = cache.get('groq', 'llama', 'system', 'user')
+    assert hit == RESULT and hit is not RESULT
+    assert cache.get('groq', 'llama', 'system', 'user2') is None
+    assert cache.get('openrouter', 'llama', 'system', 'user') is None
+    assert cache.get_stats()['hits'] == 1 and cache.get_stats()['misses'] == 2
+
+
+def test_expiry_and_lru():
+    """測試2: 過期與 LRU"""
+    cache = LLMResponseCache(max_entries=2)
+    assert cache.expires_at(now=1000) == 1800
+    assert cache.current_bar_start(now=1799) == 900
+
+    cache.put('p', 'm', 's', 'a', RESULT)
+    cache.put('p', 'm', 's', 'b', RESULT)
+    cache.get('p', 'm', 's', 'a')
+    cache.put('p', 'm', 's', 'c', RESULT)
+    assert cache.get('p', 'm', 's', 'b') is None
+    assert cache.get('p', 'm', 's', 'a') is not None
+    assert cache.stats['evictions'] == 1
+
+    key = cache.make_key('p', 'm', 's', 'a')
+    cache._entries[key] = (0, RESULT)
+    assert cache.get('p', 'm', 's', 'a') is None
+    assert cache.stats['expired'] == 1
+
+
+def test_disk_backend(tmp_path):
+    """測試3: 磁碟後端"""
+    LLMResponseCache(disk_dir=str(tmp_path)).put('p', 'm', 's', 'u', RESULT)
+    assert LLMResponseCache(disk_dir=str(tmp_path)).get('p', 'm', 's', 'u') == RESULT
+
+
+class CountingModel(ModelInterface):
+    def __init__(self, name):
+        super().__init__(name, 'k', f'https://{name}.example/v1', f'{name}-model')
+        self.calls = 0
+
+    def analyze(self, system_prompt, user_prompt):
+        self.calls += 1
+        return {'success': True, 'model': self.model, 'elapsed_time': 0.5,
+                'content': '{"action": "HOLD", "confidence": 60, "reasoning": "等待收盤"}'}
+
+
+def test_arbitrator_hits_within_bar(tmp_path):
+    """測試4: 同一根 K 棒的不同 tick"""
+    agent = object.__new__(ArbitratorConsensusAgent)
+    agent.primary_model_a, agent.primary_model_b = CountingModel('a'), CountingModel('b')
+    agent.backup_models_a = agent.backup_models_b = []
+    agent.model_config = {'hedge_delay_seconds': 0, 'streaming': {'enabled': False}}
+    agent.response_cache = LLMResponseCache(bar_seconds=10 ** 9)         # 測試期間不會跨過 K 棒收盤
+    agent.llm_replay = agent.prompt_compiler = agent.trading_executor = None
+    agent.prompt_digits = 5
+    agent.last_analysis_detail = None
+    agent.analysis_details = {}
+    agent.arbitration_count = agent.agreement_count = 0
+    agent.history_file = tmp_path / 'decision_history.json'
+    agent.decision_history = []
+    agent._create_pools(1)
+
+    def analyze(tick, equity, position=None):
+        candles = [{'timestamp': '2026-01-01 00:00:00', 'close': 100.0},
+                   {'timestamp': '2026-01-01 00:15:00', 'close': tick, 'volume': tick * 3}]      # 最後一根未收盤
+        market = {'symbol': 'BTCUSDT', 'close': tick, 'rsi': tick / 2}
+        account = {'total_equity': equity, 'unrealized_pnl': equity - 1000}
+        return agent.analyze_with_arbitration(market, account, position, historical_candles=candles)
+
+    analyze(101.2, 1000.0)
+    second = analyze(100.7, 1003.5)                                           # 同一根 K 棒的另一個 tick
+    assert agent.primary_model_a.calls == agent.primary_model_b.calls == 1
+    assert second['action'] == 'HOLD' and agent.response_cache.stats['hits'] == 2
+    detail = agent.get_last_analysis_detail()
+    assert '100.7' in detail['user_prompt']                                   # prompt 仍是最新的行情
+
+    analyze(100.9, 1001.0, {'side': 'Buy', 'size': 0.01, 'entry_price': 100.7})
+    assert agent.primary_model_a.calls == agent.primary_model_b.calls == 2    # 持倉改變
@@ -0,0 +1,107 @@
+"""
+單次掃描決策解析器測試
+
+1. 格式錯誤的輸出: 註釋、尾隨逗號、外層物件、多個物件、說明文字、截斷、空值
+2. 逐段餵入: 任何切點的結果都與一次解析相同，串流中途不會出現錯誤的欄位值
+3. 純文字的 key: value 只有在取得必要欄位時才採用
+4. 陣列內的物件、巢狀陣列與空物件保持原本的結構
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from core.json_parser_robust import DecisionParser, RobustJSONParser, parse_executor_review, parse_trading_decision
+
+
+def _parse(text):
+    return DecisionParser().feed(text).finish()
+
+
+def test_malformed_outputs():
+    """測試1: 格式錯誤的輸出"""
+    assert _parse("""先說明 action: CLOSE 的可能性
+```json
+{ /* 決策 */
+  "action": "OPEN_SHORT", // 做空
+  'confidence': 65.5,
+  "leverage": 3,
+  "stop_loss": ,
+  "risk_factors": ["波動", 2, null,],
+  "止損理由": "跌破支撐",
+  "reasoning": "他說 \\"action\\": \\"HOLD\\" \\u2192 不對",
+}
+```
+{"action": "HOLD", "confidence": 10}""") == {
+        'action': 'OPEN_SHORT', 'confidence': 65.5, 'leverage': 3, 'risk_factors': ['波動', 2, None],
+        '止損理由': '跌破支撐', 'reasoning': '他說 "action": "HOLD" → 不對'
+    }
+
+    wrapped = _parse('{"analysis": {"confidence": 10, "trend": "UP"}, "decision": {"action": "OPEN_LONG"}, '
+                     '"confidence": 80, "is_counter_trend": True, "entry_price": NaN}')
+    assert wrapped == {'confidence': 80, 'trend': 'UP', 'action': 'OPEN_LONG', 'is_counter_trend': True,
+                       'entry_price': 0, 'analysis': {'confidence': 10, 'trend': 'UP'},
+                       'decision': {'action': 'OPEN_LONG'}}
+
+    truncated = parse_trading_decision('<think>{"action": "OPEN_SHORT"}</think>{"action": "open_long", '
+                                       '"confidence": "75", "stop_loss": 67000, "reasoning": "RSI 超賣，')
+    assert truncated['action'] == 'OPEN_LONG' and truncated['confidence'] == 75
+    assert truncated['stop_loss'] == 67000.0 and truncated['reasoning'] == 'RSI 超賣，'
+    assert truncated['leverage'] == 1 and truncated['risk_assessment'] == 'HIGH'
+
+
+def test_streamed_chunks_match_one_shot():
+    """測試2: 任何切點都與一次解析相同"""
+    texts = [
+        '```json\n{"action": "HOLD", "confidence": 75, "leverage": 2, "reasoning": "等待 \\"突破\\""}\n```',
+        "<think>也許 {'action': 'CLOSE'}</think>\n{'action': 'OPEN_LONG', 'confidence': 7, 'entry_price': 67850.5}",
+        '我認為應該 action: OPEN_LONG, confidence: 72\nstop_loss: 67200\nreasoning: 技術指標超賣反彈',
+        '{"execution_decision": "REDUCE_SIZE", "risk_factors": ["波動性高", "信心度不足"], /* x */ "ratio": -1e-2}',
+    ]
+    for text in texts:
+        expected = _parse(text)
+        for split in range(1, len(text)):
+            parser = DecisionParser().feed(text[:split])
+            for key, value in parser.structured_fields.items():
+                assert expected[key] == value, (text[:split], key)              # 中途不會出現錯誤的值
+            assert parser.feed(text[split:]).finish() == expected, split
+
+        parser = DecisionParser()
+        for char in text:
+            parser.feed(char)
+        assert parser.finish() == expected
+
+    parser = DecisionParser().feed('{"action": "HOLD", "confidence": 7')
+    assert parser.structured_fields == {'action': 'HOLD'}                      # 75 還沒輸出完
+    assert parser.feed('5}').structured_fields == {'action': 'HOLD', 'confidence': 75} and parser.done
+
+
+def test_plain_text_requires_key_fields():
+    """測試3: 純文字欄位的門檻"""
+    assert RobustJSONParser.parse('我覺得 leverage: 5 比較好', {'action': 'HOLD'}) == {'action': 'HOLD'}
+    assert RobustJSONParser.parse('action: CLOSE, confidence: 60%') == {'action': 'CLOSE', 'confidence': 60}
+    assert RobustJSONParser.parse('{"leverage": 5}', {'action': 'HOLD'}) == {'leverage': 5}
+
+    review = parse_executor_review('審核結果 execution_decision: execute\nposition_size_ratio: 0.8')
+    assert review['execution_decision'] == 'EXECUTE' and review['position_size_ratio'] == 0.8
+    review = parse_executor_review('經過分析，信心度: 45%，不建議執行')
+    assert review['execution_decision'] == 'REJECT'
+
+
+def test_nested_values_keep_structure():
+    """測試4: 巢狀結構"""
+    text = ('{"action": "HOLD", "candidates": [{"name": "x", "confidence": 99, "tags": ["a", []]}, {}],'
+            ' "grid": [[1, 2], [3, 4]], "meta": {}, "levels": {"support": [97, 95], "note": {"src": "4h"}},'
+            ' "confidence": 60}')
+    expected = {'action': 'HOLD', 'candidates': [{'name': 'x', 'confidence': 99, 'tags': ['a', []]}, {}],
+                'grid': [[1, 2], [3, 4]], 'meta': {}, 'levels': {'support': [97, 95], 'note': {'src': '4h'}},
+                'support': [97, 95], 'note': {'src': '4h'}, 'src': '4h', 'confidence': 60}
+    assert _parse(text) == expected
+    for split in range(1, len(text)):
+        parser = DecisionParser().feed(text[:split])
+        for key, value in parser.structured_fields.items():
+            assert expected[key] == value, (text[:split], key)
+        assert parser.feed(text[split:]).finish() == expected, split
+
+    assert _parse("{'risk': [{level: 'HIGH', 'score': 0.8,}, [1, [2]],], 'action': 'CLOSE'}") == {
+        'risk': [{'level': 'HIGH', 'score': 0.8}, [1, [2]]], 'action': 'CLOSE'}
+    assert _parse('{"action": "HOLD", "steps": [{"a": [1, 2') == {'action': 'HOLD', 'steps': [{'a': [1, 2]}]}
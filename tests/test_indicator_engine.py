@@ -0,0 +1,69 @@
+"""
+共用指標引擎測試
+
+1. 指標數值與直接呼叫 talib 完全一致
+2. 相同規格在一次計算中只執行一次
+3. 同一份數據重複請求命中快取
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+import talib
+
+from core.indicator_engine import (
+    HLC, MARKET_INDICATORS, IndicatorEngine, compute_indicators, indicator
+)
+
+
+def _make_ohlcv(n=600, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.003, n))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.003, n))
+    volume = rng.uniform(50, 500, n)
+    return pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume})
+
+
+def test_block_matches_talib():
+    """測試1: 區塊數值與 talib 一致"""
+    df = _make_ohlcv()
+    block = compute_indicators(df, MARKET_INDICATORS)
+
+    close, high, low = df['close'].values, df['high'].values, df['low'].values
+    np.testing.assert_array_equal(block['ema200'], talib.EMA(close, timeperiod=200))
+    np.testing.assert_array_equal(block['macd_hist'], talib.MACD(close)[2])
+    np.testing.assert_array_equal(block['adx'], talib.ADX(high, low, close, timeperiod=14))
+    np.testing.assert_array_equal(block['stoch_d'], talib.STOCH(high, low, close)[1])
+
+    assert block.values.dtype == np.float64
+    assert block.values.shape == (len(df), len(block.columns))
+    assert block['close'].flags['C_CONTIGUOUS']
+
+
+def test_duplicate_specs_computed_once():
+    """測試2: 相同內容的規格只計算一次"""
+    df = _make_ohlcv()
+    engine = IndicatorEngine(cache_size=0)
+    block = engine.compute(df, [
+        indicator('ATR', 'atr', inputs=HLC, timeperiod=14),
+        indicator('ATR', 'atr_14', inputs=HLC, timeperiod=14),
+    ])
+    assert engine.stats['computed'] == 1
+    np.testing.assert_array_equal(block['atr'], block['atr_14'])
+
+
+def test_cache_hit_on_same_data():
+    """測試3: 同一份數據第二次計算命中快取"""
+    df = _make_ohlcv()
+    engine = IndicatorEngine()
+    engine.compute(df, MARKET_INDICATORS)
+    computed = engine.stats['computed']
+
+    block = engine.compute(df.copy(), MARKET_INDICATORS)
+    assert engine.stats['computed'] == computed
+    assert engine.stats['cache_hits'] == len(MARKET_INDICATORS)
+    np.testing.assert_array_equal(block['rsi'], talib.RSI(df['close'].values, timeperiod=14))
@@ -0,0 +1,151 @@
+"""
+多幣種即時交易排程測試
+
+1. 對齊K線收盤的時間計算
+2. 20 個幣種同時分析，LLM 同時呼叫數不超過上限，上一輪未完成的幣種跳過
+3. run_forever 在下一次收盤 (+ settle) 時執行，而不是固定 sleep
+4. 多個幣種同時使用同一個仲裁者: 依名額大小的執行緒池同時分析，最近決策依幣種過濾，分析記錄不互相覆蓋
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import json
+import threading
+import time
+
+import pytest
+
+from concurrent.futures import ThreadPoolExecutor
+
+from core.arbitrator_consensus_agent import ArbitratorConsensusAgent, ModelInterface
+from core.live_scheduler import LiveScheduler, next_candle_close
+
+
+def test_next_candle_close_alignment():
+    """測試1: UTC epoch 對齊"""
+    t = 1767225600.0                          # 2026-01-01 00:00:00 UTC
+    assert next_candle_close(t, '15m') == t + 900
+    assert next_candle_close(t + 1, '15m') == t + 900
+    assert next_candle_close(t + 899.9, '15m') == t + 900
+    assert next_candle_close(t + 3600 * 5 + 1, '4h') == t + 3600 * 8
+    # 收盤後 settle 秒之內仍屬於這一次收盤
+    assert next_candle_close(t + 1, '15m', settle_seconds=2) == t + 2
+    assert next_candle_close(t + 2, '15m', settle_seconds=2) == t + 902
+    with pytest.raises(ValueError):
+        LiveScheduler(['BTCUSDT'], lambda state, close: None, timeframe='7m')
+
+
+def test_watchlist_runs_concurrently_with_bounded_llm():
+    """測試2: 20 個幣種一輪在數秒內完成"""
+    symbols = [f'COIN{i}USDT' for i in range(20)]
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def run_symbol(state, candle_close):
+        time.sleep(0.05)                         # 載入數據 / 計算指標
+        with scheduler.llm_slots:
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.2)                      # LLM 呼叫
+            with lock:
+                active[0] -= 1
+        if state.symbol == 'COIN3USDT':
+            raise RuntimeError('boom')
+        return state.symbol
+
+    scheduler = LiveScheduler(symbols, run_symbol, max_llm_concurrency=5)
+    start = time.perf_counter()
+    futures = scheduler.run_once(candle_close=900.0)
+    # 上一輪還在執行 -> 這一輪全部跳過
+    assert scheduler.run_once(candle_close=1800.0) == []
+    for future in futures:
+        future.result()
+    elapsed = time.perf_counter() - start
+    scheduler.stop(wait=True)
+
+    assert 0.8 <= elapsed < 2.0                  # 20 * 0.2s / 5 個 LLM 名額，逐一執行需要 5 秒
+    assert peak[0] == 5
+    states = {s.symbol: s for s in scheduler.registry.states()}
+    assert all(s.runs == 1 and s.skipped == 1 and s.last_close == 900.0 and not s.running for s in states.values())
+    assert states['COIN3USDT'].last_error == 'boom' and states['COIN3USDT'].errors == 1
+    assert states['COIN4USDT'].last_result == 'COIN4USDT'
+    assert scheduler.registry.summary()[0]['last_duration'] > 0
+
+
+def test_run_forever_waits_for_candle_close():
+    """測試3: 等到下一次收盤 + settle 才執行"""
+    period = 60.0
+    real = time.time()
+    # 把時鐘調到距離下一根 1m 收盤還有 0.3 秒
+    offset = (period - real % period) - 0.3
+    clock = lambda: time.time() + offset
+    calls = []
+
+    scheduler = LiveScheduler(
+        ['BTCUSDT', 'ETHUSDT'],
+        lambda state, candle_close: calls.append((state.symbol, candle_close, clock())),
+        timeframe='1m', settle_seconds=0.1, clock=clock
+    )
+    scheduler.start(run_immediately=False)
+    deadline = time.time() + 3
+    while len(calls) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    scheduler.stop(wait=True)
+
+    assert sorted(c[0] for c in calls) == ['BTCUSDT', 'ETHUSDT']
+    for _, candle_close, ran_at in calls:
+        assert candle_close % period == 0
+        assert candle_close + 0.1 <= ran_at < candle_close + 0.5
+    assert not scheduler.running
+
+
+class _HoldModel(ModelInterface):
+    """所有幣種同時進入模型呼叫後才返回"""
+
+    def __init__(self, name, barrier):
+        super().__init__(name, 'k', f'https://{name}.example/v1', f'{name}-model')
+        self.barrier = barrier
+
+    def analyze(self, system_prompt, user_prompt):
+        self.barrier.wait(5)
+        return {'success': True, 'model': self.model, 'elapsed_time': 0.0,
+                'content': '{"action": "HOLD", "confidence": 60, "reasoning": "等待"}'}
+
+
+def test_shared_arbitrator_keeps_symbols_apart(tmp_path):
+    """測試4: 同一個仲裁者同時分析多個幣種"""
+    symbols = ['BTCUSDT', 'ETHUSDT', 'SOLUSDT']
+    barrier = threading.Barrier(len(symbols) * 2)
+    agent = object.__new__(ArbitratorConsensusAgent)
+    agent.primary_model_a, agent.primary_model_b = _HoldModel('a', barrier), _HoldModel('b', barrier)
+    agent.backup_models_a = agent.backup_models_b = []
+    agent.model_config = {'hedge_delay_seconds': 0, 'streaming': {'enabled': False}}
+    agent.response_cache = agent.llm_replay = agent.prompt_compiler = agent.trading_executor = None
+    agent.last_analysis_detail = None
+    agent.analysis_details = {}
+    agent.arbitration_count = agent.agreement_count = 0
+    agent.history_file = tmp_path / 'decision_history.json'
+    agent.decision_history = [
+        {'timestamp': 1.0, 'symbol': 'BTCUSDT', 'final': {'action': 'OPEN_LONG', 'reasoning': 'BTC 突破'}}
+    ]
+    agent._create_pools(len(symbols))                      # 與排程的 max_llm_concurrency 相同
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(symbols)) as pool:
+        decisions = list(pool.map(
+            lambda symbol: agent.analyze_with_arbitration({'symbol': symbol, 'close': 1.0}, {'total_equity': 1000}),
+            symbols
+        ))
+
+    assert time.monotonic() - start < 2                      # 6 個模型呼叫同時進行，不在 fanout 池排隊
+    assert [d['action'] for d in decisions] == ['HOLD'] * 3
+    for symbol in symbols:
+        detail = agent.get_last_analysis_detail(symbol)
+        assert detail['symbol'] == symbol and symbol in detail['user_prompt']
+        assert ('BTC 突破' in detail['user_prompt']) == (symbol == 'BTCUSDT')
+        assert all(s not in detail['user_prompt'] for s in symbols if s != symbol)
+    assert sorted(r['symbol'] for r in agent.decision_history[1:]) == symbols
+    saved = json.loads(agent.history_file.read_text(encoding='utf-8'))
+    assert len(saved['decisions']) == 4 and saved['decisions'][-1]['symbol'] in symbols
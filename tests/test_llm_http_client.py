@@ -0,0 +1,115 @@
+"""
+共用 LLM HTTP 客戶端測試 (本地模擬的 OpenAI 相容伺服器)
+
+1. 多次呼叫重用同一條 keep-alive 連線
+2. 串流回應逐段返回內容 (非 ASCII 內容以 UTF-8 解碼)
+3. 同一供應商的同時請求數不超過上限
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from core.llm_http_client import ProviderHTTPClient, chat_content
+
+
+class FakeProvider(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = set()
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        cls = type(self)
+        with cls.lock:
+            cls.connections.add(self.client_address)
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        time.sleep(float(self.headers.get('X-Delay', 0)))
+
+        if body.get('stream'):
+            parts = ('{"action":', ' "HOLD"', ', "reasoning": "', '看多', '，等待回踩"', '}')
+            chunks = [{'choices': [{'delta': {'content': part}}]} for part in parts]
+            # 與多數供應商相同: 不跳脫非 ASCII 字元，Content-Type 也不帶 charset
+            payload = ''.join(f"data: {json.dumps(c, ensure_ascii=False)}\n\n" for c in chunks) + "data: [DONE]\n\n"
+            content_type = 'text/event-stream'
+        else:
+            payload = json.dumps({'choices': [{'message': {'content': body['model']}}]})
+            content_type = 'application/json'
+
+        data = payload.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+        with cls.lock:
+            cls.active -= 1
+
+
+def _start_server():
+    FakeProvider.connections = set()
+    FakeProvider.active = 0
+    FakeProvider.max_active = 0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeProvider)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def test_keep_alive_reuses_connection():
+    """測試1: 連線重用"""
+    server, base_url = _start_server()
+    try:
+        client = ProviderHTTPClient()
+        messages = [{'role': 'user', 'content': 'hi'}]
+        for i in range(5):
+            result = client.chat_completion(base_url, 'key', f'model-{i}', messages, temperature=0.1)
+            assert chat_content(result) == f'model-{i}'
+        assert len(FakeProvider.connections) == 1
+        assert client.stats['pools'] == 1
+        client.close()
+    finally:
+        server.shutdown()
+
+
+def test_streaming():
+    """測試2: 串流回應 (中文)"""
+    server, base_url = _start_server()
+    try:
+        client = ProviderHTTPClient()
+        parts = list(client.stream_chat_completion(base_url, 'key', 'model', [{'role': 'user', 'content': 'hi'}]))
+        assert parts[3] == '看多'
+        assert ''.join(parts) == '{"action": "HOLD", "reasoning": "看多，等待回踩"}'
+        client.close()
+    finally:
+        server.shutdown()
+
+
+def test_bounded_concurrency():
+    """測試3: 同時請求上限"""
+    server, base_url = _start_server()
+    try:
+        client = ProviderHTTPClient(max_concurrency=2)
+        messages = [{'role': 'user', 'content': 'hi'}]
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            results = list(pool.map(
+                lambda i: client.chat_completion(base_url, 'key', 'm', messages, headers={'X-Delay': '0.1'}),
+                range(6)
+            ))
+        assert len(results) == 6
+        assert FakeProvider.max_active == 2
+        client.close()
+    finally:
+        server.shutdown()
@@ -0,0 +1,131 @@
+"""
+LLM 回應錄製 / 重播測試
+
+1. 錄製檔: 記錄成功的回應、重新開檔後重播、沒錄到時使用 stub、重播模式不呼叫遠端模型
+2. DeepSeekTradingAgent: 錄製一次後，重播得到完全相同的決策且不需要 Ollama
+3. 案例快照: 案例庫在錄製後被改動，重播仍從錄製時的案例開始；未命中率過高時警告
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import json
+import re
+
+import pytest
+
+from core.llm_agent import DeepSeekTradingAgent
+from core.llm_replay import LLMReplay, ReplayStore, open_replay
+
+
+def test_record_then_replay(tmp_path):
+    """測試1: 錄製與重播"""
+    path = tmp_path / 'replay.jsonl'
+    calls = []
+
+    def live(content, success=True):
+        def call():
+            calls.append(content)
+            return {'success': success, 'content': content, 'model': 'm', 'elapsed_time': 1.0}
+        return call
+
+    recorder = LLMReplay(path, mode='record')
+    assert recorder.complete('p', 'm', 'sys', 'u1', live('A'))['content'] == 'A'
+    recorder.complete('p', 'm', 'sys', 'u2', live('B', success=False))      # 失敗的回應不錄製
+    recorder.complete('p', 'm', 'sys', 'u1', live('A2'))                    # 同一個 prompt 以最後一筆為準
+    assert calls == ['A', 'B', 'A2'] and recorder.stats['recorded'] == 2
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"key": "trunc')                                           # 寫到一半的最後一行
+
+    replay = LLMReplay(path, mode='replay')
+    assert len(replay.store) == 1
+    hit = replay.complete('p', 'm', 'sys', 'u1', live('X'))
+    assert hit['content'] == 'A2' and hit['replayed'] and 'stub' not in hit
+    # 不同的供應商 / 模型 / system prompt 是不同的鍵 -> stub (預設 HOLD)
+    for args in (('q', 'm', 'sys', 'u1'), ('p', 'n', 'sys', 'u1'), ('p', 'm', 'sys2', 'u1')):
+        miss = replay.complete(*args, live('X'))
+        assert miss['stub'] and json.loads(miss['content'])['action'] == 'HOLD'
+    assert calls == ['A', 'B', 'A2']
+    assert replay.get_stats()['hits'] == 1 and replay.get_stats()['misses'] == 3
+
+    assert open_replay({'mode': 'live'}) is None and open_replay(None) is None
+    assert open_replay({'mode': 'replay', 'path': str(path)}).mode == 'replay'
+    with pytest.raises(ValueError):
+        LLMReplay(ReplayStore(path), mode='shadow')
+
+
+class FakeOllama:
+    """依 prompt 中的 RSI 與價格決策的替身模型 (附帶 R1 的思考過程)"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        rsi = float(re.search(r'RSI\(14\)：([\d.]+)', prompt).group(1))
+        close = float(re.search(r'當前價格：\$([\d,.]+)', prompt).group(1).replace(',', ''))
+        signal = 'LONG' if rsi < 40 else 'HOLD'
+        return 'Thinking...\n{"draft": true}\n...done thinking.\n' + json.dumps({
+            'signal': signal, 'confidence': int(100 - rsi), 'entry_price': close,
+            'stop_loss': close * 0.99, 'take_profit': close * 1.02, 'position_size_percent': 20
+        })
+
+
+def test_agent_replay_matches_recording(tmp_path, monkeypatch):
+    """測試2: 錄製後重播同一段行情"""
+    monkeypatch.chdir(tmp_path)
+    points = [
+        {'symbol': 'BTCUSDT', 'close': 60000 + 37 * i, 'rsi': 20 + (i * 7) % 60, 'macd_hist': 0.001 * (i % 5),
+         'bb_position': 0.5, 'volume_ratio': 1.2, 'ema50': 60000.0, 'ema200': 59000.0, 'atr': 500.0}
+        for i in range(40)
+    ]
+    path = tmp_path / 'replay.jsonl'
+
+    recorder = LLMReplay(path, mode='record')
+    agent = DeepSeekTradingAgent(replay=LLMReplay(path, mode='replay'))
+    fake = FakeOllama()
+    agent.model = recorder.wrap(fake, provider='ollama', model=agent.MODEL_NAME)
+    recorded = [agent.analyze_market(md) for md in points]
+    assert fake.calls == 40 and recorder.stats['recorded'] == 40
+    assert {d['signal'] for d in recorded} == {'LONG', 'HOLD'}
+
+    # 重播: 不需要 Ollama，決策完全相同
+    replay = LLMReplay(path, mode='replay')
+    replayed = DeepSeekTradingAgent(replay=replay)
+    assert [replayed.analyze_market(md) for md in points] == recorded
+    assert replay.stats == {'hits': 40, 'misses': 0, 'recorded': 0, 'live_calls': 0}
+
+    # 沒錄到的行情 -> stub 觀望
+    unseen = dict(points[0], close=1.0)
+    assert replayed.analyze_market(unseen)['signal'] == 'HOLD' and replay.stats['misses'] == 1
+
+    # 只保留在記憶體的學習不寫入案例庫
+    replayed.save_success_case(points[0], dict(recorded[0], reasoning=''), {'profit': 10}, persist=False)
+    assert len(replayed.success_cases) == 1 and not replayed.case_store.exists
+
+
+def test_cases_snapshot_and_miss_rate(tmp_path, monkeypatch):
+    """測試3: 錄製檔的案例快照"""
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / 'replay.jsonl'
+    case = {'market_data': {'rsi': 25.0, 'close': 60000.0}, 'result': {'profit': 12.5},
+            'decision': {'signal': 'LONG', 'entry_price': 60000.0, 'stop_loss': 59400.0,
+                         'take_profit': 61200.0, 'reasoning': '超賣'}}
+    agent = DeepSeekTradingAgent(replay=LLMReplay(path, mode='replay'))
+    agent.save_success_case(case['market_data'], case['decision'], case['result'])
+    initial = agent.case_store.load_all()
+
+    recorder = LLMReplay(path, mode='record')
+    assert recorder.initial_cases(agent.case_store.load_all) == initial and recorder.cases_path.exists()
+
+    # 即時回測在錄製之後又寫入案例庫
+    agent.save_success_case(dict(case['market_data'], rsi=30.0), case['decision'], case['result'])
+    assert len(agent.case_store.load_all()) == 2
+    assert recorder.initial_cases(agent.case_store.load_all) == initial                 # 之後的錄製也用快照
+    replay = LLMReplay(path, mode='replay')
+    assert DeepSeekTradingAgent(replay=replay).success_cases == initial
+
+    assert 'warning' not in replay.get_stats()
+    replay.complete('p', 'm', 'sys', 'unseen', None)
+    stats = replay.get_stats()
+    assert stats['miss_rate'] == 100 and '100.0%' in stats['warning']
@@ -0,0 +1,79 @@
+"""
+模型呼叫對沖測試
+
+1. 主力模型太慢時，對沖的備用模型先返回
+2. 主力模型失敗時立即改用備用模型
+3. 超過期限返回 (None, None)，期限到時不再加開備用模型
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.model_hedging import hedged_call
+
+
+class FakeModel:
+    def __init__(self, name, delay, success=True):
+        self.name = name
+        self.delay = delay
+        self.success = success
+
+    def analyze(self, system_prompt, user_prompt):
+        time.sleep(self.delay)
+        if not self.success:
+            return {'success': False, 'error': f'{self.name} failed'}
+        return {'success': True, 'content': self.name, 'elapsed_time': self.delay}
+
+
+def _call(model):
+    return model.analyze('system', 'user')
+
+
+def test_slow_primary_is_hedged():
+    """測試1: 主力太慢，備用先返回"""
+    launched = []
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        start = time.monotonic()
+        model, result = hedged_call(
+            [FakeModel('slow', 1.0), FakeModel('fast', 0.05)], _call, pool,
+            hedge_delay=0.1, deadline=5, on_launch=lambda m, i: launched.append(m.name)
+        )
+        elapsed = time.monotonic() - start
+
+    assert model.name == 'fast' and result['content'] == 'fast'
+    assert launched == ['slow', 'fast']
+    assert elapsed < 0.5
+
+
+def test_failure_switches_immediately():
+    """測試2: 主力失敗，立即改用備用 (不等待 hedge_delay)"""
+    failures = []
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        start = time.monotonic()
+        model, _ = hedged_call(
+            [None, FakeModel('broken', 0.01, success=False), FakeModel('backup', 0.01)], _call, pool,
+            hedge_delay=10, deadline=5, on_failure=lambda m, r: failures.append(m.name)
+        )
+        elapsed = time.monotonic() - start
+
+    assert model.name == 'backup'
+    assert failures == ['broken']
+    assert elapsed < 0.5
+
+
+def test_deadline():
+    """測試3: 超過期限"""
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        start = time.monotonic()
+        assert hedged_call([FakeModel('slow', 0.5)], _call, pool, hedge_delay=None, deadline=0.1) == (None, None)
+        assert time.monotonic() - start < 0.4
+
+        launched = []
+        for hedge_delay in (None, 5):
+            assert hedged_call([FakeModel('slow', 0.3), FakeModel('backup', 0.01)], _call, pool,
+                               hedge_delay=hedge_delay, deadline=0.1,
+                               on_launch=lambda m, i: launched.append(m.name)) == (None, None)
+        assert launched == ['slow', 'slow']
@@ -0,0 +1,113 @@
+"""
+參數掃描測試
+
+1. 網格 / 隨機搜尋空間
+2. SharedFrame 零複製、唯讀
+3. 多行程掃描: 指標依 SWEEP_FEATURE_FIELDS 只計算一次，結果與單行程一致
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.param_sweep import ParameterSweep, SharedFrame, grid_space, random_space, sweep_table
+
+
+@dataclass
+class ToyConfig:
+    ma_length: int = 10
+    threshold: float = 0.0
+    capital: float = 10000.0
+
+
+class ToyBacktester:
+    """收盤價高於均線 threshold 以上時持有一根K線"""
+    SWEEP_FEATURE_FIELDS = ('ma_length',)
+
+    def __init__(self, config):
+        self.config = config
+
+    def prepare(self, df):
+        df = df.copy()
+        df['ma'] = df['close'].rolling(self.config.ma_length).mean()
+        return df
+
+    def run_prepared(self, df):
+        if self.config.threshold < 0:
+            raise ValueError("threshold 不可為負")
+        close = df['close'].values
+        signal = close[:-1] > df['ma'].values[:-1] * (1 + self.config.threshold)
+        returns = close[1:] / close[:-1] - 1
+        return {
+            'total_trades': int(signal.sum()),
+            'return_pct': float(returns[signal].sum() * 100),
+            'trades': returns[signal].tolist(),
+        }
+
+
+def _make_df(n=2000, seed=3):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'open_time': pd.date_range('2024-01-01', periods=n, freq='15min'),
+        'close': 100 * np.exp(np.cumsum(rng.normal(0, 0.004, n))),
+        'volume': rng.integers(1, 100, n).astype(np.int32),
+        'label': ['x'] * n,
+    })
+
+
+def test_search_spaces():
+    """測試1: 網格與隨機搜尋"""
+    grid = grid_space({'ma_length': [10, 20], 'threshold': [0.0, 0.01, 0.02]})
+    assert len(grid) == 6
+    assert grid[0] == {'ma_length': 10, 'threshold': 0.0}
+    assert grid[-1] == {'ma_length': 20, 'threshold': 0.02}
+
+    points = random_space({'ma_length': (5, 8), 'threshold': (0.0, 0.01), 'mode': ['a', 'b']}, 200, seed=1)
+    assert len(points) == 200
+    assert {p['ma_length'] for p in points} == {5, 6, 7, 8}
+    assert all(isinstance(p['threshold'], float) and 0.0 <= p['threshold'] <= 0.01 for p in points)
+    assert {p['mode'] for p in points} == {'a', 'b'}
+    assert random_space({'ma_length': (5, 8)}, 20, seed=1) == random_space({'ma_length': (5, 8)}, 20, seed=1)
+
+
+def test_shared_frame_is_read_only_view():
+    """測試2: SharedFrame 保留數值與 dtype，工作端不可寫入"""
+    df = _make_df(n=101)
+    frame = SharedFrame(df)
+    try:
+        shm, view = SharedFrame.attach(frame.spec)
+        assert list(view.columns) == ['open_time', 'close', 'volume']  # object 欄位略過
+        pd.testing.assert_frame_equal(view, df[['open_time', 'close', 'volume']])
+        with pytest.raises(ValueError):
+            view['close'].values[0] = 0.0
+        del view
+        shm.close()
+    finally:
+        frame.close()
+
+
+def test_sweep_prepares_once_and_matches_inline():
+    """測試3: 兩個工作行程與單行程結果一致"""
+    df = _make_df()
+    space = grid_space({'ma_length': [10, 20], 'threshold': [0.0, 0.001, 0.002, -1.0]})
+
+    pooled = ParameterSweep(ToyBacktester, ToyConfig(), max_workers=2)
+    pooled_rows = sorted(pooled.run(df, space), key=lambda row: row['_index'])
+    inline = ParameterSweep(ToyBacktester, ToyConfig(), max_workers=1)
+    inline_rows = list(inline.run(df, space))
+
+    assert pooled_rows == inline_rows
+    assert pooled.stats == {'points': 8, 'prepared': 2, 'errors': 2}
+    assert 'trades' not in inline_rows[0]
+    assert [row['threshold'] for row in inline_rows if 'error' in row] == [-1.0, -1.0]
+
+    table = sweep_table(inline_rows)
+    assert list(table['return_pct'].dropna()) == sorted(table['return_pct'].dropna(), reverse=True)
+
+    with pytest.raises(ValueError):
+        list(inline.run(df, [{'unknown': 1}]))
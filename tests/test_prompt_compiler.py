@@ -0,0 +1,120 @@
+"""
+Token 預算 Prompt 編譯器測試
+
+1. 數值有效位數、CSV / 緊湊 JSON 編碼與 token 估計
+2. 依優先度在預算內選擇區段版本，必要區段一定放入，輸出維持原順序
+3. 仲裁者的 prompt: 20 根K棒的編譯版本比原本 10 根的 JSON 版本小，且不超過預算
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import csv
+import io
+import json
+
+import numpy as np
+
+from core.arbitrator_consensus_agent import ArbitratorConsensusAgent
+from core.prompt_compiler import (
+    PromptCompiler, PromptSection, compact_json, estimate_tokens, format_number, round_sig, tail_variants, to_csv
+)
+
+
+def test_compact_encoding():
+    """測試1: 編碼"""
+    assert round_sig(65432.123, 5) == 65432 and round_sig(0.00351234, 5) == 0.0035123
+    assert round_sig(1234567.89, 3) == 1234568                # 不丟掉整數位
+    assert [format_number(v) for v in (56585.0, -0.5, 3, 1e-7, float('nan'), True)] == \
+        ['56585', '-0.5', '3', '0.0000001', '', 'true']
+
+    rows = [
+        {'t': '2026-01-01 00:00', 'close': np.float64(60123.456), 'f': {'rsi': 48.21734, 'note': 'a,b'}},
+        {'t': '2026-01-01 00:15', 'close': 60200.0, 'f': {'rsi': None, 'note': 'c'}, 'extra': [1.23456, 2]},
+    ]
+    text = to_csv(rows, digits=4)
+    parsed = list(csv.reader(io.StringIO(text)))
+    assert parsed[0] == ['t', 'close', 'f.rsi', 'f.note', 'extra']
+    assert parsed[1] == ['2026-01-01 00:00', '60123', '48.22', 'a,b', '']
+    assert parsed[2] == ['2026-01-01 00:15', '60200', '', 'c', '[1.235,2]']
+
+    data = {'close': np.float64(56585.0), 'macd': -160.0912, 'flags': [True, None], 'bad': float('inf')}
+    assert json.loads(compact_json(data)) == {'close': 56585, 'macd': -160.09, 'flags': [True, None], 'bad': None}
+    assert ' ' not in compact_json(data)
+
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('市場數據') == 4 and estimate_tokens('abcdefg') == 2
+    assert estimate_tokens(json.dumps(rows[:1], default=float, indent=2)) > estimate_tokens(to_csv(rows[:1]))
+
+
+def test_budget_by_priority():
+    """測試2: 預算分配"""
+    long_text = 'x' * 350                                          # 100 tokens
+    sections = [
+        PromptSection('head', '', ['H' * 35], priority=100, required=True),
+        PromptSection('candles', '# candles', tail_variants(list(range(20)), (20, 10, 5),
+                                                            lambda r: long_text * (len(r) // 5)), priority=60),
+        PromptSection('cases', '# cases', [long_text * 3, long_text], priority=40),
+        PromptSection('empty', '# empty', ['']),
+        PromptSection('tail', '', ['T' * 35], priority=100, required=True),
+    ]
+    full = PromptCompiler(10000).compile(sections)
+    assert full.chosen == {'head': 0, 'candles': 0, 'cases': 0, 'tail': 0} and full.dropped == []
+    assert full.text.startswith('H') and full.text.endswith('T')   # 維持原順序
+
+    mid = PromptCompiler(400).compile(sections)
+    assert mid.chosen['candles'] == 1 and mid.chosen['cases'] == 1 and mid.tokens <= 400
+
+    small = PromptCompiler(200).compile(sections, reserved_tokens=50)
+    assert small.chosen == {'head': 0, 'candles': 2, 'tail': 0} and small.dropped == ['cases']
+    assert small.tokens <= 200 and '# cases' not in small.text
+
+    # 預算連必要區段都放不下時仍放入
+    tiny = PromptCompiler(5).compile(sections)
+    assert set(tiny.chosen) == {'head', 'tail'} and tiny.tokens > 5
+    assert 'cases' in tiny.summary() and '預算 5' in tiny.summary()
+
+
+def _candles(n):
+    rng = np.random.default_rng(0)
+    candles = []
+    for i in range(n):
+        close = 60000 + rng.normal(0, 300)
+        features = {'symbol': 'BTCUSDT', 'close': close}
+        features.update({f'ind_{k}': float(rng.normal(50, 20)) for k in range(35)})
+        candles.append({'timestamp': f'2026-01-01 {i // 4:02d}:{i % 4 * 15:02d}:00', 'open': close - 10,
+                        'high': close + 50, 'low': close - 60, 'close': close, 'volume': 123.456789,
+                        'features': features})
+    return candles
+
+
+def test_arbitrator_prompt_within_budget():
+    """測試3: 仲裁者 prompt"""
+    agent = object.__new__(ArbitratorConsensusAgent)
+    agent.prompt_digits = 5
+    candles = _candles(20)
+    market_data = candles[-1]['features']
+    account = {'total_equity': 1000.123456, 'available_balance': 900.5}
+    cases = [{'entry': market_data, 'outcome': 'profit_2.30%'}] * 10
+    recent = [{'datetime': '2026-01-01 10:00', 'action': 'HOLD', 'confidence': 55, 'reasoning': '等待突破',
+               'arbitration': False}] * 5
+    mt = {tf: {'current': market_data, 'trend_analysis': {'direction': 'UP'}} for tf in ('15m', '1h', '4h')}
+
+    agent.prompt_compiler = None
+    system, legacy, report = agent._build_prompts(market_data, account, None, candles[-10:], cases[:3], recent, mt)
+    assert report is None
+
+    agent.prompt_compiler = PromptCompiler(max_tokens=4000)
+    system2, compiled, report = agent._build_prompts(market_data, account, None, candles, cases, recent, mt)
+    assert system2 == system
+    assert report.tokens <= 4000 and estimate_tokens(system + compiled) <= report.tokens
+    assert estimate_tokens(compiled) < estimate_tokens(legacy) / 2
+    assert report.chosen['candles'] == 0                              # 20 根K棒全部放入
+    csv_block = compiled.split('=== 歷史 K 棒 (CSV，舊到新) ===\n')[1].split('\n\n')[0]
+    assert len(csv_block.split('\n')) == 21 and 'features.symbol' not in csv_block
+    assert compiled.endswith('請基於以上資訊給出交易建議。')
+
+    agent.prompt_compiler = PromptCompiler(max_tokens=1500)
+    _, smaller, report = agent._build_prompts(market_data, account, None, candles, cases, recent, mt)
+    assert report.tokens <= 1500 and report.dropped
+    assert smaller.startswith('=== 市場數據 (15m) ===')
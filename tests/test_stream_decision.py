@@ -0,0 +1,136 @@
+"""
+串流提早決策測試
+
+1. 逐段解析: 被切斷的數字、跳脫的引號、<think> 區塊都不會產生錯誤的欄位，action / confidence 一到就發布
+2. 兩個模型都先輸出 HOLD 時仲裁者不等 reasoning 直接完成；串流結束後以 completed 事件發布完整理由、
+   以新的分析記錄取代 (已返回的決策不修改)，之後才呼叫 on_settled
+3. 非 HOLD 的決策等完整回應後才合併 (與不串流時相同)
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import json
+import threading
+
+from core.arbitrator_consensus_agent import ArbitratorConsensusAgent, ModelInterface
+from core.stream_decision import DecisionStream
+
+
+class StreamingModel(ModelInterface):
+    """先輸出 action / confidence，之後等 gate 放行才輸出 reasoning"""
+
+    def __init__(self, name, action, confidence, gate):
+        super().__init__(name, 'k', f'https://{name}.example/v1', f'{name}-model')
+        self.action = action
+        self.confidence = confidence
+        self.gate = gate
+
+    def analyze_stream(self, system_prompt, user_prompt, on_delta):
+        body = json.dumps({
+            'action': self.action, 'confidence': self.confidence, 'leverage': 2, 'position_size_usdt': 100,
+            'entry_price': 100, 'stop_loss': 98, 'take_profit': 104, 'risk_assessment': 'LOW',
+            'reasoning': f'{self.name} 的完整理由'
+        }, ensure_ascii=False)
+        split = body.index('"leverage"')
+        on_delta(body[:split])
+        self.gate.wait(5)
+        on_delta(body[split:])
+        return {'success': True, 'content': body, 'model': self.model, 'elapsed_time': 0.1}
+
+
+def _agent(tmp_path, model_a, model_b):
+    agent = object.__new__(ArbitratorConsensusAgent)
+    agent.primary_model_a, agent.primary_model_b = model_a, model_b
+    agent.backup_models_a, agent.backup_models_b = [], []
+    agent.model_config = {'hedge_delay_seconds': 0, 'model_deadline_seconds': 10}
+    agent.response_cache = None
+    agent.llm_replay = None
+    agent.prompt_compiler = None
+    agent.prompt_digits = 5
+    agent.trading_executor = None
+    agent.decision_history = []
+    agent.history_file = tmp_path / 'decision_history.json'
+    agent.arbitration_count = agent.agreement_count = 0
+    agent._create_pools(1)
+    return agent
+
+
+def test_incremental_fields_and_early_publish():
+    """測試1: 逐段解析"""
+    published = []
+    deltas = []
+    stream = DecisionStream(on_decision=published.append, on_delta=deltas.append)
+    chunks = ['<think>也許 "action": "BUY", "confidence": 99,</think>',
+              '```json\n{"reasoning": "他說 \\"act', 'ion\\": \\"SELL\\" 是錯的", "confidence": 7',
+              '5, "act', 'ion": "HOLD"', ', "leverage": 3, "reasoning2": "還在輸出']
+    for chunk in chunks[:3]:
+        stream.feed(chunk)
+    assert not stream.ready.is_set() and 'confidence' not in stream.fields        # 75 還沒有分隔符號
+    stream.feed(chunks[3])
+    stream.feed(chunks[4])
+    assert stream.ready.is_set() and published == [{'reasoning': '他說 "action": "SELL" 是錯的',
+                                                     'confidence': 75, 'action': 'HOLD'}]
+    stream.feed(chunks[5])
+    assert stream.fields['leverage'] == 3 and 'reasoning2' not in stream.fields
+    assert len(published) == 1 and ''.join(deltas) == stream.text == ''.join(chunks)
+
+    unfinished = DecisionStream()
+    unfinished.feed('<think>"action": "BUY", "confidence": 90,')
+    assert unfinished.fields == {}
+    unfinished.finish()
+    assert unfinished.wait_ready(0) and unfinished.decision is None
+
+
+def test_early_hold_completes_before_reasoning(tmp_path):
+    """測試2: 兩個 HOLD 提早完成"""
+    gate = threading.Event()
+    settled = threading.Event()
+    agent = _agent(tmp_path, StreamingModel('a', 'HOLD', 60, gate), StreamingModel('b', 'HOLD', 70, gate))
+    events = []
+    decision = agent.analyze_with_arbitration({'close': 100}, {'total_equity': 1000},
+                                              on_stream=lambda event, payload: events.append((event, payload)),
+                                              on_settled=settled.set)
+
+    assert not gate.is_set() and not settled.is_set()                           # reasoning 還沒輸出，名額不釋放
+    assert decision['action'] == 'HOLD' and decision['confidence'] == 70 and decision['arbitration'] is False
+    assert sorted(p['label'] for e, p in events if e == 'decision') == ['Model A', 'Model B']
+    record = agent.decision_history[-1]
+    assert record['decision_a']['early'] and agent.agreement_count == 1
+    early_detail = agent.get_last_analysis_detail()
+    returned = json.dumps([decision, record], ensure_ascii=False, sort_keys=True)
+
+    gate.set()
+    assert settled.wait(5)
+    assert json.dumps([decision, record], ensure_ascii=False, sort_keys=True) == returned     # 已返回的不修改
+    assert early_detail['model_responses']['model_b']['raw_content'] is None
+    detail = agent.get_last_analysis_detail()
+    assert detail is not early_detail and detail['model_responses']['model_b']['reasoning'] == 'b 的完整理由'
+    assert json.loads(detail['model_responses']['model_a']['raw_content'])['action'] == 'HOLD'
+    completed = {p['label']: p['reasoning'] for e, p in events if e == 'completed'}
+    assert completed == {'Model A': 'a 的完整理由', 'Model B': 'b 的完整理由'}
+    assert [p['success'] for e, p in events if e == 'done'] == [True, True]
+
+    settled.clear()
+    agent.model_config['streaming'] = {'enabled': False}
+    agent.analyze_with_arbitration({'close': 100}, {'total_equity': 1000}, on_settled=settled.set)
+    assert settled.is_set()                                                      # 不串流時返回前就已結束
+
+
+def test_trade_decisions_wait_for_full_response(tmp_path):
+    """測試3: 非 HOLD 等待完整回應"""
+    gate = threading.Event()
+    agent = _agent(tmp_path, StreamingModel('a', 'OPEN_LONG', 80, gate), StreamingModel('b', 'OPEN_LONG', 70, gate))
+    early = []
+
+    def on_stream(event, payload):
+        if event == 'decision':
+            early.append(payload['action'])
+            if len(early) == 2:
+                gate.set()                                  # 兩個決策都提早送到前端後才放行 reasoning
+
+    decision = agent.analyze_with_arbitration({'close': 100}, {'total_equity': 1000}, on_stream=on_stream)
+    assert early == ['OPEN_LONG', 'OPEN_LONG']
+    assert decision['action'] == 'OPEN_LONG' and decision['stop_loss'] == 98 and decision['leverage'] == 2
+    assert 'a 的完整理由' in decision['reasoning']
+    assert not agent.decision_history[-1]['decision_a'].get('early')
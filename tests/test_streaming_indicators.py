@@ -0,0 +1,111 @@
+"""
+串流指標狀態測試
+
+1. 逐根更新的結果與 talib 在同一段數據上的結果一致
+2. checkpoint / restore 後繼續更新，結果與不中斷時相同
+3. 重複的 K 棒不會被重複計算，preview 不改變狀態
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+import talib
+
+from core.streaming_indicators import StreamingIndicatorState, StreamingIndicatorRegistry
+
+
+def _make_ohlcv(n=600, seed=11):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.003, n))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.003, n))
+    volume = rng.uniform(50, 500, n)
+    open_time = pd.date_range('2026-01-01', periods=n, freq='15min')
+    return pd.DataFrame({
+        'open_time': open_time, 'open': open_, 'high': high, 'low': low,
+        'close': close, 'volume': volume
+    })
+
+
+def _talib_reference(df):
+    close, high, low, volume = (df[c].values for c in ('close', 'high', 'low', 'volume'))
+    macd, macd_signal, macd_hist = talib.MACD(close)
+    stoch_k, stoch_d = talib.STOCH(high, low, close)
+    bb_upper, bb_middle, bb_lower = talib.BBANDS(close, timeperiod=20)
+    return {
+        'ema9': talib.EMA(close, timeperiod=9),
+        'ema21': talib.EMA(close, timeperiod=21),
+        'ema50': talib.EMA(close, timeperiod=50),
+        'ema200': talib.EMA(close, timeperiod=200),
+        'macd': macd,
+        'macd_signal': macd_signal,
+        'macd_hist': macd_hist,
+        'adx': talib.ADX(high, low, close, timeperiod=14),
+        'rsi': talib.RSI(close, timeperiod=14),
+        'stoch_k': stoch_k,
+        'stoch_d': stoch_d,
+        'cci': talib.CCI(high, low, close, timeperiod=14),
+        'mfi': talib.MFI(high, low, close, volume, timeperiod=14),
+        'willr': talib.WILLR(high, low, close, timeperiod=14),
+        'atr': talib.ATR(high, low, close, timeperiod=14),
+        'bb_upper': bb_upper,
+        'bb_middle': bb_middle,
+        'bb_lower': bb_lower,
+        'volume_ma': pd.Series(volume).rolling(20).mean().values,
+        'obv': talib.OBV(close, volume),
+    }
+
+
+def test_parity_with_talib():
+    """測試1: 逐根更新與 talib 結果一致"""
+    df = _make_ohlcv()
+    reference = _talib_reference(df)
+
+    state = StreamingIndicatorState('BTCUSDT', '15m')
+    rows = [state.update(row) for row in df.to_dict('records')]
+
+    for name, expected in reference.items():
+        actual = np.array([r[name] for r in rows])
+        np.testing.assert_array_equal(np.isnan(actual), np.isnan(expected), err_msg=name)
+        np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=name)
+
+
+def test_checkpoint_restore():
+    """測試2: checkpoint / restore 後結果不變"""
+    df = _make_ohlcv(400)
+    records = df.to_dict('records')
+
+    uninterrupted = StreamingIndicatorState('BTCUSDT', '15m')
+    for row in records:
+        uninterrupted.update(row)
+
+    first = StreamingIndicatorState('BTCUSDT', '15m')
+    for row in records[:250]:
+        first.update(row)
+    restored = StreamingIndicatorState.restore(first.checkpoint())
+    for row in records[250:]:
+        restored.update(row)
+
+    assert restored.bars == uninterrupted.bars
+    assert restored.current == uninterrupted.current
+    assert list(restored.history) == list(uninterrupted.history)
+
+
+def test_duplicate_and_preview():
+    """測試3: 重複 K 棒忽略，preview 不改變狀態"""
+    df = _make_ohlcv(300)
+    registry = StreamingIndicatorRegistry()
+    state = registry.sync('BTCUSDT', '15m', df.iloc[:-1])
+    before = state.checkpoint()
+
+    preview = state.preview(df.iloc[-1])
+    assert state.checkpoint() == before
+
+    assert state.update(df.iloc[-2]) is None
+    assert state.update(df.iloc[-1]) == preview
+
+    # 同步相同的數據不會新增 K 棒
+    assert registry.sync('BTCUSDT', '15m', df).bars == len(df)
@@ -0,0 +1,72 @@
+"""
+時間框架重採樣測試
+
+1. 推導結果與 pandas resample 一致 (UTC 對齊，不完整的第一個桶被捨棄)
+2. 增量更新與完整重建結果相同
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+
+from core.timeframe_resampler import TimeframeResampler, can_resample
+
+
+def _make_15m(n=1000, seed=9, start='2026-01-01 02:45'):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    open_time = pd.date_range(start, periods=n, freq='15min')
+    df = pd.DataFrame({
+        'open_time': open_time,
+        'open': open_,
+        'high': np.maximum(open_, close) * (1 + rng.uniform(0, 0.003, n)),
+        'low': np.minimum(open_, close) * (1 - rng.uniform(0, 0.003, n)),
+        'close': close,
+        'volume': rng.uniform(50, 500, n),
+        'close_time': open_time + pd.Timedelta(minutes=15) - pd.Timedelta(milliseconds=1),
+    })
+    df['timestamp'] = df['open_time']
+    return df
+
+
+def _pandas_resample(df, rule):
+    grouped = df.set_index('open_time').resample(rule, origin='epoch')
+    expected = pd.DataFrame({
+        'open': grouped['open'].first(),
+        'high': grouped['high'].max(),
+        'low': grouped['low'].min(),
+        'close': grouped['close'].last(),
+        'volume': grouped['volume'].sum(),
+    }).dropna()
+    return expected.iloc[1:]  # 第一個桶不完整 (02:45 開始)
+
+
+def test_matches_pandas_resample():
+    """測試1: 與 pandas resample 一致"""
+    assert can_resample('15m', '4h') and not can_resample('1h', '15m')
+    df = _make_15m()
+    resampler = TimeframeResampler()
+
+    for tf, rule in (('1h', '1h'), ('4h', '4h'), ('1d', '24h')):
+        derived = resampler.resample('BTCUSDT', df, '15m', tf)
+        expected = _pandas_resample(df, rule)
+        assert list(derived['open_time']) == list(expected.index)
+        for column in ('open', 'high', 'low', 'close'):
+            np.testing.assert_array_equal(derived[column].values, expected[column].values)
+        np.testing.assert_allclose(derived['volume'].values, expected['volume'].values, rtol=1e-12)
+        assert (derived['close_time'] - derived['open_time']).iloc[0] == pd.Timedelta(rule) - pd.Timedelta(milliseconds=1)
+
+
+def test_incremental_matches_rebuild():
+    """測試2: 增量更新與完整重建相同"""
+    df = _make_15m(1200)
+    incremental = TimeframeResampler(max_bars=100)
+    for end in (600, 601, 605, 640, 1200):
+        result = incremental.resample('BTCUSDT', df.iloc[:end], '15m', '1h', limit=100)
+
+    rebuilt = TimeframeResampler(max_bars=100).resample('BTCUSDT', df, '15m', '1h', limit=100)
+    assert incremental.stats == {'rebuilds': 1, 'incremental': 4}
+    pd.testing.assert_frame_equal(result, rebuilt)
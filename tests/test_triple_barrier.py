@@ -0,0 +1,124 @@
+"""
+向量化三重障礙標籤測試 (與原本逐根 K 棒迴圈的結果逐一比對)
+
+1. V3 波動率障礙 (含 NaN 波動率、同一根K線同時碰到上下軌)
+2. V12 ATR 障礙與首次觸碰位置、同時觸碰的處理方式
+3. V8 未來最高 / 最低價與 rolling 的結果一致
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+
+from core.triple_barrier import atr_barriers, forward_extremes, triple_barrier_labels, vol_barriers
+
+
+def _make_ohlc(n=3000, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    high = close * (1 + np.abs(rng.normal(0, 0.004, n)))
+    low = close * (1 - np.abs(rng.normal(0, 0.004, n)))
+    # 製造大量長下影線，確保有同一根K線同時碰到上下軌的情況
+    spikes = rng.random(n) < 0.05
+    high[spikes] *= 1.03
+    low[spikes] *= 0.97
+    return close, high, low
+
+
+def _legacy_v3(closes, highs, lows, vols, pt_ratio, sl_ratio, min_return, t_bars):
+    labels = np.zeros(len(closes))
+    for i in range(len(closes) - t_bars):
+        if np.isnan(vols[i]) or vols[i] == 0:
+            continue
+        pt_target = max(pt_ratio * vols[i], min_return)
+        sl_target = max(sl_ratio * vols[i], min_return)
+        barrier_up = closes[i] * (1 + pt_target)
+        barrier_down = closes[i] * (1 - sl_target)
+        hit_label = 0
+        for j in range(1, t_bars + 1):
+            idx = i + j
+            if highs[idx] >= barrier_up and lows[idx] <= barrier_down:
+                hit_label = -1
+                break
+            if highs[idx] >= barrier_up:
+                hit_label = 1
+                break
+            elif lows[idx] <= barrier_down:
+                hit_label = -1
+                break
+        labels[i] = hit_label
+    return labels
+
+
+def _legacy_v12(high_vals, low_vals, tp_vals, sl_vals, look_forward):
+    targets = np.zeros(len(high_vals))
+    for i in range(len(high_vals) - look_forward):
+        window_high = high_vals[i+1 : i+1+look_forward]
+        window_low = low_vals[i+1 : i+1+look_forward]
+        hit_tp_idx = np.argmax(window_high >= tp_vals[i])
+        hit_sl_idx = np.argmax(window_low <= sl_vals[i])
+        did_hit_tp = window_high[hit_tp_idx] >= tp_vals[i]
+        did_hit_sl = window_low[hit_sl_idx] <= sl_vals[i]
+        if did_hit_tp and (not did_hit_sl or hit_tp_idx < hit_sl_idx):
+            targets[i] = 1
+    return targets
+
+
+def test_v3_vol_barriers_match_loop():
+    """測試1: V3 波動率障礙"""
+    close, high, low = _make_ohlc()
+    vols = pd.Series(close).pct_change().rolling(20).std().clip(lower=0.001).values
+
+    expected = _legacy_v3(close, high, low, vols, 3.0, 1.5, 0.005, 48)
+    upper, lower = vol_barriers(close, vols, 3.0, 1.5, 0.005)
+    labels, touch = triple_barrier_labels(
+        high, low, upper, lower, 48, tie='stop', valid=~np.isnan(vols) & (vols != 0), chunk_rows=500
+    )
+
+    assert np.array_equal(labels.astype(float), expected)
+    assert set(np.unique(labels)) == {-1, 0, 1}
+    assert np.all((touch == 0) == (labels == 0))
+    assert np.all(touch[-48:] == 0)
+
+
+def test_v12_atr_barriers_and_tie_policy():
+    """測試2: V12 ATR 障礙、首次觸碰位置與同時觸碰"""
+    close, high, low = _make_ohlc(seed=11)
+    atr = pd.Series(high - low).rolling(14).mean().values  # 開頭為 NaN
+
+    upper, lower = atr_barriers(close, atr, 2.0, 1.0)
+    labels, touch = triple_barrier_labels(high, low, upper, lower, 36)
+    assert np.array_equal((labels == 1).astype(float), _legacy_v12(high, low, upper, lower, 36))
+
+    # 首次觸碰位置: 該根K線確實碰到障礙，且之前的K線都沒碰到
+    for i in np.flatnonzero(touch):
+        k = touch[i]
+        hit = high[i + k] >= upper[i] if labels[i] == 1 else low[i + k] <= lower[i]
+        assert hit
+        assert not np.any(high[i + 1:i + k] >= upper[i]) and not np.any(low[i + 1:i + k] <= lower[i])
+
+    # 同時觸碰: 只影響兩軌在同一根K線首次被碰到的列
+    profit, _ = triple_barrier_labels(high, low, upper, lower, 36, tie='profit')
+    neutral, _ = triple_barrier_labels(high, low, upper, lower, 36, tie='neutral')
+    ties = profit != labels
+    assert ties.any()
+    assert np.all(labels[ties] == -1) and np.all(profit[ties] == 1) and np.all(neutral[ties] == 0)
+    assert np.array_equal(neutral[~ties], labels[~ties])
+
+
+def test_v8_forward_extremes_match_rolling():
+    """測試3: V8 未來最高 / 最低價"""
+    close, high, low = _make_ohlc(n=500, seed=3)
+    df = pd.DataFrame({'high': high, 'low': low})
+    forward = 6
+
+    expected_high = df['high'].shift(-forward).rolling(forward, min_periods=1).max().values
+    expected_low = df['low'].shift(-forward).rolling(forward, min_periods=1).min().values
+    future_high, future_low = forward_extremes(high, low, forward)
+
+    # rolling 在開頭 forward-1 列的視窗被截斷，其餘 (包括尾端) 完全相同
+    np.testing.assert_array_equal(future_high[forward - 1:], expected_high[forward - 1:])
+    np.testing.assert_array_equal(future_low[forward - 1:], expected_low[forward - 1:])
+    assert future_high[0] == high[1:forward + 1].max()
@@ -0,0 +1,66 @@
+"""
+滾動前進驗證測試
+
+1. 滾動 / 錨定視窗的切分與 purge
+2. 多行程與單行程結果一致，樣本外預測接回原本的索引
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.walk_forward import Fold, WalkForward
+
+
+def _fit_predict(train_df, test_df):
+    """最小平方法: 用 x 預測 y"""
+    slope, intercept = np.polyfit(train_df['x'].values, train_df['y'].values, 1)
+    score = slope * test_df['x'].values + intercept
+    return {'score': score, 'slope': slope, 'train_rows': len(train_df)}
+
+
+def test_rolling_and_anchored_folds():
+    """測試1: 視窗切分"""
+    rolling = WalkForward(train_bars=100, test_bars=30, purge_bars=5).folds(200)
+    assert rolling == [
+        Fold(0, 0, 95, 100, 130),
+        Fold(1, 30, 125, 130, 160),
+        Fold(2, 60, 155, 160, 190),
+        Fold(3, 90, 185, 190, 200),
+    ]
+
+    anchored = WalkForward(train_bars=100, test_bars=30, step_bars=50, anchored=True).folds(200)
+    assert [(f.train_start, f.train_end, f.test_start, f.test_end) for f in anchored] == [
+        (0, 100, 100, 130), (0, 150, 150, 180)
+    ]
+
+    with pytest.raises(ValueError):
+        WalkForward(train_bars=10, test_bars=5, purge_bars=10)
+    with pytest.raises(ValueError):
+        WalkForward(train_bars=100, test_bars=30, max_workers=1).run(pd.DataFrame({'x': np.arange(50.0)}), _fit_predict)
+
+
+def test_pooled_matches_inline_and_stitch():
+    """測試2: 兩個工作行程與單行程一致，樣本外預測只填在測試視窗"""
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=500)
+    # 斜率隨時間改變，每個 fold 的模型應該不同
+    slope = np.linspace(1.0, 3.0, 500)
+    dataset = pd.DataFrame({'x': x, 'y': slope * x + rng.normal(0, 0.01, 500)})
+
+    inline = WalkForward(200, 100, purge_bars=10, max_workers=1).run(dataset, _fit_predict)
+    pooled = WalkForward(200, 100, purge_bars=10, max_workers=2).run(dataset, _fit_predict)
+
+    assert [r['fold'] for r in pooled] == [r['fold'] for r in inline]
+    for a, b in zip(inline, pooled):
+        np.testing.assert_array_equal(a['score'], b['score'])
+    assert [r['train_rows'] for r in inline] == [190, 190, 190]
+    assert inline[0]['slope'] < inline[1]['slope'] < inline[2]['slope']
+
+    stitched = WalkForward.stitch(len(dataset), inline, 'score')
+    assert np.isnan(stitched[:200]).all() and not np.isnan(stitched[200:]).any()
+    np.testing.assert_array_equal(stitched[300:400], inline[1]['score'])
+    assert np.array_equal(WalkForward.test_rows(inline), np.arange(200, 500))